@@ -10,6 +10,7 @@ from werkzeug.exceptions import NotFound
 
 from configs import dify_config
 from constants.languages import languages
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
 from core.rag.datasource.vdb.vector_factory import Vector
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.index_processor.constant.built_in_field import BuiltInField
@@ -21,7 +22,14 @@ from libs.helper import email as email_validate
 from libs.password import hash_password, password_pattern, valid_password
 from libs.rsa import generate_key_pair
 from models import Tenant
-from models.dataset import Dataset, DatasetCollectionBinding, DatasetMetadata, DatasetMetadataBinding, DocumentSegment
+from models.dataset import (
+    Dataset,
+    DatasetCollectionBinding,
+    DatasetKeywordTable,
+    DatasetMetadata,
+    DatasetMetadataBinding,
+    DocumentSegment,
+)
 from models.dataset import Document as DatasetDocument
 from models.model import Account, App, AppAnnotationSetting, AppMode, Conversation, MessageAnnotation
 from models.provider import Provider, ProviderModel
@@ -132,6 +140,7 @@ def reset_encrypt_key_pair():
         db.session.query(Provider).filter(Provider.provider_type == "custom", Provider.tenant_id == tenant.id).delete()
         db.session.query(ProviderModel).filter(ProviderModel.tenant_id == tenant.id).delete()
         db.session.commit()
+        ProviderConfigurationsCache.invalidate(tenant.id)
 
         click.echo(
             click.style(
@@ -609,6 +618,51 @@ def old_metadata_migration():
     click.echo(click.style("Old metadata migration completed.", fg="green"))
 
 
+@click.command("migrate-keyword-index", help="Migrate dataset keyword tables to the inverted keyword index.")
+@click.option("--batch-size", default=100, prompt=False, help="Number of keyword tables loaded per page.")
+def migrate_keyword_index(batch_size: int):
+    """
+    Copy every dataset keyword table into the posting rows used by the jieba_inverted_index keyword store.
+    The legacy tables are kept untouched, so the command can be re-run safely.
+    """
+    from core.rag.datasource.keyword.jieba.jieba_inverted_index import JiebaInvertedIndex
+
+    click.echo(click.style("Starting keyword index migration.", fg="green"))
+
+    migrated_count = 0
+    page = 1
+    while True:
+        try:
+            keyword_tables = DatasetKeywordTable.query.order_by(DatasetKeywordTable.id).paginate(
+                page=page, per_page=batch_size
+            )
+        except NotFound:
+            break
+        if not keyword_tables.items:
+            break
+        for keyword_table in keyword_tables:
+            try:
+                dataset = db.session.query(Dataset).filter(Dataset.id == keyword_table.dataset_id).first()
+                keyword_table_dict = keyword_table.keyword_table_dict
+                if not dataset or not keyword_table_dict:
+                    continue
+                table = keyword_table_dict["__data__"]["table"]
+                postings = [(keyword, node_id) for keyword, node_ids in table.items() for node_id in node_ids]
+                JiebaInvertedIndex(dataset).add_postings(postings)
+                migrated_count += 1
+                click.echo(f"Migrated keyword table of dataset {dataset.id}: {len(table)} keywords.")
+            except Exception as e:
+                db.session.rollback()
+                click.echo(
+                    click.style(
+                        f"Failed to migrate keyword table of dataset {keyword_table.dataset_id}: {str(e)}", fg="red"
+                    )
+                )
+        page += 1
+
+    click.echo(click.style(f"Keyword index migration completed, migrated {migrated_count} datasets.", fg="green"))
+
+
 @click.command("create-tenant", help="Create account and tenant.")
 @click.option("--email", prompt=True, help="Tenant account email.")
 @click.option("--name", prompt=True, help="Workspace name.")
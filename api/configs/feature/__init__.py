@@ -5,6 +5,7 @@ from pydantic import (
     Field,
     HttpUrl,
     NegativeInt,
+    NonNegativeFloat,
     NonNegativeInt,
     PositiveFloat,
     PositiveInt,
@@ -65,6 +66,18 @@ class AppExecutionConfig(BaseSettings):
         description="Maximum number of requests per app per day",
         default=5000,
     )
+    APP_STOP_FLAG_CHECK_INTERVAL: PositiveFloat = Field(
+        description="Minimum interval in seconds between two checks of the stop flag of a running task in Redis",
+        default=0.5,
+    )
+    APP_STREAM_COALESCE_WINDOW_MS: NonNegativeInt = Field(
+        description="Window in milliseconds to merge consecutive streamed text chunks into one event, 0 to disable",
+        default=0,
+    )
+    APP_STREAM_COALESCE_MAX_BYTES: PositiveInt = Field(
+        description="Maximum size in bytes of the text merged from consecutive streamed text chunks",
+        default=4096,
+    )
 
 
 class CodeExecutionSandboxConfig(BaseSettings):
@@ -97,6 +110,42 @@ class CodeExecutionSandboxConfig(BaseSettings):
         default=10.0,
     )
 
+    CODE_EXECUTION_POOL_MAX_CONNECTIONS: PositiveInt = Field(
+        description="Maximum number of connections to the code execution service per worker process",
+        default=100,
+    )
+
+    CODE_EXECUTION_POOL_MAX_KEEPALIVE_CONNECTIONS: NonNegativeInt = Field(
+        description="Maximum number of idle keep-alive connections to the code execution service",
+        default=20,
+    )
+
+    CODE_EXECUTION_POOL_KEEPALIVE_EXPIRY: PositiveFloat = Field(
+        description="Time in seconds an idle keep-alive connection to the code execution service is kept",
+        default=5.0,
+    )
+
+    CODE_EXECUTION_MAX_CONCURRENCY_PER_TENANT: NonNegativeInt = Field(
+        description="Maximum number of concurrent code executions of a tenant per worker process, 0 means unlimited",
+        default=20,
+    )
+
+    CODE_EXECUTION_BATCH_ENABLED: bool = Field(
+        description="Run concurrent executions of the same code, e.g. parallel iteration items, in one sandbox run",
+        default=False,
+    )
+
+    CODE_EXECUTION_BATCH_WINDOW_MS: NonNegativeInt = Field(
+        description="Time in milliseconds to wait for concurrent executions to join a batch, an execution starting"
+        " while no other execution of the same code is in flight runs right away",
+        default=10,
+    )
+
+    CODE_EXECUTION_BATCH_MAX_SIZE: PositiveInt = Field(
+        description="Maximum number of executions run together in one sandbox run",
+        default=32,
+    )
+
     CODE_MAX_NUMBER: PositiveInt = Field(
         description="Maximum allowed numeric value in code execution",
         default=9223372036854775807,
@@ -137,6 +186,37 @@ class CodeExecutionSandboxConfig(BaseSettings):
         default=1000,
     )
 
+    JINJA2_LOCAL_RENDER_ENABLED: bool = Field(
+        description="Render Jinja2 templates in-process with a sandboxed environment instead of the code sandbox",
+        default=False,
+    )
+
+    JINJA2_LOCAL_RENDER_MODE: Literal["thread", "process"] = Field(
+        description="Isolation of local Jinja2 rendering, a thread pool or worker processes replaced on timeout."
+        " The process pool falls back to threads in gevent and daemonic worker processes",
+        default="thread",
+    )
+
+    JINJA2_LOCAL_RENDER_MAX_WORKERS: PositiveInt = Field(
+        description="Maximum number of threads or processes rendering Jinja2 templates locally",
+        default=4,
+    )
+
+    JINJA2_LOCAL_RENDER_TIMEOUT: PositiveFloat = Field(
+        description="Maximum time in seconds to render a Jinja2 template locally",
+        default=5.0,
+    )
+
+    JINJA2_LOCAL_RENDER_MAX_OUTPUT_LENGTH: PositiveInt = Field(
+        description="Maximum number of characters a locally rendered Jinja2 template may produce",
+        default=1000000,
+    )
+
+    JINJA2_LOCAL_RENDER_TEMPLATE_CACHE_SIZE: PositiveInt = Field(
+        description="Maximum number of compiled Jinja2 templates cached per process",
+        default=256,
+    )
+
 
 class PluginConfig(BaseSettings):
     """
@@ -153,6 +233,11 @@ class PluginConfig(BaseSettings):
         default="plugin-api-key",
     )
 
+    PLUGIN_DAEMON_POOL_MAX_SIZE: PositiveInt = Field(
+        description="Maximum number of keep-alive connections to the plugin daemon per worker process",
+        default=64,
+    )
+
     INNER_API_KEY_FOR_PLUGIN: str = Field(description="Inner api key for plugin", default="inner-api-key")
 
     PLUGIN_REMOTE_INSTALL_HOST: str = Field(
@@ -381,6 +466,26 @@ class HttpConfig(BaseSettings):
         default=5,
     )
 
+    SSRF_POOL_MAX_CONNECTIONS: PositiveInt = Field(
+        description="Maximum number of connections of each pooled HTTP client used for network requests (SSRF)",
+        default=100,
+    )
+
+    SSRF_POOL_MAX_KEEPALIVE_CONNECTIONS: NonNegativeInt = Field(
+        description="Maximum number of idle keep-alive connections of each pooled HTTP client (SSRF)",
+        default=20,
+    )
+
+    SSRF_POOL_KEEPALIVE_EXPIRY: PositiveFloat = Field(
+        description="Time in seconds after which idle keep-alive connections are closed (SSRF)",
+        default=5.0,
+    )
+
+    SSRF_POOL_HTTP2_ENABLED: bool = Field(
+        description="Enable HTTP/2 for network requests (SSRF), requires the h2 package",
+        default=False,
+    )
+
     RESPECT_XFORWARD_HEADERS_ENABLED: bool = Field(
         description="Enable handling of X-Forwarded-For, X-Forwarded-Proto, and X-Forwarded-Port headers"
         " when the app is behind a single trusted reverse proxy.",
@@ -450,6 +555,63 @@ class ModelLoadBalanceConfig(BaseSettings):
         default=False,
     )
 
+    MODEL_LB_STRATEGY: Literal["round_robin", "least_in_flight", "latency_weighted"] = Field(
+        description="Strategy picking the load balancing config of a model: round_robin, least_in_flight"
+        " (fewest running invocations in the process) or latency_weighted (weighted by the observed latency)",
+        default="round_robin",
+    )
+
+    MODEL_LB_COOLDOWN_SYNC_INTERVAL: NonNegativeFloat = Field(
+        description="Interval in seconds between two reads of the cooldowns set by other processes from redis,"
+        " 0 to read them on every invocation",
+        default=5.0,
+    )
+
+    MODEL_LB_LATENCY_EWMA_ALPHA: PositiveFloat = Field(
+        description="Weight of the latest sample in the moving average latency used by the latency_weighted strategy",
+        default=0.2,
+        le=1,
+    )
+
+
+class ModelProviderCacheConfig(BaseSettings):
+    """
+    Configuration for the process-local cache of model provider configurations
+    """
+
+    PROVIDER_CONFIGURATIONS_CACHE_ENABLED: bool = Field(
+        description="Cache the provider configurations built for a workspace in each process",
+        default=True,
+    )
+
+    PROVIDER_CONFIGURATIONS_CACHE_TTL: PositiveInt = Field(
+        description="Time in seconds a cached provider configuration is kept, bounds the staleness of hosted quotas",
+        default=60,
+    )
+
+    PROVIDER_CONFIGURATIONS_CACHE_MAX_TENANTS: PositiveInt = Field(
+        description="Maximum number of workspaces whose provider configurations are cached in each process",
+        default=1000,
+    )
+
+
+class OpsTraceConfig(BaseSettings):
+    """
+    Configuration for the export of app traces to the tracing providers
+    """
+
+    OPS_TRACE_BATCH_EXPORT_ENABLED: bool = Field(
+        description="Export the traces collected at each interval as one compressed file and one celery task"
+        " instead of one file and one celery task per trace",
+        default=False,
+    )
+
+    OPS_TRACE_QUEUE_MAX_SIZE: NonNegativeInt = Field(
+        description="Maximum number of traces waiting for export in each process, new traces are dropped"
+        " when the queue is full, 0 for no limit",
+        default=10000,
+    )
+
 
 class BillingConfig(BaseSettings):
     """
@@ -510,10 +672,51 @@ class WorkflowNodeExecutionConfig(BaseSettings):
     """
 
     MAX_SUBMIT_COUNT: PositiveInt = Field(
-        description="Maximum number of submitted thread count in a ThreadPool for parallel node execution",
+        description="Deprecated, parallel node executions are queued by the workflow scheduler instead of rejected.",
+        default=100,
+    )
+
+    WORKFLOW_SCHEDULER_MAX_WORKERS: PositiveInt = Field(
+        description="Maximum number of threads of the process-wide pool running parallel branches and iterations",
         default=100,
     )
 
+    WORKFLOW_SCHEDULER_MAX_WORKERS_PER_RUN: PositiveInt = Field(
+        description="Maximum number of parallel branches of a single workflow run executed at the same time",
+        default=10,
+    )
+
+    WORKFLOW_SCHEDULER_MAX_WORKERS_PER_TENANT: PositiveInt = Field(
+        description="Maximum number of workflow scheduler threads a single tenant can use at the same time",
+        default=50,
+    )
+
+    WORKFLOW_SCHEDULER_MAX_QUEUED_TASKS: PositiveInt = Field(
+        description="Maximum number of parallel branches and iterations waiting for a thread before new ones block",
+        default=10000,
+    )
+
+    WORKFLOW_SCHEDULER_QUEUE_TIMEOUT: PositiveFloat = Field(
+        description="Maximum time in seconds a parallel branch or iteration waits for room in the scheduler queue",
+        default=60.0,
+    )
+
+    WORKFLOW_NODE_EXECUTION_FLUSH_INTERVAL: PositiveFloat = Field(
+        description="Interval in seconds between two bulk writes of the node executions of a running workflow",
+        default=1.0,
+    )
+
+    WORKFLOW_NODE_EXECUTION_FLUSH_BATCH_SIZE: PositiveInt = Field(
+        description="Number of buffered node execution changes that triggers a bulk write before the flush interval",
+        default=100,
+    )
+
+    WORKFLOW_NODE_EXECUTION_FLUSH_ON_FINISH: bool = Field(
+        description="Write every finished node execution right away instead of with the next bulk write,"
+        " one transaction per node",
+        default=False,
+    )
+
 
 class AuthConfig(BaseSettings):
     """
@@ -666,6 +869,24 @@ class RagEtlConfig(BaseSettings):
         default="database",
     )
 
+    KEYWORD_EXTRACTION_MAX_WORKERS: NonNegativeInt = Field(
+        description="Number of worker processes extracting the keywords of large batches of chunks,"
+        " 0 or 1 to extract them in the current process. The workers are started with the first large batch"
+        " of each api or celery worker process",
+        default=0,
+    )
+
+    KEYWORD_EXTRACTION_WORKER_TIMEOUT: PositiveFloat = Field(
+        description="Maximum time in seconds to wait for the keyword extraction workers to answer a batch,"
+        " the workers are restarted and the batch is extracted in the current process when they don't",
+        default=300.0,
+    )
+
+    KEYWORD_EXTRACTION_PROCESS_POOL_THRESHOLD: PositiveInt = Field(
+        description="Minimum number of chunks in a batch before keyword extraction is fanned out to processes",
+        default=500,
+    )
+
     UNSTRUCTURED_API_URL: Optional[str] = Field(
         description="API URL for Unstructured.io service",
         default=None,
@@ -717,6 +938,22 @@ class DataSetConfig(BaseSettings):
         default=30,
     )
 
+    QUERY_EMBEDDING_CACHE_TTL: PositiveInt = Field(
+        description="Time in seconds a query embedding is kept in the in-process and Redis caches",
+        default=600,
+    )
+
+    QUERY_EMBEDDING_LOCAL_CACHE_SIZE: NonNegativeInt = Field(
+        description="Maximum number of query embeddings kept in the in-process LRU cache, 0 to disable it",
+        default=1024,
+    )
+
+    DATASET_GROUP_SEARCH_ENABLED: bool = Field(
+        description="Search the knowledge bases of an app sharing a vector collection with one query"
+        " instead of one query per knowledge base, on vector stores supporting it",
+        default=True,
+    )
+
 
 class WorkspaceConfig(BaseSettings):
     """
@@ -744,6 +981,16 @@ class IndexingConfig(BaseSettings):
         default=50,
     )
 
+    TOKEN_COUNTER_CACHE_SIZE: PositiveInt = Field(
+        description="Maximum number of token counts memoized per process by text hash",
+        default=100000,
+    )
+
+    TOKEN_COUNTER_LOCAL_ENCODING_ENABLED: bool = Field(
+        description="Count the tokens of known model families with a local tiktoken encoding instead of the provider",
+        default=True,
+    )
+
 
 class MultiModalTransferConfig(BaseSettings):
     MULTIMODAL_SEND_FORMAT: Literal["base64", "url"] = Field(
@@ -872,8 +1119,10 @@ class FeatureConfig(
     LoggingConfig,
     MailConfig,
     ModelLoadBalanceConfig,
+    ModelProviderCacheConfig,
     ModerationConfig,
     MultiModalTransferConfig,
+    OpsTraceConfig,
     PositionConfig,
     RagEtlConfig,
     SecurityConfig,
@@ -82,11 +82,29 @@ class VectorStoreConfig(BaseSettings):
         default=False,
     )
 
+    VECTOR_STORE_CLIENT_SHARING_ENABLED: bool = Field(
+        description="Share one client or connection pool per vector store configuration across the process"
+        " instead of creating one for every vector store instance.",
+        default=True,
+    )
+
+    VECTOR_STORE_CLIENT_IDLE_TIMEOUT: PositiveInt = Field(
+        description="Time in seconds after which a shared vector store client that was not used is dropped.",
+        default=600,
+    )
+
+    VECTOR_STORE_CLIENT_HEALTH_CHECK_INTERVAL: PositiveInt = Field(
+        description="Minimum time in seconds between two health checks of a shared vector store client.",
+        default=60,
+    )
+
 
 class KeywordStoreConfig(BaseSettings):
     KEYWORD_STORE: str = Field(
         description="Method for keyword extraction and storage."
-        " Default is 'jieba', a Chinese text segmentation library.",
+        " Default is 'jieba', a Chinese text segmentation library."
+        " 'jieba_inverted_index' stores jieba keywords as per-keyword posting rows,"
+        " run `flask migrate-keyword-index` before switching to it.",
         default="jieba",
     )
 
@@ -170,10 +188,32 @@ class DatabaseConfig(BaseSettings):
     )
 
     RETRIEVAL_SERVICE_EXECUTORS: NonNegativeInt = Field(
-        description="Number of processes for the retrieval service, default to CPU cores.",
+        description="Maximum number of threads running the searches (keyword, semantic, full-text) submitted by"
+        " retrieval pool workers. They count against RETRIEVAL_SERVICE_MAX_WORKERS and the tenant limit,"
+        " searches beyond them run inline.",
         default=os.cpu_count(),
     )
 
+    RETRIEVAL_SERVICE_MAX_WORKERS: PositiveInt = Field(
+        description="Maximum number of threads of the process-wide retrieval pool.",
+        default=32,
+    )
+
+    RETRIEVAL_SERVICE_MAX_WORKERS_PER_TENANT: PositiveInt = Field(
+        description="Maximum number of retrieval pool threads a single tenant can use at the same time.",
+        default=8,
+    )
+
+    RETRIEVAL_SERVICE_MAX_QUEUED_TASKS: PositiveInt = Field(
+        description="Maximum number of retrieval tasks waiting for a thread before new submissions block.",
+        default=1000,
+    )
+
+    RETRIEVAL_SERVICE_QUEUE_TIMEOUT: PositiveFloat = Field(
+        description="Maximum time in seconds a retrieval task submission waits for room in the queue.",
+        default=10.0,
+    )
+
     @computed_field
     def SQLALCHEMY_ENGINE_OPTIONS(self) -> dict[str, Any]:
         return {
@@ -2,6 +2,8 @@ import json
 from collections.abc import Generator, Mapping, Sequence
 from typing import TYPE_CHECKING, Any, Optional, Union
 
+import orjson
+
 from core.app.app_config.entities import VariableEntityType
 from core.file import File, FileUploadConfig
 from factories import file_factory
@@ -152,8 +154,19 @@ class BaseAppGenerator:
             def gen():
                 for message in generator:
                     if isinstance(message, Mapping | dict):
-                        yield f"data: {json.dumps(message)}\n\n"
+                        yield f"data: {cls._dumps_event(message)}\n\n"
                     else:
                         yield f"event: {message}\n\n"
 
             return gen()
+
+    @staticmethod
+    def _dumps_event(message: Mapping) -> str:
+        """
+        Serialize a stream message with orjson, falling back to json for the values it does not support
+        """
+        try:
+            return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            # e.g. integers exceeding 64 bits or mapping types orjson does not support
+            return json.dumps(message)
@@ -1,9 +1,18 @@
 import queue
 import time
+import types
+import typing
 from abc import abstractmethod
+from collections import deque
+from collections.abc import Mapping, Sequence
+from datetime import date, datetime
+from decimal import Decimal
 from enum import Enum
-from typing import Any, Optional
+from functools import cache
+from typing import Any, Optional, Union, cast
+from uuid import UUID
 
+from pydantic import BaseModel
 from sqlalchemy.orm import DeclarativeMeta
 
 from configs import dify_config
@@ -11,9 +20,12 @@ from core.app.entities.app_invoke_entities import InvokeFrom
 from core.app.entities.queue_entities import (
     AppQueueEvent,
     MessageQueueMessage,
+    QueueAgentMessageEvent,
     QueueErrorEvent,
+    QueueLLMChunkEvent,
     QueuePingEvent,
     QueueStopEvent,
+    QueueTextChunkEvent,
     WorkflowQueueMessage,
 )
 from extensions.ext_redis import redis_client
@@ -41,37 +53,91 @@ class AppQueueManager:
         q: queue.Queue[WorkflowQueueMessage | MessageQueueMessage | None] = queue.Queue()
 
         self._q = q
+        self._stopped = False
+        self._stop_flag_checked_at: float | None = None
 
     def listen(self):
         """
-        Listen to queue
+        Listen to queue, waking up on new messages or when the next stop flag check or ping is due
         :return:
         """
         # wait for APP_MAX_EXECUTION_TIME seconds to stop listen
         listen_timeout = dify_config.APP_MAX_EXECUTION_TIME
-        start_time = time.time()
-        last_ping_time: int | float = 0
+        check_interval = dify_config.APP_STOP_FLAG_CHECK_INTERVAL
+        coalesce_window = dify_config.APP_STREAM_COALESCE_WINDOW_MS / 1000
+        start_time = time.monotonic()
+        next_check_time = start_time
+        next_ping_time = start_time + 10
+        # messages already taken from the queue while coalescing chunks
+        backlog: deque[WorkflowQueueMessage | MessageQueueMessage | None] = deque()
         while True:
-            try:
-                message = self._q.get(timeout=1)
-                if message is None:
-                    break
-
-                yield message
-            except queue.Empty:
-                continue
-            finally:
-                elapsed_time = time.time() - start_time
-                if elapsed_time >= listen_timeout or self._is_stopped():
+            now = time.monotonic()
+            if now >= next_check_time:
+                next_check_time = now + check_interval
+                if now - start_time >= listen_timeout or self._is_stopped():
                     # publish two messages to make sure the client can receive the stop signal
                     # and stop listening after the stop signal processed
                     self.publish(
                         QueueStopEvent(stopped_by=QueueStopEvent.StopBy.USER_MANUAL), PublishFrom.TASK_PIPELINE
                     )
 
-                if elapsed_time // 10 > last_ping_time:
-                    self.publish(QueuePingEvent(), PublishFrom.TASK_PIPELINE)
-                    last_ping_time = elapsed_time // 10
+            if now >= next_ping_time:
+                self.publish(QueuePingEvent(), PublishFrom.TASK_PIPELINE)
+                next_ping_time = now + 10
+
+            if backlog:
+                message = backlog.popleft()
+            else:
+                try:
+                    message = self._q.get(timeout=max(min(next_check_time, next_ping_time) - time.monotonic(), 0))
+                except queue.Empty:
+                    continue
+
+            if message is None:
+                break
+
+            if coalesce_window and _get_chunk_text(message.event) is not None:
+                message = self._coalesce_chunks(message, time.monotonic() + coalesce_window, backlog)
+
+            yield message
+
+    def _coalesce_chunks(
+        self,
+        message: WorkflowQueueMessage | MessageQueueMessage,
+        deadline: float,
+        backlog: deque[WorkflowQueueMessage | MessageQueueMessage | None],
+    ) -> WorkflowQueueMessage | MessageQueueMessage:
+        """
+        Merge the text chunks following the message until the deadline or APP_STREAM_COALESCE_MAX_BYTES is reached,
+        the first message that can't be merged is put into the backlog
+        :param message: message of a text chunk event
+        :param deadline: time.monotonic() after which no more chunks are awaited
+        :param backlog: messages to listen to before the queue
+        :return: message with the merged chunks
+        """
+        size = len(cast(str, _get_chunk_text(message.event)).encode("utf-8"))
+        while size < dify_config.APP_STREAM_COALESCE_MAX_BYTES:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                next_message = self._q.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if next_message is None:
+                # stop_listen was called, keep the marker for the listen loop
+                backlog.append(next_message)
+                break
+
+            merged_event = _merge_chunk_events(message.event, next_message.event)
+            if merged_event is None:
+                backlog.append(next_message)
+                break
+
+            message = message.model_copy(update={"event": merged_event})
+            size += len(cast(str, _get_chunk_text(next_message.event)).encode("utf-8"))
+        return message
 
     def stop_listen(self) -> None:
         """
@@ -96,7 +162,7 @@ class AppQueueManager:
         :param pub_from:
         :return:
         """
-        self._check_for_sqlalchemy_models(event.model_dump())
+        self._check_for_sqlalchemy_models(event)
         self._publish(event, pub_from)
 
     @abstractmethod
@@ -128,12 +194,24 @@ class AppQueueManager:
 
     def _is_stopped(self) -> bool:
         """
-        Check if task is stopped
+        Check if task is stopped, the stop flag is read from redis at most once per APP_STOP_FLAG_CHECK_INTERVAL
         :return:
         """
+        if self._stopped:
+            return True
+
+        now = time.monotonic()
+        if (
+            self._stop_flag_checked_at is not None
+            and now - self._stop_flag_checked_at < dify_config.APP_STOP_FLAG_CHECK_INTERVAL
+        ):
+            return False
+        self._stop_flag_checked_at = now
+
         stopped_cache_key = AppQueueManager._generate_stopped_cache_key(self._task_id)
         result = redis_client.get(stopped_cache_key)
         if result is not None:
+            self._stopped = True
             return True
 
         return False
@@ -157,18 +235,93 @@ class AppQueueManager:
         return f"generate_task_stopped:{task_id}"
 
     def _check_for_sqlalchemy_models(self, data: Any):
-        # from entity to dict or list
-        if isinstance(data, dict):
-            for key, value in data.items():
+        if isinstance(data, _SCALAR_TYPES):
+            return
+        if isinstance(data, BaseModel):
+            # only walk the fields whose declared type could hold a SQLAlchemy model
+            for field_name in _get_fields_to_check(type(data)):
+                self._check_for_sqlalchemy_models(getattr(data, field_name, None))
+        elif isinstance(data, Mapping):
+            for value in data.values():
                 self._check_for_sqlalchemy_models(value)
-        elif isinstance(data, list):
+        elif isinstance(data, list | tuple | set | frozenset):
             for item in data:
                 self._check_for_sqlalchemy_models(item)
-        else:
-            if isinstance(data, DeclarativeMeta) or hasattr(data, "_sa_instance_state"):
-                raise TypeError(
-                    "Critical Error: Passing SQLAlchemy Model instances that cause thread safety issues is not allowed."
-                )
+        elif isinstance(data, DeclarativeMeta) or hasattr(data, "_sa_instance_state"):
+            raise TypeError(
+                "Critical Error: Passing SQLAlchemy Model instances that cause thread safety issues is not allowed."
+            )
+
+
+_SCALAR_TYPES = (str, int, float, bool, bytes, Decimal, date, datetime, UUID, Enum, type(None))
+
+
+def _is_scalar_type(annotation: Any) -> bool:
+    """
+    Check whether every value allowed by the type annotation is a scalar, e.g. `str`, `Optional[list[str]]`
+    """
+    if annotation is type(None):
+        return True
+    origin = typing.get_origin(annotation)
+    if origin is None:
+        return isinstance(annotation, type) and issubclass(annotation, _SCALAR_TYPES)
+    if origin is typing.Literal:
+        return True
+    if origin in {Union, types.UnionType, list, tuple, set, frozenset, dict, Sequence, Mapping}:
+        return all(arg is Ellipsis or _is_scalar_type(arg) for arg in typing.get_args(annotation))
+    return False
+
+
+@cache
+def _get_fields_to_check(model_class: type[BaseModel]) -> tuple[str, ...]:
+    """
+    Get the fields of a model class which may hold SQLAlchemy models, computed once per class.
+    Fields declared as models are kept as well because they may hold a subclass with more fields.
+    """
+    return tuple(name for name, field in model_class.model_fields.items() if not _is_scalar_type(field.annotation))
+
+
+def _get_chunk_text(event: AppQueueEvent) -> Optional[str]:
+    """
+    Get the text of a streamed chunk event which can be merged with its neighbours
+    """
+    if isinstance(event, QueueTextChunkEvent):
+        return event.text
+    if isinstance(event, QueueLLMChunkEvent | QueueAgentMessageEvent):
+        message = event.chunk.delta.message
+        if isinstance(message.content, str) and not message.tool_calls:
+            return message.content
+    return None
+
+
+def _merge_chunk_events(event: AppQueueEvent, next_event: AppQueueEvent) -> Optional[AppQueueEvent]:
+    """
+    Merge two consecutive chunk events into one, return None if they can't be merged
+    """
+    text = _get_chunk_text(event)
+    next_text = _get_chunk_text(next_event)
+    if text is None or next_text is None or type(event) is not type(next_event):
+        return None
+
+    if isinstance(event, QueueTextChunkEvent):
+        next_event = cast(QueueTextChunkEvent, next_event)
+        if (
+            event.from_variable_selector != next_event.from_variable_selector
+            or event.in_iteration_id != next_event.in_iteration_id
+            or event.in_loop_id != next_event.in_loop_id
+        ):
+            return None
+        return event.model_copy(update={"text": text + next_text})
+
+    event = cast(QueueLLMChunkEvent | QueueAgentMessageEvent, event)
+    next_event = cast(QueueLLMChunkEvent | QueueAgentMessageEvent, next_event)
+    if event.chunk.delta.usage or event.chunk.delta.finish_reason:
+        return None
+    # the last chunk carries the usage and finish reason of the merged chunks
+    delta = next_event.chunk.delta
+    message = delta.message.model_copy(update={"content": text + next_text})
+    chunk = next_event.chunk.model_copy(update={"delta": delta.model_copy(update={"message": message})})
+    return next_event.model_copy(update={"chunk": chunk})
 
 
 class GenerateTaskStoppedError(Exception):
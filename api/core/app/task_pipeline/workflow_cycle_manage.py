@@ -5,9 +5,11 @@ from datetime import UTC, datetime
 from typing import Any, Optional, Union, cast
 from uuid import uuid4
 
-from sqlalchemy import func, select
-from sqlalchemy.orm import Session
+import sqlalchemy as sa
+from sqlalchemy import func, insert, inspect, select, update
+from sqlalchemy.orm import InstanceState, Session
 
+from configs import dify_config
 from core.app.entities.app_invoke_entities import AdvancedChatAppGenerateEntity, InvokeFrom, WorkflowAppGenerateEntity
 from core.app.entities.queue_entities import (
     QueueAgentLogEvent,
@@ -55,6 +57,7 @@ from core.workflow.enums import SystemVariableKey
 from core.workflow.nodes import NodeType
 from core.workflow.nodes.tool.entities import ToolNodeData
 from core.workflow.workflow_entry import WorkflowEntry
+from extensions.ext_database import db
 from models.account import Account
 from models.enums import CreatedByRole, WorkflowRunTriggeredFrom
 from models.model import EndUser
@@ -77,6 +80,10 @@ class WorkflowCycleManage:
     ) -> None:
         self._workflow_run: WorkflowRun | None = None
         self._workflow_node_executions: dict[str, WorkflowNodeExecution] = {}
+        # node executions created or changed since the last flush, by id, they are written in bulk
+        self._pending_workflow_node_executions: dict[str, WorkflowNodeExecution] = {}
+        self._flushed_workflow_node_execution_ids: set[str] = set()
+        self._last_flush_time = time.perf_counter()
         self._application_generate_entity = application_generate_entity
         self._workflow_system_variables = workflow_system_variables
 
@@ -136,6 +143,7 @@ class WorkflowCycleManage:
         workflow_run.created_at = datetime.now(UTC).replace(tzinfo=None)
 
         session.add(workflow_run)
+        self._workflow_run = workflow_run
 
         return workflow_run
 
@@ -162,6 +170,7 @@ class WorkflowCycleManage:
         :return:
         """
         workflow_run = self._get_workflow_run(session=session, workflow_run_id=workflow_run_id)
+        self._flush_workflow_node_executions(session=session)
 
         outputs = WorkflowEntry.handle_special_values(outputs)
 
@@ -198,6 +207,7 @@ class WorkflowCycleManage:
         trace_manager: Optional[TraceQueueManager] = None,
     ) -> WorkflowRun:
         workflow_run = self._get_workflow_run(session=session, workflow_run_id=workflow_run_id)
+        self._flush_workflow_node_executions(session=session)
         outputs = WorkflowEntry.handle_special_values(dict(outputs) if outputs else None)
 
         workflow_run.status = WorkflowRunStatus.PARTIAL_SUCCEEDED.value
@@ -254,18 +264,11 @@ class WorkflowCycleManage:
         workflow_run.finished_at = datetime.now(UTC).replace(tzinfo=None)
         workflow_run.exceptions_count = exceptions_count
 
-        stmt = select(WorkflowNodeExecution.node_execution_id).where(
-            WorkflowNodeExecution.tenant_id == workflow_run.tenant_id,
-            WorkflowNodeExecution.app_id == workflow_run.app_id,
-            WorkflowNodeExecution.workflow_id == workflow_run.workflow_id,
-            WorkflowNodeExecution.triggered_from == WorkflowNodeExecutionTriggeredFrom.WORKFLOW_RUN.value,
-            WorkflowNodeExecution.workflow_run_id == workflow_run.id,
-            WorkflowNodeExecution.status == WorkflowNodeExecutionStatus.RUNNING.value,
-        )
-        ids = session.scalars(stmt).all()
-        # Use self._get_workflow_node_execution here to make sure the cache is updated
+        # all node executions of the run are kept in memory, no need to look for the running ones in the database
         running_workflow_node_executions = [
-            self._get_workflow_node_execution(session=session, node_execution_id=id) for id in ids if id
+            workflow_node_execution
+            for workflow_node_execution in self._workflow_node_executions.values()
+            if workflow_node_execution.status == WorkflowNodeExecutionStatus.RUNNING.value
         ]
 
         for workflow_node_execution in running_workflow_node_executions:
@@ -274,6 +277,9 @@ class WorkflowCycleManage:
             workflow_node_execution.error = error
             workflow_node_execution.finished_at = now
             workflow_node_execution.elapsed_time = (now - workflow_node_execution.created_at).total_seconds()
+            self._add_pending_workflow_node_execution(workflow_node_execution)
+
+        self._flush_workflow_node_executions(session=session)
 
         if trace_manager:
             trace_manager.add_trace_task(
@@ -288,7 +294,7 @@ class WorkflowCycleManage:
         return workflow_run
 
     def _handle_node_execution_start(
-        self, *, session: Session, workflow_run: WorkflowRun, event: QueueNodeStartedEvent
+        self, *, workflow_run: WorkflowRun, event: QueueNodeStartedEvent
     ) -> WorkflowNodeExecution:
         workflow_node_execution = WorkflowNodeExecution()
         workflow_node_execution.id = str(uuid4())
@@ -315,17 +321,12 @@ class WorkflowCycleManage:
         )
         workflow_node_execution.created_at = datetime.now(UTC).replace(tzinfo=None)
 
-        session.add(workflow_node_execution)
-
         self._workflow_node_executions[event.node_execution_id] = workflow_node_execution
+        self._add_pending_workflow_node_execution(workflow_node_execution)
         return workflow_node_execution
 
-    def _handle_workflow_node_execution_success(
-        self, *, session: Session, event: QueueNodeSucceededEvent
-    ) -> WorkflowNodeExecution:
-        workflow_node_execution = self._get_workflow_node_execution(
-            session=session, node_execution_id=event.node_execution_id
-        )
+    def _handle_workflow_node_execution_success(self, *, event: QueueNodeSucceededEvent) -> WorkflowNodeExecution:
+        workflow_node_execution = self._get_workflow_node_execution(node_execution_id=event.node_execution_id)
         inputs = WorkflowEntry.handle_special_values(event.inputs)
         process_data = WorkflowEntry.handle_special_values(event.process_data)
         outputs = WorkflowEntry.handle_special_values(event.outputs)
@@ -344,13 +345,15 @@ class WorkflowCycleManage:
         workflow_node_execution.finished_at = finished_at
         workflow_node_execution.elapsed_time = elapsed_time
 
-        workflow_node_execution = session.merge(workflow_node_execution)
+        self._add_pending_workflow_node_execution(workflow_node_execution)
+        if dify_config.WORKFLOW_NODE_EXECUTION_FLUSH_ON_FINISH:
+            # a long running next node must not hold back the results of the finished ones
+            self._commit_workflow_node_executions(force=True)
         return workflow_node_execution
 
     def _handle_workflow_node_execution_failed(
         self,
         *,
-        session: Session,
         event: QueueNodeFailedEvent
         | QueueNodeInIterationFailedEvent
         | QueueNodeInLoopFailedEvent
@@ -361,9 +364,7 @@ class WorkflowCycleManage:
         :param event: queue node failed event
         :return:
         """
-        workflow_node_execution = self._get_workflow_node_execution(
-            session=session, node_execution_id=event.node_execution_id
-        )
+        workflow_node_execution = self._get_workflow_node_execution(node_execution_id=event.node_execution_id)
 
         inputs = WorkflowEntry.handle_special_values(event.inputs)
         process_data = WorkflowEntry.handle_special_values(event.process_data)
@@ -387,11 +388,14 @@ class WorkflowCycleManage:
         workflow_node_execution.elapsed_time = elapsed_time
         workflow_node_execution.execution_metadata = execution_metadata
 
-        workflow_node_execution = session.merge(workflow_node_execution)
+        self._add_pending_workflow_node_execution(workflow_node_execution)
+        if dify_config.WORKFLOW_NODE_EXECUTION_FLUSH_ON_FINISH:
+            # a long running next node must not hold back the results of the finished ones
+            self._commit_workflow_node_executions(force=True)
         return workflow_node_execution
 
     def _handle_workflow_node_execution_retried(
-        self, *, session: Session, workflow_run: WorkflowRun, event: QueueNodeRetryEvent
+        self, *, workflow_run: WorkflowRun, event: QueueNodeRetryEvent
     ) -> WorkflowNodeExecution:
         """
         Workflow node execution failed
@@ -439,11 +443,75 @@ class WorkflowCycleManage:
         workflow_node_execution.execution_metadata = execution_metadata
         workflow_node_execution.index = event.node_run_index
 
-        session.add(workflow_node_execution)
-
         self._workflow_node_executions[event.node_execution_id] = workflow_node_execution
+        self._add_pending_workflow_node_execution(workflow_node_execution)
+        if dify_config.WORKFLOW_NODE_EXECUTION_FLUSH_ON_FINISH:
+            # a long running next node must not hold back the results of the finished ones
+            self._commit_workflow_node_executions(force=True)
         return workflow_node_execution
 
+    def _commit_workflow_node_executions(self, *, force: bool = False) -> None:
+        """
+        Write the buffered node executions in their own transaction if the flush interval or batch size is reached
+        :param force: write them even if neither is reached, e.g. when the task pipeline exits
+        """
+        if not self._pending_workflow_node_executions:
+            return
+        if (
+            not force
+            and len(self._pending_workflow_node_executions) < dify_config.WORKFLOW_NODE_EXECUTION_FLUSH_BATCH_SIZE
+            and time.perf_counter() - self._last_flush_time < dify_config.WORKFLOW_NODE_EXECUTION_FLUSH_INTERVAL
+        ):
+            return
+
+        with Session(db.engine, expire_on_commit=False) as session:
+            self._flush_workflow_node_executions(session=session)
+            session.commit()
+
+    def _add_pending_workflow_node_execution(self, workflow_node_execution: WorkflowNodeExecution) -> None:
+        self._pending_workflow_node_executions[cast(str, workflow_node_execution.id)] = workflow_node_execution
+
+    def _flush_workflow_node_executions(self, *, session: Session) -> None:
+        """
+        Write the buffered node executions with one bulk insert and one bulk update, the caller commits the session.
+        The node executions themselves are never attached to a session, so the stream responses can keep reading
+        them from memory. They stay pending until the session is committed, a failed commit writes them again
+        with the next flush.
+        """
+        self._last_flush_time = time.perf_counter()
+        if not self._pending_workflow_node_executions:
+            return
+
+        new_rows = []
+        changed_rows = []
+        for workflow_node_execution in self._pending_workflow_node_executions.values():
+            row = self._workflow_node_execution_to_row(workflow_node_execution)
+            if workflow_node_execution.id in self._flushed_workflow_node_execution_ids:
+                changed_rows.append(row)
+            else:
+                new_rows.append(row)
+
+        if new_rows:
+            session.execute(insert(WorkflowNodeExecution), new_rows)
+        if changed_rows:
+            session.execute(update(WorkflowNodeExecution), changed_rows)
+
+        flushed_ids = list(self._pending_workflow_node_executions)
+
+        def _mark_flushed(_: Session) -> None:
+            self._flushed_workflow_node_execution_ids.update(flushed_ids)
+            for workflow_node_execution_id in flushed_ids:
+                self._pending_workflow_node_executions.pop(workflow_node_execution_id, None)
+
+        sa.event.listen(session, "after_commit", _mark_flushed, once=True)
+
+    @staticmethod
+    def _workflow_node_execution_to_row(workflow_node_execution: WorkflowNodeExecution) -> dict[str, Any]:
+        values = cast(InstanceState[WorkflowNodeExecution], inspect(workflow_node_execution)).dict
+        return {
+            column.key: values[column.key] for column in WorkflowNodeExecution.__table__.columns if column.key in values
+        }
+
     #################################################
     #             to stream responses               #
     #################################################
@@ -521,14 +589,10 @@ class WorkflowCycleManage:
     def _workflow_node_start_to_stream_response(
         self,
         *,
-        session: Session,
         event: QueueNodeStartedEvent,
         task_id: str,
         workflow_node_execution: WorkflowNodeExecution,
     ) -> Optional[NodeStartStreamResponse]:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
-
         if workflow_node_execution.node_type in {NodeType.ITERATION.value, NodeType.LOOP.value}:
             return None
         if not workflow_node_execution.workflow_run_id:
@@ -571,7 +635,6 @@ class WorkflowCycleManage:
     def _workflow_node_finish_to_stream_response(
         self,
         *,
-        session: Session,
         event: QueueNodeSucceededEvent
         | QueueNodeFailedEvent
         | QueueNodeInIterationFailedEvent
@@ -580,8 +643,6 @@ class WorkflowCycleManage:
         task_id: str,
         workflow_node_execution: WorkflowNodeExecution,
     ) -> Optional[NodeFinishStreamResponse]:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         if workflow_node_execution.node_type in {NodeType.ITERATION.value, NodeType.LOOP.value}:
             return None
         if not workflow_node_execution.workflow_run_id:
@@ -621,13 +682,10 @@ class WorkflowCycleManage:
     def _workflow_node_retry_to_stream_response(
         self,
         *,
-        session: Session,
         event: QueueNodeRetryEvent,
         task_id: str,
         workflow_node_execution: WorkflowNodeExecution,
     ) -> Optional[Union[NodeRetryStreamResponse, NodeFinishStreamResponse]]:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         if workflow_node_execution.node_type in {NodeType.ITERATION.value, NodeType.LOOP.value}:
             return None
         if not workflow_node_execution.workflow_run_id:
@@ -666,10 +724,8 @@ class WorkflowCycleManage:
         )
 
     def _workflow_parallel_branch_start_to_stream_response(
-        self, *, session: Session, task_id: str, workflow_run: WorkflowRun, event: QueueParallelBranchRunStartedEvent
+        self, *, task_id: str, workflow_run: WorkflowRun, event: QueueParallelBranchRunStartedEvent
     ) -> ParallelBranchStartStreamResponse:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         return ParallelBranchStartStreamResponse(
             task_id=task_id,
             workflow_run_id=workflow_run.id,
@@ -687,13 +743,10 @@ class WorkflowCycleManage:
     def _workflow_parallel_branch_finished_to_stream_response(
         self,
         *,
-        session: Session,
         task_id: str,
         workflow_run: WorkflowRun,
         event: QueueParallelBranchRunSucceededEvent | QueueParallelBranchRunFailedEvent,
     ) -> ParallelBranchFinishedStreamResponse:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         return ParallelBranchFinishedStreamResponse(
             task_id=task_id,
             workflow_run_id=workflow_run.id,
@@ -711,10 +764,8 @@ class WorkflowCycleManage:
         )
 
     def _workflow_iteration_start_to_stream_response(
-        self, *, session: Session, task_id: str, workflow_run: WorkflowRun, event: QueueIterationStartEvent
+        self, *, task_id: str, workflow_run: WorkflowRun, event: QueueIterationStartEvent
     ) -> IterationNodeStartStreamResponse:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         return IterationNodeStartStreamResponse(
             task_id=task_id,
             workflow_run_id=workflow_run.id,
@@ -733,10 +784,8 @@ class WorkflowCycleManage:
         )
 
     def _workflow_iteration_next_to_stream_response(
-        self, *, session: Session, task_id: str, workflow_run: WorkflowRun, event: QueueIterationNextEvent
+        self, *, task_id: str, workflow_run: WorkflowRun, event: QueueIterationNextEvent
     ) -> IterationNodeNextStreamResponse:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         return IterationNodeNextStreamResponse(
             task_id=task_id,
             workflow_run_id=workflow_run.id,
@@ -757,10 +806,8 @@ class WorkflowCycleManage:
         )
 
     def _workflow_iteration_completed_to_stream_response(
-        self, *, session: Session, task_id: str, workflow_run: WorkflowRun, event: QueueIterationCompletedEvent
+        self, *, task_id: str, workflow_run: WorkflowRun, event: QueueIterationCompletedEvent
     ) -> IterationNodeCompletedStreamResponse:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         return IterationNodeCompletedStreamResponse(
             task_id=task_id,
             workflow_run_id=workflow_run.id,
@@ -788,10 +835,8 @@ class WorkflowCycleManage:
         )
 
     def _workflow_loop_start_to_stream_response(
-        self, *, session: Session, task_id: str, workflow_run: WorkflowRun, event: QueueLoopStartEvent
+        self, *, task_id: str, workflow_run: WorkflowRun, event: QueueLoopStartEvent
     ) -> LoopNodeStartStreamResponse:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         return LoopNodeStartStreamResponse(
             task_id=task_id,
             workflow_run_id=workflow_run.id,
@@ -810,10 +855,8 @@ class WorkflowCycleManage:
         )
 
     def _workflow_loop_next_to_stream_response(
-        self, *, session: Session, task_id: str, workflow_run: WorkflowRun, event: QueueLoopNextEvent
+        self, *, task_id: str, workflow_run: WorkflowRun, event: QueueLoopNextEvent
     ) -> LoopNodeNextStreamResponse:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         return LoopNodeNextStreamResponse(
             task_id=task_id,
             workflow_run_id=workflow_run.id,
@@ -834,10 +877,8 @@ class WorkflowCycleManage:
         )
 
     def _workflow_loop_completed_to_stream_response(
-        self, *, session: Session, task_id: str, workflow_run: WorkflowRun, event: QueueLoopCompletedEvent
+        self, *, task_id: str, workflow_run: WorkflowRun, event: QueueLoopCompletedEvent
     ) -> LoopNodeCompletedStreamResponse:
-        # receive session to make sure the workflow_run won't be expired, need a more elegant way to handle this
-        _ = session
         return LoopNodeCompletedStreamResponse(
             task_id=task_id,
             workflow_run_id=workflow_run.id,
@@ -927,18 +968,26 @@ class WorkflowCycleManage:
             cached_workflow_run = session.merge(cached_workflow_run)
             return cached_workflow_run
         stmt = select(WorkflowRun).where(WorkflowRun.id == workflow_run_id)
-        workflow_run = session.scalar(stmt)
+        workflow_run: Optional[WorkflowRun] = session.scalar(stmt)
         if not workflow_run:
             raise WorkflowRunNotFoundError(workflow_run_id)
         self._workflow_run = workflow_run
 
         return workflow_run
 
-    def _get_workflow_node_execution(self, session: Session, node_execution_id: str) -> WorkflowNodeExecution:
+    def _get_cached_workflow_run(self, workflow_run_id: str) -> WorkflowRun:
+        """
+        Get the workflow run started by this task pipeline without a database round trip,
+        only the columns set when it was created can be read from it
+        """
+        if not self._workflow_run or self._workflow_run.id != workflow_run_id:
+            raise WorkflowRunNotFoundError(workflow_run_id)
+        return self._workflow_run
+
+    def _get_workflow_node_execution(self, node_execution_id: str) -> WorkflowNodeExecution:
         if node_execution_id not in self._workflow_node_executions:
             raise ValueError(f"Workflow node execution not found: {node_execution_id}")
-        cached_workflow_node_execution = self._workflow_node_executions[node_execution_id]
-        return session.merge(cached_workflow_node_execution)
+        return self._workflow_node_executions[node_execution_id]
 
     def _handle_agent_log(self, task_id: str, event: QueueAgentLogEvent) -> AgentLogStreamResponse:
         """
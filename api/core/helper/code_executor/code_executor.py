@@ -1,15 +1,19 @@
 import logging
-from collections.abc import Mapping
+import os
+from collections.abc import Generator, Mapping, Sequence
+from concurrent.futures import Future
+from contextlib import contextmanager
 from enum import StrEnum
-from threading import Lock
+from threading import BoundedSemaphore, Event, Lock
 from typing import Any, Optional
 
-from httpx import Timeout, post
+from httpx import Client, Limits, Timeout
 from pydantic import BaseModel
 from yarl import URL
 
 from configs import dify_config
 from core.helper.code_executor.javascript.javascript_transformer import NodeJsTemplateTransformer
+from core.helper.code_executor.jinja2.jinja2_renderer import Jinja2LocalRenderer, Jinja2RenderError
 from core.helper.code_executor.jinja2.jinja2_transformer import Jinja2TemplateTransformer
 from core.helper.code_executor.python3.python3_transformer import Python3TemplateTransformer
 from core.helper.code_executor.template_transformer import TemplateTransformer
@@ -21,6 +25,10 @@ class CodeExecutionError(Exception):
     pass
 
 
+class _BatchRunError(Exception):
+    """The sandbox run of a whole batch failed, its items are executed one by one instead."""
+
+
 class CodeExecutionResponse(BaseModel):
     class Data(BaseModel):
         stdout: Optional[str] = None
@@ -37,6 +45,12 @@ class CodeLanguage(StrEnum):
     JAVASCRIPT = "javascript"
 
 
+class _PendingBatch:
+    def __init__(self) -> None:
+        self.items: list[tuple[Mapping[str, Any], Future]] = []
+        self.full = Event()
+
+
 class CodeExecutor:
     dependencies_cache: dict[str, str] = {}
     dependencies_cache_lock = Lock()
@@ -55,13 +69,68 @@ class CodeExecutor:
 
     supported_dependencies_languages: set[CodeLanguage] = {CodeLanguage.PYTHON3}
 
+    _client: Optional[Client] = None
+    _client_pid: Optional[int] = None
+    _client_lock = Lock()
+
+    tenant_semaphores: dict[str, BoundedSemaphore] = {}
+    tenant_semaphores_lock = Lock()
+
+    pending_batches: dict[tuple[CodeLanguage, str, Optional[str]], _PendingBatch] = {}
+    # number of executions of each code waiting for or running in the sandbox, guarded by pending_batches_lock
+    executions_in_flight: dict[tuple[CodeLanguage, str, Optional[str]], int] = {}
+    pending_batches_lock = Lock()
+
     @classmethod
-    def execute_code(cls, language: CodeLanguage, preload: str, code: str) -> str:
+    def _get_client(cls) -> Client:
+        """
+        Get the pooled sandbox client of the current process, connections are kept alive across executions
+        """
+        pid = os.getpid()
+        if cls._client is None or cls._client_pid != pid:
+            with cls._client_lock:
+                if cls._client is None or cls._client_pid != pid:
+                    cls._client = Client(
+                        limits=Limits(
+                            max_connections=dify_config.CODE_EXECUTION_POOL_MAX_CONNECTIONS,
+                            max_keepalive_connections=dify_config.CODE_EXECUTION_POOL_MAX_KEEPALIVE_CONNECTIONS,
+                            keepalive_expiry=dify_config.CODE_EXECUTION_POOL_KEEPALIVE_EXPIRY,
+                        )
+                    )
+                    cls._client_pid = pid
+        return cls._client
+
+    @classmethod
+    @contextmanager
+    def _acquire_tenant_slot(cls, tenant_id: Optional[str]) -> Generator[None, None, None]:
+        """
+        Limit the number of concurrent sandbox executions of a tenant in this process
+        """
+        max_concurrency = dify_config.CODE_EXECUTION_MAX_CONCURRENCY_PER_TENANT
+        if not tenant_id or not max_concurrency:
+            yield
+            return
+
+        semaphore = cls.tenant_semaphores.get(tenant_id)
+        if semaphore is None:
+            with cls.tenant_semaphores_lock:
+                semaphore = cls.tenant_semaphores.setdefault(tenant_id, BoundedSemaphore(max_concurrency))
+
+        if not semaphore.acquire(timeout=dify_config.CODE_EXECUTION_READ_TIMEOUT):
+            raise CodeExecutionError("Too many concurrent code executions, please try again later")
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    @classmethod
+    def execute_code(cls, language: CodeLanguage, preload: str, code: str, tenant_id: Optional[str] = None) -> str:
         """
         Execute code
         :param language: code language
         :param preload: the preload script
         :param code: code
+        :param tenant_id: tenant id, used to limit the concurrent executions of a tenant
         :return:
         """
         url = URL(str(dify_config.CODE_EXECUTION_ENDPOINT)) / "v1" / "sandbox" / "run"
@@ -76,17 +145,18 @@ class CodeExecutor:
         }
 
         try:
-            response = post(
-                str(url),
-                json=data,
-                headers=headers,
-                timeout=Timeout(
-                    connect=dify_config.CODE_EXECUTION_CONNECT_TIMEOUT,
-                    read=dify_config.CODE_EXECUTION_READ_TIMEOUT,
-                    write=dify_config.CODE_EXECUTION_WRITE_TIMEOUT,
-                    pool=None,
-                ),
-            )
+            with cls._acquire_tenant_slot(tenant_id):
+                response = cls._get_client().post(
+                    str(url),
+                    json=data,
+                    headers=headers,
+                    timeout=Timeout(
+                        connect=dify_config.CODE_EXECUTION_CONNECT_TIMEOUT,
+                        read=dify_config.CODE_EXECUTION_READ_TIMEOUT,
+                        write=dify_config.CODE_EXECUTION_WRITE_TIMEOUT,
+                        pool=None,
+                    ),
+                )
             if response.status_code == 503:
                 raise CodeExecutionError("Code execution service is unavailable")
             elif response.status_code != 200:
@@ -119,23 +189,119 @@ class CodeExecutor:
         return response_code.data.stdout or ""
 
     @classmethod
-    def execute_workflow_code_template(cls, language: CodeLanguage, code: str, inputs: Mapping[str, Any]):
+    def execute_workflow_code_template(
+        cls, language: CodeLanguage, code: str, inputs: Mapping[str, Any], tenant_id: Optional[str] = None
+    ):
         """
         Execute code
         :param language: code language
         :param code: code
         :param inputs: inputs
+        :param tenant_id: tenant id, used to limit the concurrent executions of a tenant
         :return:
         """
+        if language == CodeLanguage.JINJA2 and dify_config.JINJA2_LOCAL_RENDER_ENABLED:
+            try:
+                return {"result": Jinja2LocalRenderer.render(code, inputs)}
+            except Jinja2RenderError as e:
+                raise CodeExecutionError(str(e))
+
         template_transformer = cls.code_template_transformers.get(language)
         if not template_transformer:
             raise CodeExecutionError(f"Unsupported language {language}")
 
+        if dify_config.CODE_EXECUTION_BATCH_ENABLED and template_transformer.supports_batch:
+            return cls._execute_in_batch(language, code, inputs, tenant_id)
+
+        return cls._execute_single(language, code, inputs, tenant_id)
+
+    @classmethod
+    def _execute_single(cls, language: CodeLanguage, code: str, inputs: Mapping[str, Any], tenant_id: Optional[str]):
+        template_transformer = cls.code_template_transformers[language]
         runner, preload = template_transformer.transform_caller(code, inputs)
 
         try:
-            response = cls.execute_code(language, preload, runner)
+            response = cls.execute_code(language, preload, runner, tenant_id)
         except CodeExecutionError as e:
             raise e
 
         return template_transformer.transform_response(response)
+
+    @classmethod
+    def _execute_in_batch(cls, language: CodeLanguage, code: str, inputs: Mapping[str, Any], tenant_id: Optional[str]):
+        """
+        Execute code together with the concurrent executions of the same code, e.g. the items of a parallel
+        iteration. An execution started while no other one of the same code is in flight runs right away.
+        Otherwise the first caller waits for the batch window and runs the whole batch in one sandbox run.
+        """
+        key = (language, code, tenant_id)
+        future: Future = Future()
+        with cls.pending_batches_lock:
+            in_flight = cls.executions_in_flight.get(key, 0)
+            cls.executions_in_flight[key] = in_flight + 1
+            batch = cls.pending_batches.get(key)
+            is_leader = batch is None
+            if batch is None:
+                batch = _PendingBatch()
+                if in_flight:
+                    # other executions are running, those started meanwhile join this batch
+                    cls.pending_batches[key] = batch
+            batch.items.append((inputs, future))
+            if len(batch.items) >= dify_config.CODE_EXECUTION_BATCH_MAX_SIZE:
+                cls.pending_batches.pop(key, None)
+                batch.full.set()
+
+        try:
+            if is_leader:
+                if in_flight:
+                    batch.full.wait(dify_config.CODE_EXECUTION_BATCH_WINDOW_MS / 1000)
+                    with cls.pending_batches_lock:
+                        if cls.pending_batches.get(key) is batch:
+                            del cls.pending_batches[key]
+                cls._run_batch(language, code, batch.items, tenant_id)
+
+            try:
+                return future.result()
+            except _BatchRunError:
+                # e.g. another item crashed the sandbox or exceeded its timeout, only the failing item fails on its own
+                return cls._execute_single(language, code, inputs, tenant_id)
+        finally:
+            with cls.pending_batches_lock:
+                cls.executions_in_flight[key] -= 1
+                if not cls.executions_in_flight[key]:
+                    del cls.executions_in_flight[key]
+
+    @classmethod
+    def _run_batch(
+        cls,
+        language: CodeLanguage,
+        code: str,
+        items: Sequence[tuple[Mapping[str, Any], Future]],
+        tenant_id: Optional[str],
+    ) -> None:
+        template_transformer = cls.code_template_transformers[language]
+        try:
+            if len(items) == 1:
+                inputs, future = items[0]
+                future.set_result(cls._execute_single(language, code, inputs, tenant_id))
+                return
+
+            runner, preload = template_transformer.transform_batch_caller(code, [inputs for inputs, _ in items])
+            response = cls.execute_code(language, preload, runner, tenant_id)
+            results = template_transformer.transform_batch_response(response)
+            if len(results) != len(items):
+                raise CodeExecutionError(f"Expected {len(items)} results from the sandbox, got {len(results)}")
+
+            for (_, future), result in zip(items, results):
+                if isinstance(result, str):
+                    future.set_exception(CodeExecutionError(result))
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            error: Exception = e
+            if len(items) > 1:
+                logger.warning("Batch of %d code executions failed, executing them one by one: %s", len(items), e)
+                error = _BatchRunError()
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(error)
@@ -4,6 +4,8 @@ from core.helper.code_executor.template_transformer import TemplateTransformer
 
 
 class NodeJsTemplateTransformer(TemplateTransformer):
+    supports_batch = True
+
     @classmethod
     def get_runner_script(cls) -> str:
         runner_script = dedent(
@@ -24,3 +26,34 @@ class NodeJsTemplateTransformer(TemplateTransformer):
             """
         )
         return runner_script
+
+    @classmethod
+    def get_batch_runner_script(cls) -> str:
+        runner_script = dedent(
+            f"""
+            // decode the code, it is executed again for every input object
+            var code_str = Buffer.from('{cls._code_placeholder}', 'base64').toString('utf-8')
+            var load_main = new Function('require', 'module', 'exports', code_str + '\\nreturn main')
+            
+            // decode and prepare the list of input objects
+            var inputs_list = JSON.parse(Buffer.from('{cls._inputs_placeholder}', 'base64').toString('utf-8'))
+            
+            // execute main function for every input object in its own top-level scope,
+            // an error only fails its own item
+            var output_list = inputs_list.map(function (inputs_obj) {{
+                try {{
+                    var item_module = {{ exports: {{}} }}
+                    var main = load_main(require, item_module, item_module.exports)
+                    return {{ result: main(inputs_obj) }}
+                }} catch (e) {{
+                    return {{ error: String((e && e.stack) || e) }}
+                }}
+            }})
+            
+            // convert output to json and print
+            var output_json = JSON.stringify(output_list)
+            var result = `<<RESULT>>${{output_json}}<<RESULT>>`
+            console.log(result)
+            """
+        )
+        return runner_script
@@ -0,0 +1,330 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from functools import lru_cache, wraps
+from multiprocessing.connection import Connection
+from multiprocessing.context import SpawnContext
+from multiprocessing.pool import ThreadPool
+from typing import Any, Optional
+
+from jinja2 import Template, nodes
+from jinja2.sandbox import ImmutableSandboxedEnvironment
+
+from configs import dify_config
+from core.helper.process_pool import can_start_process_pool
+
+logger = logging.getLogger(__name__)
+
+
+class Jinja2RenderError(Exception):
+    pass
+
+
+class _RenderLimits(threading.local):
+    """Limits of the render running in the current thread."""
+
+    deadline: float | None = None
+    timeout: float = 0.0
+    max_output_length: int = 0
+
+
+_limits = _RenderLimits()
+
+
+def _check_deadline() -> None:
+    if _limits.deadline is not None and time.monotonic() > _limits.deadline:
+        raise Jinja2RenderError(f"Template rendering timed out after {_limits.timeout} seconds")
+
+
+def _check_output_length(value: Any) -> None:
+    if isinstance(value, str | list | tuple) and len(value) > _limits.max_output_length:
+        raise Jinja2RenderError(f"Template output exceeds {_limits.max_output_length} characters")
+
+
+def _check_width(width: Any) -> None:
+    # padding to a huge width allocates the whole string before anything can be checked
+    if isinstance(width, int) and width > _limits.max_output_length:
+        raise Jinja2RenderError(f"Template output exceeds {_limits.max_output_length} characters")
+
+
+def _guard_loop(iterable: Iterable[Any]) -> Iterator[Any]:
+    for item in iterable:
+        _check_deadline()
+        yield item
+
+
+# filters and str methods padding their input to the width given as first argument
+_WIDTH_FILTERS = frozenset(["center", "indent"])
+_WIDTH_METHODS = frozenset(["center", "ljust", "rjust", "zfill"])
+
+
+def _guard_filter(name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Filters are called directly by the compiled template, not through the sandbox's call,
+    check the deadline before and the size of the result after each of them
+    """
+
+    @wraps(func)
+    def guarded(*args: Any, **kwargs: Any) -> Any:
+        _check_deadline()
+        if name in _WIDTH_FILTERS:
+            _check_width(kwargs.get("width", args[1] if len(args) > 1 else None))
+        result = func(*args, **kwargs)
+        _check_output_length(result)
+        return result
+
+    return guarded
+
+
+class _LimitedSandboxedEnvironment(ImmutableSandboxedEnvironment):
+    """
+    Sandbox checking the render deadline on every loop iteration, call and intercepted operator,
+    so that a runaway template stops even when it produces no output
+    """
+
+    intercepted_binops = frozenset(["*", "**"])
+
+    def __init__(self) -> None:
+        super().__init__()
+        # functools.wraps keeps the pass_context / pass_environment markers of the filters
+        self.filters = {name: _guard_filter(name, func) for name, func in self.filters.items()}
+        self.filters["_guard_loop"] = _guard_loop
+
+    def _parse(self, source: str, name: str | None, filename: str | None) -> nodes.Template:
+        template = super()._parse(source, name, filename)
+        for loop in template.find_all(nodes.For):
+            loop.iter = nodes.Filter(loop.iter, "_guard_loop", [], [], None, None, lineno=loop.iter.lineno)
+        return template
+
+    def call(__self, __context: Any, __obj: Any, *args: Any, **kwargs: Any) -> Any:  # noqa: N805
+        _check_deadline()
+        if (
+            args
+            and getattr(__obj, "__name__", None) in _WIDTH_METHODS
+            and isinstance(getattr(__obj, "__self__", None), str)
+        ):
+            _check_width(args[0])
+        result = super().call(__context, __obj, *args, **kwargs)
+        _check_output_length(result)
+        return result
+
+    def call_binop(self, context: Any, operator: str, left: Any, right: Any) -> Any:
+        _check_deadline()
+        if operator == "*":
+            for sequence, count in ((left, right), (right, left)):
+                if isinstance(sequence, str | list | tuple) and isinstance(count, int):
+                    if len(sequence) * count > _limits.max_output_length:
+                        raise Jinja2RenderError(f"Template output exceeds {_limits.max_output_length} characters")
+        elif operator == "**" and isinstance(left, int) and isinstance(right, int) and right > 0:
+            # the number of digits of the result, an enormous power takes longer than any deadline
+            if left.bit_length() * right > _limits.max_output_length * 4:
+                raise Jinja2RenderError(f"Template output exceeds {_limits.max_output_length} characters")
+        return super().call_binop(context, operator, left, right)
+
+
+# same defaults as the jinja2.Template used by the sandbox runner, but unsafe attributes
+# and methods that mutate the inputs are rejected
+_environment = _LimitedSandboxedEnvironment()
+
+
+@lru_cache(maxsize=dify_config.JINJA2_LOCAL_RENDER_TEMPLATE_CACHE_SIZE)
+def _compile_template(template: str) -> Template:
+    return _environment.from_string(template)
+
+
+def _render_template(template: str, inputs: Mapping[str, Any], timeout: float, max_output_length: int) -> str:
+    """
+    Render the template chunk by chunk, so that the output length is checked while the template is still running,
+    the sandbox checks the deadline
+    """
+    _limits.deadline = time.monotonic() + timeout
+    _limits.timeout = timeout
+    _limits.max_output_length = max_output_length
+    chunks = []
+    output_length = 0
+    try:
+        for chunk in _compile_template(template).generate(**inputs):
+            output_length += len(chunk)
+            if output_length > max_output_length:
+                raise Jinja2RenderError(f"Template output exceeds {max_output_length} characters")
+            _check_deadline()
+            chunks.append(chunk)
+    except Jinja2RenderError:
+        raise
+    except Exception as e:
+        # only pass the message of the jinja2 error to the caller
+        raise Jinja2RenderError(f"{type(e).__name__}: {e}")
+    finally:
+        _limits.deadline = None
+    return "".join(chunks)
+
+
+# time a worker process gets past the render deadline to report the timeout itself before it is killed
+_WORKER_KILL_GRACE_PERIOD = 1.0
+
+
+def _render_worker(connection: Connection) -> None:
+    """
+    Render the jobs received on the connection one at a time, report when each job starts
+    so that the caller's deadline doesn't include the start of the worker
+    """
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        connection.send(("started", None))
+        try:
+            connection.send(("result", _render_template(*job)))
+        except Jinja2RenderError as e:
+            connection.send(("error", str(e)))
+
+
+class _RenderProcess:
+    def __init__(self, context: SpawnContext) -> None:
+        self._connection, worker_connection = context.Pipe()
+        self._process = context.Process(target=_render_worker, args=(worker_connection,), daemon=True)
+        self._process.start()
+        worker_connection.close()
+
+    def is_alive(self) -> bool:
+        return self._process.is_alive()
+
+    def render(self, job: tuple[Any, ...], timeout: float) -> str:
+        try:
+            self._connection.send(job)
+            self._connection.recv()
+            if not self._connection.poll(timeout + _WORKER_KILL_GRACE_PERIOD):
+                # a filter stuck in C code can't be interrupted, only this worker is killed
+                self.kill()
+                raise Jinja2RenderError(f"Template rendering timed out after {timeout} seconds")
+            status, value = self._connection.recv()
+        except (EOFError, OSError) as e:
+            self.kill()
+            raise Jinja2RenderError(f"Template rendering worker exited: {e}")
+        if status == "error":
+            raise Jinja2RenderError(value)
+        return str(value)
+
+    def kill(self) -> None:
+        self._process.kill()
+        self._process.join()
+        self._connection.close()
+
+
+class _RenderProcessPool:
+    """
+    Worker processes rendering one template each at a time, a worker stuck past the deadline is replaced
+    without interrupting the renders running in the other workers
+    """
+
+    def __init__(self, processes: int) -> None:
+        # spawn instead of fork, the parent may hold threads, locks and database connections
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = processes
+        self._idle_workers: list[_RenderProcess] = []
+        self._started_workers = 0
+        self._terminated = False
+        self._condition = threading.Condition()
+
+    def render(self, job: tuple[Any, ...], timeout: float) -> str:
+        worker = self._acquire()
+        try:
+            return worker.render(job, timeout)
+        finally:
+            self._release(worker)
+
+    def terminate(self) -> None:
+        with self._condition:
+            self._terminated = True
+            idle_workers, self._idle_workers = self._idle_workers, []
+        for worker in idle_workers:
+            worker.kill()
+
+    def _acquire(self) -> _RenderProcess:
+        with self._condition:
+            while not self._idle_workers and self._started_workers >= self._processes:
+                self._condition.wait()
+            if self._idle_workers:
+                return self._idle_workers.pop()
+            self._started_workers += 1
+        try:
+            return _RenderProcess(self._context)
+        except BaseException:
+            with self._condition:
+                self._started_workers -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, worker: _RenderProcess) -> None:
+        with self._condition:
+            reuse = worker.is_alive() and not self._terminated
+            if reuse:
+                self._idle_workers.append(worker)
+            else:
+                self._started_workers -= 1
+            self._condition.notify()
+        if not reuse and worker.is_alive():
+            worker.kill()
+
+
+class Jinja2LocalRenderer:
+    """
+    Render Jinja2 templates in-process with a sandboxed environment instead of a round trip to the code sandbox
+    """
+
+    _pool: Optional[ThreadPool | _RenderProcessPool] = None
+    _pool_pid: Optional[int] = None
+    _pool_mode: Optional[str] = None
+    _pool_lock = threading.Lock()
+
+    @classmethod
+    def render(cls, template: str, inputs: Mapping[str, Any]) -> str:
+        """
+        Render template
+        :param template: template
+        :param inputs: inputs
+        :return: rendered template
+        """
+        # the sandbox receives the inputs as json, keep the same types locally
+        inputs = json.loads(json.dumps(inputs, ensure_ascii=False))
+        timeout = dify_config.JINJA2_LOCAL_RENDER_TIMEOUT
+        job = (template, inputs, timeout, dify_config.JINJA2_LOCAL_RENDER_MAX_OUTPUT_LENGTH)
+
+        pool = cls._get_pool()
+        if isinstance(pool, _RenderProcessPool):
+            return pool.render(job, timeout)
+
+        result = pool.apply_async(_render_template, job)
+        try:
+            return result.get(timeout=timeout)
+        except multiprocessing.TimeoutError:
+            raise Jinja2RenderError(f"Template rendering timed out after {timeout} seconds")
+
+    @classmethod
+    def _get_pool(cls) -> ThreadPool | _RenderProcessPool:
+        pid = os.getpid()
+        pool = cls._pool
+        if pool is None or cls._pool_pid != pid:
+            with cls._pool_lock:
+                pool = cls._pool
+                if pool is None or cls._pool_pid != pid:
+                    mode = dify_config.JINJA2_LOCAL_RENDER_MODE
+                    if mode == "process" and not can_start_process_pool():
+                        logger.warning(
+                            "Jinja2 process pool is not supported in gevent or daemonic worker processes,"
+                            " rendering templates in a thread pool"
+                        )
+                        mode = "thread"
+                    if mode == "process":
+                        pool = _RenderProcessPool(processes=dify_config.JINJA2_LOCAL_RENDER_MAX_WORKERS)
+                    else:
+                        pool = ThreadPool(processes=dify_config.JINJA2_LOCAL_RENDER_MAX_WORKERS)
+                    cls._pool = pool
+                    cls._pool_pid = pid
+                    cls._pool_mode = mode
+        return pool
@@ -4,6 +4,8 @@ from core.helper.code_executor.template_transformer import TemplateTransformer
 
 
 class Python3TemplateTransformer(TemplateTransformer):
+    supports_batch = True
+
     @classmethod
     def get_runner_script(cls) -> str:
         runner_script = dedent(f"""
@@ -25,3 +27,34 @@ class Python3TemplateTransformer(TemplateTransformer):
             print(result)
             """)
         return runner_script
+
+    @classmethod
+    def get_batch_runner_script(cls) -> str:
+        runner_script = dedent(f"""
+            import json
+            import traceback
+            from base64 import b64decode
+            
+            # decode the code, it is executed again for every input dict
+            code_obj = compile(b64decode('{cls._code_placeholder}').decode('utf-8'), '<code>', 'exec')
+            
+            # decode and prepare the list of input dicts
+            inputs_list = json.loads(b64decode('{cls._inputs_placeholder}').decode('utf-8'))
+            
+            # execute main function for every input dict in its own module globals,
+            # an error only fails its own item
+            output_list = []
+            for inputs_obj in inputs_list:
+                try:
+                    code_globals = {{"__name__": "__main__", "__builtins__": __builtins__}}
+                    exec(code_obj, code_globals)
+                    output_list.append({{"result": code_globals["main"](**inputs_obj)}})
+                except Exception:
+                    output_list.append({{"error": traceback.format_exc()}})
+            
+            # convert output to json and print
+            output_json = json.dumps(output_list, indent=4)
+            result = f'''<<RESULT>>{{output_json}}<<RESULT>>'''
+            print(result)
+            """)
+        return runner_script
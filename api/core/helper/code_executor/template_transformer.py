@@ -2,7 +2,7 @@ import json
 import re
 from abc import ABC, abstractmethod
 from base64 import b64encode
-from collections.abc import Mapping
+from collections.abc import Mapping, Sequence
 from typing import Any
 
 
@@ -10,6 +10,8 @@ class TemplateTransformer(ABC):
     _code_placeholder: str = "{{code}}"
     _inputs_placeholder: str = "{{inputs}}"
     _result_tag: str = "<<RESULT>>"
+    # whether the transformer has a batch runner script, concurrent executions of its language are then batched
+    supports_batch: bool = False
 
     @classmethod
     def transform_caller(cls, code: str, inputs: Mapping[str, Any]) -> tuple[str, str]:
@@ -48,6 +50,57 @@ class TemplateTransformer(ABC):
             raise ValueError("result keys must be strings")
         return result
 
+    @classmethod
+    def transform_batch_caller(cls, code: str, inputs_list: Sequence[Mapping[str, Any]]) -> tuple[str, str]:
+        """
+        Transform code to a runner that executes the code and calls main once for every inputs,
+        so the items don't share the module globals of the code
+        :param code: code
+        :param inputs_list: list of inputs
+        :return: runner, preload
+        """
+        runner_script = cls.get_batch_runner_script()
+        runner_script = runner_script.replace(cls._code_placeholder, b64encode(code.encode()).decode("utf-8"))
+        runner_script = runner_script.replace(cls._inputs_placeholder, cls.serialize_inputs(inputs_list))
+        preload_script = cls.get_preload_script()
+
+        return runner_script, preload_script
+
+    @classmethod
+    def transform_batch_response(cls, response: str) -> list[Mapping[str, Any] | str]:
+        """
+        Transform batch response to the result dict, or the error message, of every inputs
+        :param response: response
+        :return:
+        """
+        try:
+            items = json.loads(cls.extract_result_str_from_response(response))
+        except json.JSONDecodeError:
+            raise ValueError("failed to parse response")
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError("batch result must be a list of dicts")
+
+        results: list[Mapping[str, Any] | str] = []
+        for item in items:
+            result = item.get("result")
+            if item.get("error") is not None:
+                results.append(str(item["error"]))
+            elif not isinstance(result, dict):
+                results.append("result must be a dict")
+            elif not all(isinstance(k, str) for k in result):
+                results.append("result keys must be strings")
+            else:
+                results.append(result)
+        return results
+
+    @classmethod
+    def get_batch_runner_script(cls) -> str:
+        """
+        Get batch runner script executing the base64 encoded code and calling main once for every inputs,
+        only called when supports_batch is set
+        """
+        return ""
+
     @classmethod
     @abstractmethod
     def get_runner_script(cls) -> str:
@@ -57,7 +110,7 @@ class TemplateTransformer(ABC):
         pass
 
     @classmethod
-    def serialize_inputs(cls, inputs: Mapping[str, Any]) -> str:
+    def serialize_inputs(cls, inputs: Mapping[str, Any] | Sequence[Mapping[str, Any]]) -> str:
         inputs_json_str = json.dumps(inputs, ensure_ascii=False).encode()
         input_base64_encoded = b64encode(inputs_json_str).decode("utf-8")
         return input_base64_encoded
@@ -0,0 +1,11 @@
+import http.cookiejar
+
+
+class RejectCookiesPolicy(http.cookiejar.DefaultCookiePolicy):
+    """
+    Cookie policy of the pooled http clients, they are shared by all requests of the process
+    so they must not keep the cookies set by responses.
+    """
+
+    def set_ok(self, cookie, request):
+        return False
@@ -0,0 +1,18 @@
+import multiprocessing
+
+
+def is_gevent_patched() -> bool:
+    """Process pools are not safe in gevent workers, their pipes and locks are not cooperative."""
+    try:
+        from gevent import monkey  # type: ignore
+    except ImportError:
+        return False
+    return bool(monkey.is_module_patched("threading"))
+
+
+def can_start_process_pool() -> bool:
+    """
+    Whether the current process can run a spawn process pool,
+    daemonic processes such as celery prefork children are not allowed to have children
+    """
+    return not is_gevent_patched() and not multiprocessing.current_process().daemon
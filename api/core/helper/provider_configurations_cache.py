@@ -0,0 +1,192 @@
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from configs import dify_config
+from extensions.ext_redis import redis_client
+from libs import rsa
+from models.provider import (
+    LoadBalancingModelConfig,
+    Provider,
+    ProviderModel,
+    ProviderModelSetting,
+    TenantPreferredModelProvider,
+)
+
+if TYPE_CHECKING:
+    from core.entities.provider_configuration import ProviderConfigurations
+    from core.entities.provider_entities import ProviderQuotaType
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "provider_configurations_invalidation"
+
+# changes to these models change the provider configurations of their tenant
+_PROVIDER_MODELS = (
+    Provider,
+    ProviderModel,
+    ProviderModelSetting,
+    LoadBalancingModelConfig,
+    TenantPreferredModelProvider,
+)
+_SESSION_INFO_KEY = "provider_configurations_changed_tenants"
+
+
+class ProviderConfigurationsCache:
+    """
+    Process-local cache of the provider configurations built for a tenant.
+
+    Entries are versioned per tenant: a configuration built while the tenant was invalidated is not cached.
+    Invalidations are published through redis pub/sub so every process drops its entries, the TTL bounds
+    the staleness if a message is missed. Changes made with bulk updates bypass the session hooks below and
+    invalidate the tenant explicitly, except the hosted quota deductions which only patch the local entry.
+    """
+
+    _entries: TTLCache = TTLCache(
+        maxsize=dify_config.PROVIDER_CONFIGURATIONS_CACHE_MAX_TENANTS, ttl=dify_config.PROVIDER_CONFIGURATIONS_CACHE_TTL
+    )
+    _versions: dict[str, int] = {}
+    _lock = threading.Lock()
+    _listener_pid: Optional[int] = None
+
+    @classmethod
+    def get_version(cls, tenant_id: str) -> int:
+        return cls._versions.get(tenant_id, 0)
+
+    @classmethod
+    def get(cls, tenant_id: str) -> Optional["ProviderConfigurations"]:
+        """
+        Get a copy of the cached provider configurations, callers are free to modify it
+        """
+        if not dify_config.PROVIDER_CONFIGURATIONS_CACHE_ENABLED:
+            return None
+
+        cls._ensure_listener()
+        with cls._lock:
+            provider_configurations: Optional[ProviderConfigurations] = cls._entries.get(tenant_id)
+        if provider_configurations is None:
+            return None
+        return provider_configurations.model_copy(deep=True)
+
+    @classmethod
+    def set(cls, tenant_id: str, provider_configurations: "ProviderConfigurations", version: int) -> None:
+        """
+        Cache the provider configurations built at the given version of the tenant
+        """
+        if not dify_config.PROVIDER_CONFIGURATIONS_CACHE_ENABLED:
+            return
+
+        provider_configurations = provider_configurations.model_copy(deep=True)
+        with cls._lock:
+            if cls.get_version(tenant_id) == version:
+                cls._entries[tenant_id] = provider_configurations
+
+    @classmethod
+    def record_quota_usage(
+        cls, tenant_id: str, provider: str, quota_type: "ProviderQuotaType", used_quota: int
+    ) -> None:
+        """
+        Add a hosted quota deduction to the cached quota of this process. The other processes see it
+        once their entry expires, within the TTL. An exhausted quota changes the provider type in use,
+        so it invalidates the tenant in every process.
+        """
+        if not dify_config.PROVIDER_CONFIGURATIONS_CACHE_ENABLED:
+            return
+
+        exhausted = False
+        with cls._lock:
+            provider_configurations: Optional[ProviderConfigurations] = cls._entries.get(tenant_id)
+            provider_configuration = provider_configurations.get(provider) if provider_configurations else None
+            if provider_configuration is None:
+                return
+            for quota_configuration in provider_configuration.system_configuration.quota_configurations:
+                if quota_configuration.quota_type != quota_type:
+                    continue
+                quota_configuration.quota_used += used_quota
+                exhausted = -1 < quota_configuration.quota_limit <= quota_configuration.quota_used
+
+        if exhausted:
+            cls.invalidate(tenant_id)
+
+    @classmethod
+    def invalidate(cls, tenant_id: str) -> None:
+        """
+        Drop the cached provider configurations and RSA cipher of the tenant in every process
+        """
+        cls.invalidate_local(tenant_id)
+        try:
+            redis_client.publish(INVALIDATION_CHANNEL, tenant_id)
+        except Exception:
+            logger.exception("Failed to publish the provider configurations invalidation of tenant %s", tenant_id)
+
+    @classmethod
+    def invalidate_local(cls, tenant_id: str) -> None:
+        with cls._lock:
+            cls._versions[tenant_id] = cls.get_version(tenant_id) + 1
+            cls._entries.pop(tenant_id, None)
+        rsa.clear_decrypt_decoding_cache(tenant_id)
+
+    @classmethod
+    def clear_local(cls) -> None:
+        with cls._lock:
+            for tenant_id in cls._entries:
+                cls._versions[tenant_id] = cls.get_version(tenant_id) + 1
+            cls._entries.clear()
+        rsa.clear_decrypt_decoding_cache()
+
+    @classmethod
+    def _ensure_listener(cls) -> None:
+        pid = os.getpid()
+        if cls._listener_pid == pid:
+            return
+
+        with cls._lock:
+            if cls._listener_pid == pid:
+                return
+            cls._listener_pid = pid
+        threading.Thread(target=cls._listen, name="provider-configurations-invalidation", daemon=True).start()
+
+    @classmethod
+    def _listen(cls) -> None:
+        retry_interval = 1
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                retry_interval = 1
+                for message in pubsub.listen():
+                    tenant_id = message.get("data")
+                    if isinstance(tenant_id, bytes):
+                        tenant_id = tenant_id.decode("utf-8")
+                    if tenant_id:
+                        cls.invalidate_local(tenant_id)
+            except Exception as e:
+                logger.warning("Provider configurations invalidation listener failed, reconnecting: %s", e)
+            # invalidations may have been missed while disconnected
+            cls.clear_local()
+            time.sleep(retry_interval)
+            retry_interval = min(retry_interval * 2, 30)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_tenants(session: Session, flush_context) -> None:
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, _PROVIDER_MODELS) and instance.tenant_id:
+            session.info.setdefault(_SESSION_INFO_KEY, set()).add(instance.tenant_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_tenants(session: Session) -> None:
+    for tenant_id in session.info.pop(_SESSION_INFO_KEY, set()):
+        ProviderConfigurationsCache.invalidate(tenant_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_tenants(session: Session) -> None:
+    session.info.pop(_SESSION_INFO_KEY, None)
@@ -2,12 +2,19 @@
 Proxy requests to avoid SSRF
 """
 
+import asyncio
+import http.cookiejar
+import importlib.util
 import logging
+import threading
 import time
+import weakref
+from typing import Any
 
 import httpx
 
 from configs import dify_config
+from core.helper.cookie_policy import RejectCookiesPolicy
 
 SSRF_DEFAULT_MAX_RETRIES = dify_config.SSRF_DEFAULT_MAX_RETRIES
 
@@ -34,7 +41,90 @@ class MaxRetriesExceededError(ValueError):
     pass
 
 
-def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
+_clients: dict[tuple, httpx.Client] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+_clients_lock = threading.Lock()
+
+
+def _get_client_key() -> tuple:
+    return (
+        dify_config.SSRF_PROXY_ALL_URL,
+        dify_config.SSRF_PROXY_HTTP_URL,
+        dify_config.SSRF_PROXY_HTTPS_URL,
+        HTTP_REQUEST_NODE_SSL_VERIFY,
+    )
+
+
+def _is_http2_enabled() -> bool:
+    if not dify_config.SSRF_POOL_HTTP2_ENABLED:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logging.warning("SSRF_POOL_HTTP2_ENABLED is set but the h2 package is not installed, falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def _get_client_options(key: tuple, transport_class: type) -> dict[str, Any]:
+    """
+    Get the options of a pooled client for the proxy and SSL configuration of the key
+    """
+    proxy_all_url, proxy_http_url, proxy_https_url, verify = key
+    limits = httpx.Limits(
+        max_connections=dify_config.SSRF_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=dify_config.SSRF_POOL_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=dify_config.SSRF_POOL_KEEPALIVE_EXPIRY,
+    )
+    http2 = _is_http2_enabled()
+    options: dict[str, Any] = {
+        "verify": verify,
+        "limits": limits,
+        "http2": http2,
+        "cookies": http.cookiejar.CookieJar(policy=RejectCookiesPolicy()),
+    }
+    if proxy_all_url:
+        options["proxy"] = proxy_all_url
+    elif proxy_http_url and proxy_https_url:
+        options["mounts"] = {
+            "http://": transport_class(proxy=proxy_http_url, verify=verify, limits=limits, http2=http2),
+            "https://": transport_class(proxy=proxy_https_url, verify=verify, limits=limits, http2=http2),
+        }
+    return options
+
+
+def _get_client() -> httpx.Client:
+    """
+    Get the process-wide pooled client for the current proxy and SSL configuration,
+    connections are kept alive and reused across requests and retries
+    """
+    key = _get_client_key()
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = httpx.Client(**_get_client_options(key, httpx.HTTPTransport))
+                _clients[key] = client
+    return client
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """
+    Get the pooled async client of the running event loop, async connections can't be shared between loops
+    """
+    key = _get_client_key()
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(**_get_client_options(key, httpx.AsyncHTTPTransport))
+            loop_clients[key] = client
+    return client
+
+
+def _prepare_request_kwargs(kwargs: dict[str, Any]) -> dict[str, Any]:
     if "allow_redirects" in kwargs:
         allow_redirects = kwargs.pop("allow_redirects")
         if "follow_redirects" not in kwargs:
@@ -47,23 +137,17 @@ def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
             read=dify_config.SSRF_DEFAULT_READ_TIME_OUT,
             write=dify_config.SSRF_DEFAULT_WRITE_TIME_OUT,
         )
+    return kwargs
+
+
+def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
+    kwargs = _prepare_request_kwargs(kwargs)
+    client = _get_client()
 
     retries = 0
     while retries <= max_retries:
         try:
-            if dify_config.SSRF_PROXY_ALL_URL:
-                with httpx.Client(proxy=dify_config.SSRF_PROXY_ALL_URL, verify=HTTP_REQUEST_NODE_SSL_VERIFY) as client:
-                    response = client.request(method=method, url=url, **kwargs)
-            elif dify_config.SSRF_PROXY_HTTP_URL and dify_config.SSRF_PROXY_HTTPS_URL:
-                proxy_mounts = {
-                    "http://": httpx.HTTPTransport(proxy=dify_config.SSRF_PROXY_HTTP_URL),
-                    "https://": httpx.HTTPTransport(proxy=dify_config.SSRF_PROXY_HTTPS_URL),
-                }
-                with httpx.Client(mounts=proxy_mounts, verify=HTTP_REQUEST_NODE_SSL_VERIFY) as client:
-                    response = client.request(method=method, url=url, **kwargs)
-            else:
-                with httpx.Client(verify=HTTP_REQUEST_NODE_SSL_VERIFY) as client:
-                    response = client.request(method=method, url=url, **kwargs)
+            response = client.request(method=method, url=url, **kwargs)
 
             if response.status_code not in STATUS_FORCELIST:
                 return response
@@ -81,6 +165,42 @@ def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
     raise MaxRetriesExceededError(f"Reached maximum retries ({max_retries}) for URL {url}")
 
 
+async def make_async_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
+    kwargs = _prepare_request_kwargs(kwargs)
+    client = _get_async_client()
+
+    retries = 0
+    while retries <= max_retries:
+        try:
+            response = await client.request(method=method, url=url, **kwargs)
+
+            if response.status_code not in STATUS_FORCELIST:
+                return response
+            else:
+                logging.warning(f"Received status code {response.status_code} for URL {url} which is in the force list")
+
+        except httpx.RequestError as e:
+            logging.warning(f"Request to URL {url} failed on attempt {retries + 1}: {e}")
+            if max_retries == 0:
+                raise
+
+        retries += 1
+        if retries <= max_retries:
+            await asyncio.sleep(BACKOFF_FACTOR * (2 ** (retries - 1)))
+    raise MaxRetriesExceededError(f"Reached maximum retries ({max_retries}) for URL {url}")
+
+
+def close_clients() -> None:
+    """
+    Close the pooled sync clients and their connections, e.g. before the process forks
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
 def get(url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
     return make_request("GET", url, max_retries=max_retries, **kwargs)
 
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+from collections.abc import Sequence
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Optional
+
+from cachetools import LRUCache
+
+from configs import dify_config
+from core.model_runtime.model_providers.__base.tokenizers.gpt2_tokenzier import GPT2Tokenizer
+
+if TYPE_CHECKING:
+    from core.model_manager import ModelInstance
+
+logger = logging.getLogger(__name__)
+
+# providers whose models are tokenized with the tiktoken encodings, the model name picks the encoding
+_TIKTOKEN_PROVIDERS = {"openai", "azure_openai"}
+
+_counts: LRUCache = LRUCache(maxsize=dify_config.TOKEN_COUNTER_CACHE_SIZE)
+_counts_lock = Lock()
+_encodings: dict[str, Any] = {}
+_encodings_lock = Lock()
+
+
+def _get_tiktoken_encoding(model: str) -> Any:
+    """
+    Get the tiktoken encoding of a model, None when tiktoken doesn't know the model or can't load its encoding
+    """
+    if model not in _encodings:
+        with _encodings_lock:
+            if model not in _encodings:
+                try:
+                    import tiktoken
+
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except Exception:
+                    logger.debug("No local tiktoken encoding for model %s, counting tokens with the provider", model)
+                    _encodings[model] = None
+    return _encodings[model]
+
+
+class TokenCounter:
+    """
+    Count the tokens of texts for an embedding model, with a local encoder when the model family is known
+    and the provider otherwise. Counts are memoized by text hash, so the same text is only counted once.
+    """
+
+    def __init__(self, model_instance: Optional["ModelInstance"] = None) -> None:
+        self.model_instance = model_instance
+        self._encoding = None
+        if model_instance is None:
+            self._namespace = "gpt2"
+        else:
+            self._namespace = f"{model_instance.provider}:{model_instance.model}"
+            if (
+                dify_config.TOKEN_COUNTER_LOCAL_ENCODING_ENABLED
+                and model_instance.provider.split("/")[-1] in _TIKTOKEN_PROVIDERS
+            ):
+                self._encoding = _get_tiktoken_encoding(model_instance.model)
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: Sequence[str]) -> list[int]:
+        """
+        Count the tokens of texts, the texts missing from the cache are counted in one batch
+        :param texts: texts
+        :return: number of tokens of every text
+        """
+        if not texts:
+            return []
+
+        keys = [(self._namespace, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()) for text in texts]
+        counts: list[Optional[int]] = []
+        with _counts_lock:
+            for key in keys:
+                counts.append(_counts.get(key))
+
+        missing_indexes = [index for index, count in enumerate(counts) if count is None]
+        if missing_indexes:
+            # a text may appear several times in one call, count it once
+            missing_texts = list(dict.fromkeys(texts[index] for index in missing_indexes))
+            missing_counts = dict(zip(missing_texts, self._count_uncached(missing_texts)))
+            with _counts_lock:
+                for index in missing_indexes:
+                    counts[index] = missing_counts[texts[index]]
+                    _counts[keys[index]] = counts[index]
+
+        return [count or 0 for count in counts]
+
+    def _count_uncached(self, texts: list[str]) -> list[int]:
+        if self._encoding is not None:
+            return [len(self._encoding.encode_ordinary(text)) for text in texts]
+        if self.model_instance is not None:
+            return self.model_instance.get_text_embedding_num_tokens(texts=texts)
+        return [GPT2Tokenizer.get_num_tokens(text) for text in texts]
@@ -15,6 +15,7 @@ from sqlalchemy.orm.exc import ObjectDeletedError
 from configs import dify_config
 from core.entities.knowledge_entities import IndexingEstimate, PreviewDetail, QAPreviewDetail
 from core.errors.error import ProviderTokenNotInitError
+from core.helper.token_counter import TokenCounter
 from core.model_manager import ModelInstance, ModelManager
 from core.model_runtime.entities.model_entities import ModelType
 from core.rag.cleaner.clean_processor import CleanProcessor
@@ -619,7 +620,7 @@ class IndexingRunner:
             tokens = 0
             if embedding_model_instance:
                 page_content_list = [document.page_content for document in chunk_documents]
-                tokens += sum(embedding_model_instance.get_text_embedding_num_tokens(page_content_list))
+                tokens += sum(TokenCounter(embedding_model_instance).count_many(page_content_list))
 
             # load index
             index_processor.load(dataset, chunk_documents, with_keywords=False)
@@ -1,8 +1,11 @@
-from collections.abc import Sequence
-from typing import Optional
+import hashlib
+import logging
+from collections import defaultdict
+from collections.abc import Mapping, Sequence
+from typing import Any, Optional
 
 from core.app.app_config.features.file_upload.manager import FileUploadConfigManager
-from core.file import file_manager
+from core.file import FileUploadConfig, file_manager
 from core.model_manager import ModelInstance
 from core.model_runtime.entities import (
     AssistantPromptMessage,
@@ -15,9 +18,15 @@ from core.model_runtime.entities import (
 )
 from core.prompt.utils.extract_thread_messages import extract_thread_messages
 from extensions.ext_database import db
+from extensions.ext_redis import redis_client
 from factories import file_factory
 from models.model import AppMode, Conversation, Message, MessageFile
-from models.workflow import WorkflowRun
+from models.workflow import Workflow, WorkflowRun
+
+logger = logging.getLogger(__name__)
+
+# token counts are cached by the content of the prompt message, so they never go stale
+TOKEN_COUNT_CACHE_TTL = 24 * 60 * 60
 
 
 class TokenBufferMemory:
@@ -67,25 +76,14 @@ class TokenBufferMemory:
             thread_messages.pop(0)
 
         messages = list(reversed(thread_messages))
+        message_files = self._fetch_message_files(messages)
+        file_extra_configs = self._fetch_file_extra_configs(messages, message_files)
 
         prompt_messages: list[PromptMessage] = []
         for message in messages:
-            files = db.session.query(MessageFile).filter(MessageFile.message_id == message.id).all()
+            files = message_files.get(message.id)
             if files:
-                file_extra_config = None
-                if self.conversation.mode not in {AppMode.ADVANCED_CHAT, AppMode.WORKFLOW}:
-                    file_extra_config = FileUploadConfigManager.convert(self.conversation.model_config)
-                else:
-                    if message.workflow_run_id:
-                        workflow_run = (
-                            db.session.query(WorkflowRun).filter(WorkflowRun.id == message.workflow_run_id).first()
-                        )
-
-                        if workflow_run and workflow_run.workflow:
-                            file_extra_config = FileUploadConfigManager.convert(
-                                workflow_run.workflow.features_dict, is_vision=False
-                            )
-
+                file_extra_config = file_extra_configs.get(message.id)
                 detail = ImagePromptMessageContent.DETAIL.LOW
                 if file_extra_config and app_record:
                     file_objs = file_factory.build_from_message_files(
@@ -119,15 +117,123 @@ class TokenBufferMemory:
             return []
 
         # prune the chat message if it exceeds the max token limit
+        return self._prune_prompt_messages(prompt_messages, max_token_limit)
+
+    def _fetch_message_files(self, messages: Sequence[Any]) -> dict[str, list[MessageFile]]:
+        """
+        Fetch the files of the messages with one query
+        """
+        if not messages:
+            return {}
+
+        message_files: dict[str, list[MessageFile]] = defaultdict(list)
+        files = db.session.query(MessageFile).filter(MessageFile.message_id.in_([m.id for m in messages])).all()
+        for file in files:
+            message_files[str(file.message_id)].append(file)
+        return message_files
+
+    def _fetch_file_extra_configs(
+        self, messages: Sequence[Any], message_files: Mapping[str, list[MessageFile]]
+    ) -> dict[str, FileUploadConfig]:
+        """
+        Get the file upload config of every message with files, the workflows of the messages are fetched
+        with one query
+        """
+        messages = [message for message in messages if message_files.get(message.id)]
+        if not messages:
+            return {}
+
+        if self.conversation.mode not in {AppMode.ADVANCED_CHAT, AppMode.WORKFLOW}:
+            file_extra_config = FileUploadConfigManager.convert(self.conversation.model_config)
+            if not file_extra_config:
+                return {}
+            return {message.id: file_extra_config for message in messages}
+
+        workflow_run_ids = {message.workflow_run_id for message in messages if message.workflow_run_id}
+        if not workflow_run_ids:
+            return {}
+        workflow_runs = (
+            db.session.query(WorkflowRun.id, WorkflowRun.workflow_id).filter(WorkflowRun.id.in_(workflow_run_ids)).all()
+        )
+        workflow_ids: dict[str, str] = {row[0]: row[1] for row in workflow_runs}
+        workflows = db.session.query(Workflow).filter(Workflow.id.in_(set(workflow_ids.values()))).all()
+        workflow_file_extra_configs: dict[str, Optional[FileUploadConfig]] = {
+            str(workflow.id): FileUploadConfigManager.convert(workflow.features_dict, is_vision=False)
+            for workflow in workflows
+        }
+
+        file_extra_configs = {}
+        for message in messages:
+            file_extra_config = workflow_file_extra_configs.get(workflow_ids.get(message.workflow_run_id, ""))
+            if file_extra_config:
+                file_extra_configs[message.id] = file_extra_config
+        return file_extra_configs
+
+    def _prune_prompt_messages(self, prompt_messages: list[PromptMessage], max_token_limit: int) -> list[PromptMessage]:
+        """
+        Keep the newest prompt messages within the max token limit, and at least the last one.
+
+        The whole window is counted at once first, most histories fit and are returned as is. Otherwise the
+        tokens of every message are counted once and cached by model and content, the messages are walked
+        from the newest one so the messages pruned are not counted at all.
+        """
         curr_message_tokens = self.model_instance.get_llm_num_tokens(prompt_messages)
+        if curr_message_tokens <= max_token_limit or len(prompt_messages) <= 1:
+            return prompt_messages
 
-        if curr_message_tokens > max_token_limit:
-            pruned_memory = []
-            while curr_message_tokens > max_token_limit and len(prompt_messages) > 1:
-                pruned_memory.append(prompt_messages.pop(0))
-                curr_message_tokens = self.model_instance.get_llm_num_tokens(prompt_messages)
+        digests = [_get_prompt_message_digest(prompt_message) for prompt_message in prompt_messages]
+        # tokens added once per request by the model, e.g. the priming of the reply,
+        # they are counted with every single message and are deducted from them
+        overhead_digest = _get_prompt_message_digest(None)
+        token_counts = self._get_cached_token_counts([overhead_digest, *digests])
+        new_token_counts: dict[str, int] = {}
 
-        return prompt_messages
+        def count_tokens(digest: str, messages: list[PromptMessage]) -> int:
+            tokens = token_counts.get(digest)
+            if tokens is None:
+                tokens = self.model_instance.get_llm_num_tokens(messages)
+                token_counts[digest] = new_token_counts[digest] = tokens
+            return tokens
+
+        try:
+            overhead_tokens = count_tokens(overhead_digest, [])
+        except Exception:
+            # not every model can count the tokens of an empty prompt
+            overhead_tokens = 0
+        curr_message_tokens = overhead_tokens
+        start_index = len(prompt_messages)
+        while start_index > 0:
+            index = start_index - 1
+            message_tokens = max(count_tokens(digests[index], [prompt_messages[index]]) - overhead_tokens, 0)
+            if curr_message_tokens + message_tokens > max_token_limit and start_index < len(prompt_messages):
+                break
+            curr_message_tokens += message_tokens
+            start_index = index
+
+        self._set_cached_token_counts(new_token_counts)
+        return prompt_messages[start_index:]
+
+    def _get_cached_token_counts(self, digests: list[str]) -> dict[str, int]:
+        try:
+            values = redis_client.mget([self._get_token_count_cache_key(digest) for digest in digests])
+        except Exception:
+            logger.warning("Failed to get the token counts of the history messages from redis", exc_info=True)
+            return {}
+        return {digest: int(value) for digest, value in zip(digests, values) if value is not None}
+
+    def _set_cached_token_counts(self, token_counts: Mapping[str, int]) -> None:
+        if not token_counts:
+            return
+        try:
+            pipeline = redis_client.pipeline(transaction=False)
+            for digest, tokens in token_counts.items():
+                pipeline.setex(self._get_token_count_cache_key(digest), TOKEN_COUNT_CACHE_TTL, tokens)
+            pipeline.execute()
+        except Exception:
+            logger.warning("Failed to cache the token counts of the history messages in redis", exc_info=True)
+
+    def _get_token_count_cache_key(self, digest: str) -> str:
+        return f"prompt_message_tokens:{self.model_instance.provider}:{self.model_instance.model}:{digest}"
 
     def get_history_prompt_text(
         self,
@@ -169,3 +275,8 @@ class TokenBufferMemory:
                 string_messages.append(message)
 
         return "\n".join(string_messages)
+
+
+def _get_prompt_message_digest(prompt_message: Optional[PromptMessage]) -> str:
+    content = prompt_message.model_dump_json() if prompt_message is not None else ""
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
@@ -1,7 +1,14 @@
 import logging
+import random
+import time
+import weakref
+from collections import defaultdict
 from collections.abc import Callable, Generator, Iterable, Sequence
+from threading import Lock
 from typing import IO, Any, Literal, Optional, Union, cast, overload
 
+from cachetools import LRUCache
+
 from configs import dify_config
 from core.entities.embedding_type import EmbeddingInputType
 from core.entities.provider_configuration import ProviderConfiguration, ProviderModelBundle
@@ -378,23 +385,32 @@ class ModelInstance:
                 else:
                     raise last_exception
 
+            started_at = self.load_balancing_manager.begin(lb_config)
             try:
                 if "credentials" in kwargs:
                     del kwargs["credentials"]
-                return function(*args, **kwargs, credentials=lb_config.credentials)
+                result = function(*args, **kwargs, credentials=lb_config.credentials)
             except InvokeRateLimitError as e:
+                self.load_balancing_manager.end(lb_config, started_at, succeeded=False)
                 # expire in 60 seconds
                 self.load_balancing_manager.cooldown(lb_config, expire=60)
                 last_exception = e
                 continue
             except (InvokeAuthorizationError, InvokeConnectionError) as e:
+                self.load_balancing_manager.end(lb_config, started_at, succeeded=False)
                 # expire in 10 seconds
                 self.load_balancing_manager.cooldown(lb_config, expire=10)
                 last_exception = e
                 continue
             except Exception as e:
+                self.load_balancing_manager.end(lb_config, started_at, succeeded=False)
                 raise e
 
+            if isinstance(result, Generator):
+                return self.load_balancing_manager.end_after_stream(lb_config, started_at, result)
+            self.load_balancing_manager.end(lb_config, started_at)
+            return result
+
     def get_tts_voices(self, language: Optional[str] = None) -> list:
         """
         Invoke large language tts model voices
@@ -462,6 +478,26 @@ class ModelManager:
         )
 
 
+class _LBState:
+    """
+    Load balancing state of a model in this process
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.index = 0
+        # config id -> time.monotonic() at which the cooldown ends
+        self.cooldowns: dict[str, float] = {}
+        self.cooldowns_synced_at = float("-inf")
+        self.in_flight: defaultdict[str, int] = defaultdict(int)
+        # config id -> moving average latency in seconds
+        self.latencies: dict[str, float] = {}
+
+
+_lb_states: LRUCache = LRUCache(maxsize=10000)
+_lb_states_lock = Lock()
+
+
 class LBModelManager:
     def __init__(
         self,
@@ -495,55 +531,122 @@ class LBModelManager:
                 else:
                     load_balancing_config.credentials = managed_credentials
 
+        state_key = "model_lb_index:{}:{}:{}:{}".format(
+            self._tenant_id, self._provider, self._model_type.value, self._model
+        )
+        with _lb_states_lock:
+            state = _lb_states.get(state_key)
+            if state is None:
+                state = _lb_states[state_key] = _LBState()
+        self._state: _LBState = state
+
     def fetch_next(self) -> Optional[ModelLoadBalancingConfiguration]:
         """
         Get next model load balancing config
-        Strategy: Round Robin
+        Strategy: MODEL_LB_STRATEGY, round robin by default
         :return:
         """
-        cache_key = "model_lb_index:{}:{}:{}:{}".format(
-            self._tenant_id, self._provider, self._model_type.value, self._model
-        )
-
-        cooldown_load_balancing_configs = []
-        max_index = len(self._load_balancing_configs)
-
-        while True:
-            current_index = redis_client.incr(cache_key)
-            current_index = cast(int, current_index)
-            if current_index >= 10000000:
-                current_index = 1
-                redis_client.set(cache_key, current_index)
-
-            redis_client.expire(cache_key, 3600)
-            if current_index > max_index:
-                current_index = current_index % max_index
-
-            real_index = current_index - 1
-            if real_index > max_index:
-                real_index = 0
-
-            config: ModelLoadBalancingConfiguration = self._load_balancing_configs[real_index]
+        self._sync_cooldowns()
+        available_configs = [config for config in self._load_balancing_configs if not self.in_cooldown(config)]
+        if not available_configs:
+            # all configs are in cooldown
+            return None
+
+        state = self._state
+        with state.lock:
+            if dify_config.MODEL_LB_STRATEGY == "least_in_flight":
+                # rotate the candidates so the ties are still served in turn
+                state.index = state.index % 10000000 + 1
+                offset = state.index % len(available_configs)
+                candidates = available_configs[offset:] + available_configs[:offset]
+                config = min(candidates, key=lambda c: state.in_flight[c.id])
+            elif dify_config.MODEL_LB_STRATEGY == "latency_weighted":
+                latencies = [state.latencies.get(c.id) for c in available_configs]
+                known_latencies = [latency for latency in latencies if latency is not None]
+                # configs without samples get the best known latency so they are tried early
+                default_latency = min(known_latencies) if known_latencies else 1.0
+                weights = [1 / max(latency or default_latency, 0.001) for latency in latencies]
+                config = random.choices(available_configs, weights=weights)[0]
+            else:
+                while True:
+                    state.index = state.index % 10000000 + 1
+                    config = self._load_balancing_configs[(state.index - 1) % len(self._load_balancing_configs)]
+                    if config in available_configs:
+                        break
+
+        if dify_config.DEBUG:
+            logger.info(
+                f"Model LB\nid: {config.id}\nname:{config.name}\n"
+                f"tenant_id: {self._tenant_id}\nprovider: {self._provider}\n"
+                f"model_type: {self._model_type.value}\nmodel: {self._model}"
+            )
+
+        return config
+
+    def begin(self, config: ModelLoadBalancingConfiguration) -> float:
+        """
+        Mark an invocation with the config as running
+        :param config: model load balancing config
+        :return: start time of the invocation
+        """
+        with self._state.lock:
+            self._state.in_flight[config.id] += 1
+        return time.perf_counter()
 
-            if self.in_cooldown(config):
-                cooldown_load_balancing_configs.append(config)
-                if len(cooldown_load_balancing_configs) >= len(self._load_balancing_configs):
-                    # all configs are in cooldown
-                    return None
+    def end(self, config: ModelLoadBalancingConfiguration, started_at: float, succeeded: bool = True) -> None:
+        """
+        Mark an invocation with the config as finished, the latency of succeeded invocations is recorded
+        :param config: model load balancing config
+        :param started_at: start time returned by begin
+        :param succeeded: whether the invocation succeeded
+        :return:
+        """
+        self._finish(config, time.perf_counter() - started_at if succeeded else None)
 
-                continue
+    def end_after_stream(
+        self, config: ModelLoadBalancingConfiguration, started_at: float, stream: Generator
+    ) -> Generator:
+        """
+        End the invocation once the stream is consumed, the latency recorded is the time to the first chunk.
+        A stream dropped before it is consumed, even one never started, ends the invocation without latency.
+        :param config: model load balancing config
+        :param started_at: start time returned by begin
+        :param stream: stream returned by the invocation
+        :return:
+        """
 
-            if dify_config.DEBUG:
-                logger.info(
-                    f"Model LB\nid: {config.id}\nname:{config.name}\n"
-                    f"tenant_id: {self._tenant_id}\nprovider: {self._provider}\n"
-                    f"model_type: {self._model_type.value}\nmodel: {self._model}"
+        def consume() -> Generator:
+            first_chunk_at = None
+            succeeded = False
+            try:
+                for chunk in stream:
+                    if first_chunk_at is None:
+                        first_chunk_at = time.perf_counter()
+                    yield chunk
+                succeeded = True
+            finally:
+                # detach returns None once the finalizer already ended the invocation
+                if finalizer.detach() is not None:
+                    latency = None
+                    if succeeded:
+                        latency = (first_chunk_at or time.perf_counter()) - started_at
+                    self._finish(config, latency)
+
+        wrapped_stream = consume()
+        finalizer = weakref.finalize(wrapped_stream, self._finish, config, None)
+        return wrapped_stream
+
+    def _finish(self, config: ModelLoadBalancingConfiguration, latency: Optional[float]) -> None:
+        state = self._state
+        with state.lock:
+            state.in_flight[config.id] = max(state.in_flight[config.id] - 1, 0)
+            if latency is not None:
+                alpha = dify_config.MODEL_LB_LATENCY_EWMA_ALPHA
+                previous_latency = state.latencies.get(config.id)
+                state.latencies[config.id] = (
+                    latency if previous_latency is None else alpha * latency + (1 - alpha) * previous_latency
                 )
 
-            return config
-
-        return None
-
     def cooldown(self, config: ModelLoadBalancingConfiguration, expire: int = 60) -> None:
         """
         Cooldown model load balancing config
@@ -551,11 +654,14 @@ class LBModelManager:
         :param expire: cooldown time
         :return:
         """
-        cooldown_cache_key = "model_lb_index:cooldown:{}:{}:{}:{}:{}".format(
-            self._tenant_id, self._provider, self._model_type.value, self._model, config.id
-        )
+        with self._state.lock:
+            self._state.cooldowns[config.id] = time.monotonic() + expire
 
-        redis_client.setex(cooldown_cache_key, expire, "true")
+        # share the cooldown with the other processes
+        try:
+            redis_client.setex(self._get_cooldown_cache_key(config), expire, "true")
+        except Exception:
+            logger.exception("Failed to share the cooldown of model load balancing config %s", config.id)
 
     def in_cooldown(self, config: ModelLoadBalancingConfiguration) -> bool:
         """
@@ -563,13 +669,40 @@ class LBModelManager:
         :param config: model load balancing config
         :return:
         """
-        cooldown_cache_key = "model_lb_index:cooldown:{}:{}:{}:{}:{}".format(
+        self._sync_cooldowns()
+        return self._state.cooldowns.get(config.id, 0) > time.monotonic()
+
+    def _sync_cooldowns(self) -> None:
+        """
+        Merge the cooldowns set by the other processes, read from redis in one round trip at most every
+        MODEL_LB_COOLDOWN_SYNC_INTERVAL seconds
+        """
+        state = self._state
+        now = time.monotonic()
+        with state.lock:
+            if now - state.cooldowns_synced_at < dify_config.MODEL_LB_COOLDOWN_SYNC_INTERVAL:
+                return
+            state.cooldowns_synced_at = now
+
+        try:
+            pipeline = redis_client.pipeline(transaction=False)
+            for config in self._load_balancing_configs:
+                pipeline.pttl(self._get_cooldown_cache_key(config))
+            ttls = pipeline.execute()
+        except Exception:
+            logger.exception("Failed to read the cooldowns of model %s, using the local ones", self._model)
+            return
+
+        with state.lock:
+            for config, ttl in zip(self._load_balancing_configs, ttls):
+                if ttl > 0:
+                    state.cooldowns[config.id] = max(state.cooldowns.get(config.id, 0), now + ttl / 1000)
+
+    def _get_cooldown_cache_key(self, config: ModelLoadBalancingConfiguration) -> str:
+        return "model_lb_index:cooldown:{}:{}:{}:{}:{}".format(
             self._tenant_id, self._provider, self._model_type.value, self._model, config.id
         )
 
-        res: bool = redis_client.exists(cooldown_cache_key)
-        return res
-
     @staticmethod
     def get_config_in_cooldown_and_ttl(
         tenant_id: str, provider: str, model_type: ModelType, model: str, config_id: str
@@ -30,6 +30,10 @@ class GPT2Tokenizer:
     @staticmethod
     def get_encoder() -> Any:
         global _tokenizer, _lock
+        # only take the lock to load the tokenizer, encoding doesn't need it
+        if _tokenizer is not None:
+            return _tokenizer
+
         with _lock:
             if _tokenizer is None:
                 # Try to use tiktoken to get the tokenizer because it is faster
@@ -89,4 +89,5 @@ class OpikConfig(BaseTracingConfig):
 
 
 OPS_FILE_PATH = "ops_trace/"
+OPS_TRACE_BATCH_FILE_PATH = f"{OPS_FILE_PATH}batches/"
 OPS_TRACE_FAILED_KEY = "FAILED_OPS_TRACE"
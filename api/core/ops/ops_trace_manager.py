@@ -1,3 +1,4 @@
+import gzip
 import json
 import logging
 import os
@@ -13,9 +14,11 @@ from flask import current_app
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from configs import dify_config
 from core.helper.encrypter import decrypt_token, encrypt_token, obfuscated_token
 from core.ops.entities.config_entity import (
     OPS_FILE_PATH,
+    OPS_TRACE_BATCH_FILE_PATH,
     LangfuseConfig,
     LangSmithConfig,
     OpikConfig,
@@ -39,7 +42,7 @@ from extensions.ext_database import db
 from extensions.ext_storage import storage
 from models.model import App, AppModelConfig, Conversation, Message, MessageFile, TraceAppConfig
 from models.workflow import WorkflowAppLog, WorkflowRun
-from tasks.ops_trace_task import process_trace_tasks
+from tasks.ops_trace_task import process_trace_tasks, process_trace_tasks_batch
 
 
 def build_opik_trace_instance(config: OpikConfig):
@@ -341,6 +344,80 @@ class OpsTraceManager:
         return trace_instance(tracing_config).get_project_url()
 
 
+class TraceTaskLookups:
+    """
+    Rows read by trace tasks, memoized so the traces of a message (message, moderation, suggested questions,
+    retrieval, tools) share them. prefetch loads the rows of a whole batch with one query per table.
+    """
+
+    def __init__(self):
+        self.messages: dict[str, Optional[Message]] = {}
+        self.message_files: dict[str, Optional[MessageFile]] = {}
+        self.conversation_modes: dict[str, Optional[str]] = {}
+        self.workflow_app_log_ids: dict[str, Optional[str]] = {}
+
+    def prefetch(self, tasks: list["TraceTask"]):
+        message_ids = {str(task.message_id) for task in tasks if task.message_id} - self.messages.keys()
+        if not message_ids:
+            return
+
+        self.messages.update(dict.fromkeys(message_ids))
+        self.message_files.update(dict.fromkeys(message_ids))
+        for message in db.session.query(Message).filter(Message.id.in_(message_ids)):
+            self.messages[message.id] = message
+        for message_file in db.session.query(MessageFile).filter(MessageFile.message_id.in_(message_ids)):
+            if self.message_files[message_file.message_id] is None:
+                self.message_files[message_file.message_id] = message_file
+
+        messages = [message for message in self.messages.values() if message is not None]
+        conversation_ids = {message.conversation_id for message in messages} - self.conversation_modes.keys()
+        if conversation_ids:
+            self.conversation_modes.update(dict.fromkeys(conversation_ids))
+            conversation_modes_stmt = select(Conversation.id, Conversation.mode).where(
+                Conversation.id.in_(conversation_ids)
+            )
+            for conversation_id, mode in db.session.execute(conversation_modes_stmt):
+                self.conversation_modes[conversation_id] = mode
+
+        workflow_run_ids = {
+            message.workflow_run_id for message in messages if message.workflow_run_id
+        } - self.workflow_app_log_ids.keys()
+        if workflow_run_ids:
+            self.workflow_app_log_ids.update(dict.fromkeys(workflow_run_ids))
+            workflow_app_logs_stmt = select(WorkflowAppLog.workflow_run_id, WorkflowAppLog.id).where(
+                WorkflowAppLog.workflow_run_id.in_(workflow_run_ids)
+            )
+            for workflow_run_id, workflow_app_log_id in db.session.execute(workflow_app_logs_stmt):
+                if self.workflow_app_log_ids[workflow_run_id] is None:
+                    self.workflow_app_log_ids[workflow_run_id] = str(workflow_app_log_id)
+
+    def get_message(self, message_id: str) -> Optional[Message]:
+        message_id = str(message_id)
+        if message_id not in self.messages:
+            self.messages[message_id] = get_message_data(message_id)
+        return self.messages[message_id]
+
+    def get_message_file(self, message_id: str) -> Optional[MessageFile]:
+        message_id = str(message_id)
+        if message_id not in self.message_files:
+            self.message_files[message_id] = db.session.query(MessageFile).filter_by(message_id=message_id).first()
+        return self.message_files[message_id]
+
+    def get_conversation_mode(self, conversation_id: str) -> Optional[str]:
+        if conversation_id not in self.conversation_modes:
+            conversation_mode_stmt = select(Conversation.mode).where(Conversation.id == conversation_id)
+            self.conversation_modes[conversation_id] = db.session.scalars(conversation_mode_stmt).first()
+        return self.conversation_modes[conversation_id]
+
+    def get_workflow_app_log_id(self, workflow_run_id: str) -> Optional[str]:
+        if workflow_run_id not in self.workflow_app_log_ids:
+            workflow_app_log_data = db.session.query(WorkflowAppLog).filter_by(workflow_run_id=workflow_run_id).first()
+            self.workflow_app_log_ids[workflow_run_id] = (
+                str(workflow_app_log_data.id) if workflow_app_log_data else None
+            )
+        return self.workflow_app_log_ids[workflow_run_id]
+
+
 class TraceTask:
     def __init__(
         self,
@@ -360,6 +437,7 @@ class TraceTask:
         self.timer = timer
         self.file_base_url = os.getenv("FILES_URL", "http://127.0.0.1:5001")
         self.app_id = None
+        self.lookups = TraceTaskLookups()
 
         self.kwargs = kwargs
 
@@ -483,19 +561,17 @@ class TraceTask:
     def message_trace(self, message_id: str | None):
         if not message_id:
             return {}
-        message_data = get_message_data(message_id)
+        message_data = self.lookups.get_message(message_id)
         if not message_data:
             return {}
-        conversation_mode_stmt = select(Conversation.mode).where(Conversation.id == message_data.conversation_id)
-        conversation_mode = db.session.scalars(conversation_mode_stmt).all()
-        if not conversation_mode or len(conversation_mode) == 0:
+        conversation_mode = self.lookups.get_conversation_mode(message_data.conversation_id)
+        if not conversation_mode:
             return {}
-        conversation_mode = conversation_mode[0]
         created_at = message_data.created_at
         inputs = message_data.message
 
         # get message file data
-        message_file_data = db.session.query(MessageFile).filter_by(message_id=message_id).first()
+        message_file_data = self.lookups.get_message_file(message_id)
         file_list = []
         if message_file_data and message_file_data.url is not None:
             file_url = f"{self.file_base_url}/{message_file_data.url}" if message_file_data else ""
@@ -541,7 +617,7 @@ class TraceTask:
         if not moderation_result:
             return {}
         inputs = kwargs.get("inputs")
-        message_data = get_message_data(message_id)
+        message_data = self.lookups.get_message(message_id)
         if not message_data:
             return {}
         metadata = {
@@ -554,10 +630,7 @@ class TraceTask:
         # get workflow_app_log_id
         workflow_app_log_id = None
         if message_data.workflow_run_id:
-            workflow_app_log_data = (
-                db.session.query(WorkflowAppLog).filter_by(workflow_run_id=message_data.workflow_run_id).first()
-            )
-            workflow_app_log_id = str(workflow_app_log_data.id) if workflow_app_log_data else None
+            workflow_app_log_id = self.lookups.get_workflow_app_log_id(message_data.workflow_run_id)
 
         moderation_trace_info = ModerationTraceInfo(
             message_id=workflow_app_log_id or message_id,
@@ -576,7 +649,7 @@ class TraceTask:
 
     def suggested_question_trace(self, message_id, timer, **kwargs):
         suggested_question = kwargs.get("suggested_question", [])
-        message_data = get_message_data(message_id)
+        message_data = self.lookups.get_message(message_id)
         if not message_data:
             return {}
         metadata = {
@@ -594,10 +667,7 @@ class TraceTask:
         # get workflow_app_log_id
         workflow_app_log_id = None
         if message_data.workflow_run_id:
-            workflow_app_log_data = (
-                db.session.query(WorkflowAppLog).filter_by(workflow_run_id=message_data.workflow_run_id).first()
-            )
-            workflow_app_log_id = str(workflow_app_log_data.id) if workflow_app_log_data else None
+            workflow_app_log_id = self.lookups.get_workflow_app_log_id(message_data.workflow_run_id)
 
         suggested_question_trace_info = SuggestedQuestionTraceInfo(
             message_id=workflow_app_log_id or message_id,
@@ -624,7 +694,7 @@ class TraceTask:
 
     def dataset_retrieval_trace(self, message_id, timer, **kwargs):
         documents = kwargs.get("documents")
-        message_data = get_message_data(message_id)
+        message_data = self.lookups.get_message(message_id)
         if not message_data:
             return {}
 
@@ -656,7 +726,7 @@ class TraceTask:
         tool_name = kwargs.get("tool_name", "")
         tool_inputs = kwargs.get("tool_inputs", {})
         tool_outputs = kwargs.get("tool_outputs", {})
-        message_data = get_message_data(message_id)
+        message_data = self.lookups.get_message(message_id)
         if not message_data:
             return {}
         tool_config = {}
@@ -687,7 +757,7 @@ class TraceTask:
         }
 
         file_url = ""
-        message_file_data = db.session.query(MessageFile).filter_by(message_id=message_id).first()
+        message_file_data = self.lookups.get_message_file(message_id)
         if message_file_data:
             message_file_id = message_file_data.id if message_file_data else None
             type = message_file_data.type
@@ -753,9 +823,19 @@ class TraceTask:
 
 
 trace_manager_timer: Optional[threading.Timer] = None
-trace_manager_queue: queue.Queue = queue.Queue()
+trace_manager_queue: queue.Queue = queue.Queue(maxsize=dify_config.OPS_TRACE_QUEUE_MAX_SIZE)
 trace_manager_interval = int(os.getenv("TRACE_QUEUE_MANAGER_INTERVAL", 5))
 trace_manager_batch_size = int(os.getenv("TRACE_QUEUE_MANAGER_BATCH_SIZE", 100))
+trace_manager_stats: dict[str, int] = {
+    "enqueued": 0,
+    "dropped": 0,
+    "exported": 0,
+    "failed": 0,
+    "skipped": 0,
+    "files": 0,
+}
+trace_manager_stats_lock = threading.Lock()
+trace_manager_reported_dropped = 0
 
 
 class TraceQueueManager:
@@ -769,12 +849,32 @@ class TraceQueueManager:
         if trace_manager_timer is None:
             self.start_timer()
 
+    @staticmethod
+    def get_stats() -> dict[str, int]:
+        """
+        Get the trace export counters of the process and the number of traces waiting for export
+        """
+        with trace_manager_stats_lock:
+            stats = dict(trace_manager_stats)
+        stats["queued"] = trace_manager_queue.qsize()
+        return stats
+
+    @staticmethod
+    def _incr_stat(name: str, amount: int = 1):
+        with trace_manager_stats_lock:
+            trace_manager_stats[name] += amount
+
     def add_trace_task(self, trace_task: TraceTask):
         global trace_manager_timer, trace_manager_queue
         try:
             if self.trace_instance:
                 trace_task.app_id = self.app_id
-                trace_manager_queue.put(trace_task)
+                trace_manager_queue.put_nowait(trace_task)
+                self._incr_stat("enqueued")
+        except queue.Full:
+            # the exporter can't keep up, drop the trace rather than holding the request or growing the memory
+            self._incr_stat("dropped")
+            logging.debug(f"Trace queue is full, dropping trace task, trace_type {trace_task.trace_type}")
         except Exception as e:
             logging.exception(f"Error adding trace task, trace_type {trace_task.trace_type}")
         finally:
@@ -790,10 +890,21 @@ class TraceQueueManager:
         return tasks
 
     def run(self):
+        global trace_manager_reported_dropped
         try:
+            dropped = self.get_stats()["dropped"]
             tasks = self.collect_tasks()
-            if tasks:
+            while tasks:
                 self.send_to_celery(tasks)
+                # with batched export the queue is drained at every interval instead of one batch per interval
+                if not dify_config.OPS_TRACE_BATCH_EXPORT_ENABLED:
+                    break
+                tasks = self.collect_tasks()
+            if dropped > trace_manager_reported_dropped:
+                logging.warning(
+                    f"Trace queue was full, {dropped - trace_manager_reported_dropped} trace tasks were dropped"
+                )
+                trace_manager_reported_dropped = dropped
         except Exception as e:
             logging.exception("Error processing trace tasks")
 
@@ -807,20 +918,48 @@ class TraceQueueManager:
 
     def send_to_celery(self, tasks: list[TraceTask]):
         with self.flask_app.app_context():
+            tasks = [task for task in tasks if task.app_id is not None]
+            lookups = TraceTaskLookups()
+            lookups.prefetch(tasks)
+
+            tasks_data = []
             for task in tasks:
-                if task.app_id is None:
+                task.lookups = lookups
+                try:
+                    trace_info = task.execute()
+                except Exception:
+                    self._incr_stat("failed")
+                    logging.exception(f"Error preprocessing trace task, trace_type {task.trace_type}")
                     continue
-                file_id = uuid4().hex
-                trace_info = task.execute()
-                task_data = TaskData(
-                    app_id=task.app_id,
-                    trace_info_type=type(trace_info).__name__,
-                    trace_info=trace_info.model_dump() if trace_info else None,
+                if trace_info is None:
+                    # nothing to export, e.g. the message was deleted, don't store a file or enqueue a task for it
+                    self._incr_stat("skipped")
+                    continue
+                tasks_data.append(
+                    TaskData(
+                        app_id=task.app_id,
+                        trace_info_type=type(trace_info).__name__,
+                        trace_info=trace_info.model_dump(),
+                    )
                 )
-                file_path = f"{OPS_FILE_PATH}{task.app_id}/{file_id}.json"
-                storage.save(file_path, task_data.model_dump_json().encode("utf-8"))
-                file_info = {
-                    "file_id": file_id,
-                    "app_id": task.app_id,
-                }
-                process_trace_tasks.delay(file_info)
+            if not tasks_data:
+                return
+
+            if dify_config.OPS_TRACE_BATCH_EXPORT_ENABLED:
+                file_id = uuid4().hex
+                content = b"\n".join(task_data.model_dump_json().encode("utf-8") for task_data in tasks_data)
+                storage.save(f"{OPS_TRACE_BATCH_FILE_PATH}{file_id}.jsonl.gz", gzip.compress(content))
+                process_trace_tasks_batch.delay({"file_id": file_id})
+                self._incr_stat("files")
+            else:
+                for task_data in tasks_data:
+                    file_id = uuid4().hex
+                    file_path = f"{OPS_FILE_PATH}{task_data.app_id}/{file_id}.json"
+                    storage.save(file_path, task_data.model_dump_json().encode("utf-8"))
+                    file_info = {
+                        "file_id": file_id,
+                        "app_id": task_data.app_id,
+                    }
+                    process_trace_tasks.delay(file_info)
+                    self._incr_stat("files")
+            self._incr_stat("exported", len(tasks_data))
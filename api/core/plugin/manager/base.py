@@ -1,14 +1,19 @@
 import inspect
 import json
 import logging
+import os
+import threading
+import time
 from collections.abc import Callable, Generator
-from typing import TypeVar
+from typing import Any, TypeVar, cast
 
 import requests
 from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
 from yarl import URL
 
 from configs import dify_config
+from core.helper.cookie_policy import RejectCookiesPolicy
 from core.model_runtime.errors.invoke import (
     InvokeAuthorizationError,
     InvokeBadRequestError,
@@ -36,6 +41,41 @@ T = TypeVar("T", bound=(BaseModel | dict | list | bool | str))
 
 logger = logging.getLogger(__name__)
 
+_session: requests.Session | None = None
+_session_pid: int | None = None
+_session_lock = threading.Lock()
+_basic_response_models: dict[Any, Any] = {}
+
+
+def _get_session() -> requests.Session:
+    """
+    Get the pooled session of the current process, connections to the plugin daemon are kept alive
+    and reused across requests. A forked worker creates its own session instead of sharing the sockets
+    of its parent.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                session = requests.Session()
+                session.cookies.set_policy(RejectCookiesPolicy())
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=dify_config.PLUGIN_DAEMON_POOL_MAX_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session, _session_pid = session, pid
+    return _session
+
+
+def _get_basic_response_model(data_type: type[T]) -> type[PluginDaemonBasicResponse[T]]:
+    """
+    Get the parametrized response model once per data type instead of on every response
+    """
+    response_model = _basic_response_models.get(data_type)
+    if response_model is None:
+        response_model = _basic_response_models.setdefault(data_type, PluginDaemonBasicResponse[data_type])  # type: ignore
+    return cast(type[PluginDaemonBasicResponse[T]], response_model)
+
 
 class BasePluginManager:
     def _request(
@@ -59,14 +99,16 @@ class BasePluginManager:
         if headers.get("Content-Type") == "application/json" and isinstance(data, dict):
             data = json.dumps(data)
 
+        started_at = time.perf_counter()
         try:
-            response = requests.request(
+            response = _get_session().request(
                 method=method, url=str(url), headers=headers, data=data, params=params, stream=stream, files=files
             )
         except requests.exceptions.ConnectionError:
             logger.exception("Request to Plugin Daemon Service failed")
             raise PluginDaemonInnerError(code=-500, message="Request to Plugin Daemon Service failed")
 
+        logger.debug("Plugin daemon request %s %s took %.3fs", method, path, time.perf_counter() - started_at)
         return response
 
     def _stream_request(
@@ -77,17 +119,21 @@ class BasePluginManager:
         headers: dict | None = None,
         data: bytes | dict | None = None,
         files: dict | None = None,
-    ) -> Generator[bytes, None, None]:
+    ) -> Generator[str, None, None]:
         """
         Make a stream request to the plugin daemon inner API
         """
         response = self._request(method, path, headers, data, params, files, stream=True)
-        for line in response.iter_lines():
-            line = line.decode("utf-8").strip()
-            if line.startswith("data:"):
-                line = line[5:].strip()
-            if line:
-                yield line
+        try:
+            for raw_line in response.iter_lines():
+                raw_line = raw_line.strip()
+                if raw_line.startswith(b"data:"):
+                    raw_line = raw_line[5:].strip()
+                if raw_line:
+                    yield raw_line.decode("utf-8")
+        finally:
+            # hand the connection back to the pool even if the consumer stops early
+            response.close()
 
     def _stream_request_with_model(
         self,
@@ -136,11 +182,11 @@ class BasePluginManager:
         Make a request to the plugin daemon inner API and return the response as a model.
         """
         response = self._request(method, path, headers, data, params, files)
-        json_response = response.json()
+        response_model = _get_basic_response_model(type)
         if transformer:
-            json_response = transformer(json_response)
-
-        rep = PluginDaemonBasicResponse[type](**json_response)  # type: ignore
+            rep = response_model(**transformer(response.json()))
+        else:
+            rep = response_model.model_validate_json(response.content)
         if rep.code != 0:
             try:
                 error = PluginDaemonError(**json.loads(rep.message))
@@ -167,14 +213,19 @@ class BasePluginManager:
         """
         Make a stream request to the plugin daemon inner API and yield the response as a model.
         """
+        response_model = _get_basic_response_model(type)
         for line in self._stream_request(method, path, params, headers, data, files):
-            line_data = None
             try:
-                line_data = json.loads(line)
-                rep = PluginDaemonBasicResponse[type](**line_data)  # type: ignore
+                # parse and validate in one pass instead of json.loads followed by the model constructor
+                rep = response_model.model_validate_json(line)
             except Exception:
+                line_data = None
+                try:
+                    line_data = json.loads(line)
+                except Exception:
+                    pass
                 # TODO modify this when line_data has code and message
-                if line_data and "error" in line_data:
+                if isinstance(line_data, dict) and "error" in line_data:
                     raise ValueError(line_data["error"])
                 else:
                     raise ValueError(line)
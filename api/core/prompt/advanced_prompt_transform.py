@@ -163,8 +163,12 @@ class AdvancedPromptTransform(PromptTransform):
                     for k, v in inputs.items():
                         if k.startswith("#"):
                             vp.add(k[1:-1].split("."), v)
-                    raw_prompt = raw_prompt.replace("{{#context#}}", context or "")
-                    prompt = vp.convert_template(raw_prompt).text
+                    if "{{#context#}}" in raw_prompt:
+                        # the context differs per request, keep it out of the template parse cache
+                        raw_prompt = raw_prompt.replace("{{#context#}}", context or "")
+                        prompt = vp.render_template(raw_prompt, cache=False)
+                    else:
+                        prompt = vp.render_template(raw_prompt)
                 else:
                     parser = PromptTemplateParser(template=raw_prompt, with_variable_tmpl=self.with_variable_tmpl)
                     prompt_inputs: Mapping[str, str] = {k: inputs[k] for k in parser.variable_keys if k in inputs}
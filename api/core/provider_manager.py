@@ -22,6 +22,7 @@ from core.entities.provider_entities import (
 from core.helper import encrypter
 from core.helper.model_provider_cache import ProviderCredentialsCache, ProviderCredentialsCacheType
 from core.helper.position_helper import is_filtered
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
 from core.model_runtime.entities.model_entities import ModelType
 from core.model_runtime.entities.provider_entities import (
     ConfigurateMethod,
@@ -92,6 +93,13 @@ class ProviderManager:
         :param tenant_id:
         :return:
         """
+        cached_provider_configurations = ProviderConfigurationsCache.get(tenant_id)
+        if cached_provider_configurations is not None:
+            return cached_provider_configurations
+
+        # a change made while building the configurations bumps the version, the result is not cached then
+        cache_version = ProviderConfigurationsCache.get_version(tenant_id)
+
         # Get all provider records of the workspace
         provider_name_to_provider_records_dict = self._get_all_providers(tenant_id)
 
@@ -228,6 +236,8 @@ class ProviderManager:
 
             provider_configurations[str(provider_id_entity)] = provider_configuration
 
+        ProviderConfigurationsCache.set(tenant_id, provider_configurations, cache_version)
+
         # Return the encapsulated object
         return provider_configurations
 
@@ -1,12 +1,13 @@
 import json
 from collections import defaultdict
-from typing import Any, Optional
+from typing import Any, Optional, Union
 
 from pydantic import BaseModel
 
 from configs import dify_config
 from core.rag.datasource.keyword.jieba.jieba_keyword_table_handler import JiebaKeywordTableHandler
 from core.rag.datasource.keyword.keyword_base import BaseKeyword
+from core.rag.datasource.segment_hydrator import SegmentHydrator
 from core.rag.models.document import Document
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
@@ -24,14 +25,12 @@ class Jieba(BaseKeyword):
         self._config = KeywordTableConfig()
 
     def create(self, texts: list[Document], **kwargs) -> BaseKeyword:
+        # extract keywords before taking the indexing lock, it only guards the keyword table
+        keywords_list = self._extract_keywords_list(texts)
         lock_name = "keyword_indexing_lock_{}".format(self.dataset.id)
         with redis_client.lock(lock_name, timeout=600):
-            keyword_table_handler = JiebaKeywordTableHandler()
             keyword_table = self._get_dataset_keyword_table()
-            for text in texts:
-                keywords = keyword_table_handler.extract_keywords(
-                    text.page_content, self._config.max_keywords_per_chunk
-                )
+            for text, keywords in zip(texts, keywords_list):
                 if text.metadata is not None:
                     self._update_segment_keywords(self.dataset.id, text.metadata["doc_id"], list(keywords))
                     keyword_table = self._add_text_to_keyword_table(
@@ -43,24 +42,11 @@ class Jieba(BaseKeyword):
             return self
 
     def add_texts(self, texts: list[Document], **kwargs):
+        keywords_list = self._extract_keywords_list(texts, kwargs.get("keywords_list"))
         lock_name = "keyword_indexing_lock_{}".format(self.dataset.id)
         with redis_client.lock(lock_name, timeout=600):
-            keyword_table_handler = JiebaKeywordTableHandler()
-
             keyword_table = self._get_dataset_keyword_table()
-            keywords_list = kwargs.get("keywords_list")
-            for i in range(len(texts)):
-                text = texts[i]
-                if keywords_list:
-                    keywords = keywords_list[i]
-                    if not keywords:
-                        keywords = keyword_table_handler.extract_keywords(
-                            text.page_content, self._config.max_keywords_per_chunk
-                        )
-                else:
-                    keywords = keyword_table_handler.extract_keywords(
-                        text.page_content, self._config.max_keywords_per_chunk
-                    )
+            for text, keywords in zip(texts, keywords_list):
                 if text.metadata is not None:
                     self._update_segment_keywords(self.dataset.id, text.metadata["doc_id"], list(keywords))
                     keyword_table = self._add_text_to_keyword_table(
@@ -69,6 +55,22 @@ class Jieba(BaseKeyword):
 
             self._save_dataset_keyword_table(keyword_table)
 
+    def _extract_keywords_list(
+        self, texts: list[Document], keywords_list: Optional[list[list[str]]] = None
+    ) -> list[Union[list[str], set[str]]]:
+        """Use the given keywords of each text, extracting the missing ones in a single batch."""
+        result: list[Union[list[str], set[str]]] = [
+            (keywords_list[i] if keywords_list else None) or [] for i in range(len(texts))
+        ]
+        missing_indices = [i for i, keywords in enumerate(result) if not keywords]
+        if missing_indices:
+            extracted_keywords = JiebaKeywordTableHandler.get_instance().extract_keywords_batch(
+                [texts[i].page_content for i in missing_indices], self._config.max_keywords_per_chunk
+            )
+            for i, keywords in zip(missing_indices, extracted_keywords):
+                result[i] = keywords
+        return result
+
     def text_exists(self, id: str) -> bool:
         keyword_table = self._get_dataset_keyword_table()
         if keyword_table is None:
@@ -91,14 +93,17 @@ class Jieba(BaseKeyword):
         document_ids_filter = kwargs.get("document_ids_filter")
         sorted_chunk_indices = self._retrieve_ids_by_query(keyword_table or {}, query, k)
 
+        return self._get_documents_by_chunk_indices(sorted_chunk_indices, document_ids_filter)
+
+    def _get_documents_by_chunk_indices(
+        self, sorted_chunk_indices: list[str], document_ids_filter: Optional[list[str]] = None
+    ) -> list[Document]:
+        segments = SegmentHydrator.get_segments_by_index_node_ids(
+            [self.dataset.id], sorted_chunk_indices, document_ids_filter=document_ids_filter
+        )
         documents = []
         for chunk_index in sorted_chunk_indices:
-            segment_query = db.session.query(DocumentSegment).filter(
-                DocumentSegment.dataset_id == self.dataset.id, DocumentSegment.index_node_id == chunk_index
-            )
-            if document_ids_filter:
-                segment_query = segment_query.filter(DocumentSegment.document_id.in_(document_ids_filter))
-            segment = segment_query.first()
+            segment = segments.get((self.dataset.id, chunk_index))
 
             if segment:
                 documents.append(
@@ -193,7 +198,7 @@ class Jieba(BaseKeyword):
         return keyword_table
 
     def _retrieve_ids_by_query(self, keyword_table: dict, query: str, k: int = 4):
-        keyword_table_handler = JiebaKeywordTableHandler()
+        keyword_table_handler = JiebaKeywordTableHandler.get_instance()
         keywords = keyword_table_handler.extract_keywords(query)
 
         # go through text chunks in order of most matching keywords
@@ -229,21 +234,21 @@ class Jieba(BaseKeyword):
         self._save_dataset_keyword_table(keyword_table)
 
     def multi_create_segment_keywords(self, pre_segment_data_list: list):
-        keyword_table_handler = JiebaKeywordTableHandler()
+        keyword_table_handler = JiebaKeywordTableHandler.get_instance()
         keyword_table = self._get_dataset_keyword_table()
+        missing_segments = [data["segment"] for data in pre_segment_data_list if not data["keywords"]]
+        extracted_keywords = keyword_table_handler.extract_keywords_batch(
+            [segment.content for segment in missing_segments], self._config.max_keywords_per_chunk
+        )
+        for segment, keywords in zip(missing_segments, extracted_keywords):
+            segment.keywords = list(keywords)
         for pre_segment_data in pre_segment_data_list:
             segment = pre_segment_data["segment"]
             if pre_segment_data["keywords"]:
                 segment.keywords = pre_segment_data["keywords"]
-                keyword_table = self._add_text_to_keyword_table(
-                    keyword_table or {}, segment.index_node_id, pre_segment_data["keywords"]
-                )
-            else:
-                keywords = keyword_table_handler.extract_keywords(segment.content, self._config.max_keywords_per_chunk)
-                segment.keywords = list(keywords)
-                keyword_table = self._add_text_to_keyword_table(
-                    keyword_table or {}, segment.index_node_id, list(keywords)
-                )
+            keyword_table = self._add_text_to_keyword_table(
+                keyword_table or {}, segment.index_node_id, segment.keywords
+            )
         self._save_dataset_keyword_table(keyword_table)
 
     def update_segment_keywords_index(self, node_id: str, keywords: list[str]):
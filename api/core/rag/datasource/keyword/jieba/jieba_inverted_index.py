@@ -0,0 +1,134 @@
+from collections.abc import Iterable
+from typing import Any, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from core.rag.datasource.keyword.jieba.jieba import Jieba
+from core.rag.datasource.keyword.jieba.jieba_keyword_table_handler import JiebaKeywordTableHandler
+from core.rag.models.document import Document
+from extensions.ext_database import db
+from models.dataset import DatasetKeywordIndex, DocumentSegment
+
+# number of posting rows written by a single bulk insert
+POSTING_INSERT_BATCH_SIZE = 1000
+
+
+class JiebaInvertedIndex(Jieba):
+    """
+    Jieba keyword store backed by an inverted index of (keyword, segment) posting rows.
+
+    Lookups only read the postings of the query keywords, and updates append or delete
+    rows instead of rewriting the whole dataset keyword table under the indexing lock.
+    """
+
+    def create(self, texts: list[Document], **kwargs) -> "JiebaInvertedIndex":
+        self.add_texts(texts, **kwargs)
+        return self
+
+    def add_texts(self, texts: list[Document], **kwargs):
+        keywords_list = self._extract_keywords_list(texts, kwargs.get("keywords_list"))
+        postings: list[tuple[str, str]] = []
+        for text, keywords in zip(texts, keywords_list):
+            if text.metadata is not None:
+                self._update_segment_keywords(self.dataset.id, text.metadata["doc_id"], list(keywords))
+                postings.extend((keyword, text.metadata["doc_id"]) for keyword in keywords)
+
+        self.add_postings(postings)
+
+    def text_exists(self, id: str) -> bool:
+        posting = (
+            db.session.query(DatasetKeywordIndex.id)
+            .filter(DatasetKeywordIndex.dataset_id == self.dataset.id, DatasetKeywordIndex.index_node_id == id)
+            .first()
+        )
+        return posting is not None
+
+    def delete_by_ids(self, ids: list[str]) -> None:
+        if not ids:
+            return
+        db.session.query(DatasetKeywordIndex).filter(
+            DatasetKeywordIndex.dataset_id == self.dataset.id, DatasetKeywordIndex.index_node_id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+    def search(self, query: str, **kwargs: Any) -> list[Document]:
+        k = kwargs.get("top_k", 4)
+        document_ids_filter = kwargs.get("document_ids_filter")
+        sorted_chunk_indices = self._retrieve_ids_by_keywords(query, k, document_ids_filter)
+
+        return self._get_documents_by_chunk_indices(sorted_chunk_indices, document_ids_filter)
+
+    def delete(self) -> None:
+        db.session.query(DatasetKeywordIndex).filter(DatasetKeywordIndex.dataset_id == self.dataset.id).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        # drop the legacy keyword table as well if the dataset was migrated from it
+        super().delete()
+
+    def create_segment_keywords(self, node_id: str, keywords: list[str]):
+        self._update_segment_keywords(self.dataset.id, node_id, keywords)
+        self.update_segment_keywords_index(node_id, keywords)
+
+    def multi_create_segment_keywords(self, pre_segment_data_list: list):
+        keyword_table_handler = JiebaKeywordTableHandler.get_instance()
+        missing_segments = [data["segment"] for data in pre_segment_data_list if not data["keywords"]]
+        extracted_keywords = keyword_table_handler.extract_keywords_batch(
+            [segment.content for segment in missing_segments], self._config.max_keywords_per_chunk
+        )
+        for segment, keywords in zip(missing_segments, extracted_keywords):
+            segment.keywords = list(keywords)
+        postings: list[tuple[str, str]] = []
+        for pre_segment_data in pre_segment_data_list:
+            segment = pre_segment_data["segment"]
+            if pre_segment_data["keywords"]:
+                segment.keywords = pre_segment_data["keywords"]
+            postings.extend((keyword, segment.index_node_id) for keyword in segment.keywords)
+        self.add_postings(postings)
+
+    def update_segment_keywords_index(self, node_id: str, keywords: list[str]):
+        self.add_postings((keyword, node_id) for keyword in keywords)
+
+    def add_postings(self, postings: Iterable[tuple[str, str]]) -> None:
+        """Append (keyword, index_node_id) postings, ignoring the ones already indexed."""
+        rows = [
+            {"dataset_id": self.dataset.id, "keyword": keyword, "index_node_id": index_node_id}
+            for keyword, index_node_id in dict.fromkeys(postings)
+        ]
+        if not rows:
+            return
+        for i in range(0, len(rows), POSTING_INSERT_BATCH_SIZE):
+            stmt = (
+                insert(DatasetKeywordIndex)
+                .values(rows[i : i + POSTING_INSERT_BATCH_SIZE])
+                .on_conflict_do_nothing(index_elements=["dataset_id", "keyword", "index_node_id"])
+            )
+            db.session.execute(stmt)
+        db.session.commit()
+
+    def _retrieve_ids_by_keywords(
+        self, query: str, k: int = 4, document_ids_filter: Optional[list[str]] = None
+    ) -> list[str]:
+        keyword_table_handler = JiebaKeywordTableHandler.get_instance()
+        keywords = list(keyword_table_handler.extract_keywords(query))
+        if not keywords:
+            return []
+
+        # rank chunks by the number of query keywords they are indexed under
+        match_count = func.count(DatasetKeywordIndex.keyword)
+        stmt = (
+            select(DatasetKeywordIndex.index_node_id)
+            .where(DatasetKeywordIndex.dataset_id == self.dataset.id, DatasetKeywordIndex.keyword.in_(keywords))
+            .group_by(DatasetKeywordIndex.index_node_id)
+            .order_by(match_count.desc(), DatasetKeywordIndex.index_node_id)
+            .limit(k)
+        )
+        if document_ids_filter:
+            stmt = stmt.join(
+                DocumentSegment,
+                (DocumentSegment.dataset_id == DatasetKeywordIndex.dataset_id)
+                & (DocumentSegment.index_node_id == DatasetKeywordIndex.index_node_id),
+            ).where(DocumentSegment.document_id.in_(document_ids_filter))
+
+        return list(db.session.scalars(stmt).all())
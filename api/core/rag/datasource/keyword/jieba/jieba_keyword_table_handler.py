@@ -1,20 +1,46 @@
+import logging
+import os
 import re
+import threading
 from typing import Optional, cast
 
+from configs import dify_config
+from core.rag.datasource.keyword.jieba.keyword_extraction_worker import KeywordExtractionWorkerPool
+from core.rag.datasource.keyword.jieba.stopwords import STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+_STOPWORDS = frozenset(STOPWORDS)
+_SUBTOKEN_PATTERN = re.compile(r"\w+")
+
 
 class JiebaKeywordTableHandler:
+    _instance: Optional["JiebaKeywordTableHandler"] = None
+    _instance_lock = threading.Lock()
+    _worker_pool: Optional[KeywordExtractionWorkerPool] = None
+    _worker_pool_lock = threading.Lock()
+    # pid of the process which failed to start the worker processes
+    _worker_pool_failed_pid: Optional[int] = None
+
     def __init__(self):
         import jieba.analyse  # type: ignore
 
-        from core.rag.datasource.keyword.jieba.stopwords import STOPWORDS
+        # a mutable set, jieba.analyse.set_stop_words adds to it
+        jieba.analyse.default_tfidf.stop_words = set(STOPWORDS)  # type: ignore
+        self._extract_tags = jieba.analyse.extract_tags
 
-        jieba.analyse.default_tfidf.stop_words = STOPWORDS  # type: ignore
+    @classmethod
+    def get_instance(cls) -> "JiebaKeywordTableHandler":
+        """Return the process-wide handler, jieba only has to be set up once per process."""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
 
     def extract_keywords(self, text: str, max_keywords_per_chunk: Optional[int] = 10) -> set[str]:
         """Extract keywords with JIEBA tfidf."""
-        import jieba.analyse  # type: ignore
-
-        keywords = jieba.analyse.extract_tags(
+        keywords = self._extract_tags(
             sentence=text,
             topK=max_keywords_per_chunk,
         )
@@ -23,15 +49,63 @@ class JiebaKeywordTableHandler:
 
         return set(self._expand_tokens_with_subtokens(set(keywords)))
 
+    def extract_keywords_batch(self, texts: list[str], max_keywords_per_chunk: Optional[int] = 10) -> list[set[str]]:
+        """
+        Extract keywords of many texts, keeping their order.
+        Large batches are fanned out over worker processes since jieba is CPU bound and holds the GIL.
+        """
+        workers = dify_config.KEYWORD_EXTRACTION_MAX_WORKERS
+        if (
+            workers > 1
+            and len(texts) >= dify_config.KEYWORD_EXTRACTION_PROCESS_POOL_THRESHOLD
+            and self._worker_pool_failed_pid != os.getpid()
+        ):
+            try:
+                worker_pool = self._get_worker_pool(workers)
+            except Exception:
+                # don't retry in this process
+                logger.warning("Failed to start keyword extraction workers, extracting in-process", exc_info=True)
+                JiebaKeywordTableHandler._worker_pool_failed_pid = os.getpid()
+            else:
+                try:
+                    return worker_pool.extract_keywords_batch(texts, max_keywords_per_chunk)
+                except Exception:
+                    # e.g. a worker was killed, start new ones with the next batch
+                    logger.warning(
+                        "Failed to extract keywords in worker processes, extracting in-process", exc_info=True
+                    )
+                    self._close_worker_pool(worker_pool)
+
+        return [self.extract_keywords(text, max_keywords_per_chunk) for text in texts]
+
     def _expand_tokens_with_subtokens(self, tokens: set[str]) -> set[str]:
         """Get subtokens from a list of tokens., filtering for stopwords."""
-        from core.rag.datasource.keyword.jieba.stopwords import STOPWORDS
-
         results = set()
         for token in tokens:
             results.add(token)
-            sub_tokens = re.findall(r"\w+", token)
+            sub_tokens = _SUBTOKEN_PATTERN.findall(token)
             if len(sub_tokens) > 1:
-                results.update({w for w in sub_tokens if w not in list(STOPWORDS)})
+                results.update({w for w in sub_tokens if w not in _STOPWORDS})
 
         return results
+
+    @classmethod
+    def _get_worker_pool(cls, workers: int) -> KeywordExtractionWorkerPool:
+        pid = os.getpid()
+        if cls._worker_pool is None or cls._worker_pool.pid != pid:
+            with cls._worker_pool_lock:
+                if cls._worker_pool is None or cls._worker_pool.pid != pid:
+                    # the pipes of a pool inherited from the parent process belong to the parent
+                    cls._worker_pool = KeywordExtractionWorkerPool(
+                        workers, timeout=dify_config.KEYWORD_EXTRACTION_WORKER_TIMEOUT
+                    )
+        return cls._worker_pool
+
+    @classmethod
+    def _close_worker_pool(cls, worker_pool: Optional[KeywordExtractionWorkerPool] = None) -> None:
+        with cls._worker_pool_lock:
+            if cls._worker_pool is None or (worker_pool is not None and cls._worker_pool is not worker_pool):
+                return
+            worker_pool = cls._worker_pool
+            cls._worker_pool = None
+        worker_pool.close()
@@ -0,0 +1,133 @@
+"""
+Keyword extraction worker processes.
+
+The workers are started with subprocess instead of multiprocessing: daemonic celery prefork children are not
+allowed to start multiprocessing children, and gevent makes subprocess pipes cooperative, so the pool also runs
+in the celery workers doing the indexing. A worker reads batches of texts as JSON from stdin and writes their
+keywords to stdout.
+"""
+
+import json
+import os
+import select
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Optional
+
+_FRAME_HEADER = struct.Struct("!Q")
+# the api directory, so that the worker module can be imported with -m
+_API_ROOT = Path(__file__).resolve().parents[5]
+
+
+def _write_frame(stream: IO[bytes], value: Any) -> None:
+    data = json.dumps(value, ensure_ascii=False).encode()
+    stream.write(_FRAME_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_frame(stream: IO[bytes], deadline: Optional[float] = None) -> Any:
+    header = _read_bytes(stream, _FRAME_HEADER.size, deadline)
+    (size,) = _FRAME_HEADER.unpack(header)
+    return json.loads(_read_bytes(stream, size, deadline))
+
+
+def _read_bytes(stream: IO[bytes], size: int, deadline: Optional[float]) -> bytes:
+    if deadline is None:
+        data = stream.read(size)
+        if len(data) < size:
+            raise EOFError("keyword extraction worker closed the pipe")
+        return data
+
+    # read the file descriptor directly, select doesn't see data held in the buffer of the stream
+    fd = stream.fileno()
+    chunks = []
+    remaining = size
+    while remaining:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0 or not select.select([fd], [], [], timeout)[0]:
+            raise TimeoutError("keyword extraction worker didn't answer in time")
+        chunk = os.read(fd, remaining)
+        if not chunk:
+            raise EOFError("keyword extraction worker closed the pipe")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+class KeywordExtractionWorkerPool:
+    """
+    Fixed set of worker processes, a batch is split into one chunk per worker.
+    The pool belongs to the process which started it, forked children must start their own.
+    """
+
+    def __init__(self, workers: int, timeout: float) -> None:
+        self.pid = os.getpid()
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._processes: list[subprocess.Popen] = []
+        try:
+            for _ in range(workers):
+                self._processes.append(
+                    subprocess.Popen(
+                        [sys.executable, "-m", __name__],
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE,
+                        cwd=_API_ROOT,
+                    )
+                )
+        except Exception:
+            self.close()
+            raise
+
+    def extract_keywords_batch(self, texts: list[str], max_keywords_per_chunk: Optional[int]) -> list[set[str]]:
+        chunk_size = -(-len(texts) // len(self._processes))
+        chunks = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        # one batch at a time, the pipes of a worker carry one request and its response
+        with self._lock:
+            processes = self._processes[: len(chunks)]
+            # a worker reads its whole request before it answers, so all of them run while the others are written
+            for process, chunk in zip(processes, chunks):
+                _write_frame(process.stdin, [chunk, max_keywords_per_chunk])  # type: ignore[arg-type]
+            # a hung worker raises TimeoutError instead of holding the lock, the caller closes the pool
+            deadline = time.monotonic() + self._timeout
+            keywords: list[set[str]] = []
+            for process in processes:
+                chunk_keywords = _read_frame(process.stdout, deadline)  # type: ignore[arg-type]
+                keywords.extend(set(text_keywords) for text_keywords in chunk_keywords)
+        return keywords
+
+    def close(self) -> None:
+        for process in self._processes:
+            # the worker exits on end of input, kill it in case it is in the middle of a batch
+            if process.stdin:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+            process.kill()
+            process.wait()
+        self._processes = []
+
+
+def main() -> None:
+    from core.rag.datasource.keyword.jieba.jieba_keyword_table_handler import JiebaKeywordTableHandler
+
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    # stdout carries the responses, anything printed goes to stderr
+    sys.stdout = sys.stderr
+    handler = JiebaKeywordTableHandler.get_instance()
+    while True:
+        try:
+            texts, max_keywords_per_chunk = _read_frame(stdin)
+        except EOFError:
+            return
+        _write_frame(stdout, [list(handler.extract_keywords(text, max_keywords_per_chunk)) for text in texts])
+
+
+if __name__ == "__main__":
+    main()
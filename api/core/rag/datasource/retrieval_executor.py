@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from configs import dify_config
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalExecutorBusyError(Exception):
+    """Raised when a retrieval task cannot be queued before the queue timeout."""
+
+
+@dataclass
+class _RetrievalTask:
+    tenant_id: str
+    fn: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    future: Future = field(default_factory=Future)
+
+
+class RetrievalExecutor:
+    """
+    Process-wide bounded thread pool for retrieval tasks.
+
+    Workers pick tasks round-robin across tenants and skip tenants that already use
+    `max_workers_per_tenant` workers, so a single busy tenant cannot starve the others.
+    Submitting blocks while `max_queued_tasks` tasks are waiting (backpressure) and raises
+    RetrievalExecutorBusyError once `queue_timeout` is exceeded.
+
+    Tasks submitted from a worker, e.g. the searches of a knowledge base retrieved on the pool, start
+    on a small shared pool of `max_nested_workers` threads when the pool and the tenant are below their
+    limits, and run inline in the submitting worker otherwise. At most `max_workers` tasks run at once,
+    nested ones included, and nested retrievals can't deadlock the pool since they never wait for a slot.
+    """
+
+    _instance: Optional["RetrievalExecutor"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queued_tasks: int,
+        max_workers_per_tenant: int,
+        queue_timeout: float,
+        max_nested_workers: int = 4,
+    ) -> None:
+        self._max_workers = max_workers
+        self._max_queued_tasks = max_queued_tasks
+        self._max_workers_per_tenant = max_workers_per_tenant
+        self._queue_timeout = queue_timeout
+        # nested tasks count against max_workers, a larger nested pool would only hold idle threads
+        self._max_nested_workers = max(1, min(max_nested_workers, max_workers))
+
+        self._condition = threading.Condition()
+        self._tenant_queues: OrderedDict[str, deque[_RetrievalTask]] = OrderedDict()
+        self._tenant_active: dict[str, int] = {}
+        self._workers: list[threading.Thread] = []
+        self._nested_pool: Optional[ThreadPoolExecutor] = None
+        self._idle_workers = 0
+        self._queued_count = 0
+        self._active_count = 0
+        self._nested_active_count = 0
+        self._worker_local = threading.local()
+
+    @classmethod
+    def get_instance(cls) -> "RetrievalExecutor":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(
+                        max_workers=dify_config.RETRIEVAL_SERVICE_MAX_WORKERS,
+                        max_queued_tasks=dify_config.RETRIEVAL_SERVICE_MAX_QUEUED_TASKS,
+                        max_workers_per_tenant=dify_config.RETRIEVAL_SERVICE_MAX_WORKERS_PER_TENANT,
+                        queue_timeout=dify_config.RETRIEVAL_SERVICE_QUEUE_TIMEOUT,
+                        max_nested_workers=dify_config.RETRIEVAL_SERVICE_EXECUTORS or 1,
+                    )
+        return cls._instance
+
+    def submit(self, tenant_id: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        task = _RetrievalTask(tenant_id=tenant_id, fn=fn, args=args, kwargs=kwargs)
+        if getattr(self._worker_local, "is_worker", False):
+            self._submit_nested(task)
+            return task.future
+
+        with self._condition:
+            deadline = time.monotonic() + self._queue_timeout
+            while self._queued_count >= self._max_queued_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RetrievalExecutorBusyError(
+                        f"Retrieval queue is full ({self._queued_count} tasks waiting), please try again later."
+                    )
+                self._condition.wait(remaining)
+
+            self._tenant_queues.setdefault(tenant_id, deque()).append(task)
+            self._queued_count += 1
+            if self._queued_count > self._idle_workers and len(self._workers) < self._max_workers:
+                self._start_worker()
+            self._condition.notify_all()
+        return task.future
+
+    def _submit_nested(self, task: _RetrievalTask) -> None:
+        """
+        Start a task submitted from a worker on the nested pool if the pool, the nested pool and the tenant
+        have a free slot, otherwise run it inline, the submitting task waits for it anyway
+        """
+        with self._condition:
+            run_inline = (
+                # tasks submitted from a nested thread would wait for the pool they run on
+                getattr(self._worker_local, "is_nested_worker", False)
+                or self._active_count >= self._max_workers
+                or self._nested_active_count >= self._max_nested_workers
+                or self._tenant_active.get(task.tenant_id, 0) >= self._max_workers_per_tenant
+            )
+            if not run_inline:
+                self._mark_active(task)
+                self._nested_active_count += 1
+                if self._nested_pool is None:
+                    self._nested_pool = ThreadPoolExecutor(
+                        max_workers=self._max_nested_workers,
+                        thread_name_prefix="retrieval-worker-nested",
+                        initializer=self._init_nested_worker,
+                    )
+                nested_pool = self._nested_pool
+
+        if run_inline:
+            self._run_task(task)
+        else:
+            nested_pool.submit(self._run_nested_task, task)
+
+    def _run_nested_task(self, task: _RetrievalTask) -> None:
+        try:
+            self._run_task(task)
+        finally:
+            with self._condition:
+                self._nested_active_count -= 1
+                self._finish_task(task)
+
+    def _start_worker(self) -> None:
+        worker = threading.Thread(target=self._worker_loop, name=f"retrieval-worker-{len(self._workers)}", daemon=True)
+        self._workers.append(worker)
+        worker.start()
+
+    def _mark_active(self, task: _RetrievalTask) -> None:
+        self._active_count += 1
+        self._tenant_active[task.tenant_id] = self._tenant_active.get(task.tenant_id, 0) + 1
+
+    def _finish_task(self, task: _RetrievalTask) -> None:
+        self._active_count -= 1
+        self._tenant_active[task.tenant_id] -= 1
+        if not self._tenant_active[task.tenant_id]:
+            del self._tenant_active[task.tenant_id]
+        # the pool and the tenant may be below their limits again
+        self._condition.notify_all()
+
+    def _next_task(self) -> Optional[_RetrievalTask]:
+        if self._active_count >= self._max_workers:
+            # nested tasks hold the remaining slots
+            return None
+        for tenant_id in list(self._tenant_queues):
+            if self._tenant_active.get(tenant_id, 0) >= self._max_workers_per_tenant:
+                continue
+            tenant_queue = self._tenant_queues.pop(tenant_id)
+            task = tenant_queue.popleft()
+            if tenant_queue:
+                # re-append at the end so the next pick starts with another tenant
+                self._tenant_queues[tenant_id] = tenant_queue
+            return task
+        return None
+
+    def _worker_loop(self) -> None:
+        self._worker_local.is_worker = True
+        while True:
+            with self._condition:
+                task = self._next_task()
+                while task is None:
+                    self._idle_workers += 1
+                    self._condition.wait()
+                    self._idle_workers -= 1
+                    task = self._next_task()
+                self._queued_count -= 1
+                self._mark_active(task)
+                # a queue slot was freed for blocked submitters
+                self._condition.notify_all()
+
+            self._run_task(task)
+
+            with self._condition:
+                self._finish_task(task)
+
+    def _init_nested_worker(self) -> None:
+        self._worker_local.is_worker = True
+        self._worker_local.is_nested_worker = True
+
+    def _run_task(self, task: _RetrievalTask) -> None:
+        if not task.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = task.fn(*task.args, **task.kwargs)
+        except BaseException as e:
+            logger.debug("Retrieval task failed", exc_info=True)
+            task.future.set_exception(e)
+        else:
+            task.future.set_result(result)
@@ -1,13 +1,13 @@
 import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from flask import Flask, current_app
 from sqlalchemy.orm import load_only
 
-from configs import dify_config
 from core.rag.data_post_processor.data_post_processor import DataPostProcessor
 from core.rag.datasource.keyword.keyword_factory import Keyword
+from core.rag.datasource.retrieval_executor import RetrievalExecutor
+from core.rag.datasource.segment_hydrator import SegmentHydrator
 from core.rag.datasource.vdb.vector_factory import Vector
 from core.rag.embedding.retrieval import RetrievalSegments
 from core.rag.index_processor.constant.index_type import IndexType
@@ -15,7 +15,7 @@ from core.rag.models.document import Document
 from core.rag.rerank.rerank_type import RerankMode
 from core.rag.retrieval.retrieval_methods import RetrievalMethod
 from extensions.ext_database import db
-from models.dataset import ChildChunk, Dataset, DocumentSegment
+from models.dataset import Dataset
 from models.dataset import Document as DatasetDocument
 from services.external_knowledge_service import ExternalDatasetService
 
@@ -42,65 +42,71 @@ class RetrievalService:
         reranking_mode: str = "reranking_model",
         weights: Optional[dict] = None,
         document_ids_filter: Optional[list[str]] = None,
+        dataset: Optional[Dataset] = None,
     ):
         if not query:
             return []
-        dataset = cls._get_dataset(dataset_id)
+        if dataset is None:
+            dataset = cls._get_dataset(dataset_id)
         if not dataset or dataset.available_document_count == 0 or dataset.available_segment_count == 0:
             return []
 
         all_documents: list[Document] = []
         exceptions: list[str] = []
 
-        # Optimize multithreading with thread pools
-        with ThreadPoolExecutor(max_workers=dify_config.RETRIEVAL_SERVICE_EXECUTORS) as executor:  # type: ignore
-            futures = []
-            if retrieval_method == "keyword_search":
-                futures.append(
-                    executor.submit(
-                        cls.keyword_search,
-                        flask_app=current_app._get_current_object(),  # type: ignore
-                        dataset_id=dataset_id,
-                        query=query,
-                        top_k=top_k,
-                        all_documents=all_documents,
-                        exceptions=exceptions,
-                        document_ids_filter=document_ids_filter,
-                    )
+        # run the searches on the process-wide retrieval pool, the loaded dataset is handed over to the workers
+        executor = RetrievalExecutor.get_instance()
+        futures = []
+        if retrieval_method == "keyword_search":
+            futures.append(
+                executor.submit(
+                    dataset.tenant_id,
+                    cls.keyword_search,
+                    flask_app=current_app._get_current_object(),  # type: ignore
+                    dataset=dataset,
+                    query=query,
+                    top_k=top_k,
+                    all_documents=all_documents,
+                    exceptions=exceptions,
+                    document_ids_filter=document_ids_filter,
                 )
-            if RetrievalMethod.is_support_semantic_search(retrieval_method):
-                futures.append(
-                    executor.submit(
-                        cls.embedding_search,
-                        flask_app=current_app._get_current_object(),  # type: ignore
-                        dataset_id=dataset_id,
-                        query=query,
-                        top_k=top_k,
-                        score_threshold=score_threshold,
-                        reranking_model=reranking_model,
-                        all_documents=all_documents,
-                        retrieval_method=retrieval_method,
-                        exceptions=exceptions,
-                        document_ids_filter=document_ids_filter,
-                    )
+            )
+        if RetrievalMethod.is_support_semantic_search(retrieval_method):
+            futures.append(
+                executor.submit(
+                    dataset.tenant_id,
+                    cls.embedding_search,
+                    flask_app=current_app._get_current_object(),  # type: ignore
+                    dataset=dataset,
+                    query=query,
+                    top_k=top_k,
+                    score_threshold=score_threshold,
+                    reranking_model=reranking_model,
+                    all_documents=all_documents,
+                    retrieval_method=retrieval_method,
+                    exceptions=exceptions,
+                    document_ids_filter=document_ids_filter,
                 )
-            if RetrievalMethod.is_support_fulltext_search(retrieval_method):
-                futures.append(
-                    executor.submit(
-                        cls.full_text_index_search,
-                        flask_app=current_app._get_current_object(),  # type: ignore
-                        dataset_id=dataset_id,
-                        query=query,
-                        top_k=top_k,
-                        score_threshold=score_threshold,
-                        reranking_model=reranking_model,
-                        all_documents=all_documents,
-                        retrieval_method=retrieval_method,
-                        exceptions=exceptions,
-                        document_ids_filter=document_ids_filter,
-                    )
+            )
+        if RetrievalMethod.is_support_fulltext_search(retrieval_method):
+            futures.append(
+                executor.submit(
+                    dataset.tenant_id,
+                    cls.full_text_index_search,
+                    flask_app=current_app._get_current_object(),  # type: ignore
+                    dataset=dataset,
+                    query=query,
+                    top_k=top_k,
+                    score_threshold=score_threshold,
+                    reranking_model=reranking_model,
+                    all_documents=all_documents,
+                    retrieval_method=retrieval_method,
+                    exceptions=exceptions,
+                    document_ids_filter=document_ids_filter,
                 )
-            concurrent.futures.wait(futures, timeout=30, return_when=concurrent.futures.ALL_COMPLETED)
+            )
+        # the searches write to all_documents and exceptions, wait for all of them before reading
+        concurrent.futures.wait(futures, return_when=concurrent.futures.ALL_COMPLETED)
 
         if exceptions:
             raise ValueError(";\n".join(exceptions))
@@ -118,6 +124,37 @@ class RetrievalService:
 
         return all_documents
 
+    @classmethod
+    def embedding_search_in_groups(
+        cls,
+        datasets: list[Dataset],
+        query: str,
+        top_k: int,
+        score_threshold: Optional[float] = 0.0,
+    ) -> dict[str, list[Document]]:
+        """
+        Semantic search of datasets sharing the embedding model and the vector collection, the query is embedded
+        once and searched with one query, top_k and score_threshold apply to each dataset
+        :return: documents of each dataset id
+        """
+        if not query:
+            return {}
+        datasets = [
+            dataset
+            for dataset in datasets
+            if dataset.available_document_count != 0 and dataset.available_segment_count != 0
+        ]
+        if not datasets:
+            return {}
+
+        vector = Vector(dataset=datasets[0])
+        return vector.search_by_vector_in_groups(
+            query,
+            [dataset.id for dataset in datasets],
+            top_k=top_k,
+            score_threshold=score_threshold,
+        )
+
     @classmethod
     def external_retrieve(cls, dataset_id: str, query: str, external_retrieval_model: Optional[dict] = None):
         dataset = db.session.query(Dataset).filter(Dataset.id == dataset_id).first()
@@ -136,7 +173,7 @@ class RetrievalService:
     def keyword_search(
         cls,
         flask_app: Flask,
-        dataset_id: str,
+        dataset: Dataset,
         query: str,
         top_k: int,
         all_documents: list,
@@ -145,9 +182,8 @@ class RetrievalService:
     ):
         with flask_app.app_context():
             try:
-                dataset = cls._get_dataset(dataset_id)
-                if not dataset:
-                    raise ValueError("dataset not found")
+                # attach the caller's dataset to this thread's session without reloading it
+                dataset = db.session.merge(dataset, load=False)
 
                 keyword = Keyword(dataset=dataset)
 
@@ -162,7 +198,7 @@ class RetrievalService:
     def embedding_search(
         cls,
         flask_app: Flask,
-        dataset_id: str,
+        dataset: Dataset,
         query: str,
         top_k: int,
         score_threshold: Optional[float],
@@ -174,9 +210,8 @@ class RetrievalService:
     ):
         with flask_app.app_context():
             try:
-                dataset = cls._get_dataset(dataset_id)
-                if not dataset:
-                    raise ValueError("dataset not found")
+                # attach the caller's dataset to this thread's session without reloading it
+                dataset = db.session.merge(dataset, load=False)
 
                 vector = Vector(dataset=dataset)
                 documents = vector.search_by_vector(
@@ -215,7 +250,7 @@ class RetrievalService:
     def full_text_index_search(
         cls,
         flask_app: Flask,
-        dataset_id: str,
+        dataset: Dataset,
         query: str,
         top_k: int,
         score_threshold: Optional[float],
@@ -227,9 +262,8 @@ class RetrievalService:
     ):
         with flask_app.app_context():
             try:
-                dataset = cls._get_dataset(dataset_id)
-                if not dataset:
-                    raise ValueError("dataset not found")
+                # attach the caller's dataset to this thread's session without reloading it
+                dataset = db.session.merge(dataset, load=False)
 
                 vector_processor = Vector(dataset=dataset)
 
@@ -284,6 +318,32 @@ class RetrievalService:
                 .all()
             }
 
+            # Batch query child chunks and segments, keeping the ranking order of the documents below
+            parent_child_documents = []
+            normal_documents = []
+            for document in documents:
+                dataset_document = dataset_documents.get(document.metadata.get("document_id"))
+                if not dataset_document:
+                    continue
+                if not document.metadata.get("doc_id"):
+                    continue
+                if dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX:
+                    parent_child_documents.append((document, dataset_document))
+                else:
+                    normal_documents.append((document, dataset_document))
+
+            child_chunks = SegmentHydrator.get_child_chunks_by_index_node_ids(
+                document.metadata["doc_id"] for document, _ in parent_child_documents
+            )
+            parent_segments = SegmentHydrator.get_segments_by_ids(
+                (child_chunk.segment_id for child_chunk in child_chunks.values()), only_available=True
+            )
+            segments = SegmentHydrator.get_segments_by_index_node_ids(
+                (dataset_document.dataset_id for _, dataset_document in normal_documents),
+                (document.metadata["doc_id"] for document, _ in normal_documents),
+                only_available=True,
+            )
+
             records = []
             include_segment_ids = set()
             segment_child_map = {}
@@ -301,33 +361,15 @@ class RetrievalService:
                 if dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX:
                     # Handle parent-child documents
                     child_index_node_id = document.metadata.get("doc_id")
+                    if not child_index_node_id:
+                        continue
 
-                    child_chunk = (
-                        db.session.query(ChildChunk).filter(ChildChunk.index_node_id == child_index_node_id).first()
-                    )
-
+                    child_chunk = child_chunks.get(child_index_node_id)
                     if not child_chunk:
                         continue
 
-                    segment = (
-                        db.session.query(DocumentSegment)
-                        .filter(
-                            DocumentSegment.dataset_id == dataset_document.dataset_id,
-                            DocumentSegment.enabled == True,
-                            DocumentSegment.status == "completed",
-                            DocumentSegment.id == child_chunk.segment_id,
-                        )
-                        .options(
-                            load_only(
-                                DocumentSegment.id,
-                                DocumentSegment.content,
-                                DocumentSegment.answer,
-                            )
-                        )
-                        .first()
-                    )
-
-                    if not segment:
+                    segment = parent_segments.get(child_chunk.segment_id)
+                    if not segment or segment.dataset_id != dataset_document.dataset_id:
                         continue
 
                     if segment.id not in include_segment_ids:
@@ -364,17 +406,7 @@ class RetrievalService:
                     if not index_node_id:
                         continue
 
-                    segment = (
-                        db.session.query(DocumentSegment)
-                        .filter(
-                            DocumentSegment.dataset_id == dataset_document.dataset_id,
-                            DocumentSegment.enabled == True,
-                            DocumentSegment.status == "completed",
-                            DocumentSegment.index_node_id == index_node_id,
-                        )
-                        .first()
-                    )
-
+                    segment = segments.get((dataset_document.dataset_id, index_node_id))
                     if not segment:
                         continue
 
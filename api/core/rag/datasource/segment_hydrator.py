@@ -0,0 +1,71 @@
+from collections.abc import Iterable
+from typing import Optional
+
+from extensions.ext_database import db
+from models.dataset import ChildChunk, DocumentSegment
+
+
+class SegmentHydrator:
+    """
+    Resolve retrieval hits to their segments and child chunks with one `IN` query per entity type,
+    instead of one query per hit. Callers keep their own ranking order by looking results up in the
+    returned mappings.
+    """
+
+    @staticmethod
+    def get_segments_by_index_node_ids(
+        dataset_ids: Iterable[str],
+        index_node_ids: Iterable[str],
+        document_ids_filter: Optional[list[str]] = None,
+        only_available: bool = False,
+    ) -> dict[tuple[str, str], DocumentSegment]:
+        """Map (dataset_id, index_node_id) to segments."""
+        dataset_ids = set(dataset_ids)
+        index_node_ids = set(index_node_ids)
+        if not dataset_ids or not index_node_ids:
+            return {}
+
+        segment_query = db.session.query(DocumentSegment).filter(
+            DocumentSegment.dataset_id.in_(dataset_ids),
+            DocumentSegment.index_node_id.in_(index_node_ids),
+        )
+        if document_ids_filter:
+            segment_query = segment_query.filter(DocumentSegment.document_id.in_(document_ids_filter))
+        if only_available:
+            segment_query = segment_query.filter(
+                DocumentSegment.enabled == True,
+                DocumentSegment.status == "completed",
+            )
+
+        segments: dict[tuple[str, str], DocumentSegment] = {}
+        for segment in segment_query.all():
+            segments.setdefault((segment.dataset_id, segment.index_node_id), segment)
+        return segments
+
+    @staticmethod
+    def get_segments_by_ids(segment_ids: Iterable[str], only_available: bool = False) -> dict[str, DocumentSegment]:
+        """Map segment id to segments."""
+        segment_ids = set(segment_ids)
+        if not segment_ids:
+            return {}
+
+        segment_query = db.session.query(DocumentSegment).filter(DocumentSegment.id.in_(segment_ids))
+        if only_available:
+            segment_query = segment_query.filter(
+                DocumentSegment.enabled == True,
+                DocumentSegment.status == "completed",
+            )
+
+        return {segment.id: segment for segment in segment_query.all()}
+
+    @staticmethod
+    def get_child_chunks_by_index_node_ids(index_node_ids: Iterable[str]) -> dict[str, ChildChunk]:
+        """Map index_node_id to child chunks."""
+        index_node_ids = set(index_node_ids)
+        if not index_node_ids:
+            return {}
+
+        child_chunks: dict[str, ChildChunk] = {}
+        for child_chunk in db.session.query(ChildChunk).filter(ChildChunk.index_node_id.in_(index_node_ids)).all():
+            child_chunks.setdefault(child_chunk.index_node_id, child_chunk)
+        return child_chunks
@@ -8,6 +8,8 @@ _import_err_msg = (
     "please run `pip install alibabacloud_gpdb20160503 alibabacloud_tea_openapi`"
 )
 
+from core.rag.datasource.vdb.vector_factory import VectorClientRegistry
+from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.models.document import Document
 from extensions.ext_redis import redis_client
 
@@ -62,7 +64,9 @@ class AnalyticdbVectorOpenAPI:
         self._collection_name = collection_name.lower()
         self.config = config
         self._client_config = open_api_models.Config(user_agent="dify", **config.to_analyticdb_client_params())
-        self._client = Client(self._client_config)
+        self._client = VectorClientRegistry.get_client(
+            VectorType.ANALYTICDB, config, lambda: Client(self._client_config)
+        )
         self._initialize()
 
     def _initialize(self) -> None:
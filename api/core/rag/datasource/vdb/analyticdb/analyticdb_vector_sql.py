@@ -4,9 +4,11 @@ from contextlib import contextmanager
 from typing import Any
 
 import psycopg2.extras  # type: ignore
-import psycopg2.pool  # type: ignore
 from pydantic import BaseModel, model_validator
 
+from core.rag.datasource.vdb.pg_connection_pool import BlockingConnectionPool
+from core.rag.datasource.vdb.vector_factory import VectorClientRegistry
+from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.models.document import Document
 from extensions.ext_redis import redis_client
 
@@ -50,7 +52,7 @@ class AnalyticdbVectorBySql:
         self.pool = None
         self._initialize()
         if not self.pool:
-            self.pool = self._create_connection_pool()
+            self.pool = self._get_connection_pool()
 
     def _initialize(self) -> None:
         cache_key = f"vector_initialize_{self.config.host}"
@@ -62,8 +64,11 @@ class AnalyticdbVectorBySql:
             self._initialize_vector_database()
             redis_client.set(database_exist_cache_key, 1, ex=3600)
 
+    def _get_connection_pool(self):
+        return VectorClientRegistry.get_client(VectorType.ANALYTICDB, self.config, self._create_connection_pool)
+
     def _create_connection_pool(self):
-        return psycopg2.pool.SimpleConnectionPool(
+        return BlockingConnectionPool(
             self.config.min_connection,
             self.config.max_connection,
             host=self.config.host,
@@ -81,9 +86,11 @@ class AnalyticdbVectorBySql:
         try:
             yield cur
         finally:
-            cur.close()
-            conn.commit()
-            self.pool.putconn(conn)
+            try:
+                cur.close()
+                conn.commit()
+            finally:
+                self.pool.putconn(conn)
 
     def _initialize_vector_database(self) -> None:
         conn = psycopg2.connect(
@@ -104,7 +111,7 @@ class AnalyticdbVectorBySql:
         finally:
             cur.close()
             conn.close()
-        self.pool = self._create_connection_pool()
+        self.pool = self._get_connection_pool()
         with self._get_cursor() as cur:
             try:
                 cur.execute("CREATE TEXT SEARCH CONFIGURATION zh_cn (PARSER = zhparser)")
@@ -15,7 +15,7 @@ from pymochow.model.table import AnnSearch, HNSWSearchParams, Partition, Row  #
 
 from configs import dify_config
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -60,7 +60,7 @@ class BaiduVector(BaseVector):
     def __init__(self, collection_name: str, config: BaiduConfig):
         super().__init__(collection_name)
         self._client_config = config
-        self._client = self._init_client(config)
+        self._client = VectorClientRegistry.get_client(VectorType.BAIDU, config, lambda: self._init_client(config))
         self._db = self._init_database()
 
     def get_type(self) -> str:
@@ -7,7 +7,7 @@ from pydantic import BaseModel
 
 from configs import dify_config
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -44,7 +44,12 @@ class ChromaVector(BaseVector):
     def __init__(self, collection_name: str, config: ChromaConfig):
         super().__init__(collection_name)
         self._client_config = config
-        self._client = chromadb.HttpClient(**self._client_config.to_chroma_params())
+        self._client = VectorClientRegistry.get_client(
+            VectorType.CHROMA,
+            config,
+            lambda: chromadb.HttpClient(**config.to_chroma_params()),
+            health_check=lambda client: client.heartbeat(),
+        )
 
     def get_type(self) -> str:
         return VectorType.CHROMA
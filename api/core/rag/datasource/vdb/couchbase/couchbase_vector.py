@@ -17,7 +17,7 @@ from flask import current_app
 from pydantic import BaseModel, model_validator
 
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -57,16 +57,20 @@ class CouchbaseVector(BaseVector):
 
         """Connect to couchbase"""
 
-        auth = PasswordAuthenticator(config.user, config.password)
-        options = ClusterOptions(auth)
-        self._cluster = Cluster(config.connection_string, options)
+        self._cluster = VectorClientRegistry.get_client(VectorType.COUCHBASE, config, lambda: self._connect(config))
         self._bucket = self._cluster.bucket(config.bucket_name)
         self._scope = self._bucket.scope(config.scope_name)
         self._bucket_name = config.bucket_name
         self._scope_name = config.scope_name
 
+    def _connect(self, config: CouchbaseConfig) -> Cluster:
+        auth = PasswordAuthenticator(config.user, config.password)
+        options = ClusterOptions(auth)
+        cluster = Cluster(config.connection_string, options)
+
         # Wait until the cluster is ready for use.
-        self._cluster.wait_until_ready(timedelta(seconds=5))
+        cluster.wait_until_ready(timedelta(seconds=5))
+        return cluster
 
     def create(self, texts: list[Document], embeddings: list[list[float]], **kwargs):
         index_id = str(uuid.uuid4()).replace("-", "")
@@ -11,7 +11,7 @@ from pydantic import BaseModel, model_validator
 
 from core.rag.datasource.vdb.field import Field
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -44,7 +44,12 @@ class ElasticSearchConfig(BaseModel):
 class ElasticSearchVector(BaseVector):
     def __init__(self, index_name: str, config: ElasticSearchConfig, attributes: list):
         super().__init__(index_name.lower())
-        self._client = self._init_client(config)
+        self._client = VectorClientRegistry.get_client(
+            VectorType.ELASTICSEARCH,
+            config,
+            lambda: self._init_client(config),
+            health_check=lambda client: client.ping(),
+        )
         self._version = self._get_version()
         self._check_version()
         self._attributes = attributes
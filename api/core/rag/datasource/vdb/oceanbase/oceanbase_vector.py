@@ -10,7 +10,7 @@ from sqlalchemy.dialects.mysql import LONGTEXT
 
 from configs import dify_config
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -52,11 +52,15 @@ class OceanBaseVector(BaseVector):
         super().__init__(collection_name)
         self._config = config
         self._hnsw_ef_search = -1
-        self._client = ObVecClient(
-            uri=f"{self._config.host}:{self._config.port}",
-            user=self._config.user,
-            password=self._config.password,
-            db_name=self._config.database,
+        self._client = VectorClientRegistry.get_client(
+            VectorType.OCEANBASE,
+            config,
+            lambda: ObVecClient(
+                uri=f"{self._config.host}:{self._config.port}",
+                user=self._config.user,
+                password=self._config.password,
+                db_name=self._config.database,
+            ),
         )
         self._hybrid_search_enabled = self._check_hybrid_search_support()  # Check if hybrid search is supported
 
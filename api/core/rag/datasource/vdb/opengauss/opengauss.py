@@ -4,12 +4,12 @@ from contextlib import contextmanager
 from typing import Any
 
 import psycopg2.extras  # type: ignore
-import psycopg2.pool  # type: ignore
 from pydantic import BaseModel, model_validator
 
 from configs import dify_config
+from core.rag.datasource.vdb.pg_connection_pool import BlockingConnectionPool
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -72,7 +72,9 @@ USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
 class OpenGauss(BaseVector):
     def __init__(self, collection_name: str, config: OpenGaussConfig):
         super().__init__(collection_name)
-        self.pool = self._create_connection_pool(config)
+        self.pool = VectorClientRegistry.get_client(
+            VectorType.OPENGAUSS, config, lambda: self._create_connection_pool(config)
+        )
         self.table_name = f"embedding_{collection_name}"
         self.pq_enabled = config.enable_pq
 
@@ -80,7 +82,7 @@ class OpenGauss(BaseVector):
         return VectorType.OPENGAUSS
 
     def _create_connection_pool(self, config: OpenGaussConfig):
-        return psycopg2.pool.SimpleConnectionPool(
+        return BlockingConnectionPool(
             config.min_connection,
             config.max_connection,
             host=config.host,
@@ -97,9 +99,11 @@ class OpenGauss(BaseVector):
         try:
             yield cur
         finally:
-            cur.close()
-            conn.commit()
-            self.pool.putconn(conn)
+            try:
+                cur.close()
+                conn.commit()
+            finally:
+                self.pool.putconn(conn)
 
     def create(self, texts: list[Document], embeddings: list[list[float]], **kwargs):
         dimension = len(embeddings[0])
@@ -0,0 +1,38 @@
+import threading
+
+import psycopg2.pool  # type: ignore
+
+
+class BlockingConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """
+    psycopg2 connection pool that can be shared by threads: getconn waits for a connection to be returned
+    when all of them are in use instead of failing, and closed connections are not put back into the pool
+    """
+
+    def __init__(self, minconn: int, maxconn: int, *args, timeout: float = 30, **kwargs):
+        self._semaphore = threading.BoundedSemaphore(maxconn)
+        self._timeout = timeout
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def getconn(self, key=None):
+        if not self._semaphore.acquire(timeout=self._timeout):
+            raise psycopg2.pool.PoolError(f"no connection available after {self._timeout} seconds")
+        try:
+            conn = super().getconn(key)
+            if conn.closed:
+                # the connection was lost while idle in the pool, open a new one
+                super().putconn(conn, key, close=True)
+                conn = super().getconn(key)
+            return conn
+        except Exception:
+            self._semaphore.release()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close=close or bool(conn.closed))
+        finally:
+            self._semaphore.release()
+
+    def close(self) -> None:
+        self.closeall()
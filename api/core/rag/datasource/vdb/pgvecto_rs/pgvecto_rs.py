@@ -6,7 +6,7 @@ from uuid import UUID, uuid4
 from numpy import ndarray
 from pgvecto_rs.sqlalchemy import VECTOR  # type: ignore
 from pydantic import BaseModel, model_validator
-from sqlalchemy import Float, String, create_engine, insert, select, text
+from sqlalchemy import Engine, Float, String, create_engine, insert, select, text
 from sqlalchemy import text as sql_text
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Mapped, Session, mapped_column
@@ -14,7 +14,7 @@ from sqlalchemy.orm import Mapped, Session, mapped_column
 from configs import dify_config
 from core.rag.datasource.vdb.pgvecto_rs.collection import CollectionORM
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -54,10 +54,9 @@ class PGVectoRS(BaseVector):
         self._url = (
             f"postgresql+psycopg2://{config.user}:{config.password}@{config.host}:{config.port}/{config.database}"
         )
-        self._client = create_engine(self._url)
-        with Session(self._client) as session:
-            session.execute(text("CREATE EXTENSION IF NOT EXISTS vectors"))
-            session.commit()
+        self._client = VectorClientRegistry.get_client(
+            VectorType.PGVECTO_RS, config, self._create_engine, close=lambda engine: engine.dispose()
+        )
         self._fields: list[str] = []
 
         class _Table(CollectionORM):
@@ -77,6 +76,13 @@ class PGVectoRS(BaseVector):
     def get_type(self) -> str:
         return VectorType.PGVECTO_RS
 
+    def _create_engine(self) -> Engine:
+        engine = create_engine(self._url, pool_pre_ping=True)
+        with Session(engine) as session:
+            session.execute(text("CREATE EXTENSION IF NOT EXISTS vectors"))
+            session.commit()
+        return engine
+
     def create(self, texts: list[Document], embeddings: list[list[float]], **kwargs):
         self.create_collection(len(embeddings[0]))
         self.add_texts(texts, embeddings)
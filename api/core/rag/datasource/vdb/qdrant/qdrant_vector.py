@@ -22,7 +22,7 @@ from qdrant_client.local.qdrant_local import QdrantLocal
 from configs import dify_config
 from core.rag.datasource.vdb.field import Field
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -71,7 +71,9 @@ class QdrantVector(BaseVector):
     def __init__(self, collection_name: str, group_id: str, config: QdrantConfig, distance_func: str = "Cosine"):
         super().__init__(collection_name)
         self._client_config = config
-        self._client = qdrant_client.QdrantClient(**self._client_config.to_qdrant_params())
+        self._client = VectorClientRegistry.get_client(
+            VectorType.QDRANT, config, lambda: qdrant_client.QdrantClient(**config.to_qdrant_params())
+        )
         self._distance_func = distance_func.upper()
         self._group_id = group_id
 
@@ -343,6 +345,7 @@ class QdrantVector(BaseVector):
                         match=models.MatchAny(any=document_ids_filter),
                     )
                 )
+        score_threshold = float(kwargs.get("score_threshold") or 0.0)
         results = self._client.search(
             collection_name=self._collection_name,
             query_vector=query_vector,
@@ -350,15 +353,47 @@ class QdrantVector(BaseVector):
             limit=kwargs.get("top_k", 4),
             with_payload=True,
             with_vectors=True,
-            score_threshold=float(kwargs.get("score_threshold") or 0.0),
+            score_threshold=score_threshold,
         )
+        return self._documents_from_search_results(results, score_threshold)
+
+    def search_by_vector_in_groups(
+        self, query_vector: list[float], group_ids: list[str], **kwargs: Any
+    ) -> dict[str, list[Document]]:
+        from qdrant_client.http import models
+
+        score_threshold = float(kwargs.get("score_threshold") or 0.0)
+        # one query returning the top_k points of each group instead of one query per group
+        result = self._client.search_groups(
+            collection_name=self._collection_name,
+            query_vector=query_vector,
+            group_by=Field.GROUP_KEY.value,
+            query_filter=models.Filter(
+                must=[
+                    models.FieldCondition(
+                        key=Field.GROUP_KEY.value,
+                        match=models.MatchAny(any=group_ids),
+                    ),
+                ],
+            ),
+            limit=len(group_ids),
+            group_size=kwargs.get("top_k", 4),
+            with_payload=True,
+            with_vectors=True,
+            score_threshold=score_threshold,
+        )
+        documents: dict[str, list[Document]] = {group_id: [] for group_id in group_ids}
+        for group in result.groups:
+            documents[str(group.id)] = self._documents_from_search_results(group.hits, score_threshold)
+        return documents
+
+    def _documents_from_search_results(self, results: list, score_threshold: float) -> list[Document]:
         docs = []
         for result in results:
             if result.payload is None:
                 continue
             metadata = result.payload.get(Field.METADATA_KEY.value) or {}
             # duplicate check score threshold
-            score_threshold = float(kwargs.get("score_threshold") or 0.0)
             if result.score > score_threshold:
                 metadata["score"] = result.score
                 doc = Document(
@@ -434,6 +469,9 @@ class QdrantVector(BaseVector):
 
 
 class QdrantVectorFactory(AbstractVectorFactory):
+    # datasets bound to the same embedding model share a collection, told apart by their group_id
+    supports_group_search = True
+
     def init_vector(self, dataset: Dataset, attributes: list, embeddings: Embeddings) -> QdrantVector:
         if dataset.collection_binding_id:
             dataset_collection_binding = (
@@ -8,7 +8,7 @@ from sqlalchemy import text as sql_text
 from sqlalchemy.dialects.postgresql import JSON, TEXT
 from sqlalchemy.orm import Session
 
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from models.dataset import Dataset
@@ -57,7 +57,12 @@ class RelytVector(BaseVector):
         self._url = (
             f"postgresql+psycopg2://{config.user}:{config.password}@{config.host}:{config.port}/{config.database}"
         )
-        self.client = create_engine(self._url)
+        self.client = VectorClientRegistry.get_client(
+            VectorType.RELYT,
+            config,
+            lambda: create_engine(self._url, pool_pre_ping=True),
+            close=lambda engine: engine.dispose(),
+        )
         self._fields: list[str] = []
         self._group_id = group_id
 
@@ -8,7 +8,7 @@ from pydantic import BaseModel, model_validator
 from configs import dify_config
 from core.rag.datasource.vdb.field import Field
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -40,11 +40,15 @@ class TableStoreVector(BaseVector):
     def __init__(self, collection_name: str, config: TableStoreConfig):
         super().__init__(collection_name)
         self._config = config
-        self._tablestore_client = tablestore.OTSClient(
-            config.endpoint,
-            config.access_key_id,
-            config.access_key_secret,
-            config.instance_name,
+        self._tablestore_client = VectorClientRegistry.get_client(
+            VectorType.TABLESTORE,
+            config,
+            lambda: tablestore.OTSClient(
+                config.endpoint,
+                config.access_key_id,
+                config.access_key_secret,
+                config.instance_name,
+            ),
         )
         self._table_name = f"{collection_name}"
         self._index_name = f"{collection_name}_idx"
@@ -10,7 +10,7 @@ from tcvectordb.model.document import Filter  # type: ignore
 
 from configs import dify_config
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -43,7 +43,9 @@ class TencentVector(BaseVector):
     def __init__(self, collection_name: str, config: TencentConfig):
         super().__init__(collection_name)
         self._client_config = config
-        self._client = RPCVectorDBClient(**self._client_config.to_tencent_params())
+        self._client = VectorClientRegistry.get_client(
+            VectorType.TENCENT, config, lambda: RPCVectorDBClient(**config.to_tencent_params())
+        )
 
     def _init_database(self):
         return self._client.create_database_if_not_exists(database_name=self._client_config.database)
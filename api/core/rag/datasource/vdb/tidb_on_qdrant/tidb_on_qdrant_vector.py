@@ -25,7 +25,7 @@ from configs import dify_config
 from core.rag.datasource.vdb.field import Field
 from core.rag.datasource.vdb.tidb_on_qdrant.tidb_service import TidbService
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -81,7 +81,9 @@ class TidbOnQdrantVector(BaseVector):
     def __init__(self, collection_name: str, group_id: str, config: TidbOnQdrantConfig, distance_func: str = "Cosine"):
         super().__init__(collection_name)
         self._client_config = config
-        self._client = qdrant_client.QdrantClient(**self._client_config.to_qdrant_params())
+        self._client = VectorClientRegistry.get_client(
+            VectorType.TIDB_ON_QDRANT, config, lambda: qdrant_client.QdrantClient(**config.to_qdrant_params())
+        )
         self._distance_func = distance_func.upper()
         self._group_id = group_id
 
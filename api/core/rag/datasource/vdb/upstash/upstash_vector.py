@@ -7,7 +7,7 @@ from upstash_vector import Index, Vector
 
 from configs import dify_config
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -32,7 +32,9 @@ class UpstashVector(BaseVector):
     def __init__(self, collection_name: str, config: UpstashVectorConfig):
         super().__init__(collection_name)
         self._table_name = collection_name
-        self.index = Index(url=config.url, token=config.token)
+        self.index = VectorClientRegistry.get_client(
+            VectorType.UPSTASH, config, lambda: Index(url=config.url, token=config.token)
+        )
 
     def _get_index_dimension(self) -> int:
         index_info = self.index.info()
@@ -41,6 +41,16 @@ class BaseVector(ABC):
     def search_by_vector(self, query_vector: list[float], **kwargs: Any) -> list[Document]:
         raise NotImplementedError
 
+    def search_by_vector_in_groups(
+        self, query_vector: list[float], group_ids: list[str], **kwargs: Any
+    ) -> dict[str, list[Document]]:
+        """
+        Search the documents of several groups sharing the collection with one query,
+        top_k and score_threshold apply to each group
+        :return: documents of each group id
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def search_by_full_text(self, query: str, **kwargs: Any) -> list[Document]:
         raise NotImplementedError
@@ -1,5 +1,14 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from collections.abc import Callable
+from typing import Any, Optional, TypeVar, cast
+
+from pydantic import BaseModel
 
 from configs import dify_config
 from core.model_manager import ModelManager
@@ -13,8 +22,161 @@ from extensions.ext_database import db
 from extensions.ext_redis import redis_client
 from models.dataset import Dataset, Whitelist
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _close_client(client: Any) -> None:
+    close = getattr(client, "close", None)
+    if callable(close):
+        close()
+
+
+class _SharedClient:
+    def __init__(
+        self, client: Any, health_check: Optional[Callable[[Any], Any]], close: Optional[Callable[[Any], Any]]
+    ) -> None:
+        self.client = client
+        self.health_check = health_check
+        self.close = close or _close_client
+        self.last_used_at = time.monotonic()
+        self.checked_at = time.monotonic()
+
+
+class VectorClientRegistry:
+    """
+    Process-wide registry of the vector store clients and connection pools, one per vector store configuration,
+    so that vector store instances borrow a connected client instead of connecting again.
+
+    Clients unused for VECTOR_STORE_CLIENT_IDLE_TIMEOUT seconds or failing their health check are dropped
+    from the registry and closed, the idle timeout must be longer than a vector store instance keeps its client.
+    """
+
+    _clients: dict[str, _SharedClient] = {}
+    _creation_locks: dict[str, threading.Lock] = {}
+    _lock = threading.Lock()
+    _pid: Optional[int] = None
+
+    @classmethod
+    def get_client(
+        cls,
+        vector_type: str,
+        config: Any,
+        factory: Callable[[], T],
+        health_check: Optional[Callable[[T], Any]] = None,
+        close: Optional[Callable[[T], Any]] = None,
+    ) -> T:
+        """
+        Borrow the shared client of a vector store configuration, created with factory on first use
+        :param vector_type: vector type
+        :param config: configuration the client is created from, clients are shared by equal configurations
+        :param factory: create the client
+        :param health_check: check the client, it is replaced when the check returns False or raises
+        :param close: close the client once it is dropped from the registry, calls its close method by default
+        :return: client
+        """
+        if not dify_config.VECTOR_STORE_CLIENT_SHARING_ENABLED:
+            return factory()
+
+        key = cls._get_key(vector_type, config)
+        shared = cls._borrow(key)
+        if shared is not None and not cls._is_healthy(vector_type, key, shared):
+            shared = None
+        if shared is not None:
+            return cast(T, shared.client)
+
+        with cls._lock:
+            creation_lock = cls._creation_locks.setdefault(key, threading.Lock())
+        # connecting may be slow, only hold the lock of this configuration
+        with creation_lock:
+            shared = cls._borrow(key)
+            if shared is None:
+                shared = _SharedClient(factory(), health_check, close)
+                with cls._lock:
+                    cls._clients[key] = shared
+        return cast(T, shared.client)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            clients = list(cls._clients.items())
+            cls._clients.clear()
+            cls._creation_locks.clear()
+            owned = cls._pid == os.getpid()
+        if owned:
+            for key, shared in clients:
+                cls._close(key, shared)
+
+    @classmethod
+    def _get_key(cls, vector_type: str, config: Any) -> str:
+        if isinstance(config, BaseModel):
+            config = config.model_dump(mode="json")
+        digest = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{vector_type}:{digest}"
+
+    @classmethod
+    def _borrow(cls, key: str) -> Optional[_SharedClient]:
+        now = time.monotonic()
+        evicted = []
+        with cls._lock:
+            if cls._pid != os.getpid():
+                # connections must not be shared with the parent process
+                cls._clients.clear()
+                cls._creation_locks.clear()
+                cls._pid = os.getpid()
+
+            for idle_key, idle_shared in list(cls._clients.items()):
+                if now - idle_shared.last_used_at > dify_config.VECTOR_STORE_CLIENT_IDLE_TIMEOUT:
+                    del cls._clients[idle_key]
+                    evicted.append((idle_key, idle_shared))
+
+            shared = cls._clients.get(key)
+            if shared is not None:
+                shared.last_used_at = now
+
+        # closing may wait for the vector store, outside of the registry lock
+        for idle_key, idle_shared in evicted:
+            cls._close(idle_key, idle_shared)
+        return shared
+
+    @classmethod
+    def _is_healthy(cls, vector_type: str, key: str, shared: _SharedClient) -> bool:
+        now = time.monotonic()
+        if (
+            shared.health_check is None
+            or now - shared.checked_at < dify_config.VECTOR_STORE_CLIENT_HEALTH_CHECK_INTERVAL
+        ):
+            return True
+
+        shared.checked_at = now
+        try:
+            healthy = shared.health_check(shared.client) is not False
+        except Exception as e:
+            logger.warning("Health check of the shared %s client failed: %s", vector_type, e)
+            healthy = False
+
+        if not healthy:
+            with cls._lock:
+                removed = cls._clients.get(key) is shared
+                if removed:
+                    del cls._clients[key]
+            if removed:
+                cls._close(key, shared)
+        return healthy
+
+    @classmethod
+    def _close(cls, key: str, shared: _SharedClient) -> None:
+        try:
+            shared.close(shared.client)
+        except Exception as e:
+            logger.warning("Failed to close the shared %s client: %s", key.split(":", 1)[0], e)
+
 
 class AbstractVectorFactory(ABC):
+    # whether the datasets of a collection can be searched together with search_by_vector_in_groups
+    supports_group_search = False
+
     @abstractmethod
     def init_vector(self, dataset: Dataset, attributes: list, embeddings: Embeddings) -> BaseVector:
         raise NotImplementedError
@@ -184,6 +346,10 @@ class Vector:
         query_vector = self._embeddings.embed_query(query)
         return self._vector_processor.search_by_vector(query_vector, **kwargs)
 
+    def search_by_vector_in_groups(self, query: str, group_ids: list[str], **kwargs: Any) -> dict[str, list[Document]]:
+        query_vector = self._embeddings.embed_query(query)
+        return self._vector_processor.search_by_vector_in_groups(query_vector, group_ids, **kwargs)
+
     def search_by_full_text(self, query: str, **kwargs: Any) -> list[Document]:
         return self._vector_processor.search_by_full_text(query, **kwargs)
 
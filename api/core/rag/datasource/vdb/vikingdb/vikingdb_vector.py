@@ -16,7 +16,7 @@ from volcengine.viking_db import (  # type: ignore
 from configs import dify_config
 from core.rag.datasource.vdb.field import Field as vdb_Field
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
@@ -43,14 +43,18 @@ class VikingDBVector(BaseVector):
         self._group_id = group_id
         self._client_config = config
         self._index_name = f"{self._collection_name}_idx"
-        self._client = VikingDBService(
-            host=config.host,
-            region=config.region,
-            scheme=config.scheme,
-            connection_timeout=config.connection_timeout,
-            socket_timeout=config.socket_timeout,
-            ak=config.access_key,
-            sk=config.secret_key,
+        self._client = VectorClientRegistry.get_client(
+            VectorType.VIKINGDB,
+            config,
+            lambda: VikingDBService(
+                host=config.host,
+                region=config.region,
+                scheme=config.scheme,
+                connection_timeout=config.connection_timeout,
+                socket_timeout=config.socket_timeout,
+                ak=config.access_key,
+                sk=config.secret_key,
+            ),
         )
 
     def _has_collection(self) -> bool:
@@ -1,5 +1,7 @@
 import datetime
 import json
+import threading
+import weakref
 from typing import Any, Optional
 
 import requests
@@ -9,13 +11,17 @@ from pydantic import BaseModel, model_validator
 from configs import dify_config
 from core.rag.datasource.vdb.field import Field
 from core.rag.datasource.vdb.vector_base import BaseVector
-from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory
+from core.rag.datasource.vdb.vector_factory import AbstractVectorFactory, VectorClientRegistry
 from core.rag.datasource.vdb.vector_type import VectorType
 from core.rag.embedding.embedding_base import Embeddings
 from core.rag.models.document import Document
 from extensions.ext_redis import redis_client
 from models.dataset import Dataset
 
+# the batch of a client buffers the objects added to it, imports through a shared client must not interleave
+_batch_locks: "weakref.WeakKeyDictionary[weaviate.Client, threading.Lock]" = weakref.WeakKeyDictionary()
+_batch_locks_lock = threading.Lock()
+
 
 class WeaviateConfig(BaseModel):
     endpoint: str
@@ -33,7 +39,14 @@ class WeaviateConfig(BaseModel):
 class WeaviateVector(BaseVector):
     def __init__(self, collection_name: str, config: WeaviateConfig, attributes: list):
         super().__init__(collection_name)
-        self._client = self._init_client(config)
+        self._client = VectorClientRegistry.get_client(
+            VectorType.WEAVIATE,
+            config,
+            lambda: self._init_client(config),
+            health_check=lambda client: client.is_ready(),
+        )
+        with _batch_locks_lock:
+            self._batch_lock = _batch_locks.setdefault(self._client, threading.Lock())
         self._attributes = attributes
 
     def _init_client(self, config: WeaviateConfig) -> weaviate.Client:
@@ -103,7 +116,7 @@ class WeaviateVector(BaseVector):
 
         ids = []
 
-        with self._client.batch as batch:
+        with self._batch_lock, self._client.batch as batch:
             for i, text in enumerate(texts):
                 data_properties = {Field.TEXT_KEY.value: text}
                 if metadatas is not None:
@@ -3,6 +3,7 @@ from typing import Any, Optional
 
 from sqlalchemy import func
 
+from core.helper.token_counter import TokenCounter
 from core.model_manager import ModelManager
 from core.model_runtime.entities.model_entities import ModelType
 from core.rag.models.document import Document
@@ -81,7 +82,7 @@ class DatasetDocumentStore:
 
         if embedding_model:
             page_content_list = [doc.page_content for doc in docs]
-            tokens_list = embedding_model.get_text_embedding_num_tokens(page_content_list)
+            tokens_list = TokenCounter(embedding_model).count_many(page_content_list)
         else:
             tokens_list = [0] * len(docs)
 
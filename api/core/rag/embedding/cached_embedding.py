@@ -1,8 +1,11 @@
-import base64
 import logging
+import threading
 from typing import Any, Optional, cast
 
 import numpy as np
+from cachetools import TTLCache
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 
 from configs import dify_config
@@ -18,6 +21,17 @@ from models.dataset import Embedding
 
 logger = logging.getLogger(__name__)
 
+# number of hashes resolved by a single `IN` query against the embedding cache
+EMBEDDING_CACHE_QUERY_BATCH_SIZE = 1000
+# number of rows written by a single bulk insert into the embedding cache
+EMBEDDING_CACHE_INSERT_BATCH_SIZE = 500
+
+# process-wide LRU tier in front of the Redis query embedding cache
+_query_embedding_local_cache: TTLCache = TTLCache(
+    maxsize=max(dify_config.QUERY_EMBEDDING_LOCAL_CACHE_SIZE, 1), ttl=dify_config.QUERY_EMBEDDING_CACHE_TTL
+)
+_query_embedding_local_cache_lock = threading.Lock()
+
 
 class CacheEmbedding(Embeddings):
     def __init__(self, model_instance: ModelInstance, user: Optional[str] = None) -> None:
@@ -28,18 +42,13 @@ class CacheEmbedding(Embeddings):
         """Embed search docs in batches of 10."""
         # use doc embedding cache or store if not exists
         text_embeddings: list[Any] = [None for _ in range(len(texts))]
+        text_hashes = [helper.generate_text_hash(text) for text in texts]
+        cached_embeddings = self._get_cached_embeddings(text_hashes)
         embedding_queue_indices = []
-        for i, text in enumerate(texts):
-            hash = helper.generate_text_hash(text)
-            embedding = (
-                db.session.query(Embedding)
-                .filter_by(
-                    model_name=self._model_instance.model, hash=hash, provider_name=self._model_instance.provider
-                )
-                .first()
-            )
-            if embedding:
-                text_embeddings[i] = embedding.get_embedding()
+        for i, hash in enumerate(text_hashes):
+            cached_embedding = cached_embeddings.get(hash)
+            if cached_embedding is not None:
+                text_embeddings[i] = cached_embedding
             else:
                 embedding_queue_indices.append(i)
         if embedding_queue_indices:
@@ -76,23 +85,11 @@ class CacheEmbedding(Embeddings):
                             db.session.rollback()
                         except Exception:
                             logging.exception("Failed transform embedding")
-                cache_embeddings = []
-                try:
-                    for i, n_embedding in zip(embedding_queue_indices, embedding_queue_embeddings):
-                        text_embeddings[i] = n_embedding
-                        hash = helper.generate_text_hash(texts[i])
-                        if hash not in cache_embeddings:
-                            embedding_cache = Embedding(
-                                model_name=self._model_instance.model,
-                                hash=hash,
-                                provider_name=self._model_instance.provider,
-                            )
-                            embedding_cache.set_embedding(n_embedding)
-                            db.session.add(embedding_cache)
-                            cache_embeddings.append(hash)
-                    db.session.commit()
-                except IntegrityError:
-                    db.session.rollback()
+                new_embeddings: dict[str, list[float]] = {}
+                for i, n_embedding in zip(embedding_queue_indices, embedding_queue_embeddings):
+                    text_embeddings[i] = n_embedding
+                    new_embeddings.setdefault(text_hashes[i], n_embedding)
+                self._save_cached_embeddings(new_embeddings)
             except Exception as ex:
                 db.session.rollback()
                 logger.exception("Failed to embed documents: %s")
@@ -100,43 +97,161 @@ class CacheEmbedding(Embeddings):
 
         return text_embeddings
 
+    def _get_cached_embeddings(self, text_hashes: list[str]) -> dict[str, list[float]]:
+        """Resolve cached document embeddings with one `IN` query per batch of hashes."""
+        cached_embeddings: dict[str, list[float]] = {}
+        unique_hashes = list(dict.fromkeys(text_hashes))
+        for i in range(0, len(unique_hashes), EMBEDDING_CACHE_QUERY_BATCH_SIZE):
+            batch_hashes = unique_hashes[i : i + EMBEDDING_CACHE_QUERY_BATCH_SIZE]
+            rows = db.session.execute(
+                select(Embedding.hash, Embedding.embedding).where(
+                    Embedding.model_name == self._model_instance.model,
+                    Embedding.provider_name == self._model_instance.provider,
+                    Embedding.hash.in_(batch_hashes),
+                )
+            ).all()
+            for row in rows:
+                hash, raw_embedding = cast(tuple[str, bytes], tuple(row))
+                try:
+                    cached_embeddings[hash] = Embedding.decode_embedding(raw_embedding)
+                except Exception:
+                    # treat undecodable rows as cache misses, they are re-embedded below
+                    logger.exception(f"Failed to decode cached embedding {hash}")
+        return cached_embeddings
+
+    def _save_cached_embeddings(self, embeddings: dict[str, list[float]]) -> None:
+        """Bulk insert new document embeddings, skipping rows written concurrently by other workers."""
+        if not embeddings:
+            return
+        rows = [
+            {
+                "model_name": self._model_instance.model,
+                "hash": hash,
+                "provider_name": self._model_instance.provider,
+                "embedding": Embedding.encode_embedding(embedding),
+            }
+            for hash, embedding in embeddings.items()
+        ]
+        try:
+            for i in range(0, len(rows), EMBEDDING_CACHE_INSERT_BATCH_SIZE):
+                stmt = (
+                    insert(Embedding)
+                    .values(rows[i : i + EMBEDDING_CACHE_INSERT_BATCH_SIZE])
+                    .on_conflict_do_nothing(index_elements=["model_name", "hash", "provider_name"])
+                )
+                db.session.execute(stmt)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+
     def embed_query(self, text: str) -> list[float]:
         """Embed query text."""
-        # use doc embedding cache or store if not exists
-        hash = helper.generate_text_hash(text)
-        embedding_cache_key = f"{self._model_instance.provider}_{self._model_instance.model}_{hash}"
-        embedding = redis_client.get(embedding_cache_key)
-        if embedding:
-            redis_client.expire(embedding_cache_key, 600)
-            decoded_embedding = np.frombuffer(base64.b64decode(embedding), dtype="float")
-            return [float(x) for x in decoded_embedding]
+        return cast(list[float], self.embed_queries([text])[0].tolist())
+
+    def embed_queries(self, texts: list[str]) -> list[np.ndarray]:
+        """
+        Embed query texts, resolving each one from the in-process cache, then Redis, then the model.
+
+        Redis is hit with a single pipelined round trip for all local misses, and the model is invoked
+        once for all remaining misses. The returned float32 arrays are shared with the cache and read-only.
+        """
+        ttl = dify_config.QUERY_EMBEDDING_CACHE_TTL
+        cache_keys = [self._get_query_cache_key(text) for text in texts]
+        query_embeddings: list[Any] = [None for _ in range(len(texts))]
+        missing_indices: dict[str, list[int]] = {}
+        for i, cache_key in enumerate(cache_keys):
+            local_embedding = _get_local_query_embedding(cache_key)
+            if local_embedding is not None:
+                query_embeddings[i] = local_embedding
+            else:
+                missing_indices.setdefault(cache_key, []).append(i)
+        if not missing_indices:
+            return query_embeddings
+
         try:
-            embedding_result = self._model_instance.invoke_text_embedding(
-                texts=[text], user=self._user, input_type=EmbeddingInputType.QUERY
-            )
+            # GETEX refreshes the expiry of cache hits within the same round trip
+            pipeline = redis_client.pipeline(transaction=False)
+            for cache_key in missing_indices:
+                pipeline.getex(cache_key, ex=ttl)
+            for cache_key, raw_embedding in zip(list(missing_indices), pipeline.execute()):
+                if raw_embedding:
+                    query_embedding = np.frombuffer(raw_embedding, dtype=np.float32)
+                    _set_local_query_embedding(cache_key, query_embedding)
+                    for i in missing_indices.pop(cache_key):
+                        query_embeddings[i] = query_embedding
+        except Exception as ex:
+            if dify_config.DEBUG:
+                logging.exception(f"Failed to get {len(missing_indices)} query embeddings from redis")
+            raise ex
+        if not missing_indices:
+            return query_embeddings
 
-            embedding_results = embedding_result.embeddings[0]
-            # FIXME: type ignore for numpy here
-            embedding_results = (embedding_results / np.linalg.norm(embedding_results)).tolist()  # type: ignore
-            if np.isnan(embedding_results).any():
-                raise ValueError("Normalized embedding is nan please try again")
+        embedding_queue_texts = [texts[indices[0]] for indices in missing_indices.values()]
+        try:
+            embedding_results = self._invoke_query_embeddings(embedding_queue_texts)
         except Exception as ex:
             if dify_config.DEBUG:
-                logging.exception(f"Failed to embed query text '{text[:10]}...({len(text)} chars)'")
+                logging.exception(
+                    f"Failed to embed query text '{embedding_queue_texts[0][:10]}...' "
+                    f"({len(embedding_queue_texts)} queries)"
+                )
             raise ex
 
         try:
-            # encode embedding to base64
-            embedding_vector = np.array(embedding_results)
-            vector_bytes = embedding_vector.tobytes()
-            # Transform to Base64
-            encoded_vector = base64.b64encode(vector_bytes)
-            # Transform to string
-            encoded_str = encoded_vector.decode("utf-8")
-            redis_client.setex(embedding_cache_key, 600, encoded_str)
+            pipeline = redis_client.pipeline(transaction=False)
+            for (cache_key, indices), query_embedding in zip(missing_indices.items(), embedding_results):
+                pipeline.setex(cache_key, ttl, query_embedding.tobytes())
+                _set_local_query_embedding(cache_key, query_embedding)
+                for i in indices:
+                    query_embeddings[i] = query_embedding
+            pipeline.execute()
         except Exception as ex:
             if dify_config.DEBUG:
-                logging.exception(f"Failed to add embedding to redis for the text '{text[:10]}...({len(text)} chars)'")
+                logging.exception(f"Failed to add {len(embedding_results)} query embeddings to redis")
             raise ex
 
-        return embedding_results
+        return query_embeddings
+
+    def _get_query_cache_key(self, text: str) -> str:
+        hash = helper.generate_text_hash(text)
+        return f"{self._model_instance.provider}_{self._model_instance.model}_{hash}_float32"
+
+    def _invoke_query_embeddings(self, texts: list[str]) -> list[np.ndarray]:
+        max_chunks = len(texts)
+        if max_chunks > 1:
+            model_type_instance = cast(TextEmbeddingModel, self._model_instance.model_type_instance)
+            model_schema = model_type_instance.get_model_schema(
+                self._model_instance.model, self._model_instance.credentials
+            )
+            if model_schema and ModelPropertyKey.MAX_CHUNKS in model_schema.model_properties:
+                max_chunks = model_schema.model_properties[ModelPropertyKey.MAX_CHUNKS]
+            else:
+                max_chunks = 1
+
+        query_embeddings: list[np.ndarray] = []
+        for i in range(0, len(texts), max_chunks):
+            embedding_result = self._model_instance.invoke_text_embedding(
+                texts=texts[i : i + max_chunks], user=self._user, input_type=EmbeddingInputType.QUERY
+            )
+            vectors = np.asarray(embedding_result.embeddings, dtype=np.float64)
+            normalized_vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            if np.isnan(normalized_vectors).any():
+                raise ValueError("Normalized embedding is nan please try again")
+            for normalized_vector in normalized_vectors.astype(np.float32):
+                normalized_vector.setflags(write=False)
+                query_embeddings.append(normalized_vector)
+        return query_embeddings
+
+
+def _get_local_query_embedding(cache_key: str) -> Optional[np.ndarray]:
+    if not dify_config.QUERY_EMBEDDING_LOCAL_CACHE_SIZE:
+        return None
+    with _query_embedding_local_cache_lock:
+        return cast(Optional[np.ndarray], _query_embedding_local_cache.get(cache_key))
+
+
+def _set_local_query_embedding(cache_key: str, query_embedding: np.ndarray) -> None:
+    if not dify_config.QUERY_EMBEDDING_LOCAL_CACHE_SIZE:
+        return
+    with _query_embedding_local_cache_lock:
+        _query_embedding_local_cache[cache_key] = query_embedding
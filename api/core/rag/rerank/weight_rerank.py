@@ -1,6 +1,4 @@
-import math
-from collections import Counter
-from typing import Optional
+from typing import Optional, cast
 
 import numpy as np
 
@@ -71,74 +69,68 @@ class WeightRerankRunner(BaseRerankRunner):
 
         :return:
         """
-        keyword_table_handler = JiebaKeywordTableHandler()
+        keyword_table_handler = JiebaKeywordTableHandler.get_instance()
         query_keywords = keyword_table_handler.extract_keywords(query, None)
-        documents_keywords = []
-        for document in documents:
+        # documents without metadata are not scored, but they count in the IDF
+        total_documents = len(documents)
+        documents = [document for document in documents if document.metadata is not None]
+        documents_keywords = keyword_table_handler.extract_keywords_batch(
+            [document.page_content for document in documents], None
+        )
+        for document, document_keywords in zip(documents, documents_keywords):
             # get the document keywords
-            document_keywords = keyword_table_handler.extract_keywords(document.page_content, None)
             if document.metadata is not None:
                 document.metadata["keywords"] = document_keywords
-                documents_keywords.append(document_keywords)
 
-        # Counter query keywords(TF)
-        query_keyword_counts = Counter(query_keywords)
+        return self._calculate_tfidf_similarities(query_keywords, documents_keywords, total_documents)
 
-        # total documents
-        total_documents = len(documents)
-
-        # calculate all documents' keywords IDF
-        all_keywords = set()
-        for document_keywords in documents_keywords:
-            all_keywords.update(document_keywords)
-
-        keyword_idf = {}
-        for keyword in all_keywords:
-            # calculate include query keywords' documents
-            doc_count_containing_keyword = sum(1 for doc_keywords in documents_keywords if keyword in doc_keywords)
-            # IDF
-            keyword_idf[keyword] = math.log((1 + total_documents) / (1 + doc_count_containing_keyword)) + 1
-
-        query_tfidf = {}
-
-        for keyword, count in query_keyword_counts.items():
-            tf = count
-            idf = keyword_idf.get(keyword, 0)
-            query_tfidf[keyword] = tf * idf
-
-        # calculate all documents' TF-IDF
-        documents_tfidf = []
-        for document_keywords in documents_keywords:
-            document_keyword_counts = Counter(document_keywords)
-            document_tfidf = {}
-            for keyword, count in document_keyword_counts.items():
-                tf = count
-                idf = keyword_idf.get(keyword, 0)
-                document_tfidf[keyword] = tf * idf
-            documents_tfidf.append(document_tfidf)
-
-        def cosine_similarity(vec1, vec2):
-            intersection = set(vec1.keys()) & set(vec2.keys())
-            numerator = sum(vec1[x] * vec2[x] for x in intersection)
-
-            sum1 = sum(vec1[x] ** 2 for x in vec1)
-            sum2 = sum(vec2[x] ** 2 for x in vec2)
-            denominator = math.sqrt(sum1) * math.sqrt(sum2)
-
-            if not denominator:
-                return 0.0
-            else:
-                return float(numerator) / denominator
-
-        similarities = []
-        for document_tfidf in documents_tfidf:
-            similarity = cosine_similarity(query_tfidf, document_tfidf)
-            similarities.append(similarity)
-
-        # for idx, similarity in enumerate(similarities):
-        #     print(f"Document {idx + 1} similarity: {similarity}")
+    @staticmethod
+    def _calculate_tfidf_similarities(
+        query_keywords: set[str], documents_keywords: list[set[str]], total_documents: Optional[int] = None
+    ) -> list[float]:
+        """
+        Calculate the TF-IDF cosine similarity between the query and each document.
 
-        return similarities
+        Keywords are sets, so every term frequency is 1 and the document-term matrix is binary.
+        It is kept in sparse coordinate form (one entry per document keyword), which turns document
+        frequencies, document norms and dot products into a single bincount each.
+        `total_documents` is the number of documents of the IDF, defaults to the number of scored documents.
+        """
+        scored_documents = len(documents_keywords)
+        if not scored_documents:
+            return []
+        if total_documents is None:
+            total_documents = scored_documents
+
+        vocabulary: dict[str, int] = {}
+        row_indices: list[int] = []
+        col_indices: list[int] = []
+        for row, document_keywords in enumerate(documents_keywords):
+            for keyword in document_keywords:
+                row_indices.append(row)
+                col_indices.append(vocabulary.setdefault(keyword, len(vocabulary)))
+        if not vocabulary:
+            return [0.0] * scored_documents
+        rows = np.asarray(row_indices, dtype=np.intp)
+        cols = np.asarray(col_indices, dtype=np.intp)
+
+        # IDF of every keyword, from the number of documents containing it
+        doc_count_containing_keyword = np.bincount(cols, minlength=len(vocabulary))
+        keyword_idf = np.log((1 + total_documents) / (1 + doc_count_containing_keyword)) + 1
+
+        # query TF-IDF, keywords missing from every document have an IDF of 0
+        query_tfidf = np.zeros(len(vocabulary))
+        query_cols = [vocabulary[keyword] for keyword in query_keywords if keyword in vocabulary]
+        query_tfidf[query_cols] = keyword_idf[query_cols]
+        query_norm = np.sqrt(np.sum(query_tfidf**2))
+
+        entry_idf = keyword_idf[cols]
+        numerators = np.bincount(rows, weights=entry_idf * query_tfidf[cols], minlength=scored_documents)
+        document_norms = np.sqrt(np.bincount(rows, weights=entry_idf**2, minlength=scored_documents))
+        denominators = document_norms * query_norm
+
+        similarities = np.divide(numerators, denominators, out=np.zeros(scored_documents), where=denominators != 0)
+        return cast(list[float], similarities.tolist())
 
     def _calculate_cosine(
         self, tenant_id: str, query: str, documents: list[Document], vector_setting: VectorSetting
@@ -150,7 +142,16 @@ class WeightRerankRunner(BaseRerankRunner):
 
         :return:
         """
-        query_vector_scores = []
+        query_vector_scores: list[float] = []
+        unscored_indices = []
+        for i, document in enumerate(documents):
+            if document.metadata and "score" in document.metadata:
+                query_vector_scores.append(document.metadata["score"])
+            else:
+                query_vector_scores.append(0.0)
+                unscored_indices.append(i)
+        if not unscored_indices:
+            return query_vector_scores
 
         model_manager = ModelManager()
 
@@ -161,25 +162,21 @@ class WeightRerankRunner(BaseRerankRunner):
             model=vector_setting.embedding_model_name,
         )
         cache_embedding = CacheEmbedding(embedding_model)
-        query_vector = cache_embedding.embed_query(query)
-        for document in documents:
-            # calculate cosine similarity
-            if document.metadata and "score" in document.metadata:
-                query_vector_scores.append(document.metadata["score"])
-            else:
-                # transform to NumPy
-                vec1 = np.array(query_vector)
-                vec2 = np.array(document.vector)
-
-                # calculate dot product
-                dot_product = np.dot(vec1, vec2)
-
-                # calculate norm
-                norm_vec1 = np.linalg.norm(vec1)
-                norm_vec2 = np.linalg.norm(vec2)
+        query_vector = cache_embedding.embed_queries([query])[0]
 
-                # calculate cosine similarity
-                cosine_sim = dot_product / (norm_vec1 * norm_vec2)
-                query_vector_scores.append(cosine_sim)
+        # calculate the cosine similarity of all documents with a single matrix-vector product
+        cosine_similarities = self._calculate_cosine_similarities(
+            query_vector, [documents[i].vector for i in unscored_indices]
+        )
+        for i, cosine_similarity in zip(unscored_indices, cosine_similarities):
+            query_vector_scores[i] = cosine_similarity
 
         return query_vector_scores
+
+    @staticmethod
+    def _calculate_cosine_similarities(query_vector, document_vectors: list) -> list[float]:
+        query = np.asarray(query_vector, dtype=np.float64)
+        matrix = np.asarray(document_vectors, dtype=np.float64)
+        dot_products = matrix @ query
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        return cast(list[float], (dot_products / norms).tolist())
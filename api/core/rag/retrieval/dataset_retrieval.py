@@ -1,7 +1,8 @@
+import concurrent.futures
 import json
+import logging
 import math
 import re
-import threading
 from collections import Counter, defaultdict
 from collections.abc import Generator, Mapping
 from typing import Any, Optional, Union, cast
@@ -10,6 +11,7 @@ from flask import Flask, current_app
 from sqlalchemy import Integer, and_, or_, text
 from sqlalchemy import cast as sqlalchemy_cast
 
+from configs import dify_config
 from core.app.app_config.entities import (
     DatasetEntity,
     DatasetRetrieveConfigEntity,
@@ -34,7 +36,10 @@ from core.prompt.entities.advanced_prompt_entities import ChatModelMessage, Comp
 from core.prompt.simple_prompt_transform import ModelMode
 from core.rag.data_post_processor.data_post_processor import DataPostProcessor
 from core.rag.datasource.keyword.jieba.jieba_keyword_table_handler import JiebaKeywordTableHandler
+from core.rag.datasource.retrieval_executor import RetrievalExecutor
 from core.rag.datasource.retrieval_service import RetrievalService
+from core.rag.datasource.vdb.vector_factory import Vector
+from core.rag.embedding.cached_embedding import CacheEmbedding
 from core.rag.entities.context_entities import DocumentContext
 from core.rag.entities.metadata_entities import Condition, MetadataCondition
 from core.rag.index_processor.constant.index_type import IndexType
@@ -418,7 +423,8 @@ class DatasetRetrieval:
     ):
         if not available_datasets:
             return []
-        threads = []
+        executor = RetrievalExecutor.get_instance()
+        futures = []
         all_documents: list[Document] = []
         dataset_ids = [dataset.id for dataset in available_datasets]
         index_type_check = all(
@@ -452,6 +458,9 @@ class DatasetRetrieval:
                     ].embedding_model_provider
                     weights["vector_setting"]["embedding_model_name"] = available_datasets[0].embedding_model
 
+        self._prefetch_query_embeddings(tenant_id, available_datasets, query)
+
+        retrievals: list[tuple[Dataset, Optional[list[str]]]] = []
         for dataset in available_datasets:
             index_type = dataset.indexing_technique
             document_ids_filter = None
@@ -464,22 +473,38 @@ class DatasetRetrieval:
                         document_ids_filter = document_ids
                     else:
                         continue
-            retrieval_thread = threading.Thread(
-                target=self._retriever,
-                kwargs={
-                    "flask_app": current_app._get_current_object(),  # type: ignore
-                    "dataset_id": dataset.id,
-                    "query": query,
-                    "top_k": top_k,
-                    "all_documents": all_documents,
-                    "document_ids_filter": document_ids_filter,
-                    "metadata_condition": metadata_condition,
-                },
+            retrievals.append((dataset, document_ids_filter))
+
+        dataset_groups, retrievals = self._group_datasets_for_search(retrievals, top_k)
+        for datasets in dataset_groups:
+            futures.append(
+                executor.submit(
+                    tenant_id,
+                    self._group_retriever,
+                    flask_app=current_app._get_current_object(),  # type: ignore
+                    datasets=datasets,
+                    query=query,
+                    all_documents=all_documents,
+                )
+            )
+        for dataset, document_ids_filter in retrievals:
+            futures.append(
+                executor.submit(
+                    tenant_id,
+                    self._retriever,
+                    flask_app=current_app._get_current_object(),  # type: ignore
+                    dataset=dataset,
+                    query=query,
+                    top_k=top_k,
+                    all_documents=all_documents,
+                    document_ids_filter=document_ids_filter,
+                    metadata_condition=metadata_condition,
+                )
             )
-            threads.append(retrieval_thread)
-            retrieval_thread.start()
-        for thread in threads:
-            thread.join()
+        concurrent.futures.wait(futures)
+        for future in futures:
+            if future.exception():
+                logging.error("Failed to retrieve dataset", exc_info=future.exception())
 
         with measure_time() as timer:
             if reranking_enable:
@@ -502,6 +527,117 @@ class DatasetRetrieval:
 
         return all_documents
 
+    def _prefetch_query_embeddings(self, tenant_id: str, available_datasets: list, query: str) -> None:
+        """
+        Embed the query once per embedding model before the per-dataset retrieval threads start,
+        so that each of them resolves the query vector from the in-process embedding cache.
+        """
+        embedding_models = {
+            (dataset.embedding_model_provider, dataset.embedding_model)
+            for dataset in available_datasets
+            if dataset.provider != "external"
+            and dataset.indexing_technique == "high_quality"
+            and RetrievalMethod.is_support_semantic_search(
+                (dataset.retrieval_model or default_retrieval_model)["search_method"]
+            )
+        }
+        if len(embedding_models) == len(available_datasets):
+            # every dataset uses its own embedding model, nothing to share
+            return
+        model_manager = ModelManager()
+        for provider, model in embedding_models:
+            try:
+                embedding_model = model_manager.get_model_instance(
+                    tenant_id=tenant_id,
+                    provider=provider,
+                    model_type=ModelType.TEXT_EMBEDDING,
+                    model=model,
+                )
+                CacheEmbedding(embedding_model).embed_queries([query])
+            except Exception:
+                # retrieval threads embed the query themselves and surface the error there
+                logging.warning(f"Failed to prefetch query embedding for {provider}/{model}", exc_info=True)
+
+    def _group_datasets_for_search(
+        self, retrievals: list[tuple[Dataset, Optional[list[str]]]], top_k: int
+    ) -> tuple[list[list[Dataset]], list[tuple[Dataset, Optional[list[str]]]]]:
+        """
+        Group the datasets sharing the embedding model, the vector collection and the search settings,
+        each group is searched with one query instead of one per dataset.
+        :return: groups of datasets and the retrievals left to the per dataset search
+        """
+        if not dify_config.DATASET_GROUP_SEARCH_ENABLED or top_k <= 0:
+            return [], retrievals
+
+        groups: dict[tuple, list[Dataset]] = defaultdict(list)
+        for dataset, document_ids_filter in retrievals:
+            if document_ids_filter is None:
+                group_key = self._get_group_search_key(dataset)
+                if group_key is not None:
+                    groups[group_key].append(dataset)
+
+        dataset_groups = [datasets for datasets in groups.values() if len(datasets) > 1]
+        grouped_dataset_ids = {dataset.id for datasets in dataset_groups for dataset in datasets}
+        return dataset_groups, [retrieval for retrieval in retrievals if retrieval[0].id not in grouped_dataset_ids]
+
+    @staticmethod
+    def _get_group_search_key(dataset: Dataset) -> Optional[tuple]:
+        if dataset.provider == "external" or dataset.indexing_technique != "high_quality":
+            return None
+        # only datasets bound to a shared collection can be searched together
+        index_struct_dict = dataset.index_struct_dict
+        if not dataset.collection_binding_id or not index_struct_dict:
+            return None
+
+        retrieval_model = dataset.retrieval_model or default_retrieval_model
+        if retrieval_model.get("search_method") != RetrievalMethod.SEMANTIC_SEARCH.value:
+            return None
+        reranking_model = retrieval_model.get("reranking_model") if retrieval_model.get("reranking_enable") else None
+        if (
+            reranking_model
+            and reranking_model.get("reranking_model_name")
+            and reranking_model.get("reranking_provider_name")
+        ):
+            # the documents of these datasets are reranked per dataset
+            return None
+
+        vector_type = index_struct_dict["type"]
+        try:
+            if not Vector.get_vector_factory(vector_type).supports_group_search:
+                return None
+        except ValueError:
+            return None
+
+        top_k = retrieval_model.get("top_k") or 2
+        score_threshold = (
+            retrieval_model.get("score_threshold", 0.0) if retrieval_model.get("score_threshold_enabled") else 0.0
+        )
+        return (
+            vector_type,
+            dataset.collection_binding_id,
+            dataset.embedding_model_provider,
+            dataset.embedding_model,
+            top_k,
+            score_threshold,
+        )
+
+    def _group_retriever(self, flask_app: Flask, datasets: list[Dataset], query: str, all_documents: list):
+        with flask_app.app_context():
+            # attach the caller's datasets to this thread's session without reloading them
+            datasets = [db.session.merge(dataset, load=False) for dataset in datasets]
+            retrieval_model = datasets[0].retrieval_model or default_retrieval_model
+
+            documents = RetrievalService.embedding_search_in_groups(
+                datasets=datasets,
+                query=query,
+                top_k=retrieval_model.get("top_k") or 2,
+                score_threshold=retrieval_model.get("score_threshold", 0.0)
+                if retrieval_model.get("score_threshold_enabled")
+                else 0.0,
+            )
+            for dataset in datasets:
+                all_documents.extend(documents.get(dataset.id, []))
+
     def _on_retrieval_end(
         self, documents: list[Document], message_id: Optional[str] = None, timer: Optional[dict] = None
     ) -> None:
@@ -575,7 +711,7 @@ class DatasetRetrieval:
     def _retriever(
         self,
         flask_app: Flask,
-        dataset_id: str,
+        dataset: Dataset,
         query: str,
         top_k: int,
         all_documents: list,
@@ -583,10 +719,9 @@ class DatasetRetrieval:
         metadata_condition: Optional[MetadataCondition] = None,
     ):
         with flask_app.app_context():
-            dataset = db.session.query(Dataset).filter(Dataset.id == dataset_id).first()
-
-            if not dataset:
-                return []
+            # attach the caller's dataset to this thread's session without reloading it
+            dataset = db.session.merge(dataset, load=False)
+            dataset_id = dataset.id
 
             if dataset.provider == "external":
                 external_documents = ExternalDatasetService.fetch_external_knowledge_retrieval(
@@ -620,6 +755,7 @@ class DatasetRetrieval:
                         query=query,
                         top_k=top_k,
                         document_ids_filter=document_ids_filter,
+                        dataset=dataset,
                     )
                     if documents:
                         all_documents.extend(documents)
@@ -640,6 +776,7 @@ class DatasetRetrieval:
                             reranking_mode=retrieval_model.get("reranking_mode") or "reranking_model",
                             weights=retrieval_model.get("weights", None),
                             document_ids_filter=document_ids_filter,
+                            dataset=dataset,
                         )
 
                         all_documents.extend(documents)
@@ -743,7 +880,7 @@ class DatasetRetrieval:
 
         :return:
         """
-        keyword_table_handler = JiebaKeywordTableHandler()
+        keyword_table_handler = JiebaKeywordTableHandler.get_instance()
         query_keywords = keyword_table_handler.extract_keywords(query, None)
         documents_keywords = []
         for document in documents:
@@ -4,8 +4,8 @@ from __future__ import annotations
 
 from typing import Any, Optional
 
+from core.helper.token_counter import TokenCounter
 from core.model_manager import ModelInstance
-from core.model_runtime.model_providers.__base.tokenizers.gpt2_tokenzier import GPT2Tokenizer
 from core.rag.splitter.text_splitter import (
     TS,
     Collection,
@@ -30,14 +30,10 @@ class EnhanceRecursiveCharacterTextSplitter(RecursiveCharacterTextSplitter):
         disallowed_special: Union[Literal["all"], Collection[str]] = "all",  # noqa: UP037
         **kwargs: Any,
     ):
-        def _token_encoder(texts: list[str]) -> list[int]:
-            if not texts:
-                return []
+        token_counter = TokenCounter(embedding_model_instance)
 
-            if embedding_model_instance:
-                return embedding_model_instance.get_text_embedding_num_tokens(texts=texts)
-            else:
-                return [GPT2Tokenizer.get_num_tokens(text) for text in texts]
+        def _token_encoder(texts: list[str]) -> list[int]:
+            return token_counter.count_many(texts)
 
         if issubclass(cls, TokenTextSplitter):
             extra_kwargs = {
@@ -1,6 +1,9 @@
 from collections.abc import Sequence
+from typing import Any, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
+
+from core.workflow.entities.variable_pool import CompiledSelector, compile_node_data_selector
 
 
 class VariableSelector(BaseModel):
@@ -10,3 +13,12 @@ class VariableSelector(BaseModel):
 
     variable: str
     value_selector: Sequence[str]
+
+    _compiled_value_selector: Optional[CompiledSelector] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._compiled_value_selector = compile_node_data_selector(self.value_selector)
+
+    @property
+    def compiled_value_selector(self) -> Sequence[str] | CompiledSelector:
+        return self._compiled_value_selector or self.value_selector
@@ -1,13 +1,16 @@
 import re
+import weakref
 from collections import defaultdict
 from collections.abc import Mapping, Sequence
-from typing import Any, Union
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional, Union, cast
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from core.file import File, FileAttribute, file_manager
 from core.variables import Segment, SegmentGroup, Variable
-from core.variables.segments import FileSegment, NoneSegment
+from core.variables.segments import FileSegment, NoneSegment, StringSegment
 from factories import variable_factory
 
 from ..constants import CONVERSATION_VARIABLE_NODE_ID, ENVIRONMENT_VARIABLE_NODE_ID, SYSTEM_VARIABLE_NODE_ID
@@ -17,6 +20,28 @@ VariableValue = Union[str, int, float, dict, list, File]
 
 VARIABLE_PATTERN = re.compile(r"\{\{#([a-zA-Z0-9_]{1,50}(?:\.[a-zA-Z_][a-zA-Z0-9_]{0,29}){1,10})#\}\}")
 
+# maximum number of parsed templates kept in the process-wide template cache
+TEMPLATE_CACHE_SIZE = 4096
+
+# Python support `attr in FileAttribute` after 3.12
+_FILE_ATTRIBUTES: Mapping[str, FileAttribute] = {item.value: item for item in FileAttribute}
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledSelector:
+    """
+    A selector resolved to its variable pool keys once, see `VariablePool.compile_selector`.
+    Nodes that look up the same selector many times (e.g. in iterations) should keep and reuse it.
+    """
+
+    selector: tuple[str, ...]
+    node_id: str
+    hash_key: int
+    # set when the last element of the selector is a file attribute,
+    # the attribute is read from the file variable of the parent selector if the selector itself is missing
+    file_attr: Optional[FileAttribute] = None
+    parent_hash_key: Optional[int] = None
+
 
 class VariablePool(BaseModel):
     # Variable dictionary is a dictionary for looking up variables by their selector.
@@ -43,6 +68,14 @@ class VariablePool(BaseModel):
         default_factory=list,
     )
 
+    # set on overlays, see `create_overlay`
+    _parent: Optional["VariablePool"] = PrivateAttr(default=None)
+    # keys and nodes removed from an overlay, they must not be read through to the parent
+    _removed_keys: set[tuple[str, int]] = PrivateAttr(default_factory=set)
+    _removed_nodes: set[str] = PrivateAttr(default_factory=set)
+    # overlays created from this pool, they keep the values this pool had when they were created
+    _overlays: Optional[list["weakref.ref[VariablePool]"]] = PrivateAttr(default=None)
+
     def __init__(
         self,
         *,
@@ -74,7 +107,65 @@ class VariablePool(BaseModel):
         for var in self.conversation_variables:
             self.add((CONVERSATION_VARIABLE_NODE_ID, var.name), var)
 
-    def add(self, selector: Sequence[str], value: Any, /) -> None:
+    def create_overlay(self) -> "VariablePool":
+        """
+        Create a copy-on-write child of the variable pool. The child reads through to this pool
+        and only keeps its own writes and removals, so nothing is copied when it is created.
+
+        The child sees this pool as it was when the child was created, like a copy would: before a variable
+        of this pool is replaced or removed, its previous value is copied into the children reading it through.
+        The variables of this pool must not be modified in place while the child is used,
+        variables are replaced with `add` instead.
+
+        Returns:
+            VariablePool: The child variable pool.
+        """
+        overlay = VariablePool.model_construct(
+            variable_dictionary=defaultdict(dict),
+            user_inputs=self.user_inputs,
+            system_variables=self.system_variables,
+            environment_variables=self.environment_variables,
+            conversation_variables=self.conversation_variables,
+        )
+        overlay._parent = self
+        if self._overlays is None:
+            self._overlays = []
+        else:
+            self._overlays = [ref for ref in self._overlays if ref() is not None]
+        self._overlays.append(weakref.ref(overlay))
+        return overlay
+
+    @staticmethod
+    def compile_selector(selector: Sequence[str], /) -> CompiledSelector:
+        """
+        Resolve a selector to its variable pool keys, so repeated `add` and `get` calls
+        don't have to slice and hash the selector again.
+
+        Args:
+            selector (Sequence[str]): The selector for the variable.
+
+        Raises:
+            ValueError: If the selector is invalid.
+
+        Returns:
+            CompiledSelector: The compiled selector.
+        """
+        if isinstance(selector, CompiledSelector):
+            return selector
+        if len(selector) < 2:
+            raise ValueError("Invalid selector")
+
+        selector = tuple(selector)
+        file_attr = _FILE_ATTRIBUTES.get(selector[-1]) if len(selector) > 2 else None
+        return CompiledSelector(
+            selector=selector,
+            node_id=selector[0],
+            hash_key=hash(selector[1:]),
+            file_attr=file_attr,
+            parent_hash_key=hash(selector[1:-1]) if file_attr is not None else None,
+        )
+
+    def add(self, selector: Sequence[str] | CompiledSelector, value: Any, /) -> None:
         """
         Adds a variable to the variable pool.
 
@@ -82,7 +173,7 @@ class VariablePool(BaseModel):
         even if it is allowed now.
 
         Args:
-            selector (Sequence[str]): The selector for the variable.
+            selector (Sequence[str] | CompiledSelector): The selector for the variable.
             value (VariableValue): The value of the variable.
 
         Raises:
@@ -91,26 +182,34 @@ class VariablePool(BaseModel):
         Returns:
             None
         """
-        if len(selector) < 2:
+        if isinstance(selector, CompiledSelector):
+            node_id, hash_key, selector = selector.node_id, selector.hash_key, selector.selector
+        elif len(selector) < 2:
             raise ValueError("Invalid selector")
+        else:
+            node_id, hash_key = selector[0], hash(tuple(selector[1:]))
 
         if isinstance(value, Variable):
+            # already wrapped, e.g. environment and conversation variables
             variable = value
-        if isinstance(value, Segment):
+        elif isinstance(value, Segment):
             variable = variable_factory.segment_to_variable(segment=value, selector=selector)
         else:
             segment = variable_factory.build_segment(value)
             variable = variable_factory.segment_to_variable(segment=segment, selector=selector)
 
-        hash_key = hash(tuple(selector[1:]))
-        self.variable_dictionary[selector[0]][hash_key] = variable
+        if self._overlays:
+            self._preserve_in_overlays(node_id, hash_key)
+        self.variable_dictionary[node_id][hash_key] = variable
+        if self._removed_keys:
+            self._removed_keys.discard((node_id, hash_key))
 
-    def get(self, selector: Sequence[str], /) -> Segment | None:
+    def get(self, selector: Sequence[str] | CompiledSelector, /) -> Segment | None:
         """
         Retrieves the value from the variable pool based on the given selector.
 
         Args:
-            selector (Sequence[str]): The selector used to identify the variable.
+            selector (Sequence[str] | CompiledSelector): The selector used to identify the variable.
 
         Returns:
             Any: The value associated with the given selector.
@@ -118,58 +217,171 @@ class VariablePool(BaseModel):
         Raises:
             ValueError: If the selector is invalid.
         """
-        if len(selector) < 2:
+        if isinstance(selector, CompiledSelector):
+            compiled_selector = selector
+        elif len(selector) < 2:
             return None
+        else:
+            compiled_selector = self.compile_selector(selector)
 
-        hash_key = hash(tuple(selector[1:]))
-        value = self.variable_dictionary[selector[0]].get(hash_key)
-
-        if value is None:
-            selector, attr = selector[:-1], selector[-1]
-            # Python support `attr in FileAttribute` after 3.12
-            if attr not in {item.value for item in FileAttribute}:
-                return None
-            value = self.get(selector)
-            if not isinstance(value, FileSegment | NoneSegment):
-                return None
-            if isinstance(value, FileSegment):
-                attr = FileAttribute(attr)
-                attr_value = file_manager.get_attr(file=value.value, attr=attr)
-                return variable_factory.build_segment(attr_value)
+        value = self._get_variable(compiled_selector.node_id, compiled_selector.hash_key)
+        if value is not None or compiled_selector.parent_hash_key is None:
             return value
 
-        return value
+        value = self._get_variable(compiled_selector.node_id, compiled_selector.parent_hash_key)
+        if isinstance(value, FileSegment):
+            attr_value = file_manager.get_attr(file=value.value, attr=cast(FileAttribute, compiled_selector.file_attr))
+            return variable_factory.build_segment(attr_value)
+        if isinstance(value, NoneSegment):
+            return value
+        return None
 
-    def remove(self, selector: Sequence[str], /):
+    def remove(self, selector: Sequence[str] | CompiledSelector, /):
         """
         Remove variables from the variable pool based on the given selector.
 
         Args:
-            selector (Sequence[str]): A sequence of strings representing the selector.
+            selector (Sequence[str] | CompiledSelector): A sequence of strings representing the selector.
 
         Returns:
             None
         """
-        if not selector:
+        if isinstance(selector, CompiledSelector):
+            node_id, hash_key = selector.node_id, selector.hash_key
+        elif not selector:
             return
-        if len(selector) == 1:
+        elif len(selector) == 1:
+            if self._overlays:
+                self._preserve_node_in_overlays(selector[0])
             self.variable_dictionary[selector[0]] = {}
+            if self._parent is not None:
+                self._removed_nodes.add(selector[0])
             return
-        hash_key = hash(tuple(selector[1:]))
-        self.variable_dictionary[selector[0]].pop(hash_key, None)
+        else:
+            node_id, hash_key = selector[0], hash(tuple(selector[1:]))
+
+        if self._overlays:
+            self._preserve_in_overlays(node_id, hash_key)
+        self.variable_dictionary[node_id].pop(hash_key, None)
+        if self._parent is not None:
+            self._removed_keys.add((node_id, hash_key))
+
+    def _get_live_overlays(self) -> list["VariablePool"]:
+        overlays = [overlay for overlay in (ref() for ref in self._overlays or ()) if overlay is not None]
+        if self._overlays is not None and len(overlays) < len(self._overlays):
+            self._overlays = [weakref.ref(overlay) for overlay in overlays]
+        return overlays
+
+    def _preserve_in_overlays(self, node_id: str, hash_key: int, /) -> None:
+        """
+        Copy the current value of a variable about to be replaced or removed into the overlays reading it through,
+        a variable that doesn't exist yet is marked as removed in them
+        """
+        value = self._get_variable(node_id, hash_key)
+        for overlay in self._get_live_overlays():
+            if (
+                node_id in overlay._removed_nodes
+                or (node_id, hash_key) in overlay._removed_keys
+                or hash_key in overlay.variable_dictionary.get(node_id, ())
+            ):
+                continue
+            if value is None:
+                overlay._removed_keys.add((node_id, hash_key))
+            else:
+                overlay.variable_dictionary[node_id][hash_key] = value
+
+    def _preserve_node_in_overlays(self, node_id: str, /) -> None:
+        hash_keys: set[int] = set()
+        pool: Optional[VariablePool] = self
+        while pool is not None:
+            hash_keys.update(pool.variable_dictionary.get(node_id, ()))
+            if node_id in pool._removed_nodes:
+                break
+            pool = pool._parent
+        for hash_key in hash_keys:
+            self._preserve_in_overlays(node_id, hash_key)
+
+    def _get_variable(self, node_id: str, hash_key: int, /) -> Segment | None:
+        pool = self
+        while True:
+            variables = pool.variable_dictionary.get(node_id)
+            if variables:
+                value = variables.get(hash_key)
+                if value is not None:
+                    return value
+            if pool._parent is None or node_id in pool._removed_nodes or (node_id, hash_key) in pool._removed_keys:
+                return None
+            pool = pool._parent
+
+    def convert_template(self, template: str, /, *, cache: bool = True):
+        """
+        Convert the template to a segment group.
 
-    def convert_template(self, template: str, /):
-        parts = VARIABLE_PATTERN.split(template)
+        Pass `cache=False` for templates that embed per-request text (e.g. the
+        retrieved context), they would never hit the parse cache and only evict
+        the reusable entries.
+        """
         segments = []
-        for part in filter(lambda x: x, parts):
-            if "." in part and (variable := self.get(part.split("."))):
+        for part in _get_template_parts(template, cache=cache):
+            if part.selector is not None and (variable := self.get(part.selector)):
                 segments.append(variable)
             else:
-                segments.append(variable_factory.build_segment(part))
+                segments.append(part.segment)
         return SegmentGroup(value=segments)
 
+    def render_template(self, template: str, /, *, cache: bool = True) -> str:
+        """
+        Render the template to text, same as `convert_template(template).text`
+        but without building the segment group.
+        """
+        texts = []
+        for part in _get_template_parts(template, cache=cache):
+            if part.selector is not None and (variable := self.get(part.selector)):
+                texts.append(variable.text)
+            else:
+                texts.append(part.text)
+        return "".join(texts)
+
     def get_file(self, selector: Sequence[str], /) -> FileSegment | None:
         segment = self.get(selector)
         if isinstance(segment, FileSegment):
             return segment
         return None
+
+
+def compile_node_data_selector(selector: Optional[Sequence[str]], /) -> Optional[CompiledSelector]:
+    """
+    Compile a selector of the node data when the node is built.
+    Returns None if the selector is not set or invalid, the lookups then use the raw selector.
+    """
+    if not selector or len(selector) < 2:
+        return None
+    return VariablePool.compile_selector(selector)
+
+
+@dataclass(frozen=True, slots=True)
+class _TemplatePart:
+    text: str
+    # prebuilt segment used when the part is a literal, segments are immutable so it's shared between renders
+    segment: StringSegment
+    # set when the part may reference a variable
+    selector: Optional[CompiledSelector] = None
+
+
+def _split_template(template: str) -> tuple[_TemplatePart, ...]:
+    """Split the template into literal and variable parts."""
+    parts = []
+    for part in VARIABLE_PATTERN.split(template):
+        if not part:
+            continue
+        selector = VariablePool.compile_selector(part.split(".")) if "." in part else None
+        parts.append(_TemplatePart(text=part, segment=StringSegment(value=part), selector=selector))
+    return tuple(parts)
+
+
+# parse once per template string, only for templates that are reused between runs
+_parse_template = lru_cache(maxsize=TEMPLATE_CACHE_SIZE)(_split_template)
+
+
+def _get_template_parts(template: str, *, cache: bool) -> tuple[_TemplatePart, ...]:
+    return _parse_template(template) if cache else _split_template(template)
@@ -0,0 +1,249 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from configs import dify_config
+
+logger = logging.getLogger(__name__)
+
+
+class WorkflowSchedulerBusyError(Exception):
+    """Raised when a workflow task cannot be queued before the queue timeout."""
+
+
+@dataclass
+class _TaskGroup:
+    """Tasks of one graph engine run or one parallel iteration, limited to `max_workers` concurrent tasks."""
+
+    group_id: str
+    tenant_id: str
+    max_workers: int
+    queue: deque["_WorkflowTask"] = field(default_factory=deque)
+    # tasks submitted from workers waiting for a slot of this group, they don't wait for the pool or tenant limits
+    nested_queue: deque["_WorkflowTask"] = field(default_factory=deque)
+    active_count: int = 0
+
+
+@dataclass
+class _WorkflowTask:
+    group: _TaskGroup
+    fn: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    future: Future = field(default_factory=Future)
+    # groups of the task and of the tasks waiting for it, outermost first
+    scope: tuple[_TaskGroup, ...] = ()
+
+
+class WorkflowScheduler:
+    """
+    Process-wide bounded thread pool running parallel branches and parallel iterations of all workflow runs.
+
+    Every graph engine run and parallel iteration submits its tasks to a task group with its own concurrency
+    limit. Workers pick queued tasks round-robin across tenants and across the groups of a tenant, skipping
+    groups and tenants at their limit, so a single large run cannot starve the others.
+
+    Tasks submitted from a worker (nested parallels, iterations inside a parallel branch) are children of a
+    task that already holds a slot and waits for them, so they don't wait in the queue. They start on a worker
+    when their group (unless the submitting task belongs to or waits for it, its slots may be held by the tasks
+    waiting for this one), the pool and the tenant are below their limits. When only the pool or the tenant is
+    at its limit they run inline on the waiting worker, and when only their group is, they wait for a task of
+    the group to finish and take its slot. At most `max_workers` threads run tasks, and workers waiting for
+    their children can't deadlock the pool. Other callers block while `max_queued_tasks` tasks are waiting and
+    get WorkflowSchedulerBusyError after `queue_timeout`.
+    """
+
+    _instance: Optional["WorkflowScheduler"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_workers: int, max_workers_per_tenant: int, max_queued_tasks: int, queue_timeout: float):
+        self._max_workers = max_workers
+        self._max_workers_per_tenant = max_workers_per_tenant
+        self._max_queued_tasks = max_queued_tasks
+        self._queue_timeout = queue_timeout
+
+        self._condition = threading.Condition()
+        # tenant id -> group id -> group with queued tasks, both in round-robin order
+        self._queued_groups: OrderedDict[str, OrderedDict[str, _TaskGroup]] = OrderedDict()
+        # tasks already counted as active, waiting for a worker to pick them up
+        self._ready_tasks: deque[_WorkflowTask] = deque()
+        self._tenant_active: dict[str, int] = {}
+        self._workers: list[threading.Thread] = []
+        self._idle_workers = 0
+        self._queued_count = 0
+        self._active_count = 0
+        self._worker_local = threading.local()
+
+    @classmethod
+    def get_instance(cls) -> "WorkflowScheduler":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(
+                        max_workers=dify_config.WORKFLOW_SCHEDULER_MAX_WORKERS,
+                        max_workers_per_tenant=dify_config.WORKFLOW_SCHEDULER_MAX_WORKERS_PER_TENANT,
+                        max_queued_tasks=dify_config.WORKFLOW_SCHEDULER_MAX_QUEUED_TASKS,
+                        queue_timeout=dify_config.WORKFLOW_SCHEDULER_QUEUE_TIMEOUT,
+                    )
+        return cls._instance
+
+    def create_group(self, group_id: str, tenant_id: str, max_workers: int) -> "WorkflowTaskGroup":
+        return WorkflowTaskGroup(
+            scheduler=self,
+            group=_TaskGroup(group_id=group_id, tenant_id=tenant_id, max_workers=max_workers),
+        )
+
+    def submit(self, group: _TaskGroup, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        task = _WorkflowTask(group=group, fn=fn, args=args, kwargs=kwargs)
+        if getattr(self._worker_local, "is_worker", False):
+            scope: tuple[_TaskGroup, ...] = self._worker_local.scope
+            task.scope = (*scope, group)
+            with self._condition:
+                if group.active_count >= group.max_workers and not any(parent is group for parent in scope):
+                    group.nested_queue.append(task)
+                    return task.future
+                run_inline = (
+                    self._active_count >= self._max_workers
+                    or self._tenant_active.get(group.tenant_id, 0) >= self._max_workers_per_tenant
+                )
+                if not run_inline:
+                    self._mark_active(task)
+                    self._dispatch(task)
+            if run_inline:
+                # the pool or the tenant is at its limit, the submitting task waits for this one anyway
+                self._run_task(task)
+                self._worker_local.scope = scope
+            return task.future
+
+        task.scope = (group,)
+
+        with self._condition:
+            deadline = time.monotonic() + self._queue_timeout
+            while self._queued_count >= self._max_queued_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WorkflowSchedulerBusyError(
+                        f"Workflow task queue is full ({self._queued_count} tasks waiting), please try again later."
+                    )
+                self._condition.wait(remaining)
+
+            group.queue.append(task)
+            self._queued_groups.setdefault(group.tenant_id, OrderedDict())[group.group_id] = group
+            self._queued_count += 1
+            self._ensure_worker(self._queued_count + len(self._ready_tasks))
+            self._condition.notify_all()
+        return task.future
+
+    def _mark_active(self, task: _WorkflowTask) -> None:
+        group = task.group
+        group.active_count += 1
+        self._tenant_active[group.tenant_id] = self._tenant_active.get(group.tenant_id, 0) + 1
+        self._active_count += 1
+
+    def _dispatch(self, task: _WorkflowTask) -> None:
+        """
+        Hand a task already counted as active to an idle or a new worker, there is one since at most
+        `max_workers` tasks are active and tasks run inline don't hold a worker of their own
+        """
+        self._ready_tasks.append(task)
+        self._ensure_worker(len(self._ready_tasks))
+        self._condition.notify_all()
+
+    def _ensure_worker(self, pending_count: int) -> None:
+        if pending_count > self._idle_workers and len(self._workers) < self._max_workers:
+            worker = threading.Thread(
+                target=self._worker_loop, name=f"workflow-worker-{len(self._workers)}", daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_task(self) -> Optional[_WorkflowTask]:
+        if self._ready_tasks:
+            return self._ready_tasks.popleft()
+        if self._active_count >= self._max_workers:
+            return None
+
+        for tenant_id in list(self._queued_groups):
+            if self._tenant_active.get(tenant_id, 0) >= self._max_workers_per_tenant:
+                continue
+            groups = self._queued_groups[tenant_id]
+            for group_id in list(groups):
+                group = groups[group_id]
+                if group.active_count >= group.max_workers:
+                    continue
+                task = group.queue.popleft()
+                self._queued_count -= 1
+                # move the picked group and tenant to the end so the next pick starts with the others
+                del groups[group_id]
+                if group.queue:
+                    groups[group_id] = group
+                del self._queued_groups[tenant_id]
+                if groups:
+                    self._queued_groups[tenant_id] = groups
+                self._mark_active(task)
+                return task
+        return None
+
+    def _worker_loop(self) -> None:
+        self._worker_local.is_worker = True
+        while True:
+            with self._condition:
+                task = self._next_task()
+                while task is None:
+                    self._idle_workers += 1
+                    self._condition.wait()
+                    self._idle_workers -= 1
+                    task = self._next_task()
+                # a queue slot was freed for blocked submitters
+                self._condition.notify_all()
+
+            self._run_task(task)
+            self._finish_task(task)
+
+    def _finish_task(self, task: _WorkflowTask) -> None:
+        with self._condition:
+            group = task.group
+            group.active_count -= 1
+            self._tenant_active[group.tenant_id] -= 1
+            if not self._tenant_active[group.tenant_id]:
+                del self._tenant_active[group.tenant_id]
+            self._active_count -= 1
+            if group.nested_queue and group.active_count < group.max_workers:
+                # takes over the pool and tenant slots just released by the finished task of the same group
+                nested_task = group.nested_queue.popleft()
+                self._mark_active(nested_task)
+                self._dispatch(nested_task)
+            # the group, the tenant and the pool may be below their limits again
+            self._condition.notify_all()
+
+    def _run_task(self, task: _WorkflowTask) -> None:
+        self._worker_local.scope = task.scope
+        if not task.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = task.fn(*task.args, **task.kwargs)
+        except BaseException as e:
+            logger.debug("Workflow task failed", exc_info=True)
+            task.future.set_exception(e)
+        else:
+            task.future.set_result(result)
+
+
+class WorkflowTaskGroup:
+    """Handle to submit tasks of one graph engine run or parallel iteration to the WorkflowScheduler."""
+
+    def __init__(self, scheduler: WorkflowScheduler, group: _TaskGroup):
+        self._scheduler = scheduler
+        self._group = group
+
+    @property
+    def group_id(self) -> str:
+        return self._group.group_id
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        return self._scheduler.submit(self._group, fn, *args, **kwargs)
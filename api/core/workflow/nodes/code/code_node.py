@@ -49,7 +49,7 @@ class CodeNode(BaseNode[CodeNodeData]):
         variables = {}
         for variable_selector in self.node_data.variables:
             variable_name = variable_selector.variable
-            variable = self.graph_runtime_state.variable_pool.get(variable_selector.value_selector)
+            variable = self.graph_runtime_state.variable_pool.get(variable_selector.compiled_value_selector)
             if isinstance(variable, ArrayFileSegment):
                 variables[variable_name] = [v.to_dict() for v in variable.value] if variable.value else None
             else:
@@ -60,6 +60,7 @@ class CodeNode(BaseNode[CodeNodeData]):
                 language=code_language,
                 code=code,
                 inputs=variables,
+                tenant_id=self.tenant_id,
             )
 
             # Transform result
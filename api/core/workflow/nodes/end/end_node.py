@@ -18,7 +18,7 @@ class EndNode(BaseNode[EndNodeData]):
 
         outputs = {}
         for variable_selector in output_variables:
-            variable = self.graph_runtime_state.variable_pool.get(variable_selector.value_selector)
+            variable = self.graph_runtime_state.variable_pool.get(variable_selector.compiled_value_selector)
             value = variable.to_object() if variable is not None else None
             outputs[variable_selector.variable] = value
 
@@ -79,9 +79,9 @@ class Executor:
         if node_data.authorization.type == "api-key":
             if node_data.authorization.config is None:
                 raise AuthorizationConfigError("authorization config is required")
-            node_data.authorization.config.api_key = variable_pool.convert_template(
+            node_data.authorization.config.api_key = variable_pool.render_template(
                 node_data.authorization.config.api_key
-            ).text
+            )
 
         self.url: str = node_data.url
         self.method = node_data.method
@@ -107,7 +107,7 @@ class Executor:
         self._init_body()
 
     def _init_url(self):
-        self.url = self.variable_pool.convert_template(self.node_data.url).text
+        self.url = self.variable_pool.render_template(self.node_data.url)
 
         # check if url is a valid URL
         if not self.url:
@@ -131,9 +131,7 @@ class Executor:
                 continue
 
             value_str = value[0].strip() if value else ""
-            result.append(
-                (self.variable_pool.convert_template(key).text, self.variable_pool.convert_template(value_str).text)
-            )
+            result.append((self.variable_pool.render_template(key), self.variable_pool.render_template(value_str)))
 
         self.params = result
 
@@ -151,7 +149,7 @@ class Executor:
             'aa\n cc : dd'   -> {'aa': '', 'cc': 'dd'}
 
         """
-        headers = self.variable_pool.convert_template(self.node_data.headers).text
+        headers = self.variable_pool.render_template(self.node_data.headers)
         self.headers = {
             key.strip(): (value[0].strip() if value else "")
             for line in headers.splitlines()
@@ -169,11 +167,11 @@ class Executor:
                 case "raw-text":
                     if len(data) != 1:
                         raise RequestBodyError("raw-text body type should have exactly one item")
-                    self.content = self.variable_pool.convert_template(data[0].value).text
+                    self.content = self.variable_pool.render_template(data[0].value)
                 case "json":
                     if len(data) != 1:
                         raise RequestBodyError("json body type should have exactly one item")
-                    json_string = self.variable_pool.convert_template(data[0].value).text
+                    json_string = self.variable_pool.render_template(data[0].value)
                     try:
                         json_object = json.loads(json_string, strict=False)
                     except json.JSONDecodeError as e:
@@ -191,21 +189,17 @@ class Executor:
                     self.content = file_manager.download(file)
                 case "x-www-form-urlencoded":
                     form_data = {
-                        self.variable_pool.convert_template(item.key).text: self.variable_pool.convert_template(
-                            item.value
-                        ).text
+                        self.variable_pool.render_template(item.key): self.variable_pool.render_template(item.value)
                         for item in data
                     }
                     self.data = form_data
                 case "form-data":
                     form_data = {
-                        self.variable_pool.convert_template(item.key).text: self.variable_pool.convert_template(
-                            item.value
-                        ).text
+                        self.variable_pool.render_template(item.key): self.variable_pool.render_template(item.value)
                         for item in filter(lambda item: item.type == "text", data)
                     }
                     file_selectors = {
-                        self.variable_pool.convert_template(item.key).text: item.file
+                        self.variable_pool.render_template(item.key): item.file
                         for item in filter(lambda item: item.type == "file", data)
                     }
 
@@ -4,6 +4,7 @@ import uuid
 from collections.abc import Generator, Mapping, Sequence
 from concurrent.futures import Future, wait
 from datetime import UTC, datetime
+from functools import cached_property
 from queue import Empty, Queue
 from typing import TYPE_CHECKING, Any, Optional, cast
 
@@ -15,7 +16,7 @@ from core.workflow.entities.node_entities import (
     NodeRunMetadataKey,
     NodeRunResult,
 )
-from core.workflow.entities.variable_pool import VariablePool
+from core.workflow.entities.variable_pool import CompiledSelector, VariablePool
 from core.workflow.graph_engine.entities.event import (
     BaseGraphEvent,
     BaseNodeEvent,
@@ -33,6 +34,7 @@ from core.workflow.graph_engine.entities.event import (
     NodeRunSucceededEvent,
 )
 from core.workflow.graph_engine.entities.graph import Graph
+from core.workflow.graph_engine.workflow_scheduler import WorkflowScheduler
 from core.workflow.nodes.base import BaseNode
 from core.workflow.nodes.enums import NodeType
 from core.workflow.nodes.event import NodeEvent, RunCompletedEvent
@@ -61,6 +63,14 @@ class IterationNode(BaseNode[IterationNodeData]):
     _node_data_cls = IterationNodeData
     _node_type = NodeType.ITERATION
 
+    @cached_property
+    def _index_selector(self) -> CompiledSelector:
+        return VariablePool.compile_selector([self.node_id, "index"])
+
+    @cached_property
+    def _item_selector(self) -> CompiledSelector:
+        return VariablePool.compile_selector([self.node_id, "item"])
+
     @classmethod
     def get_default_config(cls, filters: Optional[dict] = None) -> dict:
         return {
@@ -116,11 +126,11 @@ class IterationNode(BaseNode[IterationNodeData]):
         variable_pool = self.graph_runtime_state.variable_pool
 
         # append iteration variable (item, index) to variable pool
-        variable_pool.add([self.node_id, "index"], 0)
-        variable_pool.add([self.node_id, "item"], iterator_list_value[0])
+        variable_pool.add(self._index_selector, 0)
+        variable_pool.add(self._item_selector, iterator_list_value[0])
 
         # init graph engine
-        from core.workflow.graph_engine.graph_engine import GraphEngine, GraphEngineThreadPool
+        from core.workflow.graph_engine.graph_engine import GraphEngine
 
         graph_engine = GraphEngine(
             tenant_id=self.tenant_id,
@@ -167,8 +177,8 @@ class IterationNode(BaseNode[IterationNodeData]):
             if self.node_data.is_parallel:
                 futures: list[Future] = []
                 q: Queue = Queue()
-                thread_pool = GraphEngineThreadPool(
-                    max_workers=self.node_data.parallel_nums, max_submit_count=dify_config.MAX_SUBMIT_COUNT
+                thread_pool = WorkflowScheduler.get_instance().create_group(
+                    group_id=str(uuid.uuid4()), tenant_id=self.tenant_id, max_workers=self.node_data.parallel_nums
                 )
                 for index, item in enumerate(iterator_list_value):
                     future: Future = thread_pool.submit(
@@ -186,7 +196,6 @@ class IterationNode(BaseNode[IterationNodeData]):
                         item=item,
                         iter_run_map=iter_run_map,
                     )
-                    future.add_done_callback(thread_pool.task_done_callback)
                     futures.append(future)
                 succeeded_count = 0
                 while True:
@@ -278,8 +287,8 @@ class IterationNode(BaseNode[IterationNodeData]):
             )
         finally:
             # remove iteration variable (item, index) from variable pool after iteration run completed
-            variable_pool.remove([self.node_id, "index"])
-            variable_pool.remove([self.node_id, "item"])
+            variable_pool.remove(self._index_selector)
+            variable_pool.remove(self._item_selector)
 
     @classmethod
     def _extract_variable_selector_to_variable_mapping(
@@ -397,7 +406,7 @@ class IterationNode(BaseNode[IterationNodeData]):
         try:
             rst = graph_engine.run()
             # get current iteration index
-            index_variable = variable_pool.get([self.node_id, "index"])
+            index_variable = variable_pool.get(self._index_selector)
             if not isinstance(index_variable, IntegerVariable):
                 raise IterationIndexNotFoundError(f"iteration {self.node_id} current index not found")
             current_index = index_variable.value
@@ -466,9 +475,9 @@ class IterationNode(BaseNode[IterationNodeData]):
                                 **metadata_event.model_dump(),
                             )
                             outputs[current_index] = None
-                            variable_pool.add([self.node_id, "index"], next_index)
+                            variable_pool.add(self._index_selector, next_index)
                             if next_index < len(iterator_list_value):
-                                variable_pool.add([self.node_id, "item"], iterator_list_value[next_index])
+                                variable_pool.add(self._item_selector, iterator_list_value[next_index])
                             duration = (datetime.now(UTC).replace(tzinfo=None) - iter_start_at).total_seconds()
                             iter_run_map[iteration_run_id] = duration
                             yield IterationRunNextEvent(
@@ -486,10 +495,10 @@ class IterationNode(BaseNode[IterationNodeData]):
                             yield NodeInIterationFailedEvent(
                                 **metadata_event.model_dump(),
                             )
-                            variable_pool.add([self.node_id, "index"], next_index)
+                            variable_pool.add(self._index_selector, next_index)
 
                             if next_index < len(iterator_list_value):
-                                variable_pool.add([self.node_id, "item"], iterator_list_value[next_index])
+                                variable_pool.add(self._item_selector, iterator_list_value[next_index])
                             duration = (datetime.now(UTC).replace(tzinfo=None) - iter_start_at).total_seconds()
                             iter_run_map[iteration_run_id] = duration
                             yield IterationRunNextEvent(
@@ -528,10 +537,10 @@ class IterationNode(BaseNode[IterationNodeData]):
                 variable_pool.remove([node_id])
 
             # move to next iteration
-            variable_pool.add([self.node_id, "index"], next_index)
+            variable_pool.add(self._index_selector, next_index)
 
             if next_index < len(iterator_list_value):
-                variable_pool.add([self.node_id, "item"], iterator_list_value[next_index])
+                variable_pool.add(self._item_selector, iterator_list_value[next_index])
             duration = (datetime.now(UTC).replace(tzinfo=None) - iter_start_at).total_seconds()
             iter_run_map[iteration_run_id] = duration
             yield IterationRunNextEvent(
@@ -591,8 +600,8 @@ class IterationNode(BaseNode[IterationNodeData]):
             parallel_mode_run_id = uuid.uuid4().hex
             graph_engine_copy = graph_engine.create_copy()
             variable_pool_copy = graph_engine_copy.graph_runtime_state.variable_pool
-            variable_pool_copy.add([self.node_id, "index"], index)
-            variable_pool_copy.add([self.node_id, "item"], item)
+            variable_pool_copy.add(self._index_selector, index)
+            variable_pool_copy.add(self._item_selector, item)
             for event in self._run_single_iter(
                 iterator_list_value=iterator_list_value,
                 variable_pool=variable_pool_copy,
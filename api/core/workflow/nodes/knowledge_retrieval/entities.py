@@ -1,8 +1,9 @@
 from collections.abc import Sequence
 from typing import Any, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
+from core.workflow.entities.variable_pool import CompiledSelector, compile_node_data_selector
 from core.workflow.nodes.base import BaseNodeData
 from core.workflow.nodes.llm.entities import VisionConfig
 
@@ -132,3 +133,12 @@ class KnowledgeRetrievalNodeData(BaseNodeData):
     metadata_model_config: Optional[ModelConfig] = None
     metadata_filtering_conditions: Optional[MetadataFilteringCondition] = None
     vision: VisionConfig = Field(default_factory=VisionConfig)
+
+    _compiled_query_variable_selector: Optional[CompiledSelector] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._compiled_query_variable_selector = compile_node_data_selector(self.query_variable_selector)
+
+    @property
+    def compiled_query_variable_selector(self) -> Sequence[str] | CompiledSelector:
+        return self._compiled_query_variable_selector or self.query_variable_selector
@@ -99,26 +99,27 @@ class ListOperatorNode(BaseNode[ListOperatorNodeData]):
             if isinstance(variable, ArrayStringSegment):
                 if not isinstance(condition.value, str):
                     raise InvalidFilterValueError(f"Invalid filter value: {condition.value}")
-                value = self.graph_runtime_state.variable_pool.convert_template(condition.value).text
+                value = self.graph_runtime_state.variable_pool.render_template(condition.value)
                 filter_func = _get_string_filter_func(condition=condition.comparison_operator, value=value)
                 result = list(filter(filter_func, variable.value))
                 variable = variable.model_copy(update={"value": result})
             elif isinstance(variable, ArrayNumberSegment):
                 if not isinstance(condition.value, str):
                     raise InvalidFilterValueError(f"Invalid filter value: {condition.value}")
-                value = self.graph_runtime_state.variable_pool.convert_template(condition.value).text
+                value = self.graph_runtime_state.variable_pool.render_template(condition.value)
                 filter_func = _get_number_filter_func(condition=condition.comparison_operator, value=float(value))
                 result = list(filter(filter_func, variable.value))
                 variable = variable.model_copy(update={"value": result})
             elif isinstance(variable, ArrayFileSegment):
+                file_value: str | Sequence[str]
                 if isinstance(condition.value, str):
-                    value = self.graph_runtime_state.variable_pool.convert_template(condition.value).text
+                    file_value = self.graph_runtime_state.variable_pool.render_template(condition.value)
                 else:
-                    value = condition.value
+                    file_value = condition.value
                 filter_func = _get_file_filter_func(
                     key=condition.key,
                     condition=condition.comparison_operator,
-                    value=value,
+                    value=file_value,
                 )
                 result = list(filter(filter_func, variable.value))
                 variable = variable.model_copy(update={"value": result})
@@ -149,7 +150,7 @@ class ListOperatorNode(BaseNode[ListOperatorNodeData]):
     def _extract_slice(
         self, variable: Union[ArrayFileSegment, ArrayNumberSegment, ArrayStringSegment]
     ) -> Union[ArrayFileSegment, ArrayNumberSegment, ArrayStringSegment]:
-        value = int(self.graph_runtime_state.variable_pool.convert_template(self.node_data.extract_by.serial).text) - 1
+        value = int(self.graph_runtime_state.variable_pool.render_template(self.node_data.extract_by.serial)) - 1
         if len(variable.value) > int(value):
             result = variable.value[value]
         else:
@@ -1,11 +1,12 @@
 from collections.abc import Sequence
 from typing import Any, Optional
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 
 from core.model_runtime.entities import ImagePromptMessageContent, LLMMode
 from core.prompt.entities.advanced_prompt_entities import ChatModelMessage, CompletionModelPromptTemplate, MemoryConfig
 from core.workflow.entities.variable_entities import VariableSelector
+from core.workflow.entities.variable_pool import CompiledSelector, compile_node_data_selector
 from core.workflow.nodes.base import BaseNodeData
 
 
@@ -20,11 +21,29 @@ class ContextConfig(BaseModel):
     enabled: bool
     variable_selector: Optional[list[str]] = None
 
+    _compiled_variable_selector: Optional[CompiledSelector] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._compiled_variable_selector = compile_node_data_selector(self.variable_selector)
+
+    @property
+    def compiled_variable_selector(self) -> Sequence[str] | CompiledSelector:
+        return self._compiled_variable_selector or self.variable_selector or []
+
 
 class VisionConfigOptions(BaseModel):
     variable_selector: Sequence[str] = Field(default_factory=lambda: ["sys", "files"])
     detail: ImagePromptMessageContent.DETAIL = ImagePromptMessageContent.DETAIL.HIGH
 
+    _compiled_variable_selector: Optional[CompiledSelector] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._compiled_variable_selector = compile_node_data_selector(self.variable_selector)
+
+    @property
+    def compiled_variable_selector(self) -> Sequence[str] | CompiledSelector:
+        return self._compiled_variable_selector or self.variable_selector
+
 
 class VisionConfig(BaseModel):
     enabled: bool = False
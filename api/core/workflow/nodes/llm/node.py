@@ -11,6 +11,7 @@ from core.entities.provider_entities import QuotaUnit
 from core.errors.error import ModelCurrentlyNotSupportError, ProviderTokenNotInitError, QuotaExceededError
 from core.file import FileType, file_manager
 from core.helper.code_executor import CodeExecutor, CodeLanguage
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
 from core.memory.token_buffer_memory import TokenBufferMemory
 from core.model_manager import ModelInstance, ModelManager
 from core.model_runtime.entities import (
@@ -45,7 +46,7 @@ from core.variables import (
 from core.workflow.constants import SYSTEM_VARIABLE_NODE_ID
 from core.workflow.entities.node_entities import NodeRunMetadataKey, NodeRunResult
 from core.workflow.entities.variable_entities import VariableSelector
-from core.workflow.entities.variable_pool import VariablePool
+from core.workflow.entities.variable_pool import CompiledSelector, VariablePool
 from core.workflow.enums import SystemVariableKey
 from core.workflow.graph_engine.entities.event import InNodeEvent
 from core.workflow.nodes.base import BaseNode
@@ -115,7 +116,7 @@ class LLMNode(BaseNode[LLMNodeData]):
 
             # fetch files
             files = (
-                self._fetch_files(selector=self.node_data.vision.configs.variable_selector)
+                self._fetch_files(selector=self.node_data.vision.configs.compiled_variable_selector)
                 if self.node_data.vision.enabled
                 else []
             )
@@ -319,7 +320,7 @@ class LLMNode(BaseNode[LLMNodeData]):
 
         for variable_selector in node_data.prompt_config.jinja2_variables or []:
             variable_name = variable_selector.variable
-            variable = self.graph_runtime_state.variable_pool.get(variable_selector.value_selector)
+            variable = self.graph_runtime_state.variable_pool.get(variable_selector.compiled_value_selector)
             if variable is None:
                 raise VariableNotFoundError(f"Variable {variable_selector.variable} not found")
 
@@ -369,7 +370,7 @@ class LLMNode(BaseNode[LLMNodeData]):
             variable_selectors = variable_template_parser.extract_variable_selectors()
 
         for variable_selector in variable_selectors:
-            variable = self.graph_runtime_state.variable_pool.get(variable_selector.value_selector)
+            variable = self.graph_runtime_state.variable_pool.get(variable_selector.compiled_value_selector)
             if variable is None:
                 raise VariableNotFoundError(f"Variable {variable_selector.variable} not found")
             if isinstance(variable, NoneSegment):
@@ -382,7 +383,7 @@ class LLMNode(BaseNode[LLMNodeData]):
                 template=memory.query_prompt_template
             ).extract_variable_selectors()
             for variable_selector in query_variable_selectors:
-                variable = self.graph_runtime_state.variable_pool.get(variable_selector.value_selector)
+                variable = self.graph_runtime_state.variable_pool.get(variable_selector.compiled_value_selector)
                 if variable is None:
                     raise VariableNotFoundError(f"Variable {variable_selector.variable} not found")
                 if isinstance(variable, NoneSegment):
@@ -391,7 +392,7 @@ class LLMNode(BaseNode[LLMNodeData]):
 
         return inputs
 
-    def _fetch_files(self, *, selector: Sequence[str]) -> Sequence["File"]:
+    def _fetch_files(self, *, selector: Sequence[str] | CompiledSelector) -> Sequence["File"]:
         variable = self.graph_runtime_state.variable_pool.get(selector)
         if variable is None:
             return []
@@ -410,7 +411,9 @@ class LLMNode(BaseNode[LLMNodeData]):
         if not node_data.context.variable_selector:
             return
 
-        context_value_variable = self.graph_runtime_state.variable_pool.get(node_data.context.variable_selector)
+        context_value_variable = self.graph_runtime_state.variable_pool.get(
+            node_data.context.compiled_variable_selector
+        )
         if context_value_variable:
             if isinstance(context_value_variable, StringSegment):
                 yield RunRetrieverResourceEvent(retriever_resources=[], context=context_value_variable.value)
@@ -758,20 +761,29 @@ class LLMNode(BaseNode[LLMNodeData]):
                 used_quota = 1
 
         if used_quota is not None and system_configuration.current_quota_type is not None:
-            db.session.query(Provider).filter(
-                Provider.tenant_id == tenant_id,
-                # TODO: Use provider name with prefix after the data migration.
-                Provider.provider_name == ModelProviderID(model_instance.provider).provider_name,
-                Provider.provider_type == ProviderType.SYSTEM.value,
-                Provider.quota_type == system_configuration.current_quota_type.value,
-                Provider.quota_limit > Provider.quota_used,
-            ).update(
-                {
-                    "quota_used": Provider.quota_used + used_quota,
-                    "last_used": datetime.now(tz=UTC).replace(tzinfo=None),
-                }
+            updated_count = (
+                db.session.query(Provider)
+                .filter(
+                    Provider.tenant_id == tenant_id,
+                    # TODO: Use provider name with prefix after the data migration.
+                    Provider.provider_name == ModelProviderID(model_instance.provider).provider_name,
+                    Provider.provider_type == ProviderType.SYSTEM.value,
+                    Provider.quota_type == system_configuration.current_quota_type.value,
+                    Provider.quota_limit > Provider.quota_used,
+                )
+                .update(
+                    {
+                        "quota_used": Provider.quota_used + used_quota,
+                        "last_used": datetime.now(tz=UTC).replace(tzinfo=None),
+                    }
+                )
             )
             db.session.commit()
+            if updated_count:
+                # the bulk update bypasses the session hooks, only the cached quota of this process is patched
+                ProviderConfigurationsCache.record_quota_usage(
+                    tenant_id, model_instance.provider, system_configuration.current_quota_type, used_quota
+                )
 
     @classmethod
     def _extract_variable_selector_to_variable_mapping(
@@ -887,11 +899,12 @@ class LLMNode(BaseNode[LLMNodeData]):
                 prompt_messages.append(prompt_message)
             else:
                 # Get segment group from basic message
-                if context:
+                if context and "{#context#}" in message.text:
                     template = message.text.replace("{#context#}", context)
+                    # the context differs per request, keep it out of the template parse cache
+                    segment_group = variable_pool.convert_template(template, cache=False)
                 else:
-                    template = message.text
-                segment_group = variable_pool.convert_template(template)
+                    segment_group = variable_pool.convert_template(message.text)
 
                 # Process segments for images
                 file_contents = []
@@ -949,7 +962,7 @@ def _render_jinja2_message(
 
     jinjia2_inputs = {}
     for jinja2_variable in jinjia2_variables:
-        variable = variable_pool.get(jinja2_variable.value_selector)
+        variable = variable_pool.get(jinja2_variable.compiled_value_selector)
         jinjia2_inputs[jinja2_variable.variable] = variable.to_object() if variable else ""
     code_execute_resp = CodeExecutor.execute_workflow_code_template(
         language=CodeLanguage.JINJA2,
@@ -1054,11 +1067,11 @@ def _handle_completion_template(
             variable_pool=variable_pool,
         )
     else:
-        if context:
-            template_text = template.text.replace("{#context#}", context)
+        if context and "{#context#}" in template.text:
+            # the context differs per request, keep it out of the template parse cache
+            result_text = variable_pool.render_template(template.text.replace("{#context#}", context), cache=False)
         else:
-            template_text = template.text
-        result_text = variable_pool.convert_template(template_text).text
+            result_text = variable_pool.render_template(template.text)
     prompt_message = _combine_message_content_with_role(
         contents=[TextPromptMessageContent(data=result_text)], role=PromptMessageRole.USER
     )
@@ -296,7 +296,7 @@ class LoopNode(BaseNode[LoopNodeData]):
                 # Check if all variables in break conditions exist
                 exists_variable = False
                 for condition in break_conditions:
-                    if not self.graph_runtime_state.variable_pool.get(condition.variable_selector):
+                    if not self.graph_runtime_state.variable_pool.get(condition.compiled_variable_selector):
                         exists_variable = False
                         break
                     else:
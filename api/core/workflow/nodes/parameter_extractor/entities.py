@@ -1,8 +1,10 @@
+from collections.abc import Sequence
 from typing import Any, Literal, Optional
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 
 from core.prompt.entities.advanced_prompt_entities import MemoryConfig
+from core.workflow.entities.variable_pool import CompiledSelector, compile_node_data_selector
 from core.workflow.nodes.base import BaseNodeData
 from core.workflow.nodes.llm import ModelConfig, VisionConfig
 
@@ -41,6 +43,15 @@ class ParameterExtractorNodeData(BaseNodeData):
     reasoning_mode: Literal["function_call", "prompt"]
     vision: VisionConfig = Field(default_factory=VisionConfig)
 
+    _compiled_query: Optional[CompiledSelector] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._compiled_query = compile_node_data_selector(self.query)
+
+    @property
+    def compiled_query(self) -> Sequence[str] | CompiledSelector:
+        return self._compiled_query or self.query
+
     @field_validator("reasoning_mode", mode="before")
     @classmethod
     def set_reasoning_mode(cls, v) -> str:
@@ -89,12 +89,12 @@ class ParameterExtractorNode(LLMNode):
         Run the node.
         """
         node_data = cast(ParameterExtractorNodeData, self.node_data)
-        variable = self.graph_runtime_state.variable_pool.get(node_data.query)
+        variable = self.graph_runtime_state.variable_pool.get(node_data.compiled_query)
         query = variable.text if variable else ""
 
         files = (
             self._fetch_files(
-                selector=node_data.vision.configs.variable_selector,
+                selector=node_data.vision.configs.compiled_variable_selector,
             )
             if node_data.vision.enabled
             else []
@@ -661,7 +661,7 @@ class ParameterExtractorNode(LLMNode):
         model_mode = ModelMode.value_of(node_data.model.mode)
         input_text = query
         memory_str = ""
-        instruction = variable_pool.convert_template(node_data.instruction or "").text
+        instruction = variable_pool.render_template(node_data.instruction or "")
 
         if memory and node_data.memory and node_data.memory.window:
             memory_str = memory.get_history_prompt_text(
@@ -688,7 +688,7 @@ class ParameterExtractorNode(LLMNode):
         model_mode = ModelMode.value_of(node_data.model.mode)
         input_text = query
         memory_str = ""
-        instruction = variable_pool.convert_template(node_data.instruction or "").text
+        instruction = variable_pool.render_template(node_data.instruction or "")
 
         if memory and node_data.memory and node_data.memory.window:
             memory_str = memory.get_history_prompt_text(
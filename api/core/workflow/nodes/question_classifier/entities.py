@@ -1,8 +1,10 @@
-from typing import Optional
+from collections.abc import Sequence
+from typing import Any, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from core.prompt.entities.advanced_prompt_entities import MemoryConfig
+from core.workflow.entities.variable_pool import CompiledSelector, compile_node_data_selector
 from core.workflow.nodes.base import BaseNodeData
 from core.workflow.nodes.llm import ModelConfig, VisionConfig
 
@@ -19,3 +21,12 @@ class QuestionClassifierNodeData(BaseNodeData):
     instruction: Optional[str] = None
     memory: Optional[MemoryConfig] = None
     vision: VisionConfig = Field(default_factory=VisionConfig)
+
+    _compiled_query_variable_selector: Optional[CompiledSelector] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._compiled_query_variable_selector = compile_node_data_selector(self.query_variable_selector)
+
+    @property
+    def compiled_query_variable_selector(self) -> Sequence[str] | CompiledSelector:
+        return self._compiled_query_variable_selector or self.query_variable_selector
@@ -44,7 +44,9 @@ class QuestionClassifierNode(LLMNode):
         variable_pool = self.graph_runtime_state.variable_pool
 
         # extract variables
-        variable = variable_pool.get(node_data.query_variable_selector) if node_data.query_variable_selector else None
+        variable = (
+            variable_pool.get(node_data.compiled_query_variable_selector) if node_data.query_variable_selector else None
+        )
         query = variable.value if variable else None
         variables = {"query": query}
         # fetch model config
@@ -56,11 +58,11 @@ class QuestionClassifierNode(LLMNode):
         )
         # fetch instruction
         node_data.instruction = node_data.instruction or ""
-        node_data.instruction = variable_pool.convert_template(node_data.instruction).text
+        node_data.instruction = variable_pool.render_template(node_data.instruction)
 
         files = (
             self._fetch_files(
-                selector=node_data.vision.configs.variable_selector,
+                selector=node_data.vision.configs.compiled_variable_selector,
             )
             if node_data.vision.enabled
             else []
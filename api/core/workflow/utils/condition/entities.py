@@ -1,7 +1,9 @@
 from collections.abc import Sequence
-from typing import Literal
+from typing import Any, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
+
+from core.workflow.entities.variable_pool import CompiledSelector, compile_node_data_selector
 
 SupportedComparisonOperator = Literal[
     # for string or array
@@ -47,3 +49,12 @@ class Condition(BaseModel):
     comparison_operator: SupportedComparisonOperator
     value: str | Sequence[str] | None = None
     sub_variable_condition: SubVariableCondition | None = None
+
+    _compiled_variable_selector: Optional[CompiledSelector] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._compiled_variable_selector = compile_node_data_selector(self.variable_selector)
+
+    @property
+    def compiled_variable_selector(self) -> Sequence[str] | CompiledSelector:
+        return self._compiled_variable_selector or self.variable_selector
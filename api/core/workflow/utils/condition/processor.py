@@ -20,7 +20,7 @@ class ConditionProcessor:
         group_results = []
 
         for condition in conditions:
-            variable = variable_pool.get(condition.variable_selector)
+            variable = variable_pool.get(condition.compiled_variable_selector)
             if variable is None:
                 raise ValueError(f"Variable {condition.variable_selector} not found")
 
@@ -50,7 +50,7 @@ class ConditionProcessor:
                 actual_value = variable.value if variable else None
                 expected_value = condition.value
                 if isinstance(expected_value, str):
-                    expected_value = variable_pool.convert_template(expected_value).text
+                    expected_value = variable_pool.render_template(expected_value)
                 input_conditions.append(
                     {
                         "actual_value": actual_value,
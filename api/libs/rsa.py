@@ -1,5 +1,8 @@
 import hashlib
+import threading
+from typing import Optional
 
+from cachetools import TTLCache
 from Crypto.Cipher import AES
 from Crypto.PublicKey import RSA
 from Crypto.Random import get_random_bytes
@@ -19,12 +22,18 @@ def generate_key_pair(tenant_id):
     filepath = "privkeys/{tenant_id}".format(tenant_id=tenant_id) + "/private.pem"
 
     storage.save(filepath, pem_private)
+    clear_decrypt_decoding_cache(tenant_id)
 
     return pem_public.decode()
 
 
 prefix_hybrid = b"HYBRID:"
 
+# imported private keys and their ciphers, importing a key and building its cipher is costly
+# and the ciphers don't keep state between calls, so they are shared by the threads of the process
+_decrypt_decoding_cache: TTLCache = TTLCache(maxsize=1000, ttl=120)
+_decrypt_decoding_cache_lock = threading.Lock()
+
 
 def encrypt(text, public_key):
     if isinstance(public_key, str):
@@ -46,6 +55,11 @@ def encrypt(text, public_key):
 
 
 def get_decrypt_decoding(tenant_id):
+    with _decrypt_decoding_cache_lock:
+        decrypt_decoding = _decrypt_decoding_cache.get(tenant_id)
+    if decrypt_decoding is not None:
+        return decrypt_decoding
+
     filepath = "privkeys/{tenant_id}".format(tenant_id=tenant_id) + "/private.pem"
 
     cache_key = "tenant_privkey:{hash}".format(hash=hashlib.sha3_256(filepath.encode()).hexdigest())
@@ -61,9 +75,20 @@ def get_decrypt_decoding(tenant_id):
     rsa_key = RSA.import_key(private_key)
     cipher_rsa = gmpy2_pkcs10aep_cipher.new(rsa_key)
 
+    with _decrypt_decoding_cache_lock:
+        _decrypt_decoding_cache[tenant_id] = (rsa_key, cipher_rsa)
+
     return rsa_key, cipher_rsa
 
 
+def clear_decrypt_decoding_cache(tenant_id: Optional[str] = None):
+    with _decrypt_decoding_cache_lock:
+        if tenant_id is None:
+            _decrypt_decoding_cache.clear()
+        else:
+            _decrypt_decoding_cache.pop(tenant_id, None)
+
+
 def decrypt_token_with_decoding(encrypted_text, rsa_key, cipher_rsa):
     if encrypted_text.startswith(prefix_hybrid):
         encrypted_text = encrypted_text[len(prefix_hybrid) :]
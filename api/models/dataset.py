@@ -11,6 +11,7 @@ import time
 from json import JSONDecodeError
 from typing import Any, cast
 
+import numpy as np
 from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped
@@ -906,6 +907,23 @@ class DatasetKeywordTable(db.Model):  # type: ignore[name-defined]
                 return None
 
 
+class DatasetKeywordIndex(db.Model):  # type: ignore[name-defined]
+    """Posting row of the inverted keyword index, one per (keyword, segment) pair of a dataset."""
+
+    __tablename__ = "dataset_keyword_indexes"
+    __table_args__ = (
+        db.PrimaryKeyConstraint("id", name="dataset_keyword_index_pkey"),
+        db.UniqueConstraint("dataset_id", "keyword", "index_node_id", name="dataset_keyword_index_unique_idx"),
+        db.Index("dataset_keyword_index_node_idx", "dataset_id", "index_node_id"),
+    )
+
+    id = db.Column(StringUUID, primary_key=True, server_default=db.text("uuid_generate_v4()"))
+    dataset_id = db.Column(StringUUID, nullable=False)
+    keyword = db.Column(db.Text, nullable=False)
+    index_node_id = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
+
+
 class Embedding(db.Model):  # type: ignore[name-defined]
     __tablename__ = "embeddings"
     __table_args__ = (
@@ -923,11 +941,26 @@ class Embedding(db.Model):  # type: ignore[name-defined]
     created_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
     provider_name = db.Column(db.String(255), nullable=False, server_default=db.text("''::character varying"))
 
+    # Header of the compact float32 encoding. Legacy rows hold pickled lists, whose
+    # payload always starts with the pickle PROTO opcode (0x80), so the two never collide.
+    BINARY_MAGIC = b"DF32"
+
     def set_embedding(self, embedding_data: list[float]):
-        self.embedding = pickle.dumps(embedding_data, protocol=pickle.HIGHEST_PROTOCOL)
+        self.embedding = self.encode_embedding(embedding_data)
 
     def get_embedding(self) -> list[float]:
-        return cast(list[float], pickle.loads(self.embedding))  # noqa: S301
+        return self.decode_embedding(self.embedding)
+
+    @classmethod
+    def encode_embedding(cls, embedding_data: list[float]) -> bytes:
+        return cls.BINARY_MAGIC + np.asarray(embedding_data, dtype="<f4").tobytes()
+
+    @classmethod
+    def decode_embedding(cls, raw: bytes) -> list[float]:
+        raw = bytes(raw)
+        if raw.startswith(cls.BINARY_MAGIC):
+            return cast(list[float], np.frombuffer(raw, dtype="<f4", offset=len(cls.BINARY_MAGIC)).tolist())
+        return cast(list[float], pickle.loads(raw))  # noqa: S301
 
 
 class DatasetCollectionBinding(db.Model):  # type: ignore[name-defined]
@@ -17,7 +17,7 @@ from core.plugin.entities.plugin import (
     PluginInstallation,
     PluginInstallationSource,
 )
-from core.plugin.entities.plugin_daemon import PluginInstallTask, PluginUploadResponse
+from core.plugin.entities.plugin_daemon import PluginInstallTask, PluginInstallTaskStatus, PluginUploadResponse
 from core.plugin.manager.asset import PluginAssetManager
 from core.plugin.manager.debugging import PluginDebuggingManager
 from core.plugin.manager.plugin import PluginInstallationManager
@@ -34,6 +34,8 @@ class PluginService:
 
     REDIS_KEY_PREFIX = "plugin_service:latest_plugin:"
     REDIS_TTL = 60 * 5  # 5 minutes
+    INSTALL_TASK_FINISHED_KEY_PREFIX = "plugin_service:install_task_finished:"
+    INSTALL_TASK_FINISHED_TTL = 60 * 60 * 24  # 1 day
 
     @staticmethod
     def fetch_latest_plugin_version(plugin_ids: Sequence[str]) -> Mapping[str, Optional[LatestPluginCache]]:
@@ -159,12 +161,41 @@ class PluginService:
         Fetch plugin installation tasks
         """
         manager = PluginInstallationManager()
-        return manager.fetch_plugin_installation_tasks(tenant_id, page, page_size)
+        tasks = manager.fetch_plugin_installation_tasks(tenant_id, page, page_size)
+        PluginService._invalidate_provider_configurations_of_finished_tasks(tenant_id, tasks)
+        return tasks
 
     @staticmethod
     def fetch_install_task(tenant_id: str, task_id: str) -> PluginInstallTask:
         manager = PluginInstallationManager()
-        return manager.fetch_plugin_installation_task(tenant_id, task_id)
+        task = manager.fetch_plugin_installation_task(tenant_id, task_id)
+        PluginService._invalidate_provider_configurations_of_finished_tasks(tenant_id, [task])
+        return task
+
+    @staticmethod
+    def _invalidate_provider_configurations_of_finished_tasks(
+        tenant_id: str, tasks: Sequence[PluginInstallTask]
+    ) -> None:
+        """
+        Installations and upgrades finish in the background while their tasks are polled, the model providers
+        of the tenant change once a task finishes. Invalidate them the first time a finished task is seen.
+        """
+        # models import this module, import the cache lazily to avoid a circular import
+        from core.helper.provider_configurations_cache import ProviderConfigurationsCache
+
+        newly_finished = [
+            task
+            for task in tasks
+            if task.status in (PluginInstallTaskStatus.Success, PluginInstallTaskStatus.Failed)
+            and redis_client.set(
+                f"{PluginService.INSTALL_TASK_FINISHED_KEY_PREFIX}{task.id}",
+                1,
+                ex=PluginService.INSTALL_TASK_FINISHED_TTL,
+                nx=True,
+            )
+        ]
+        if newly_finished:
+            ProviderConfigurationsCache.invalidate(tenant_id)
 
     @staticmethod
     def delete_install_task(tenant_id: str, task_id: str) -> bool:
@@ -352,8 +383,12 @@ class PluginService:
 
     @staticmethod
     def uninstall(tenant_id: str, plugin_installation_id: str) -> bool:
+        from core.helper.provider_configurations_cache import ProviderConfigurationsCache
+
         manager = PluginInstallationManager()
-        return manager.uninstall(tenant_id, plugin_installation_id)
+        result = manager.uninstall(tenant_id, plugin_installation_id)
+        ProviderConfigurationsCache.invalidate(tenant_id)
+        return result
 
     @staticmethod
     def check_tools_existence(tenant_id: str, provider_ids: Sequence[GenericProviderID]) -> Sequence[bool]:
@@ -1,10 +1,11 @@
+import gzip
 import json
 import logging
 
 from celery import shared_task  # type: ignore
 from flask import current_app
 
-from core.ops.entities.config_entity import OPS_FILE_PATH, OPS_TRACE_FAILED_KEY
+from core.ops.entities.config_entity import OPS_FILE_PATH, OPS_TRACE_BATCH_FILE_PATH, OPS_TRACE_FAILED_KEY
 from core.ops.entities.trace_entity import trace_info_info_map
 from core.rag.models.document import Document
 from extensions.ext_redis import redis_client
@@ -25,18 +26,56 @@ def process_trace_tasks(file_info):
     file_id = file_info.get("file_id")
     file_path = f"{OPS_FILE_PATH}{app_id}/{file_id}.json"
     file_data = json.loads(storage.load(file_path))
-    trace_info = file_data.get("trace_info")
-    trace_info_type = file_data.get("trace_info_type")
     trace_instance = OpsTraceManager.get_ops_trace_instance(app_id)
 
-    if trace_info.get("message_data"):
-        trace_info["message_data"] = Message.from_dict(data=trace_info["message_data"])
-    if trace_info.get("workflow_data"):
-        trace_info["workflow_data"] = WorkflowRun.from_dict(data=trace_info["workflow_data"])
-    if trace_info.get("documents"):
-        trace_info["documents"] = [Document(**doc) for doc in trace_info["documents"]]
+    try:
+        _trace(trace_instance, app_id, file_data)
+    finally:
+        storage.delete(file_path)
+
+
+@shared_task(queue="ops_trace")
+def process_trace_tasks_batch(file_info):
+    """
+    Async process a batch of trace tasks, stored as gzip compressed json lines
+    Usage: process_trace_tasks_batch.delay({"file_id": file_id})
+    """
+    from core.ops.ops_trace_manager import OpsTraceManager
+
+    file_id = file_info.get("file_id")
+    file_path = f"{OPS_TRACE_BATCH_FILE_PATH}{file_id}.jsonl.gz"
+    trace_instances = {}
+
+    try:
+        for line in gzip.decompress(storage.load(file_path)).splitlines():
+            if not line:
+                continue
+            file_data = json.loads(line)
+            app_id = file_data.get("app_id")
+            if app_id not in trace_instances:
+                trace_instances[app_id] = OpsTraceManager.get_ops_trace_instance(app_id)
+            _trace(trace_instances[app_id], app_id, file_data)
+    finally:
+        storage.delete(file_path)
+
+
+def _trace(trace_instance, app_id, file_data):
+    trace_info = file_data.get("trace_info")
+    trace_info_type = file_data.get("trace_info_type")
+    if not trace_info:
+        # the trace task collected nothing, e.g. its message was deleted, there is nothing to export
+        logging.info(f"Skipping empty trace task, app_id: {app_id}")
+        return
 
     try:
+        # a failed trace of a batch must not prevent the export of the others
+        if trace_info.get("message_data"):
+            trace_info["message_data"] = Message.from_dict(data=trace_info["message_data"])
+        if trace_info.get("workflow_data"):
+            trace_info["workflow_data"] = WorkflowRun.from_dict(data=trace_info["workflow_data"])
+        if trace_info.get("documents"):
+            trace_info["documents"] = [Document(**doc) for doc in trace_info["documents"]]
+
         if trace_instance:
             with current_app.app_context():
                 trace_type = trace_info_info_map.get(trace_info_type)
@@ -48,5 +87,3 @@ def process_trace_tasks(file_info):
         failed_key = f"{OPS_TRACE_FAILED_KEY}_{app_id}"
         redis_client.incr(failed_key)
         logging.info(f"Processing trace tasks failed, app_id: {app_id}")
-    finally:
-        storage.delete(file_path)
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from core.app.app_config.entities import VariableEntity, VariableEntityType
@@ -50,3 +52,19 @@ def test_validate_input_with_none_for_required_variable():
             )
 
         assert str(exc_info.value) == "test_var is required in input form"
+
+
+def test_convert_to_event_stream():
+    def generator():
+        yield {"event": "message", "answer": "你好", "metadata": {1: "one"}}
+        yield "ping"
+
+    frames = list(BaseAppGenerator.convert_to_event_stream(generator()))
+
+    assert json.loads(frames[0].removeprefix("data: ")) == {
+        "event": "message",
+        "answer": "你好",
+        "metadata": {"1": "one"},
+    }
+    assert frames[0].endswith("\n\n")
+    assert frames[1] == "event: ping\n\n"
@@ -0,0 +1,138 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from configs import dify_config
+from core.app.apps.base_app_queue_manager import GenerateTaskStoppedError, PublishFrom, _get_fields_to_check
+from core.app.apps.message_based_app_queue_manager import MessageBasedAppQueueManager
+from core.app.entities.app_invoke_entities import InvokeFrom
+from core.app.entities.queue_entities import (
+    QueueMessageEndEvent,
+    QueuePingEvent,
+    QueueRetrieverResourcesEvent,
+    QueueTextChunkEvent,
+)
+
+
+class _FakeSQLAlchemyModel:
+    _sa_instance_state = object()
+
+
+@pytest.fixture
+def mock_redis():
+    with patch("core.app.apps.base_app_queue_manager.redis_client", new=MagicMock()) as mock:
+        mock.get.return_value = None
+        yield mock
+
+
+@pytest.fixture
+def queue_manager(mock_redis) -> MessageBasedAppQueueManager:
+    return MessageBasedAppQueueManager(
+        task_id="task",
+        user_id="user",
+        invoke_from=InvokeFrom.SERVICE_API,
+        conversation_id="conversation",
+        app_mode="chat",
+        message_id="message",
+    )
+
+
+def test_text_chunk_event_has_no_fields_to_check():
+    assert _get_fields_to_check(QueueTextChunkEvent) == ()
+    assert _get_fields_to_check(QueueRetrieverResourcesEvent) == ("retriever_resources",)
+
+
+def test_publish_rejects_nested_sqlalchemy_models(queue_manager):
+    event = QueueRetrieverResourcesEvent(retriever_resources=[{"segment": _FakeSQLAlchemyModel()}])
+
+    with pytest.raises(TypeError, match="SQLAlchemy Model"):
+        queue_manager.publish(event, PublishFrom.TASK_PIPELINE)
+
+
+def test_stop_flag_is_cached_between_checks(queue_manager, mock_redis, monkeypatch):
+    monkeypatch.setattr(dify_config, "APP_STOP_FLAG_CHECK_INTERVAL", 60.0)
+    for _ in range(10):
+        queue_manager.publish(QueueTextChunkEvent(text="chunk"), PublishFrom.APPLICATION_MANAGER)
+    assert mock_redis.get.call_count == 1
+
+    monkeypatch.setattr(dify_config, "APP_STOP_FLAG_CHECK_INTERVAL", 0.0001)
+    mock_redis.get.return_value = b"1"
+    queue_manager._stop_flag_checked_at = 0.0
+    with pytest.raises(GenerateTaskStoppedError):
+        queue_manager.publish(QueueTextChunkEvent(text="chunk"), PublishFrom.APPLICATION_MANAGER)
+
+    # once stopped the task stays stopped without asking redis again
+    with pytest.raises(GenerateTaskStoppedError):
+        queue_manager.publish(QueueTextChunkEvent(text="chunk"), PublishFrom.APPLICATION_MANAGER)
+    assert mock_redis.get.call_count == 2
+
+
+def _listen_events(queue_manager: MessageBasedAppQueueManager) -> list:
+    return [message.event for message in queue_manager.listen()]
+
+
+def test_listen_yields_each_chunk_without_coalescing(queue_manager, monkeypatch):
+    monkeypatch.setattr(dify_config, "APP_STREAM_COALESCE_WINDOW_MS", 0)
+    for text in ["a", "b", "c"]:
+        queue_manager.publish(QueueTextChunkEvent(text=text), PublishFrom.TASK_PIPELINE)
+    queue_manager.publish(QueueMessageEndEvent(), PublishFrom.TASK_PIPELINE)
+
+    events = _listen_events(queue_manager)
+
+    assert [event.text for event in events[:3]] == ["a", "b", "c"]
+    assert isinstance(events[3], QueueMessageEndEvent)
+
+
+def test_listen_coalesces_consecutive_chunks(queue_manager, monkeypatch):
+    monkeypatch.setattr(dify_config, "APP_STREAM_COALESCE_WINDOW_MS", 1000)
+    for event in [
+        QueueTextChunkEvent(text="a", from_variable_selector=["llm", "text"]),
+        QueueTextChunkEvent(text="b", from_variable_selector=["llm", "text"]),
+        QueuePingEvent(),
+        QueueTextChunkEvent(text="c", from_variable_selector=["llm", "text"]),
+        QueueTextChunkEvent(text="d", from_variable_selector=["answer"]),
+    ]:
+        queue_manager.publish(event, PublishFrom.TASK_PIPELINE)
+    queue_manager.publish(QueueMessageEndEvent(), PublishFrom.TASK_PIPELINE)
+
+    events = _listen_events(queue_manager)
+
+    assert len(events) == 5
+    assert events[0].text == "ab"
+    assert isinstance(events[1], QueuePingEvent)
+    assert events[2].text == "c"
+    assert events[3].text == "d"
+    assert isinstance(events[4], QueueMessageEndEvent)
+
+
+def test_listen_coalescing_respects_max_bytes(queue_manager, monkeypatch):
+    monkeypatch.setattr(dify_config, "APP_STREAM_COALESCE_WINDOW_MS", 1000)
+    monkeypatch.setattr(dify_config, "APP_STREAM_COALESCE_MAX_BYTES", 4)
+    for _ in range(6):
+        queue_manager.publish(QueueTextChunkEvent(text="ab"), PublishFrom.TASK_PIPELINE)
+    queue_manager.publish(QueueMessageEndEvent(), PublishFrom.TASK_PIPELINE)
+
+    events = _listen_events(queue_manager)
+
+    assert [event.text for event in events[:-1]] == ["abab", "abab", "abab"]
+
+
+@pytest.mark.benchmark(group="app_queue_manager_publish")
+def test_benchmark_publish_text_chunks(benchmark, queue_manager):
+    chunk_count = 1000
+    events = [QueueTextChunkEvent(text=f"token {i} ") for i in range(chunk_count)]
+
+    def _stream():
+        for event in events:
+            queue_manager.publish(event, PublishFrom.APPLICATION_MANAGER)
+        # drain the queue so every round starts empty
+        drained = 0
+        while not queue_manager._q.empty():
+            queue_manager._q.get_nowait()
+            drained += 1
+        return drained
+
+    assert benchmark(_stream) == chunk_count
+    # no stats are collected with --benchmark-disable
+    if benchmark.stats:
+        benchmark.extra_info["chunks_per_second"] = chunk_count / benchmark.stats.stats.mean
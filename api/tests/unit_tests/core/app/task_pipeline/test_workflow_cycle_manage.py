@@ -0,0 +1,155 @@
+from datetime import UTC, datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import Update
+from sqlalchemy.orm import Session
+
+from configs import dify_config
+from core.app.task_pipeline.workflow_cycle_manage import WorkflowCycleManage
+from core.workflow.nodes import NodeType
+from models.workflow import WorkflowNodeExecutionStatus, WorkflowRun
+
+
+@pytest.fixture
+def workflow_cycle_manager() -> WorkflowCycleManage:
+    manager = WorkflowCycleManage(application_generate_entity=MagicMock(), workflow_system_variables={})
+    workflow_run = WorkflowRun()
+    workflow_run.id = "run-id"
+    workflow_run.tenant_id = "tenant-id"
+    workflow_run.app_id = "app-id"
+    workflow_run.workflow_id = "workflow-id"
+    workflow_run.created_by_role = "account"
+    workflow_run.created_by = "user-id"
+    manager._workflow_run = workflow_run
+    return manager
+
+
+def _start_node(manager: WorkflowCycleManage, node_execution_id: str):
+    event = MagicMock(
+        node_execution_id=node_execution_id,
+        node_id=node_execution_id,
+        node_type=NodeType.LLM,
+        node_run_index=1,
+        predecessor_node_id=None,
+        parallel_mode_run_id=None,
+        in_iteration_id=None,
+        in_loop_id=None,
+    )
+    return manager._handle_node_execution_start(workflow_run=manager._get_cached_workflow_run("run-id"), event=event)
+
+
+def _succeed_node(manager: WorkflowCycleManage, node_execution_id: str):
+    event = MagicMock(
+        node_execution_id=node_execution_id,
+        inputs={"query": "hello"},
+        process_data=None,
+        outputs={"text": "world"},
+        execution_metadata=None,
+        start_at=datetime.now(UTC).replace(tzinfo=None),
+    )
+    return manager._handle_workflow_node_execution_success(event=event)
+
+
+def _session() -> Session:
+    session = Session()
+    session.execute = MagicMock()
+    return session
+
+
+@pytest.fixture
+def sessions(monkeypatch) -> list[Session]:
+    monkeypatch.setattr(dify_config, "WORKFLOW_NODE_EXECUTION_FLUSH_INTERVAL", 60.0)
+    monkeypatch.setattr(dify_config, "WORKFLOW_NODE_EXECUTION_FLUSH_BATCH_SIZE", 100)
+    created: list[Session] = []
+
+    def _create_session(*args, **kwargs):
+        created.append(_session())
+        return created[-1]
+
+    with (
+        patch("core.app.task_pipeline.workflow_cycle_manage.Session", side_effect=_create_session),
+        patch("core.app.task_pipeline.workflow_cycle_manage.db"),
+    ):
+        yield created
+
+
+def test_node_executions_are_buffered_until_commit(workflow_cycle_manager, sessions):
+    _start_node(workflow_cycle_manager, "node-1")
+    _start_node(workflow_cycle_manager, "node-2")
+    session = _session()
+
+    workflow_cycle_manager._flush_workflow_node_executions(session=session)
+
+    # one bulk insert holding both node executions
+    assert session.execute.call_count == 1
+    rows = session.execute.call_args.args[1]
+    assert [row["node_id"] for row in rows] == ["node-1", "node-2"]
+    assert rows[0]["status"] == WorkflowNodeExecutionStatus.RUNNING.value
+    # they are only known to be written once the transaction is committed
+    assert len(workflow_cycle_manager._pending_workflow_node_executions) == 2
+    session.commit()
+    assert not workflow_cycle_manager._pending_workflow_node_executions
+    assert not sessions
+
+
+def test_failed_commit_keeps_node_executions_pending(workflow_cycle_manager, sessions):
+    _start_node(workflow_cycle_manager, "node-1")
+    session = _session()
+
+    workflow_cycle_manager._flush_workflow_node_executions(session=session)
+    session.rollback()
+    session.close()
+
+    assert list(workflow_cycle_manager._pending_workflow_node_executions) == [
+        workflow_cycle_manager._get_workflow_node_execution("node-1").id
+    ]
+    assert not workflow_cycle_manager._flushed_workflow_node_execution_ids
+
+
+def test_finished_nodes_are_buffered(workflow_cycle_manager, sessions):
+    _start_node(workflow_cycle_manager, "node-1")
+    _succeed_node(workflow_cycle_manager, "node-1")
+    _start_node(workflow_cycle_manager, "node-2")
+    _succeed_node(workflow_cycle_manager, "node-2")
+
+    assert not sessions
+    workflow_cycle_manager._commit_workflow_node_executions(force=True)
+
+    # both nodes are inserted in their final state with one statement
+    assert len(sessions) == 1
+    assert sessions[0].execute.call_count == 1
+    rows = sessions[0].execute.call_args.args[1]
+    assert [row["status"] for row in rows] == [WorkflowNodeExecutionStatus.SUCCEEDED.value] * 2
+
+
+def test_finished_node_is_committed_right_away_when_enabled(workflow_cycle_manager, sessions, monkeypatch):
+    monkeypatch.setattr(dify_config, "WORKFLOW_NODE_EXECUTION_FLUSH_ON_FINISH", True)
+    _start_node(workflow_cycle_manager, "node-1")
+    session = _session()
+    workflow_cycle_manager._flush_workflow_node_executions(session=session)
+    session.commit()
+
+    node_execution = _succeed_node(workflow_cycle_manager, "node-1")
+
+    assert len(sessions) == 1
+    statement, rows = sessions[0].execute.call_args.args
+    assert isinstance(statement, Update)
+    assert rows[0]["status"] == WorkflowNodeExecutionStatus.SUCCEEDED.value
+    assert rows[0]["outputs"] == '{"text": "world"}'
+    assert not workflow_cycle_manager._pending_workflow_node_executions
+    # the stream responses keep reading the detached node execution from memory
+    assert node_execution.outputs_dict == {"text": "world"}
+
+
+def test_commit_waits_for_interval_or_batch_size(workflow_cycle_manager, sessions, monkeypatch):
+    monkeypatch.setattr(dify_config, "WORKFLOW_NODE_EXECUTION_FLUSH_BATCH_SIZE", 2)
+
+    _start_node(workflow_cycle_manager, "node-1")
+    workflow_cycle_manager._commit_workflow_node_executions()
+    assert not sessions
+
+    _start_node(workflow_cycle_manager, "node-2")
+    workflow_cycle_manager._commit_workflow_node_executions()
+    assert len(sessions) == 1
+    assert not workflow_cycle_manager._pending_workflow_node_executions
@@ -0,0 +1,175 @@
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from configs import dify_config
+from core.helper.code_executor.code_executor import CodeExecutionError, CodeExecutor, CodeLanguage
+from core.helper.code_executor.python3.python3_transformer import Python3TemplateTransformer
+
+CODE = """
+def main(value: int) -> dict:
+    if value < 0:
+        raise ValueError("negative value")
+    return {"result": value * 2}
+"""
+
+
+def _run_script(script: str) -> str:
+    return subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+
+
+class _FakeSandbox:
+    """
+    Runs the python scripts in a fresh interpreter and records the calls made to the sandbox
+    """
+
+    def __init__(self, delay: float = 0) -> None:
+        self.delay = delay
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, json, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delay)
+            stdout = _run_script(json["preload"] + json["code"])
+            response = MagicMock(status_code=200)
+            response.json.return_value = {"code": 0, "message": "", "data": {"stdout": stdout}}
+            return response
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def sandbox():
+    sandbox = _FakeSandbox()
+    with patch("httpx.Client.post", new=sandbox.post):
+        yield sandbox
+
+
+def test_client_is_reused():
+    assert CodeExecutor._get_client() is CodeExecutor._get_client()
+
+
+def test_batch_runner_returns_every_result_and_error():
+    runner, preload = Python3TemplateTransformer.transform_batch_caller(CODE, [{"value": 1}, {"value": -1}])
+
+    results = Python3TemplateTransformer.transform_batch_response(_run_script(preload + runner))
+
+    assert results[0] == {"result": 2}
+    assert isinstance(results[1], str)
+    assert "negative value" in results[1]
+
+
+def test_batch_runner_executes_the_code_for_every_item():
+    code = """
+seen = []
+def main(value: int) -> dict:
+    seen.append(value)
+    return {"seen": len(seen)}
+"""
+    runner, preload = Python3TemplateTransformer.transform_batch_caller(code, [{"value": 1}, {"value": 2}])
+
+    results = Python3TemplateTransformer.transform_batch_response(_run_script(preload + runner))
+
+    # the items don't share the module globals of the code
+    assert results == [{"seen": 1}, {"seen": 1}]
+
+
+def _another_execution_in_flight(monkeypatch, code: str) -> None:
+    monkeypatch.setitem(CodeExecutor.executions_in_flight, (CodeLanguage.PYTHON3, code, "tenant"), 1)
+
+
+def test_concurrent_executions_share_one_sandbox_run(sandbox, monkeypatch):
+    monkeypatch.setattr(dify_config, "CODE_EXECUTION_BATCH_ENABLED", True)
+    monkeypatch.setattr(dify_config, "CODE_EXECUTION_BATCH_WINDOW_MS", 1000)
+    monkeypatch.setattr(dify_config, "CODE_EXECUTION_BATCH_MAX_SIZE", 4)
+    _another_execution_in_flight(monkeypatch, CODE)
+
+    def execute(value: int):
+        try:
+            return CodeExecutor.execute_workflow_code_template(CodeLanguage.PYTHON3, CODE, {"value": value}, "tenant")
+        except CodeExecutionError as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(execute, [1, 2, -1, 3]))
+
+    # the batch is full, so it runs without waiting for the whole window
+    assert sandbox.calls == 1
+    assert results[0] == {"result": 2}
+    assert results[1] == {"result": 4}
+    assert isinstance(results[2], CodeExecutionError)
+    assert "negative value" in str(results[2])
+    assert results[3] == {"result": 6}
+
+
+def test_failed_batch_is_retried_item_by_item(sandbox, monkeypatch):
+    monkeypatch.setattr(dify_config, "CODE_EXECUTION_BATCH_ENABLED", True)
+    monkeypatch.setattr(dify_config, "CODE_EXECUTION_BATCH_WINDOW_MS", 1000)
+    monkeypatch.setattr(dify_config, "CODE_EXECUTION_BATCH_MAX_SIZE", 3)
+    # an item killing the interpreter fails the sandbox run of the whole batch
+    code = CODE.replace(
+        "    if value < 0:", "    if value == 13:\n        __import__('os')._exit(1)\n    if value < 0:"
+    )
+    _another_execution_in_flight(monkeypatch, code)
+
+    def execute(value: int):
+        try:
+            return CodeExecutor.execute_workflow_code_template(CodeLanguage.PYTHON3, code, {"value": value}, "tenant")
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(execute, [1, 13, 2]))
+
+    # one batch run, then every item on its own
+    assert sandbox.calls == 4
+    assert results[0] == {"result": 2}
+    assert isinstance(results[1], Exception)
+    assert results[2] == {"result": 4}
+
+
+def test_single_execution_in_batch_mode_runs_right_away(sandbox, monkeypatch):
+    monkeypatch.setattr(dify_config, "CODE_EXECUTION_BATCH_ENABLED", True)
+    monkeypatch.setattr(dify_config, "CODE_EXECUTION_BATCH_WINDOW_MS", 10_000)
+
+    started_at = time.monotonic()
+    result = CodeExecutor.execute_workflow_code_template(CodeLanguage.PYTHON3, CODE, {"value": 5})
+
+    # no other execution of the code is in flight, so it doesn't wait for the batch window
+    assert time.monotonic() - started_at < 5
+    assert result == {"result": 10}
+    assert sandbox.calls == 1
+    assert not CodeExecutor.pending_batches
+    assert not CodeExecutor.executions_in_flight
+
+
+def test_tenant_concurrency_is_limited(monkeypatch):
+    monkeypatch.setattr(dify_config, "CODE_EXECUTION_MAX_CONCURRENCY_PER_TENANT", 2)
+    monkeypatch.setattr(CodeExecutor, "tenant_semaphores", {})
+    sandbox = _FakeSandbox(delay=0.05)
+
+    with patch("httpx.Client.post", new=sandbox.post), ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(
+            executor.map(
+                lambda value: CodeExecutor.execute_workflow_code_template(
+                    CodeLanguage.PYTHON3, CODE, {"value": value}, "tenant"
+                ),
+                range(6),
+            )
+        )
+
+    assert results == [{"result": value * 2} for value in range(6)]
+    assert sandbox.max_running == 2
@@ -0,0 +1,184 @@
+import subprocess
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from configs import dify_config
+from core.helper.code_executor.code_executor import CodeExecutionError, CodeExecutor, CodeLanguage
+from core.helper.code_executor.jinja2.jinja2_renderer import Jinja2LocalRenderer, Jinja2RenderError
+
+TEMPLATE = "{% for item in items %}{{ loop.index }}. {{ item.name | upper }}\n{% endfor %}{{ title }}"
+INPUTS = {"title": "done", "items": [{"name": f"item {i}"} for i in range(20)]}
+
+
+@pytest.fixture(params=["thread", "process"])
+def render_mode(request, monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_MODE", request.param)
+    Jinja2LocalRenderer._pool = None
+    yield request.param
+    if Jinja2LocalRenderer._pool is not None:
+        Jinja2LocalRenderer._pool.terminate()
+        Jinja2LocalRenderer._pool = None
+
+
+def test_render(render_mode):
+    result = Jinja2LocalRenderer.render("Hello {{ name }}! {{ items | join(', ') }}", {"name": "Dify", "items": [1, 2]})
+    assert result == "Hello Dify! 1, 2"
+
+
+def test_render_rejects_unsafe_templates(render_mode):
+    with pytest.raises(Jinja2RenderError, match="SecurityError"):
+        Jinja2LocalRenderer.render("{{ ''.__class__.__mro__ }}", {})
+
+    with pytest.raises(Jinja2RenderError, match="SecurityError"):
+        Jinja2LocalRenderer.render("{{ items.append(1) }}", {"items": []})
+
+
+def test_render_limits_output_length(render_mode, monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_MAX_OUTPUT_LENGTH", 10)
+
+    with pytest.raises(Jinja2RenderError, match="exceeds 10 characters"):
+        Jinja2LocalRenderer.render("{% for i in range(100) %}{{ i }}{% endfor %}", {})
+
+
+def test_render_limits_render_time(render_mode, monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_TIMEOUT", 0.2)
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_MAX_OUTPUT_LENGTH", 10**9)
+
+    with pytest.raises(Jinja2RenderError, match="timed out"):
+        Jinja2LocalRenderer.render(
+            "{% for i in range(100000) %}{% for j in range(100000) %}{{ j }}{% endfor %}{% endfor %}", {}
+        )
+    # the renderer keeps working after a timeout
+    assert Jinja2LocalRenderer.render("{{ 1 + 1 }}", {}) == "2"
+
+
+def test_stuck_render_process_is_replaced_without_stopping_the_other_workers(monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_MODE", "process")
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_MAX_WORKERS", 2)
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_TIMEOUT", 1.0)
+    # kill the worker before its own deadline fires, as if it was stuck in C code
+    monkeypatch.setattr("core.helper.code_executor.jinja2.jinja2_renderer._WORKER_KILL_GRACE_PERIOD", -0.8)
+    Jinja2LocalRenderer._pool = None
+    pool = Jinja2LocalRenderer._get_pool()
+    stuck_template = "{% for i in range(100000) %}{% for j in range(100000) %}{% endfor %}{% endfor %}"
+    try:
+        workers = [pool._acquire(), pool._acquire()]
+        for worker in workers:
+            pool._release(worker)
+
+        with pytest.raises(Jinja2RenderError, match="timed out"):
+            Jinja2LocalRenderer.render(stuck_template, {})
+
+        assert [worker.is_alive() for worker in workers] == [True, False]
+        assert pool._idle_workers == [workers[0]]
+        assert Jinja2LocalRenderer.render("{{ 1 + 1 }}", {}) == "2"
+    finally:
+        pool.terminate()
+        Jinja2LocalRenderer._pool = None
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        # no output, no calls, only loop iterations
+        "{% for i in items %}{% for j in items %}{% for k in items %}{% endfor %}{% endfor %}{% endfor %}",
+        "{% for i in items %}{% for j in items %}{% set x = i * j %}{% endfor %}{% endfor %}",
+        "{% for i in range(100000) %}{% for j in range(100000) %}{% endfor %}{% endfor %}",
+    ],
+)
+def test_render_limits_render_time_without_output(template, render_mode, monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_TIMEOUT", 0.2)
+    # start the workers first, only the render itself is measured
+    Jinja2LocalRenderer.render("{{ 1 }}", {})
+
+    started_at = time.monotonic()
+    with pytest.raises(Jinja2RenderError, match="timed out"):
+        Jinja2LocalRenderer.render(template, {"items": list(range(100000))})
+    assert time.monotonic() - started_at < 2
+
+
+@pytest.mark.parametrize("template", ["{{ 'a' * 1000000000 }}", "{{ [1] * 1000000000 }}", "{{ 10 ** 1000000000 }}"])
+def test_render_rejects_huge_values(template, render_mode, monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_MAX_OUTPUT_LENGTH", 1000)
+
+    with pytest.raises(Jinja2RenderError, match="exceeds 1000 characters"):
+        Jinja2LocalRenderer.render(template, {})
+
+    assert Jinja2LocalRenderer.render("{{ 'ab' * 2 }} {{ 2 ** 10 }}", {}) == "abab 1024"
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "{{ 'x' | center(100000000) }}",
+        "{{ 'x'.ljust(100000000) }}",
+        "{{ 'xx' | replace('x', 'xx') | replace('x', 'xx') | replace('x', 'xx') | replace('x', 'xx') }}",
+    ],
+)
+def test_render_rejects_huge_filter_results(template, render_mode, monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_MAX_OUTPUT_LENGTH", 10)
+
+    with pytest.raises(Jinja2RenderError, match="exceeds 10 characters"):
+        Jinja2LocalRenderer.render(template, {})
+
+    assert Jinja2LocalRenderer.render("{{ 'x' | center(3) }}", {}) == " x "
+
+
+def test_process_mode_falls_back_to_threads_where_processes_cant_start(monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_MODE", "process")
+    Jinja2LocalRenderer._pool = None
+    try:
+        with patch("core.helper.code_executor.jinja2.jinja2_renderer.can_start_process_pool", return_value=False):
+            assert Jinja2LocalRenderer.render("{{ 1 + 1 }}", {}) == "2"
+
+        assert Jinja2LocalRenderer._pool_mode == "thread"
+    finally:
+        if Jinja2LocalRenderer._pool is not None:
+            Jinja2LocalRenderer._pool.terminate()
+            Jinja2LocalRenderer._pool = None
+
+
+def test_execute_workflow_code_template_renders_locally(monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_ENABLED", True)
+
+    with patch.object(CodeExecutor, "execute_code") as mock_execute_code:
+        result = CodeExecutor.execute_workflow_code_template(CodeLanguage.JINJA2, "{{ a }}", {"a": "b"})
+        with pytest.raises(CodeExecutionError):
+            CodeExecutor.execute_workflow_code_template(CodeLanguage.JINJA2, "{{ a ", {})
+
+    assert result == {"result": "b"}
+    mock_execute_code.assert_not_called()
+
+
+def _run_in_interpreter(client, url, json, **kwargs):
+    """
+    Stand-in for the code sandbox, runs the script in a fresh interpreter like the sandbox does
+    """
+    process = subprocess.run(
+        [sys.executable, "-c", json["preload"] + json["code"]], capture_output=True, text=True, check=True
+    )
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"code": 0, "message": "success", "data": {"stdout": process.stdout, "error": ""}}
+    return response
+
+
+@pytest.mark.benchmark(group="jinja2_render")
+def test_benchmark_sandbox_round_trip(benchmark, monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_ENABLED", False)
+
+    with patch("httpx.Client.post", new=_run_in_interpreter):
+        result = benchmark(CodeExecutor.execute_workflow_code_template, CodeLanguage.JINJA2, TEMPLATE, INPUTS)
+
+    assert result["result"].endswith("done")
+
+
+@pytest.mark.benchmark(group="jinja2_render")
+def test_benchmark_local_render(benchmark, render_mode, monkeypatch):
+    monkeypatch.setattr(dify_config, "JINJA2_LOCAL_RENDER_ENABLED", True)
+
+    result = benchmark(CodeExecutor.execute_workflow_code_template, CodeLanguage.JINJA2, TEMPLATE, INPUTS)
+
+    assert result["result"].endswith("done")
@@ -0,0 +1,220 @@
+import base64
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from Crypto.PublicKey import RSA
+
+from configs import dify_config
+from core.entities.provider_configuration import ProviderConfigurations
+from core.entities.provider_entities import (
+    CustomConfiguration,
+    CustomProviderConfiguration,
+    ProviderQuotaType,
+    QuotaConfiguration,
+    QuotaUnit,
+    SystemConfiguration,
+)
+from core.helper import encrypter, provider_configurations_cache
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
+from core.model_manager import ModelManager
+from core.model_runtime.entities.common_entities import I18nObject
+from core.model_runtime.entities.model_entities import ModelType
+from core.model_runtime.entities.provider_entities import ConfigurateMethod, ProviderEntity
+from core.model_runtime.model_providers.__base.ai_model import AIModel
+from core.provider_manager import ProviderManager
+from libs import rsa
+from models.provider import Provider, ProviderType
+
+TENANT_ID = "tenant-id"
+# simulated latency of a database query or a plugin daemon request
+ROUND_TRIP_LATENCY = 0.001
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    ProviderConfigurationsCache._entries.clear()
+    ProviderConfigurationsCache._versions.clear()
+    rsa.clear_decrypt_decoding_cache()
+    with (
+        patch.object(ProviderConfigurationsCache, "_ensure_listener"),
+        patch.object(provider_configurations_cache, "redis_client", new=MagicMock()) as mock_redis,
+    ):
+        yield mock_redis
+    ProviderConfigurationsCache._entries.clear()
+    ProviderConfigurationsCache._versions.clear()
+
+
+def _provider_configurations() -> ProviderConfigurations:
+    from core.entities.provider_configuration import ProviderConfiguration
+
+    provider_configurations = ProviderConfigurations(tenant_id=TENANT_ID)
+    provider_configurations["langgenius/openai/openai"] = ProviderConfiguration(
+        tenant_id=TENANT_ID,
+        provider=_provider_entity(),
+        preferred_provider_type=ProviderType.CUSTOM,
+        using_provider_type=ProviderType.CUSTOM,
+        system_configuration=SystemConfiguration(enabled=False),
+        custom_configuration=CustomConfiguration(
+            provider=CustomProviderConfiguration(credentials={"openai_api_key": "key"})
+        ),
+        model_settings=[],
+    )
+    return provider_configurations
+
+
+def _provider_entity() -> ProviderEntity:
+    return ProviderEntity(
+        provider="langgenius/openai/openai",
+        label=I18nObject(en_US="OpenAI"),
+        supported_model_types=[ModelType.LLM],
+        configurate_methods=[ConfigurateMethod.PREDEFINED_MODEL],
+    )
+
+
+def test_cached_configurations_are_copies():
+    ProviderConfigurationsCache.set(TENANT_ID, _provider_configurations(), version=0)
+
+    cached = ProviderConfigurationsCache.get(TENANT_ID)
+    assert cached is not None
+    credentials = cached["openai"].get_current_credentials(ModelType.LLM, "gpt-4o")
+    assert credentials == {"openai_api_key": "key"}
+    credentials["openai_api_key"] = "changed"
+
+    cached_again = ProviderConfigurationsCache.get(TENANT_ID)
+    assert cached_again is not None
+    assert cached_again["openai"].get_current_credentials(ModelType.LLM, "gpt-4o") == {"openai_api_key": "key"}
+
+
+def test_configurations_built_before_an_invalidation_are_not_cached(clean_cache):
+    version = ProviderConfigurationsCache.get_version(TENANT_ID)
+    ProviderConfigurationsCache.invalidate(TENANT_ID)
+    ProviderConfigurationsCache.set(TENANT_ID, _provider_configurations(), version)
+
+    assert ProviderConfigurationsCache.get(TENANT_ID) is None
+    clean_cache.publish.assert_called_once_with(provider_configurations_cache.INVALIDATION_CHANNEL, TENANT_ID)
+
+
+def test_committed_provider_changes_invalidate_their_tenant(clean_cache):
+    ProviderConfigurationsCache.set(TENANT_ID, _provider_configurations(), version=0)
+    session = MagicMock(new=[Provider(tenant_id=TENANT_ID)], dirty=[], deleted=[], info={})
+
+    provider_configurations_cache._collect_changed_tenants(session, None)
+    assert ProviderConfigurationsCache.get(TENANT_ID) is not None
+
+    provider_configurations_cache._invalidate_changed_tenants(session)
+    assert ProviderConfigurationsCache.get(TENANT_ID) is None
+    clean_cache.publish.assert_called_once_with(provider_configurations_cache.INVALIDATION_CHANNEL, TENANT_ID)
+
+
+def _cache_trial_quota(quota_used: int, quota_limit: int) -> None:
+    provider_configurations = _provider_configurations()
+    provider_configurations["openai"].system_configuration = SystemConfiguration(
+        enabled=True,
+        current_quota_type=ProviderQuotaType.TRIAL,
+        quota_configurations=[
+            QuotaConfiguration(
+                quota_type=ProviderQuotaType.TRIAL,
+                quota_unit=QuotaUnit.TIMES,
+                quota_used=quota_used,
+                quota_limit=quota_limit,
+                is_valid=True,
+            )
+        ],
+    )
+    ProviderConfigurationsCache.set(TENANT_ID, provider_configurations, version=0)
+
+
+def test_quota_usage_patches_the_cached_quota(clean_cache):
+    _cache_trial_quota(quota_used=1, quota_limit=10)
+
+    ProviderConfigurationsCache.record_quota_usage(TENANT_ID, "openai", ProviderQuotaType.TRIAL, 2)
+
+    cached = ProviderConfigurationsCache.get(TENANT_ID)
+    assert cached is not None
+    assert cached["openai"].system_configuration.quota_configurations[0].quota_used == 3
+    # the other processes are not notified, their entries expire with the TTL
+    clean_cache.publish.assert_not_called()
+
+
+def test_exhausted_quota_invalidates_the_tenant(clean_cache):
+    _cache_trial_quota(quota_used=9, quota_limit=10)
+
+    ProviderConfigurationsCache.record_quota_usage(TENANT_ID, "openai", ProviderQuotaType.TRIAL, 1)
+
+    assert ProviderConfigurationsCache.get(TENANT_ID) is None
+    clean_cache.publish.assert_called_once_with(provider_configurations_cache.INVALIDATION_CHANNEL, TENANT_ID)
+
+
+def test_decrypt_decoding_is_cached():
+    private_key = RSA.generate(2048)
+    token = base64.b64encode(rsa.encrypt("secret", private_key.publickey().export_key())).decode()
+
+    with (
+        patch.object(rsa, "redis_client", new=MagicMock()) as mock_redis,
+        patch.object(rsa, "storage", new=MagicMock()) as mock_storage,
+    ):
+        mock_redis.get.return_value = private_key.export_key()
+        assert encrypter.decrypt_token(TENANT_ID, token) == "secret"
+        assert encrypter.decrypt_token(TENANT_ID, token) == "secret"
+
+        assert mock_redis.get.call_count == 1
+        mock_storage.load.assert_not_called()
+
+        ProviderConfigurationsCache.invalidate_local(TENANT_ID)
+        assert encrypter.decrypt_token(TENANT_ID, token) == "secret"
+        assert mock_redis.get.call_count == 2
+
+
+def _slow(return_value):
+    def _call(*args, **kwargs):
+        time.sleep(ROUND_TRIP_LATENCY)
+        return return_value
+
+    return _call
+
+
+def _benchmark_get_model_instance(benchmark, cache_enabled: bool, monkeypatch):
+    monkeypatch.setattr(dify_config, "PROVIDER_CONFIGURATIONS_CACHE_ENABLED", cache_enabled)
+    provider_record = Provider(
+        id="provider-id",
+        tenant_id=TENANT_ID,
+        provider_name="openai",
+        provider_type=ProviderType.CUSTOM.value,
+        encrypted_config='{"openai_api_key": "key"}',
+        is_valid=True,
+    )
+    model_type_instance = MagicMock(spec=AIModel, model_type=ModelType.LLM)
+
+    with (
+        patch.object(ProviderManager, "_get_all_providers", _slow({"langgenius/openai/openai": [provider_record]})),
+        patch.object(ProviderManager, "_init_trial_provider_records", side_effect=lambda tenant_id, records: records),
+        patch.object(ProviderManager, "_get_all_provider_models", _slow({})),
+        patch.object(ProviderManager, "_get_all_preferred_model_providers", _slow({})),
+        patch.object(ProviderManager, "_get_all_provider_model_settings", _slow({})),
+        patch.object(ProviderManager, "_get_all_provider_load_balancing_configs", _slow({})),
+        patch("core.provider_manager.ModelProviderFactory") as mock_factory,
+        patch("core.provider_manager.ProviderCredentialsCache") as mock_credentials_cache,
+        patch(
+            "core.entities.provider_configuration.ProviderConfiguration.get_model_type_instance",
+            return_value=model_type_instance,
+        ),
+    ):
+        mock_factory.return_value.get_providers.side_effect = _slow([_provider_entity()])
+        mock_credentials_cache.return_value.get.side_effect = _slow({"openai_api_key": "key"})
+
+        model_instance = benchmark(
+            ModelManager().get_model_instance, TENANT_ID, "langgenius/openai/openai", ModelType.LLM, "gpt-4o"
+        )
+
+    assert model_instance.credentials == {"openai_api_key": "key"}
+
+
+@pytest.mark.benchmark(group="get_model_instance")
+def test_benchmark_get_model_instance_without_cache(benchmark, monkeypatch):
+    _benchmark_get_model_instance(benchmark, False, monkeypatch)
+
+
+@pytest.mark.benchmark(group="get_model_instance")
+def test_benchmark_get_model_instance_with_cache(benchmark, monkeypatch):
+    _benchmark_get_model_instance(benchmark, True, monkeypatch)
@@ -1,8 +1,11 @@
+import asyncio
 import random
 from unittest.mock import MagicMock, patch
 
+import httpx
 import pytest
 
+from core.helper import ssrf_proxy
 from core.helper.ssrf_proxy import SSRF_DEFAULT_MAX_RETRIES, STATUS_FORCELIST, make_request
 
 
@@ -50,3 +53,62 @@ def test_retry_logic_success(mock_request):
     assert response.status_code == 200
     assert mock_request.call_count == SSRF_DEFAULT_MAX_RETRIES + 1
     assert mock_request.call_args_list[0][1].get("method") == "GET"
+
+
+def _clear_clients():
+    ssrf_proxy.close_clients()
+    ssrf_proxy._async_clients.clear()
+
+
+@pytest.fixture
+def pooled_clients():
+    _clear_clients()
+    yield
+    _clear_clients()
+
+
+@patch("httpx.Client.request")
+def test_client_is_reused_across_requests_and_retries(mock_request, pooled_clients):
+    mock_response_500 = MagicMock()
+    mock_response_500.status_code = 500
+    mock_response_200 = MagicMock()
+    mock_response_200.status_code = 200
+    mock_request.side_effect = [mock_response_500, mock_response_200, mock_response_200]
+
+    with patch("time.sleep"):
+        make_request("GET", "http://example.com")
+    make_request("GET", "http://example.com")
+
+    assert len(ssrf_proxy._clients) == 1
+    assert mock_request.call_count == 3
+
+
+@patch("httpx.AsyncClient.request")
+def test_async_client_is_pooled_per_event_loop(mock_request, pooled_clients):
+    mock_response_200 = MagicMock()
+    mock_response_200.status_code = 200
+    mock_request.return_value = mock_response_200
+
+    async def _requests():
+        await ssrf_proxy.make_async_request("GET", "http://example.com")
+        await ssrf_proxy.make_async_request("GET", "http://example.com")
+        # keep the loop alive, the clients of a loop are dropped with it
+        return ssrf_proxy._get_async_client(), asyncio.get_running_loop()
+
+    first_loop_client, first_loop = asyncio.run(_requests())
+    second_loop_client, second_loop = asyncio.run(_requests())
+
+    assert first_loop_client is not second_loop_client
+    assert mock_request.call_count == 4
+    # the loops are still referenced, their clients are kept
+    assert len(ssrf_proxy._async_clients) == 2
+
+
+def test_pooled_client_does_not_keep_cookies(pooled_clients):
+    client = ssrf_proxy._get_client()
+    request = httpx.Request("GET", "http://example.com")
+    response = httpx.Response(200, headers={"set-cookie": "session=secret"}, request=request)
+
+    client.cookies.extract_cookies(response)
+
+    assert len(client.cookies.jar) == 0
@@ -0,0 +1,84 @@
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.helper import token_counter
+from core.helper.token_counter import TokenCounter
+
+
+def _mock_model_instance(provider: str, model: str | None = None) -> MagicMock:
+    model_instance = MagicMock()
+    model_instance.provider = provider
+    # a fresh model per test, so counts memoized by other tests are not reused
+    model_instance.model = model or f"model-{uuid.uuid4()}"
+    model_instance.get_text_embedding_num_tokens.side_effect = lambda texts: [len(text) for text in texts]
+    return model_instance
+
+
+@pytest.fixture
+def clean_cache():
+    token_counter._counts.clear()
+    token_counter._encodings.clear()
+
+
+def test_counts_are_memoized(clean_cache):
+    model_instance = _mock_model_instance("langgenius/cohere/cohere")
+    counter = TokenCounter(model_instance)
+
+    assert counter.count_many(["hello", "world", "hello"]) == [5, 5, 5]
+    assert counter.count_many(["world", "dify"]) == [5, 4]
+    assert counter.count("hello") == 5
+
+    calls = [call.kwargs["texts"] for call in model_instance.get_text_embedding_num_tokens.call_args_list]
+    assert calls == [["hello", "world"], ["dify"]]
+
+
+def test_counts_are_cached_per_model(clean_cache):
+    first = _mock_model_instance("langgenius/cohere/cohere")
+    second = _mock_model_instance("langgenius/cohere/cohere")
+
+    TokenCounter(first).count("hello")
+    TokenCounter(second).count("hello")
+
+    assert first.get_text_embedding_num_tokens.call_count == 1
+    assert second.get_text_embedding_num_tokens.call_count == 1
+
+
+def test_known_model_family_is_counted_locally(clean_cache):
+    encoding = MagicMock()
+    encoding.encode_ordinary.side_effect = lambda text: text.split()
+    model_instance = _mock_model_instance("langgenius/openai/openai", "text-embedding-3-small")
+
+    with patch("tiktoken.encoding_for_model", return_value=encoding) as mock_encoding_for_model:
+        assert TokenCounter(model_instance).count_many(["a b c", "d"]) == [3, 1]
+
+    mock_encoding_for_model.assert_called_once_with("text-embedding-3-small")
+    model_instance.get_text_embedding_num_tokens.assert_not_called()
+
+
+def test_unknown_model_is_counted_by_provider(clean_cache):
+    model_instance = _mock_model_instance("langgenius/openai/openai", "my-fine-tuned-embedding")
+
+    with patch("tiktoken.encoding_for_model", side_effect=KeyError("unknown model")):
+        assert TokenCounter(model_instance).count("hello") == 5
+
+    model_instance.get_text_embedding_num_tokens.assert_called_once()
+
+
+def test_splitter_does_not_count_the_same_text_twice(clean_cache):
+    from core.rag.splitter.fixed_text_splitter import FixedRecursiveCharacterTextSplitter
+
+    model_instance = _mock_model_instance("langgenius/cohere/cohere")
+    splitter = FixedRecursiveCharacterTextSplitter.from_encoder(
+        embedding_model_instance=model_instance, chunk_size=50, chunk_overlap=10, fixed_separator="\n\n"
+    )
+    text = "\n\n".join(" ".join(f"word{i}" for i in range(40)) for _ in range(20))
+
+    chunks = splitter.split_text(text)
+
+    assert chunks
+    counted_texts = [
+        text for call in model_instance.get_text_embedding_num_tokens.call_args_list for text in call.kwargs["texts"]
+    ]
+    assert len(counted_texts) == len(set(counted_texts))
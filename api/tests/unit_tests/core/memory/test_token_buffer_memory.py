@@ -0,0 +1,134 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.memory import token_buffer_memory
+from core.memory.token_buffer_memory import TokenBufferMemory
+from core.model_runtime.entities import AssistantPromptMessage, PromptMessage, UserPromptMessage
+from models.model import AppMode, MessageFile
+
+# tokens added once per request, e.g. the priming of the reply
+_OVERHEAD_TOKENS = 3
+
+
+def _count_tokens(prompt_messages: list[PromptMessage]) -> int:
+    return _OVERHEAD_TOKENS + sum(len(str(prompt_message.content)) for prompt_message in prompt_messages)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data: dict[str, int] = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        pipeline = MagicMock()
+        pipeline.setex.side_effect = lambda key, ttl, value: self.data.__setitem__(key, value)
+        return pipeline
+
+
+@pytest.fixture
+def fake_redis():
+    with patch.object(token_buffer_memory, "redis_client", new=_FakeRedis()) as redis:
+        yield redis
+
+
+@pytest.fixture
+def memory(fake_redis) -> TokenBufferMemory:
+    model_instance = MagicMock(provider="openai", model="gpt-4o")
+    model_instance.get_llm_num_tokens.side_effect = _count_tokens
+    return TokenBufferMemory(conversation=MagicMock(mode=AppMode.CHAT), model_instance=model_instance)
+
+
+def _history(turns: int, start: int = 0) -> list[PromptMessage]:
+    prompt_messages: list[PromptMessage] = []
+    for turn in range(start, start + turns):
+        prompt_messages.append(UserPromptMessage(content=f"question {turn:04d}"))
+        prompt_messages.append(AssistantPromptMessage(content=f"answer {turn:04d} " + "x" * 40))
+    return prompt_messages
+
+
+def _prune_by_recounting(count_tokens, prompt_messages: list[PromptMessage], max_token_limit: int):
+    # the previous pruning, counting the whole history again after removing every message
+    prompt_messages = list(prompt_messages)
+    curr_message_tokens = count_tokens(prompt_messages)
+    while curr_message_tokens > max_token_limit and len(prompt_messages) > 1:
+        prompt_messages.pop(0)
+        curr_message_tokens = count_tokens(prompt_messages)
+    return prompt_messages
+
+
+@pytest.mark.parametrize("max_token_limit", [0, 100, 500, 2000, 100000])
+def test_prune_keeps_the_same_messages_as_recounting(memory, max_token_limit):
+    prompt_messages = _history(20)
+
+    pruned = memory._prune_prompt_messages(prompt_messages, max_token_limit)
+
+    assert pruned == _prune_by_recounting(_count_tokens, prompt_messages, max_token_limit)
+
+
+def test_prune_counts_a_window_that_fits_at_once(memory):
+    count_calls = memory.model_instance.get_llm_num_tokens
+    prompt_messages = _history(20)
+
+    assert memory._prune_prompt_messages(prompt_messages, 100000) == prompt_messages
+    count_calls.assert_called_once_with(prompt_messages)
+
+
+def test_prune_counts_each_message_once(memory):
+    count_calls = memory.model_instance.get_llm_num_tokens
+
+    pruned = memory._prune_prompt_messages(_history(20), 500)
+    # the whole window, the overhead, the kept messages and the first message over the limit
+    assert count_calls.call_count == 1 + 1 + len(pruned) + 1
+
+    # the next turn only counts the whole window and its own messages
+    count_calls.reset_mock()
+    memory._prune_prompt_messages(_history(20) + _history(1, start=20), 500)
+    assert count_calls.call_count == 3
+
+
+def test_files_and_workflows_are_fetched_with_batched_queries(memory):
+    memory.conversation.mode = AppMode.ADVANCED_CHAT
+    messages = [
+        SimpleNamespace(id=f"message-{i}", workflow_run_id=f"run-{i % 2}", query="q", answer="a") for i in range(10)
+    ]
+    files = [MagicMock(spec=MessageFile, message_id=f"message-{i}") for i in (1, 2, 3)]
+    workflows = [SimpleNamespace(id="workflow", features_dict={})]
+
+    with (
+        patch.object(token_buffer_memory, "db") as mock_db,
+        patch.object(token_buffer_memory.FileUploadConfigManager, "convert", return_value="config") as convert,
+    ):
+        mock_db.session.query.return_value.filter.return_value.all.side_effect = [
+            files,
+            [("run-0", "workflow"), ("run-1", "workflow")],
+            workflows,
+        ]
+        message_files = memory._fetch_message_files(messages)
+        file_extra_configs = memory._fetch_file_extra_configs(messages, message_files)
+
+    assert mock_db.session.query.call_count == 3
+    assert message_files["message-2"] == [files[1]]
+    assert file_extra_configs == {f"message-{i}": "config" for i in (1, 2, 3)}
+    assert convert.call_count == 1
+
+
+@pytest.mark.parametrize("incremental", [False, True], ids=["recounting", "incremental"])
+@pytest.mark.benchmark(group="token_buffer_memory_prune")
+def test_benchmark_prune_history(benchmark, memory, incremental):
+    prompt_messages = _history(100)
+
+    def count_tokens(prompt_messages):
+        # stands in for the round trip to the plugin daemon counting the tokens
+        time.sleep(0.0005)
+        return _count_tokens(prompt_messages)
+
+    memory.model_instance.get_llm_num_tokens.side_effect = count_tokens
+    if incremental:
+        benchmark(memory._prune_prompt_messages, prompt_messages, 2000)
+    else:
+        benchmark(_prune_by_recounting, count_tokens, prompt_messages, 2000)
@@ -0,0 +1,172 @@
+import gzip
+import json
+import queue
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from configs import dify_config
+from core.ops import ops_trace_manager
+from core.ops.entities.trace_entity import GenerateNameTraceInfo, TraceTaskName
+from core.ops.ops_trace_manager import TraceQueueManager, TraceTask, TraceTaskLookups
+from tasks.ops_trace_task import process_trace_tasks_batch
+
+
+@pytest.fixture
+def trace_queue_manager(monkeypatch) -> TraceQueueManager:
+    monkeypatch.setattr(ops_trace_manager, "trace_manager_queue", queue.Queue(maxsize=2))
+    monkeypatch.setattr(
+        ops_trace_manager, "trace_manager_stats", dict.fromkeys(ops_trace_manager.trace_manager_stats, 0)
+    )
+    manager = TraceQueueManager.__new__(TraceQueueManager)
+    manager.app_id = "app-id"
+    manager.user_id = None
+    manager.trace_instance = MagicMock()
+    manager.flask_app = MagicMock()
+    manager.start_timer = MagicMock()
+    return manager
+
+
+def _generate_name_task(conversation_id: str) -> TraceTask:
+    return TraceTask(
+        TraceTaskName.GENERATE_NAME_TRACE,
+        conversation_id=conversation_id,
+        generate_conversation_name="name",
+        inputs="hello",
+        tenant_id="tenant-id",
+        timer={"start": None, "end": None},
+    )
+
+
+def test_full_queue_drops_trace_tasks(trace_queue_manager):
+    for i in range(3):
+        trace_queue_manager.add_trace_task(_generate_name_task(f"conversation-{i}"))
+
+    stats = TraceQueueManager.get_stats()
+    assert stats["enqueued"] == 2
+    assert stats["dropped"] == 1
+    assert stats["queued"] == 2
+
+
+def test_batch_export_writes_one_file_and_one_task(trace_queue_manager, monkeypatch):
+    monkeypatch.setattr(dify_config, "OPS_TRACE_BATCH_EXPORT_ENABLED", True)
+    tasks = [_generate_name_task(f"conversation-{i}") for i in range(3)]
+    for task in tasks:
+        task.app_id = "app-id"
+
+    with (
+        patch.object(ops_trace_manager, "storage") as storage,
+        patch.object(ops_trace_manager, "process_trace_tasks") as process_trace_tasks,
+        patch.object(ops_trace_manager, "process_trace_tasks_batch") as process_trace_tasks_batch,
+    ):
+        trace_queue_manager.send_to_celery(tasks)
+
+    assert storage.save.call_count == 1
+    assert not process_trace_tasks.delay.called
+    assert process_trace_tasks_batch.delay.call_count == 1
+    file_path, content = storage.save.call_args.args
+    file_id = process_trace_tasks_batch.delay.call_args.args[0]["file_id"]
+    assert file_path == f"ops_trace/batches/{file_id}.jsonl.gz"
+    lines = [json.loads(line) for line in gzip.decompress(content).splitlines()]
+    assert [line["trace_info"]["conversation_id"] for line in lines] == [
+        "conversation-0",
+        "conversation-1",
+        "conversation-2",
+    ]
+    assert {line["trace_info_type"] for line in lines} == {"GenerateNameTraceInfo"}
+
+    stats = TraceQueueManager.get_stats()
+    assert stats["exported"] == 3
+    assert stats["files"] == 1
+
+
+def test_empty_trace_tasks_are_not_exported(trace_queue_manager):
+    tasks = [_generate_name_task(f"conversation-{i}") for i in range(2)]
+    for task in tasks:
+        task.app_id = "app-id"
+
+    with (
+        patch.object(ops_trace_manager, "storage") as storage,
+        patch.object(ops_trace_manager, "process_trace_tasks") as process_trace_tasks,
+        patch.object(TraceTask, "execute", side_effect=[None, None]),
+    ):
+        trace_queue_manager.send_to_celery(tasks)
+
+    # no file is stored and no celery task is enqueued for trace tasks which collected nothing
+    assert not storage.save.called
+    assert not process_trace_tasks.delay.called
+    stats = TraceQueueManager.get_stats()
+    assert stats["skipped"] == 2
+    assert stats["exported"] == 0
+
+
+def test_batch_task_traces_every_line():
+    trace_infos = [
+        GenerateNameTraceInfo(conversation_id=f"conversation-{i}", tenant_id="tenant-id", metadata={}) for i in range(3)
+    ]
+    lines = [
+        json.dumps({"app_id": "app-id", "trace_info_type": "GenerateNameTraceInfo", "trace_info": info.model_dump()})
+        for info in trace_infos
+    ]
+    trace_instance = MagicMock()
+    trace_instance.trace.side_effect = [None, Exception("provider unavailable"), None]
+
+    with (
+        patch("tasks.ops_trace_task.storage") as storage,
+        patch("tasks.ops_trace_task.redis_client", new=MagicMock()) as redis_client,
+        patch("core.ops.ops_trace_manager.OpsTraceManager.get_ops_trace_instance", return_value=trace_instance) as get,
+    ):
+        storage.load.return_value = gzip.compress("\n".join(lines).encode("utf-8"))
+        process_trace_tasks_batch({"file_id": "file-id"})
+
+    # the trace instance is built once per app and a failed trace doesn't stop the batch
+    assert get.call_count == 1
+    assert trace_instance.trace.call_count == 3
+    redis_client.incr.assert_called_once_with("FAILED_OPS_TRACE_app-id")
+    storage.delete.assert_called_once_with("ops_trace/batches/file-id.jsonl.gz")
+
+
+def test_batch_task_skips_empty_trace_infos():
+    trace_info = GenerateNameTraceInfo(conversation_id="conversation-id", tenant_id="tenant-id", metadata={})
+    lines = [
+        json.dumps({"app_id": "app-id", "trace_info_type": "NoneType", "trace_info": None}),
+        json.dumps(
+            {"app_id": "app-id", "trace_info_type": "GenerateNameTraceInfo", "trace_info": trace_info.model_dump()}
+        ),
+    ]
+    trace_instance = MagicMock()
+
+    with (
+        patch("tasks.ops_trace_task.storage") as storage,
+        patch("tasks.ops_trace_task.redis_client", new=MagicMock()) as redis_client,
+        patch("core.ops.ops_trace_manager.OpsTraceManager.get_ops_trace_instance", return_value=trace_instance),
+    ):
+        storage.load.return_value = gzip.compress("\n".join(lines).encode("utf-8"))
+        process_trace_tasks_batch({"file_id": "file-id"})
+
+    trace_instance.trace.assert_called_once()
+    assert not redis_client.incr.called
+
+
+def test_lookups_are_shared_by_the_traces_of_a_message():
+    message = MagicMock(id="message-id", conversation_id="conversation-id", workflow_run_id=None)
+    lookups = TraceTaskLookups()
+
+    with patch.object(ops_trace_manager, "db") as db:
+        db.session.query.return_value.filter.side_effect = [[message], []]
+        db.session.execute.return_value = [("conversation-id", "chat")]
+        lookups.prefetch(
+            [
+                TraceTask(TraceTaskName.MESSAGE_TRACE, message_id=message_id)
+                for message_id in ["message-id", "missing-id"]
+            ]
+        )
+        assert db.session.query.call_count == 2
+        assert db.session.execute.call_count == 1
+
+        assert lookups.get_message("message-id") is message
+        assert lookups.get_message("missing-id") is None
+        assert lookups.get_conversation_mode("conversation-id") == "chat"
+        # prefetched rows, including the missing ones, are not queried again
+        assert db.session.query.call_count == 2
+        assert db.session.execute.call_count == 1
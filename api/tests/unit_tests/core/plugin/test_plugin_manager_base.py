@@ -0,0 +1,84 @@
+import urllib.request
+from email.message import Message
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.plugin.entities.plugin_daemon import PluginDaemonInnerError
+from core.plugin.manager import base
+from core.plugin.manager.base import BasePluginManager
+
+TENANT_ID = "9f2b3c4d-1a2b-4c3d-8e9f-0a1b2c3d4e5f"
+
+
+def _mock_response(content: bytes = b"", lines: list[bytes] | None = None, status_code: int = 200) -> MagicMock:
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = content
+    response.iter_lines.return_value = lines or []
+    return response
+
+
+@pytest.fixture
+def mock_session():
+    session = MagicMock()
+    with patch("core.plugin.manager.base._get_session", return_value=session):
+        yield session
+
+
+def test_session_is_reused_within_process():
+    assert base._get_session() is base._get_session()
+
+
+def test_session_does_not_keep_cookies():
+    session = base._get_session()
+    headers = Message()
+    headers["Set-Cookie"] = "session=secret"
+    response = MagicMock()
+    response.info.return_value = headers
+
+    session.cookies.extract_cookies(response, urllib.request.Request("http://localhost/plugin"))
+
+    assert len(session.cookies) == 0
+
+
+def test_basic_response_model_is_created_once_per_type():
+    assert base._get_basic_response_model(dict) is base._get_basic_response_model(dict)
+
+
+def test_request_with_plugin_daemon_response(mock_session):
+    mock_session.request.return_value = _mock_response(b'{"code": 0, "message": "", "data": {"a": 1}}')
+
+    data = BasePluginManager()._request_with_plugin_daemon_response("GET", f"plugin/{TENANT_ID}/test", dict)
+
+    assert data == {"a": 1}
+
+
+def test_stream_response_parses_every_line(mock_session):
+    response = _mock_response(
+        lines=[
+            b'data: {"code": 0, "message": "", "data": "hello"}',
+            b"",
+            b'{"code": 0, "message": "", "data": "world"}',
+        ]
+    )
+    mock_session.request.return_value = response
+
+    chunks = list(BasePluginManager()._request_with_plugin_daemon_response_stream("POST", "dispatch/stream", str))
+
+    assert chunks == ["hello", "world"]
+    response.close.assert_called_once()
+
+
+def test_stream_response_raises_daemon_error(mock_session):
+    mock_session.request.return_value = _mock_response(lines=[b'{"error": "plugin crashed"}'])
+
+    with pytest.raises(ValueError, match="plugin crashed"):
+        list(BasePluginManager()._request_with_plugin_daemon_response_stream("POST", "dispatch/stream", str))
+
+
+def test_stream_response_raises_inner_error(mock_session):
+    mock_session.request.return_value = _mock_response(lines=[b'{"code": -500, "message": "boom", "data": null}'])
+
+    with pytest.raises(PluginDaemonInnerError):
+        list(BasePluginManager()._request_with_plugin_daemon_response_stream("POST", "dispatch/stream", str))
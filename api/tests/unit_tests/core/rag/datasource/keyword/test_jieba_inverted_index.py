@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from core.rag.datasource.keyword.jieba.jieba_inverted_index import JiebaInvertedIndex
+from core.rag.datasource.keyword.keyword_factory import Keyword
+from core.rag.datasource.keyword.keyword_type import KeyWordType
+
+
+def _dataset() -> MagicMock:
+    dataset = MagicMock()
+    dataset.id = "dataset-id"
+    return dataset
+
+
+def test_keyword_factory_returns_inverted_index():
+    assert Keyword.get_keyword_factory(KeyWordType.JIEBA_INVERTED_INDEX) is JiebaInvertedIndex
+
+
+@patch("core.rag.datasource.keyword.jieba.jieba_inverted_index.db")
+def test_add_postings_deduplicates_and_ignores_conflicts(mock_db):
+    JiebaInvertedIndex(_dataset()).add_postings(
+        [("apple", "node-1"), ("banana", "node-1"), ("apple", "node-1"), ("apple", "node-2")]
+    )
+
+    mock_db.session.execute.assert_called_once()
+    stmt = mock_db.session.execute.call_args.args[0]
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    assert "ON CONFLICT (dataset_id, keyword, index_node_id) DO NOTHING" in str(compiled)
+    assert len([key for key in compiled.params if key.startswith("keyword")]) == 3
+    mock_db.session.commit.assert_called_once()
+
+
+@patch("core.rag.datasource.keyword.jieba.jieba_inverted_index.db")
+def test_add_postings_skips_empty_input(mock_db):
+    JiebaInvertedIndex(_dataset()).add_postings([])
+
+    mock_db.session.execute.assert_not_called()
+    mock_db.session.commit.assert_not_called()
+
+
+@patch("core.rag.datasource.keyword.jieba.jieba_inverted_index.db")
+def test_search_ranks_by_matched_keywords_in_a_single_query(mock_db):
+    mock_db.session.scalars.return_value.all.return_value = ["node-2", "node-1"]
+    keyword_store = JiebaInvertedIndex(_dataset())
+
+    with patch.object(keyword_store, "_get_documents_by_chunk_indices", return_value=[]) as get_documents:
+        keyword_store.search("苹果 香蕉", top_k=2, document_ids_filter=["document-id"])
+
+    stmt = mock_db.session.scalars.call_args.args[0]
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "GROUP BY dataset_keyword_indexes.index_node_id" in sql
+    assert "ORDER BY count(dataset_keyword_indexes.keyword) DESC" in sql
+    assert "JOIN document_segments" in sql
+    get_documents.assert_called_once_with(["node-2", "node-1"], ["document-id"])
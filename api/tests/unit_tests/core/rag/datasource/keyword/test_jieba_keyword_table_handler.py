@@ -0,0 +1,147 @@
+import multiprocessing
+import os
+import signal
+import time
+from unittest.mock import patch
+
+import pytest
+
+from core.rag.datasource.keyword.jieba.jieba_keyword_table_handler import JiebaKeywordTableHandler
+
+SAMPLE_SENTENCES = [
+    "Dify 是一个开源的大语言模型应用开发平台，融合了后端即服务和 LLMOps 的理念。",
+    "知识库支持多种索引方式，包括高质量向量索引和经济型关键词索引。",
+    "The keyword index maps every extracted keyword to the segments that contain it.",
+    "工作流节点可以并行执行，迭代节点会对列表中的每个元素运行子图。",
+    "Retrieval-augmented generation combines semantic search with full-text search and reranking.",
+]
+
+
+def _corpus(size: int) -> list[str]:
+    return [f"{SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)]} 段落{i} chunk_{i}" for i in range(size)]
+
+
+def test_get_instance_returns_singleton():
+    assert JiebaKeywordTableHandler.get_instance() is JiebaKeywordTableHandler.get_instance()
+
+
+def test_expand_tokens_filters_stopwords_from_subtokens():
+    handler = JiebaKeywordTableHandler.get_instance()
+
+    assert handler._expand_tokens_with_subtokens({"retrieval-during-indexing"}) == {
+        "retrieval-during-indexing",
+        "retrieval",
+        "indexing",
+    }
+
+
+def test_extract_keywords_batch_matches_single_extraction():
+    handler = JiebaKeywordTableHandler.get_instance()
+    texts = _corpus(20)
+
+    assert handler.extract_keywords_batch(texts, 10) == [handler.extract_keywords(text, 10) for text in texts]
+
+
+@pytest.fixture
+def worker_pool_config():
+    with patch("core.rag.datasource.keyword.jieba.jieba_keyword_table_handler.dify_config") as mock_config:
+        mock_config.KEYWORD_EXTRACTION_MAX_WORKERS = 2
+        mock_config.KEYWORD_EXTRACTION_PROCESS_POOL_THRESHOLD = 4
+        mock_config.KEYWORD_EXTRACTION_WORKER_TIMEOUT = 60.0
+        yield mock_config
+    JiebaKeywordTableHandler._close_worker_pool()
+    JiebaKeywordTableHandler._worker_pool_failed_pid = None
+
+
+def test_extract_keywords_batch_in_worker_processes(worker_pool_config):
+    handler = JiebaKeywordTableHandler.get_instance()
+    texts = _corpus(9)
+
+    with patch.object(handler, "extract_keywords", wraps=handler.extract_keywords) as extract_keywords:
+        keywords = handler.extract_keywords_batch(texts, 10)
+
+    # the fan-out happened in the worker processes, not in this one
+    extract_keywords.assert_not_called()
+    assert keywords == [handler.extract_keywords(text, 10) for text in texts]
+
+
+def test_worker_processes_run_in_daemonic_processes(worker_pool_config):
+    handler = JiebaKeywordTableHandler.get_instance()
+    texts = _corpus(8)
+
+    # celery prefork children are daemonic, they can't start multiprocessing children
+    with patch.dict(multiprocessing.current_process()._config, {"daemon": True}):
+        with patch.object(handler, "extract_keywords", wraps=handler.extract_keywords) as extract_keywords:
+            keywords = handler.extract_keywords_batch(texts, 10)
+
+    extract_keywords.assert_not_called()
+    assert keywords == [handler.extract_keywords(text, 10) for text in texts]
+
+
+def test_killed_worker_is_replaced_with_the_next_batch(worker_pool_config):
+    handler = JiebaKeywordTableHandler.get_instance()
+    texts = _corpus(8)
+    expected = [handler.extract_keywords(text, 10) for text in texts]
+    handler.extract_keywords_batch(texts, 10)
+    worker_pool = JiebaKeywordTableHandler._worker_pool
+    assert worker_pool is not None
+    worker_pool._processes[0].kill()
+    worker_pool._processes[0].wait()
+
+    # the batch falls back to this process, the next one runs on new workers
+    assert handler.extract_keywords_batch(texts, 10) == expected
+    assert JiebaKeywordTableHandler._worker_pool is None
+    assert handler.extract_keywords_batch(texts, 10) == expected
+    assert JiebaKeywordTableHandler._worker_pool is not None
+
+
+def test_hung_worker_is_replaced_after_the_timeout(worker_pool_config):
+    handler = JiebaKeywordTableHandler.get_instance()
+    texts = _corpus(8)
+    expected = [handler.extract_keywords(text, 10) for text in texts]
+    handler.extract_keywords_batch(texts, 10)
+    worker_pool = JiebaKeywordTableHandler._worker_pool
+    assert worker_pool is not None
+    worker_pool._timeout = 0.5
+    os.kill(worker_pool._processes[0].pid, signal.SIGSTOP)
+
+    started_at = time.monotonic()
+    assert handler.extract_keywords_batch(texts, 10) == expected
+    assert time.monotonic() - started_at < 5
+    # the hung worker is killed, the next batch runs on new workers
+    assert worker_pool._processes == []
+    assert handler.extract_keywords_batch(texts, 10) == expected
+    assert JiebaKeywordTableHandler._worker_pool is not worker_pool
+
+
+def test_stop_words_stay_mutable():
+    import jieba.analyse  # type: ignore
+
+    JiebaKeywordTableHandler.get_instance()
+
+    # jieba.analyse.set_stop_words adds to the set in place
+    assert isinstance(jieba.analyse.default_tfidf.stop_words, set)
+
+
+def test_worker_start_failure_is_not_retried_in_the_same_process(worker_pool_config):
+    handler = JiebaKeywordTableHandler.get_instance()
+    texts = _corpus(8)
+
+    with patch.object(
+        JiebaKeywordTableHandler, "_get_worker_pool", side_effect=OSError("can't start")
+    ) as get_worker_pool:
+        first = handler.extract_keywords_batch(texts, 10)
+        second = handler.extract_keywords_batch(texts, 10)
+
+    assert get_worker_pool.call_count == 1
+    assert first == second == [handler.extract_keywords(text, 10) for text in texts]
+
+
+@pytest.mark.benchmark(group="jieba-keyword-extraction")
+def test_benchmark_extract_keywords_batch(benchmark):
+    handler = JiebaKeywordTableHandler.get_instance()
+    texts = _corpus(2_000)
+
+    keywords = benchmark(handler.extract_keywords_batch, texts, 10)
+
+    assert len(keywords) == len(texts)
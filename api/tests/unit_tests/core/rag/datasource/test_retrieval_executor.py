@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+from core.rag.datasource.retrieval_executor import RetrievalExecutor, RetrievalExecutorBusyError
+
+
+def _executor(**kwargs) -> RetrievalExecutor:
+    options = {"max_workers": 2, "max_queued_tasks": 100, "max_workers_per_tenant": 2, "queue_timeout": 1.0}
+    options.update(kwargs)
+    return RetrievalExecutor(**options)
+
+
+def _wait_until_idle(executor: RetrievalExecutor) -> None:
+    # futures are resolved before the worker releases the task's slot
+    deadline = time.monotonic() + 5
+    while executor._active_count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_submit_returns_result():
+    executor = _executor()
+
+    assert executor.submit("tenant", lambda x: x * 2, 21).result(timeout=5) == 42
+
+    _wait_until_idle(executor)
+    assert executor._queued_count == 0
+    assert executor._active_count == 0
+    assert len(executor._workers) == 1
+
+
+def test_submit_propagates_exceptions():
+    executor = _executor()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        executor.submit("tenant", fail).result(timeout=5)
+
+
+def test_nested_submits_run_in_parallel_without_deadlock():
+    executor = _executor(max_workers=4, max_workers_per_tenant=4, max_nested_workers=3)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def search():
+        # every search waits for the two others, running them one after another would break the barrier
+        barrier.wait()
+        return executor.submit("tenant", lambda: threading.current_thread().name).result(timeout=5)
+
+    def outer():
+        futures = [executor.submit("tenant", search) for _ in range(3)]
+        return [future.result(timeout=5) for future in futures]
+
+    names = executor.submit("tenant", outer).result(timeout=5)
+
+    # nested submits run on the nested pool, deeper ones inline
+    assert all(name.startswith("retrieval-worker-nested") for name in names)
+
+
+def test_nested_submits_stay_within_the_pool_and_tenant_limits():
+    executor = _executor(max_workers=4, max_workers_per_tenant=2, max_nested_workers=4)
+    running = 0
+    max_running = 0
+    thread_names: list[str] = []
+    lock = threading.Lock()
+
+    def search():
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+            thread_names.append(threading.current_thread().name)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    def outer():
+        futures = [executor.submit("tenant", search) for _ in range(6)]
+        for future in futures:
+            future.result(timeout=5)
+
+    executor.submit("tenant", outer).result(timeout=5)
+
+    # the outer task holds one of the tenant's two slots, the searches beyond the other one run inline
+    assert max_running <= 2
+    assert len(thread_names) == 6
+    assert any(not name.startswith("retrieval-worker-nested") for name in thread_names)
+    _wait_until_idle(executor)
+    assert executor._active_count == 0
+    assert executor._tenant_active == {}
+
+
+def test_tenants_are_served_round_robin():
+    executor = _executor(max_workers=1, max_workers_per_tenant=1)
+    blocker = threading.Event()
+    order: list[str] = []
+    executor.submit("busy", blocker.wait)
+    futures = [executor.submit("busy", order.append, f"busy-{i}") for i in range(3)]
+    futures.append(executor.submit("quiet", order.append, "quiet-0"))
+
+    blocker.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    # the quiet tenant does not wait behind the whole backlog of the busy one
+    assert order.index("quiet-0") < order.index("busy-2")
+
+
+def test_full_queue_rejects_after_timeout():
+    executor = _executor(max_workers=1, max_queued_tasks=1, queue_timeout=0.05)
+    started = threading.Event()
+    blocker = threading.Event()
+    executor.submit("tenant", lambda: started.set() or blocker.wait())
+    # wait until the worker picked the blocking task so that exactly one slot is left in the queue
+    assert started.wait(timeout=5)
+    executor.submit("tenant", lambda: None)
+
+    with pytest.raises(RetrievalExecutorBusyError):
+        executor.submit("tenant", lambda: None)
+
+    blocker.set()
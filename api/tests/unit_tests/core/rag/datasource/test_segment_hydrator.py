@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+from core.rag.datasource.retrieval_service import RetrievalService
+from core.rag.datasource.segment_hydrator import SegmentHydrator
+from core.rag.index_processor.constant.index_type import IndexType
+from core.rag.models.document import Document
+from models.dataset import ChildChunk, DocumentSegment
+from models.dataset import Document as DatasetDocument
+
+
+def _segment(id: str, index_node_id: str, dataset_id: str = "dataset-id") -> DocumentSegment:
+    return DocumentSegment(id=id, index_node_id=index_node_id, dataset_id=dataset_id, content=id)
+
+
+@patch("core.rag.datasource.segment_hydrator.db")
+def test_get_segments_by_index_node_ids_uses_single_query(mock_db):
+    segment_query = mock_db.session.query.return_value.filter.return_value
+    segment_query.filter.return_value = segment_query
+    segment_query.all.return_value = [_segment("s1", "n1"), _segment("s2", "n2")]
+
+    segments = SegmentHydrator.get_segments_by_index_node_ids(["dataset-id"], ["n1", "n2", "n3"])
+
+    mock_db.session.query.assert_called_once_with(DocumentSegment)
+    assert {key: segment.id for key, segment in segments.items()} == {
+        ("dataset-id", "n1"): "s1",
+        ("dataset-id", "n2"): "s2",
+    }
+
+
+@patch("core.rag.datasource.segment_hydrator.db")
+def test_hydrator_skips_queries_for_empty_input(mock_db):
+    assert SegmentHydrator.get_segments_by_index_node_ids(["dataset-id"], []) == {}
+    assert SegmentHydrator.get_segments_by_ids([]) == {}
+    assert SegmentHydrator.get_child_chunks_by_index_node_ids([]) == {}
+    mock_db.session.query.assert_not_called()
+
+
+@patch("core.rag.datasource.retrieval_service.SegmentHydrator")
+@patch("core.rag.datasource.retrieval_service.db")
+def test_format_retrieval_documents_keeps_ranking_order(mock_db, mock_hydrator):
+    mock_db.session.query.return_value.filter.return_value.options.return_value.all.return_value = [
+        DatasetDocument(id="doc-normal", doc_form=IndexType.PARAGRAPH_INDEX, dataset_id="dataset-id"),
+        DatasetDocument(id="doc-parent", doc_form=IndexType.PARENT_CHILD_INDEX, dataset_id="dataset-id"),
+    ]
+    mock_hydrator.get_child_chunks_by_index_node_ids.return_value = {
+        "child-1": ChildChunk(id="c1", segment_id="parent", content="child 1", position=1),
+        "child-2": ChildChunk(id="c2", segment_id="parent", content="child 2", position=2),
+    }
+    mock_hydrator.get_segments_by_ids.return_value = {"parent": _segment("parent", "parent-node")}
+    mock_hydrator.get_segments_by_index_node_ids.return_value = {
+        ("dataset-id", "n2"): _segment("s2", "n2"),
+        ("dataset-id", "n1"): _segment("s1", "n1"),
+    }
+    documents = [
+        Document(page_content="", metadata={"document_id": "doc-normal", "doc_id": "n2", "score": 0.9}),
+        Document(page_content="", metadata={"document_id": "doc-parent", "doc_id": "child-1", "score": 0.8}),
+        Document(page_content="", metadata={"document_id": "doc-normal", "doc_id": "n1", "score": 0.7}),
+        Document(page_content="", metadata={"document_id": "doc-parent", "doc_id": "child-2", "score": 0.85}),
+    ]
+
+    records = RetrievalService.format_retrieval_documents(documents)
+
+    assert [record.segment.id for record in records] == ["s2", "parent", "s1"]
+    assert [record.score for record in records] == [0.9, 0.85, 0.7]
+    assert [child.id for child in records[1].child_chunks or []] == ["c1", "c2"]
+    mock_hydrator.get_child_chunks_by_index_node_ids.assert_called_once()
+    mock_hydrator.get_segments_by_ids.assert_called_once()
+    mock_hydrator.get_segments_by_index_node_ids.assert_called_once()
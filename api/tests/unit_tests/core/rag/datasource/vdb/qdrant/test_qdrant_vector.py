@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock, patch
+
+from qdrant_client.http import models
+
+from core.rag.datasource.vdb.qdrant.qdrant_vector import QdrantConfig, QdrantVector
+from core.rag.datasource.vdb.vector_factory import VectorClientRegistry
+
+
+def _scored_point(point_id: int, score: float, dataset_id: str) -> models.ScoredPoint:
+    return models.ScoredPoint(
+        id=point_id,
+        version=1,
+        score=score,
+        payload={
+            "page_content": f"content {point_id}",
+            "metadata": {"doc_id": str(point_id), "dataset_id": dataset_id},
+            "group_id": dataset_id,
+        },
+    )
+
+
+def test_search_by_vector_in_groups_runs_one_query():
+    client = MagicMock()
+    client.search_groups.return_value = models.GroupsResult(
+        groups=[
+            models.PointGroup(
+                id="dataset-1", hits=[_scored_point(2, 0.6, "dataset-1"), _scored_point(1, 0.9, "dataset-1")]
+            ),
+            models.PointGroup(id="dataset-2", hits=[_scored_point(3, 0.3, "dataset-2")]),
+        ]
+    )
+    with patch.object(VectorClientRegistry, "get_client", return_value=client):
+        vector = QdrantVector("shared_collection", "dataset-1", QdrantConfig(endpoint="http://localhost:6333"))
+
+    documents = vector.search_by_vector_in_groups(
+        [0.1, 0.2], ["dataset-1", "dataset-2", "dataset-3"], top_k=2, score_threshold=0.5
+    )
+
+    assert client.search_groups.call_count == 1
+    kwargs = client.search_groups.call_args.kwargs
+    assert kwargs["group_by"] == "group_id"
+    assert kwargs["limit"] == 3
+    assert kwargs["group_size"] == 2
+    assert kwargs["query_filter"].must[0].match.any == ["dataset-1", "dataset-2", "dataset-3"]
+
+    assert [document.metadata["doc_id"] for document in documents["dataset-1"]] == ["1", "2"]
+    # hits under the score threshold are dropped like in search_by_vector
+    assert documents["dataset-2"] == []
+    assert documents["dataset-3"] == []
@@ -0,0 +1,139 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import psycopg2.pool
+import pytest
+
+from configs import dify_config
+from core.rag.datasource.vdb.pg_connection_pool import BlockingConnectionPool
+from core.rag.datasource.vdb.pgvector.pgvector import PGVector, PGVectorConfig
+from core.rag.datasource.vdb.vector_factory import VectorClientRegistry
+from core.rag.datasource.vdb.vector_type import VectorType
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(dify_config, "VECTOR_STORE_CLIENT_SHARING_ENABLED", True)
+    VectorClientRegistry.clear()
+    yield VectorClientRegistry
+    VectorClientRegistry.clear()
+
+
+def _pgvector_config(**kwargs) -> PGVectorConfig:
+    options = {
+        "host": "localhost",
+        "port": 5432,
+        "user": "postgres",
+        "password": "password",
+        "database": "dify",
+        "min_connection": 1,
+        "max_connection": 2,
+    }
+    options.update(kwargs)
+    return PGVectorConfig(**options)
+
+
+def test_clients_are_shared_by_equal_configs(monkeypatch):
+    factory = MagicMock(side_effect=lambda: object())
+
+    first = VectorClientRegistry.get_client(VectorType.QDRANT, {"url": "http://a"}, factory)
+    second = VectorClientRegistry.get_client(VectorType.QDRANT, {"url": "http://a"}, factory)
+    other = VectorClientRegistry.get_client(VectorType.QDRANT, {"url": "http://b"}, factory)
+
+    assert first is second
+    assert other is not first
+    assert factory.call_count == 2
+
+    monkeypatch.setattr(dify_config, "VECTOR_STORE_CLIENT_SHARING_ENABLED", False)
+    assert VectorClientRegistry.get_client(VectorType.QDRANT, {"url": "http://a"}, factory) is not first
+
+
+def test_idle_and_unhealthy_clients_are_replaced(monkeypatch):
+    monkeypatch.setattr(dify_config, "VECTOR_STORE_CLIENT_HEALTH_CHECK_INTERVAL", 1)
+    monkeypatch.setattr(dify_config, "VECTOR_STORE_CLIENT_IDLE_TIMEOUT", 10)
+    health_check = MagicMock(return_value=True)
+    factory = MagicMock(side_effect=lambda: MagicMock())
+    now = 1000.0
+
+    with patch("core.rag.datasource.vdb.vector_factory.time.monotonic", side_effect=lambda: now):
+        first = VectorClientRegistry.get_client(VectorType.ELASTICSEARCH, {}, factory, health_check)
+        now += 2
+        assert VectorClientRegistry.get_client(VectorType.ELASTICSEARCH, {}, factory, health_check) is first
+        assert health_check.call_count == 1
+
+        now += 2
+        health_check.return_value = False
+        second = VectorClientRegistry.get_client(VectorType.ELASTICSEARCH, {}, factory, health_check)
+        assert second is not first
+
+        now += 11
+        third = VectorClientRegistry.get_client(VectorType.ELASTICSEARCH, {}, factory, health_check)
+        assert third is not second
+
+    assert factory.call_count == 3
+    # the idle client is replaced without a health check
+    assert health_check.call_count == 2
+    # the dropped clients are closed, the one in use is not
+    first.close.assert_called_once()
+    second.close.assert_called_once()
+    third.close.assert_not_called()
+
+
+def test_dropped_clients_are_closed_with_the_close_hook(monkeypatch):
+    monkeypatch.setattr(dify_config, "VECTOR_STORE_CLIENT_IDLE_TIMEOUT", 10)
+    close = MagicMock(side_effect=RuntimeError("already closed"))
+    now = 1000.0
+
+    with patch("core.rag.datasource.vdb.vector_factory.time.monotonic", side_effect=lambda: now):
+        engine = VectorClientRegistry.get_client(VectorType.RELYT, {}, MagicMock, close=close)
+        now += 11
+        # a failing close hook doesn't prevent the replacement
+        assert VectorClientRegistry.get_client(VectorType.RELYT, {}, MagicMock, close=close) is not engine
+
+    close.assert_called_once_with(engine)
+    engine.close.assert_not_called()
+
+
+def test_blocking_connection_pool_waits_for_a_free_connection():
+    with patch.object(psycopg2.pool.psycopg2, "connect", side_effect=lambda *args, **kwargs: MagicMock(closed=0)):
+        pool = BlockingConnectionPool(1, 1, timeout=0.05)
+        conn = pool.getconn()
+
+        with pytest.raises(psycopg2.pool.PoolError):
+            pool.getconn()
+
+        threading.Timer(0.01, pool.putconn, args=(conn,)).start()
+        pool._timeout = 5
+        assert pool.getconn() is conn
+
+        # a connection lost while idle is replaced
+        conn.closed = 1
+        pool.putconn(conn)
+        assert pool.getconn() is not conn
+
+
+def test_pgvector_instances_share_the_connection_pool():
+    with patch.object(psycopg2.pool.psycopg2, "connect", return_value=MagicMock(closed=0)) as connect:
+        first = PGVector("collection_1", _pgvector_config())
+        second = PGVector("collection_2", _pgvector_config())
+        other = PGVector("collection_3", _pgvector_config(database="other"))
+
+    assert first.pool is second.pool
+    assert other.pool is not first.pool
+    assert isinstance(first.pool, BlockingConnectionPool)
+    assert connect.call_count == 2
+
+
+@pytest.mark.parametrize("sharing_enabled", [False, True], ids=["new_pool", "shared_pool"])
+@pytest.mark.benchmark(group="vector_store_init")
+def test_benchmark_pgvector_init(benchmark, monkeypatch, sharing_enabled):
+    monkeypatch.setattr(dify_config, "VECTOR_STORE_CLIENT_SHARING_ENABLED", sharing_enabled)
+
+    def connect(*args, **kwargs):
+        # stands in for the TCP and authentication round trips of a new postgres connection
+        time.sleep(0.005)
+        return MagicMock(closed=0)
+
+    with patch.object(psycopg2.pool.psycopg2, "connect", side_effect=connect):
+        benchmark(PGVector, "collection", _pgvector_config())
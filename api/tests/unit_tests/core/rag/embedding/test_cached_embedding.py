@@ -0,0 +1,154 @@
+import pickle
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from core.rag.embedding.cached_embedding import (
+    EMBEDDING_CACHE_QUERY_BATCH_SIZE,
+    CacheEmbedding,
+    _query_embedding_local_cache,
+)
+from libs import helper
+from models.dataset import Embedding
+
+
+def _model_instance() -> MagicMock:
+    model_instance = MagicMock()
+    model_instance.model = "text-embedding-3-small"
+    model_instance.provider = "openai"
+    return model_instance
+
+
+def _vector(seed: int, dimension: int = 8) -> list[float]:
+    vector = np.random.default_rng(seed).random(dimension, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def test_embedding_binary_roundtrip():
+    vector = _vector(0)
+    raw = Embedding.encode_embedding(vector)
+
+    assert raw.startswith(Embedding.BINARY_MAGIC)
+    assert len(raw) == len(Embedding.BINARY_MAGIC) + 4 * len(vector)
+    assert Embedding.decode_embedding(raw) == vector
+    assert Embedding.decode_embedding(memoryview(raw)) == vector
+
+
+def test_embedding_reads_legacy_pickled_rows():
+    vector = [0.1, 0.2, 0.3]
+    embedding = Embedding(embedding=pickle.dumps(vector, protocol=pickle.HIGHEST_PROTOCOL))
+
+    assert embedding.get_embedding() == vector
+
+
+@patch("core.rag.embedding.cached_embedding.db")
+def test_embed_documents_resolves_cache_hits_in_batches(mock_db):
+    texts = [f"text {i}" for i in range(EMBEDDING_CACHE_QUERY_BATCH_SIZE + 1)]
+    rows = [(helper.generate_text_hash(text), Embedding.encode_embedding(_vector(i))) for i, text in enumerate(texts)]
+    mock_db.session.execute.return_value.all.side_effect = [
+        rows[:EMBEDDING_CACHE_QUERY_BATCH_SIZE],
+        rows[EMBEDDING_CACHE_QUERY_BATCH_SIZE:],
+    ]
+    model_instance = _model_instance()
+
+    embeddings = CacheEmbedding(model_instance).embed_documents(texts)
+
+    assert mock_db.session.execute.call_count == 2
+    assert embeddings == [_vector(i) for i in range(len(texts))]
+    model_instance.invoke_text_embedding.assert_not_called()
+
+
+@patch("core.rag.embedding.cached_embedding.db")
+def test_embed_documents_bulk_inserts_cache_misses(mock_db):
+    texts = ["cached", "missing", "missing"]
+    mock_db.session.execute.return_value.all.return_value = [
+        (helper.generate_text_hash("cached"), Embedding.encode_embedding([1.0, 0.0]))
+    ]
+    model_instance = _model_instance()
+    model_instance.model_type_instance.get_model_schema.return_value = None
+    model_instance.invoke_text_embedding.side_effect = [
+        MagicMock(embeddings=[[3.0, 4.0]]),
+        MagicMock(embeddings=[[3.0, 4.0]]),
+    ]
+
+    embeddings = CacheEmbedding(model_instance).embed_documents(texts)
+
+    assert embeddings == [[1.0, 0.0], [0.6, 0.8], [0.6, 0.8]]
+    # one lookup query plus a single insert for the deduplicated misses
+    assert mock_db.session.execute.call_count == 2
+    insert_stmt = mock_db.session.execute.call_args_list[1].args[0]
+    compiled = insert_stmt.compile()
+    assert "ON CONFLICT" in str(compiled).upper()
+    mock_db.session.commit.assert_called_once()
+
+
+@pytest.mark.benchmark(group="embedding-cache")
+@patch("core.rag.embedding.cached_embedding.db")
+def test_benchmark_embed_documents_cache_hits(mock_db, benchmark):
+    texts = [f"benchmark text {i}" for i in range(10_000)]
+    raw = Embedding.encode_embedding(_vector(0, dimension=1536))
+    rows = [(helper.generate_text_hash(text), raw) for text in texts]
+    batch_size = EMBEDDING_CACHE_QUERY_BATCH_SIZE
+    batches = [rows[i : i + batch_size] for i in range(0, len(rows), batch_size)]
+
+    def _run():
+        mock_db.session.execute.return_value.all.side_effect = list(batches)
+        return CacheEmbedding(_model_instance()).embed_documents(texts)
+
+    embeddings = benchmark(_run)
+
+    assert len(embeddings) == len(texts)
+    assert all(embedding is not None for embedding in embeddings)
+
+
+@pytest.fixture
+def mock_redis():
+    with patch("core.rag.embedding.cached_embedding.redis_client", new=MagicMock()) as mock:
+        yield mock
+
+
+@pytest.fixture
+def _clear_local_query_cache():
+    _query_embedding_local_cache.clear()
+    yield
+    _query_embedding_local_cache.clear()
+
+
+@pytest.mark.usefixtures("_clear_local_query_cache")
+def test_embed_queries_uses_single_pipeline_and_single_model_call(mock_redis):
+    pipeline = mock_redis.pipeline.return_value
+    cached = np.asarray([0.0, 1.0], dtype=np.float32).tobytes()
+    pipeline.execute.side_effect = [[cached, None], [True]]
+    model_instance = _model_instance()
+    model_instance.invoke_text_embedding.return_value = MagicMock(embeddings=[[3.0, 4.0]])
+
+    embeddings = CacheEmbedding(model_instance).embed_queries(["cached", "missing", "missing"])
+
+    assert [embedding.tolist() for embedding in embeddings] == [
+        [0.0, 1.0],
+        pytest.approx([0.6, 0.8]),
+        pytest.approx([0.6, 0.8]),
+    ]
+    assert all(embedding.dtype == np.float32 for embedding in embeddings)
+    assert pipeline.getex.call_count == 2
+    pipeline.setex.assert_called_once()
+    model_instance.invoke_text_embedding.assert_called_once()
+    assert model_instance.invoke_text_embedding.call_args.kwargs["texts"] == ["missing"]
+
+
+@pytest.mark.usefixtures("_clear_local_query_cache")
+def test_embed_query_served_from_local_cache(mock_redis):
+    pipeline = mock_redis.pipeline.return_value
+    pipeline.execute.side_effect = [[None], [True]]
+    model_instance = _model_instance()
+    model_instance.invoke_text_embedding.return_value = MagicMock(embeddings=[[3.0, 4.0]])
+    cache_embedding = CacheEmbedding(model_instance)
+
+    first = cache_embedding.embed_query("query")
+    second = CacheEmbedding(model_instance).embed_query("query")
+
+    assert first == second == pytest.approx([0.6, 0.8])
+    # the second lookup neither touches redis nor the model
+    assert mock_redis.pipeline.call_count == 2
+    model_instance.invoke_text_embedding.assert_called_once()
@@ -0,0 +1,156 @@
+import math
+import random
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from core.rag.models.document import Document
+from core.rag.rerank.weight_rerank import WeightRerankRunner
+
+
+def _legacy_tfidf_similarities(
+    query_keywords: set[str], documents_keywords: list[set[str]], total_documents: int | None = None
+) -> list[float]:
+    """
+    The dict based scorer WeightRerankRunner used before it was vectorized,
+    `total_documents` counted the documents without metadata too.
+    """
+    query_keyword_counts = Counter(query_keywords)
+    if total_documents is None:
+        total_documents = len(documents_keywords)
+    all_keywords = set()
+    for document_keywords in documents_keywords:
+        all_keywords.update(document_keywords)
+
+    keyword_idf = {}
+    for keyword in all_keywords:
+        doc_count_containing_keyword = sum(1 for doc_keywords in documents_keywords if keyword in doc_keywords)
+        keyword_idf[keyword] = math.log((1 + total_documents) / (1 + doc_count_containing_keyword)) + 1
+
+    query_tfidf = {keyword: count * keyword_idf.get(keyword, 0) for keyword, count in query_keyword_counts.items()}
+    documents_tfidf = []
+    for document_keywords in documents_keywords:
+        document_keyword_counts = Counter(document_keywords)
+        documents_tfidf.append(
+            {keyword: count * keyword_idf.get(keyword, 0) for keyword, count in document_keyword_counts.items()}
+        )
+
+    def cosine_similarity(vec1, vec2):
+        intersection = set(vec1.keys()) & set(vec2.keys())
+        numerator = sum(vec1[x] * vec2[x] for x in intersection)
+        sum1 = sum(vec1[x] ** 2 for x in vec1)
+        sum2 = sum(vec2[x] ** 2 for x in vec2)
+        denominator = math.sqrt(sum1) * math.sqrt(sum2)
+        if not denominator:
+            return 0.0
+        return float(numerator) / denominator
+
+    return [cosine_similarity(query_tfidf, document_tfidf) for document_tfidf in documents_tfidf]
+
+
+def _legacy_cosine_similarities(query_vector: list[float], document_vectors: list[list[float]]) -> list[float]:
+    scores = []
+    for document_vector in document_vectors:
+        vec1 = np.array(query_vector)
+        vec2 = np.array(document_vector)
+        scores.append(np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
+    return scores
+
+
+def _keyword_corpus(documents: int, seed: int = 42) -> tuple[set[str], list[set[str]]]:
+    rng = random.Random(seed)
+    vocabulary = [f"keyword{i}" for i in range(2_000)]
+    query_keywords = set(rng.sample(vocabulary, 8)) | {"only_in_query"}
+    documents_keywords = [set(rng.sample(vocabulary, rng.randint(0, 60))) for _ in range(documents)]
+    return query_keywords, documents_keywords
+
+
+def test_tfidf_similarities_match_legacy_scorer():
+    query_keywords, documents_keywords = _keyword_corpus(200)
+
+    assert WeightRerankRunner._calculate_tfidf_similarities(query_keywords, documents_keywords) == pytest.approx(
+        _legacy_tfidf_similarities(query_keywords, documents_keywords), rel=1e-12, abs=1e-15
+    )
+
+
+@pytest.mark.parametrize(
+    ("query_keywords", "documents_keywords"),
+    [
+        (set(), [{"a"}, {"b"}]),
+        ({"a"}, [set(), set()]),
+        ({"a"}, []),
+        ({"missing"}, [{"a", "b"}, {"b"}]),
+    ],
+)
+def test_tfidf_similarities_edge_cases(query_keywords, documents_keywords):
+    assert WeightRerankRunner._calculate_tfidf_similarities(query_keywords, documents_keywords) == pytest.approx(
+        _legacy_tfidf_similarities(query_keywords, documents_keywords)
+    )
+
+
+def test_tfidf_similarities_count_unscored_documents_in_the_idf():
+    query_keywords, documents_keywords = _keyword_corpus(200)
+
+    assert WeightRerankRunner._calculate_tfidf_similarities(
+        query_keywords, documents_keywords, total_documents=230
+    ) == pytest.approx(_legacy_tfidf_similarities(query_keywords, documents_keywords, 230), rel=1e-12, abs=1e-15)
+
+
+def test_keyword_score_counts_documents_without_metadata():
+    documents = [
+        Document(page_content="apple banana", metadata={"doc_id": "1"}),
+        Document(page_content="banana cherry", metadata={"doc_id": "2"}),
+        Document(page_content="apple cherry"),
+    ]
+    documents[2].metadata = None
+    keyword_table_handler = MagicMock()
+    keyword_table_handler.extract_keywords.side_effect = lambda text, max_keywords: set(text.split())
+    keyword_table_handler.extract_keywords_batch.side_effect = lambda texts, max_keywords: [
+        set(text.split()) for text in texts
+    ]
+    runner = WeightRerankRunner(tenant_id="tenant-id", weights=MagicMock())
+
+    with patch(
+        "core.rag.rerank.weight_rerank.JiebaKeywordTableHandler.get_instance", return_value=keyword_table_handler
+    ):
+        scores = runner._calculate_keyword_score("apple", documents)
+
+    # the document without metadata is not scored, but it counts in the IDF like before
+    expected = _legacy_tfidf_similarities({"apple"}, [{"apple", "banana"}, {"banana", "cherry"}], total_documents=3)
+    assert scores == pytest.approx(expected)
+
+
+def test_cosine_similarities_match_legacy_scorer():
+    rng = np.random.default_rng(0)
+    query_vector = rng.random(256).tolist()
+    document_vectors = rng.random((50, 256)).tolist()
+
+    assert WeightRerankRunner._calculate_cosine_similarities(query_vector, document_vectors) == pytest.approx(
+        _legacy_cosine_similarities(query_vector, document_vectors), rel=1e-12
+    )
+
+
+@pytest.mark.benchmark(group="weight-rerank-keyword-score")
+@pytest.mark.parametrize("scorer", ["legacy", "vectorized"])
+def test_benchmark_tfidf_similarities(benchmark, scorer):
+    query_keywords, documents_keywords = _keyword_corpus(250)
+    score = _legacy_tfidf_similarities if scorer == "legacy" else WeightRerankRunner._calculate_tfidf_similarities
+
+    similarities = benchmark(score, query_keywords, documents_keywords)
+
+    assert len(similarities) == len(documents_keywords)
+
+
+@pytest.mark.benchmark(group="weight-rerank-vector-score")
+@pytest.mark.parametrize("scorer", ["legacy", "vectorized"])
+def test_benchmark_cosine_similarities(benchmark, scorer):
+    rng = np.random.default_rng(0)
+    query_vector = rng.random(1536).tolist()
+    document_vectors = rng.random((250, 1536)).tolist()
+    score = _legacy_cosine_similarities if scorer == "legacy" else WeightRerankRunner._calculate_cosine_similarities
+
+    similarities = benchmark(score, query_vector, document_vectors)
+
+    assert len(similarities) == len(document_vectors)
@@ -0,0 +1,95 @@
+import json
+from typing import Optional
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from configs import dify_config
+from core.rag.models.document import Document
+from core.rag.retrieval.dataset_retrieval import DatasetRetrieval
+from models.dataset import Dataset
+
+
+def _dataset(
+    dataset_id: str,
+    vector_type: str = "qdrant",
+    collection_binding_id: Optional[str] = "binding-id",
+    top_k: int = 4,
+    search_method: str = "semantic_search",
+) -> Dataset:
+    dataset = Dataset()
+    dataset.id = dataset_id
+    dataset.tenant_id = "tenant-id"
+    dataset.provider = "vendor"
+    dataset.indexing_technique = "high_quality"
+    dataset.embedding_model_provider = "openai"
+    dataset.embedding_model = "text-embedding-3-small"
+    dataset.collection_binding_id = collection_binding_id
+    dataset.index_struct = json.dumps({"type": vector_type, "vector_store": {"class_prefix": "Vector_index_Node"}})
+    dataset.retrieval_model = {
+        "search_method": search_method,
+        "reranking_enable": False,
+        "reranking_model": {"reranking_provider_name": "", "reranking_model_name": ""},
+        "top_k": top_k,
+        "score_threshold_enabled": False,
+    }
+    return dataset
+
+
+@pytest.fixture(autouse=True)
+def group_search_enabled(monkeypatch):
+    monkeypatch.setattr(dify_config, "DATASET_GROUP_SEARCH_ENABLED", True)
+
+
+def test_datasets_sharing_a_collection_are_grouped():
+    first, second = _dataset("dataset-1"), _dataset("dataset-2")
+    other_top_k = _dataset("dataset-3", top_k=2)
+    filtered = _dataset("dataset-4")
+    full_text = _dataset("dataset-5", search_method="full_text_search")
+    unbound = _dataset("dataset-6", collection_binding_id=None)
+    pgvector = _dataset("dataset-7", vector_type="pgvector")
+    retrievals = [
+        (first, None),
+        (second, None),
+        (other_top_k, None),
+        (filtered, ["document-id"]),
+        (full_text, None),
+        (unbound, None),
+        (pgvector, None),
+    ]
+
+    dataset_groups, remaining = DatasetRetrieval()._group_datasets_for_search(retrievals, top_k=4)
+
+    assert dataset_groups == [[first, second]]
+    assert [dataset.id for dataset, _ in remaining] == ["dataset-3", "dataset-4", "dataset-5", "dataset-6", "dataset-7"]
+
+
+def test_group_search_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(dify_config, "DATASET_GROUP_SEARCH_ENABLED", False)
+    retrievals = [(_dataset("dataset-1"), None), (_dataset("dataset-2"), None)]
+
+    dataset_groups, remaining = DatasetRetrieval()._group_datasets_for_search(retrievals, top_k=4)
+
+    assert dataset_groups == []
+    assert remaining == retrievals
+
+
+def test_group_retriever_returns_the_documents_of_each_dataset():
+    datasets = [_dataset("dataset-1"), _dataset("dataset-2")]
+    documents = {
+        "dataset-2": [Document(page_content="b", metadata={"score": 0.8})],
+        "dataset-1": [Document(page_content="a", metadata={"score": 0.9})],
+    }
+    all_documents: list[Document] = []
+
+    with (
+        patch("core.rag.retrieval.dataset_retrieval.db") as db,
+        patch(
+            "core.rag.retrieval.dataset_retrieval.RetrievalService.embedding_search_in_groups", return_value=documents
+        ) as search,
+    ):
+        db.session.merge.side_effect = lambda dataset, load: dataset
+        DatasetRetrieval()._group_retriever(MagicMock(), datasets, "query", all_documents)
+
+    search.assert_called_once_with(datasets=datasets, query="query", top_k=4, score_threshold=0.0)
+    assert [document.page_content for document in all_documents] == ["a", "b"]
@@ -1,16 +1,23 @@
+from collections import Counter
 from unittest.mock import MagicMock, patch
 
 import pytest
 import redis
+from cachetools import LRUCache
 
+from configs import dify_config
+from core import model_manager
 from core.entities.provider_entities import ModelLoadBalancingConfiguration
 from core.model_manager import LBModelManager
 from core.model_runtime.entities.model_entities import ModelType
-from extensions.ext_redis import redis_client
 
 
 @pytest.fixture
-def lb_model_manager():
+def lb_model_manager(monkeypatch):
+    monkeypatch.setattr(model_manager, "_lb_states", LRUCache(maxsize=10))
+    monkeypatch.setattr(model_manager, "redis_client", MagicMock())
+    model_manager.redis_client.pipeline.return_value.execute.return_value = [-2, -2, -2]
+
     load_balancing_configs = [
         ModelLoadBalancingConfiguration(id="id1", name="__inherit__", credentials={}),
         ModelLoadBalancingConfiguration(id="id2", name="first", credentials={"openai_api_key": "fake_key"}),
@@ -39,10 +46,7 @@ def lb_model_manager():
     return lb_model_manager
 
 
-def test_lb_model_manager_fetch_next(mocker, lb_model_manager):
-    # initialize redis client
-    redis_client.initialize(redis.Redis())
-
+def test_lb_model_manager_fetch_next(lb_model_manager):
     assert len(lb_model_manager._load_balancing_configs) == 3
 
     config1 = lb_model_manager._load_balancing_configs[0]
@@ -53,20 +57,111 @@ def test_lb_model_manager_fetch_next(mocker, lb_model_manager):
     assert lb_model_manager.in_cooldown(config2) is False
     assert lb_model_manager.in_cooldown(config3) is False
 
-    start_index = 0
+    config = lb_model_manager.fetch_next()
+    assert config == config2
+
+    config = lb_model_manager.fetch_next()
+    assert config == config3
+
+
+@pytest.fixture
+def local_lb_model_manager(monkeypatch):
+    monkeypatch.setattr(model_manager, "_lb_states", LRUCache(maxsize=10))
+    monkeypatch.setattr(model_manager, "redis_client", MagicMock())
+    model_manager.redis_client.pipeline.return_value.execute.return_value = [-2, -2, -2]
+
+    return LBModelManager(
+        tenant_id="tenant_id",
+        provider="openai",
+        model_type=ModelType.LLM,
+        model="gpt-4",
+        load_balancing_configs=[
+            ModelLoadBalancingConfiguration(id=f"id{i}", name=f"config{i}", credentials={}) for i in range(1, 4)
+        ],
+    )
+
+
+def test_lb_model_manager_round_robin_skips_local_cooldowns(local_lb_model_manager, monkeypatch):
+    monkeypatch.setattr(dify_config, "MODEL_LB_COOLDOWN_SYNC_INTERVAL", 60.0)
+    config1, config2, config3 = local_lb_model_manager._load_balancing_configs
+
+    local_lb_model_manager.cooldown(config2, expire=60)
+
+    assert [local_lb_model_manager.fetch_next() for _ in range(4)] == [config1, config3, config1, config3]
+    # the cooldown is shared through redis, the cooldowns of the other processes are read once per interval
+    model_manager.redis_client.setex.assert_called_once()
+    assert model_manager.redis_client.pipeline.call_count == 1
+    assert not model_manager.redis_client.incr.called
+
+    for config in (config1, config3):
+        local_lb_model_manager.cooldown(config, expire=60)
+    assert local_lb_model_manager.fetch_next() is None
+
 
-    def incr(key):
-        nonlocal start_index
-        start_index += 1
-        return start_index
+def test_lb_model_manager_reads_cooldowns_of_other_processes(local_lb_model_manager, monkeypatch):
+    monkeypatch.setattr(dify_config, "MODEL_LB_COOLDOWN_SYNC_INTERVAL", 0.0)
+    model_manager.redis_client.pipeline.return_value.execute.return_value = [30000, -2, 10000]
 
-    with (
-        patch.object(redis_client, "incr", side_effect=incr),
-        patch.object(redis_client, "set", return_value=None),
-        patch.object(redis_client, "expire", return_value=None),
-    ):
-        config = lb_model_manager.fetch_next()
-        assert config == config2
+    assert local_lb_model_manager.fetch_next().id == "id2"
+    assert local_lb_model_manager.fetch_next().id == "id2"
+
+    model_manager.redis_client.pipeline.return_value.execute.side_effect = redis.ConnectionError()
+    # the local cooldowns are kept when redis is unavailable
+    assert local_lb_model_manager.fetch_next().id == "id2"
+
+
+def test_lb_model_manager_least_in_flight(local_lb_model_manager, monkeypatch):
+    monkeypatch.setattr(dify_config, "MODEL_LB_STRATEGY", "least_in_flight")
+
+    first = local_lb_model_manager.fetch_next()
+    first_started_at = local_lb_model_manager.begin(first)
+    second = local_lb_model_manager.fetch_next()
+    local_lb_model_manager.begin(second)
+    third = local_lb_model_manager.fetch_next()
+
+    assert len({first.id, second.id, third.id}) == 3
+
+    local_lb_model_manager.begin(third)
+    local_lb_model_manager.end(first, first_started_at)
+    assert local_lb_model_manager.fetch_next() == first
+
+
+def test_lb_model_manager_latency_weighted(local_lb_model_manager, monkeypatch):
+    monkeypatch.setattr(dify_config, "MODEL_LB_STRATEGY", "latency_weighted")
+    monkeypatch.setattr(dify_config, "MODEL_LB_LATENCY_EWMA_ALPHA", 1.0)
+    config1, config2, config3 = local_lb_model_manager._load_balancing_configs
+    local_lb_model_manager._state.latencies.update({"id1": 0.01, "id2": 1.0, "id3": 1.0})
+
+    picks = Counter(local_lb_model_manager.fetch_next().id for _ in range(1000))
+
+    assert picks["id1"] > picks["id2"] + picks["id3"]
+
+    with patch.object(model_manager.time, "perf_counter", side_effect=[0.0, 2.0]):
+        stream = local_lb_model_manager.end_after_stream(
+            config2, local_lb_model_manager.begin(config2), (chunk for chunk in ["a", "b"])
+        )
+        assert list(stream) == ["a", "b"]
+    # streams record the time to the first chunk
+    assert local_lb_model_manager._state.latencies["id2"] == 2.0
+    assert local_lb_model_manager._state.in_flight["id2"] == 0
+
+
+def test_lb_model_manager_ends_streams_dropped_before_they_start(local_lb_model_manager):
+    config1 = local_lb_model_manager._load_balancing_configs[0]
+
+    stream = local_lb_model_manager.end_after_stream(
+        config1, local_lb_model_manager.begin(config1), (chunk for chunk in ["a", "b"])
+    )
+    assert local_lb_model_manager._state.in_flight["id1"] == 1
+    del stream
+
+    assert local_lb_model_manager._state.in_flight["id1"] == 0
+    assert "id1" not in local_lb_model_manager._state.latencies
+
+    started_stream = local_lb_model_manager.end_after_stream(
+        config1, local_lb_model_manager.begin(config1), (chunk for chunk in ["a", "b"])
+    )
+    assert next(started_stream) == "a"
+    del started_stream
 
-        config = lb_model_manager.fetch_next()
-        assert config == config3
+    assert local_lb_model_manager._state.in_flight["id1"] == 0
@@ -0,0 +1,197 @@
+import threading
+import time
+
+import pytest
+
+from core.workflow.graph_engine.workflow_scheduler import WorkflowScheduler, WorkflowSchedulerBusyError
+
+
+def _scheduler(**kwargs) -> WorkflowScheduler:
+    options = {"max_workers": 2, "max_workers_per_tenant": 2, "max_queued_tasks": 100, "queue_timeout": 1.0}
+    options.update(kwargs)
+    return WorkflowScheduler(**options)
+
+
+def _wait_for(predicate) -> None:
+    deadline = time.monotonic() + 5
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_submit_returns_result():
+    scheduler = _scheduler()
+    group = scheduler.create_group(group_id="run", tenant_id="tenant", max_workers=2)
+
+    assert group.submit(lambda x: x * 2, 21).result(timeout=5) == 42
+
+    assert scheduler._queued_count == 0
+    assert len(scheduler._workers) == 1
+
+
+def test_submit_propagates_exceptions():
+    scheduler = _scheduler()
+    group = scheduler.create_group(group_id="run", tenant_id="tenant", max_workers=2)
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        group.submit(fail).result(timeout=5)
+
+
+def test_group_limit_queues_instead_of_raising():
+    scheduler = _scheduler(max_workers=4, max_workers_per_tenant=4)
+    group = scheduler.create_group(group_id="run", tenant_id="tenant", max_workers=1)
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def task():
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.001)
+        with lock:
+            running -= 1
+
+    futures = [group.submit(task) for _ in range(20)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert max_running == 1
+
+
+def test_nested_submit_uses_free_worker():
+    scheduler = _scheduler(max_workers=2)
+    group = scheduler.create_group(group_id="run", tenant_id="tenant", max_workers=2)
+
+    def outer():
+        return group.submit(lambda: threading.current_thread().name).result(timeout=5)
+
+    assert group.submit(outer).result(timeout=5) == "workflow-worker-1"
+
+
+def test_nested_iteration_runs_in_parallel_on_free_workers():
+    scheduler = _scheduler(max_workers=4, max_workers_per_tenant=4)
+    group = scheduler.create_group(group_id="run", tenant_id="tenant", max_workers=1)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def outer():
+        inner_group = scheduler.create_group(group_id="iteration", tenant_id="tenant", max_workers=10)
+        # every item waits for the others, this only passes when the items run at the same time
+        futures = [inner_group.submit(barrier.wait) for _ in range(3)]
+        return [future.result(timeout=5) for future in futures]
+
+    assert sorted(group.submit(outer).result(timeout=5)) == [0, 1, 2]
+
+
+@pytest.mark.parametrize(
+    ("max_workers", "max_workers_per_tenant"),
+    [
+        # the pool is full
+        (1, 4),
+        # the tenant is at its limit
+        (4, 1),
+    ],
+)
+def test_nested_submit_runs_inline_at_the_pool_or_tenant_limit(max_workers, max_workers_per_tenant):
+    scheduler = _scheduler(max_workers=max_workers, max_workers_per_tenant=max_workers_per_tenant)
+    group = scheduler.create_group(group_id="run", tenant_id="tenant", max_workers=1)
+
+    def outer():
+        inner_group = scheduler.create_group(group_id="iteration", tenant_id="tenant", max_workers=10)
+        futures = [inner_group.submit(lambda: threading.current_thread().name) for _ in range(3)]
+        return threading.current_thread().name, [future.result(timeout=5) for future in futures]
+
+    outer_thread, inner_threads = group.submit(outer).result(timeout=5)
+
+    assert inner_threads == [outer_thread] * 3
+    _wait_for(lambda: scheduler._active_count == 0)
+    assert len(scheduler._workers) == 1
+
+
+def test_nested_iteration_keeps_its_own_limit():
+    scheduler = _scheduler(max_workers=4, max_workers_per_tenant=4)
+    group = scheduler.create_group(group_id="run", tenant_id="tenant", max_workers=1)
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def item():
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.005)
+        with lock:
+            running -= 1
+
+    def outer():
+        inner_group = scheduler.create_group(group_id="iteration", tenant_id="tenant", max_workers=2)
+        futures = [inner_group.submit(item) for _ in range(10)]
+        for future in futures:
+            future.result(timeout=5)
+
+    group.submit(outer).result(timeout=5)
+    assert max_running == 2
+
+
+def test_nested_submit_to_parent_group_at_limit_does_not_deadlock():
+    scheduler = _scheduler(max_workers=1)
+    group = scheduler.create_group(group_id="run", tenant_id="tenant", max_workers=1)
+
+    def outer():
+        # nested parallel branches of the same run, the run's only slot is held by this task
+        return group.submit(lambda: "inner").result(timeout=5)
+
+    assert group.submit(outer).result(timeout=5) == "inner"
+
+
+def test_tenants_are_served_round_robin():
+    scheduler = _scheduler(max_workers=1, max_workers_per_tenant=1)
+    busy_group = scheduler.create_group(group_id="busy-run", tenant_id="busy", max_workers=1)
+    quiet_group = scheduler.create_group(group_id="quiet-run", tenant_id="quiet", max_workers=1)
+    blocker = threading.Event()
+    order: list[str] = []
+    busy_group.submit(blocker.wait)
+    futures = [busy_group.submit(order.append, f"busy-{i}") for i in range(3)]
+    futures.append(quiet_group.submit(order.append, "quiet-0"))
+
+    blocker.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    # the quiet tenant does not wait behind the whole backlog of the busy one
+    assert order.index("quiet-0") < order.index("busy-2")
+
+
+def test_tenant_limit_is_shared_by_its_runs():
+    scheduler = _scheduler(max_workers=4, max_workers_per_tenant=1)
+    groups = [scheduler.create_group(group_id=f"run-{i}", tenant_id="tenant", max_workers=4) for i in range(2)]
+    blocker = threading.Event()
+    futures = [group.submit(blocker.wait) for group in groups]
+
+    _wait_for(lambda: scheduler._active_count == 1)
+    assert scheduler._queued_count == 1
+    assert scheduler._tenant_active == {"tenant": 1}
+
+    blocker.set()
+    for future in futures:
+        future.result(timeout=5)
+
+
+def test_full_queue_rejects_after_timeout():
+    scheduler = _scheduler(max_workers=1, max_queued_tasks=1, queue_timeout=0.05)
+    group = scheduler.create_group(group_id="run", tenant_id="tenant", max_workers=1)
+    blocker = threading.Event()
+    group.submit(blocker.wait)
+    # wait until the worker picked the blocking task so that exactly one slot is left in the queue
+    _wait_for(lambda: scheduler._active_count == 1)
+    group.submit(lambda: None)
+
+    with pytest.raises(WorkflowSchedulerBusyError):
+        group.submit(lambda: None)
+
+    blocker.set()
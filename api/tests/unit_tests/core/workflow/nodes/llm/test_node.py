@@ -18,7 +18,7 @@ from core.model_runtime.entities.message_entities import (
 from core.model_runtime.entities.model_entities import AIModelEntity, FetchFrom, ModelType
 from core.model_runtime.model_providers.model_provider_factory import ModelProviderFactory
 from core.variables import ArrayAnySegment, ArrayFileSegment, NoneSegment
-from core.workflow.entities.variable_pool import VariablePool
+from core.workflow.entities.variable_pool import VariablePool, _parse_template
 from core.workflow.graph_engine import Graph, GraphInitParams, GraphRuntimeState
 from core.workflow.nodes.answer import AnswerStreamGenerateRoute
 from core.workflow.nodes.end import EndStreamParam
@@ -465,3 +465,27 @@ def test_handle_list_messages_basic(llm_node):
     assert len(result) == 1
     assert isinstance(result[0], UserPromptMessage)
     assert result[0].content == [TextPromptMessageContent(data="Hello, world")]
+
+
+def test_handle_list_messages_without_context_placeholder_uses_template_cache(llm_node):
+    messages = [
+        LLMNodeChatModelMessage(
+            text="Hello, there",
+            role=PromptMessageRole.USER,
+            edition_type="basic",
+        )
+    ]
+    _parse_template.cache_clear()
+
+    for _ in range(2):
+        result = llm_node._handle_list_messages(
+            messages=messages,
+            context="world",
+            jinja2_variables=[],
+            variable_pool=llm_node.graph_runtime_state.variable_pool,
+            vision_detail_config=ImagePromptMessageContent.DETAIL.HIGH,
+        )
+
+    # only templates embedding the context bypass the parse cache
+    assert _parse_template.cache_info().hits == 1
+    assert result[0].content == [TextPromptMessageContent(data="Hello, there")]
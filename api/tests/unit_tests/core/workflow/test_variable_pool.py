@@ -1,8 +1,13 @@
+import tracemalloc
+from copy import deepcopy
+
 import pytest
 
 from core.file import File, FileTransferMethod, FileType
-from core.variables import FileSegment, StringSegment
-from core.workflow.entities.variable_pool import VariablePool
+from core.variables import FileSegment, StringSegment, StringVariable
+from core.workflow.entities.variable_entities import VariableSelector
+from core.workflow.entities.variable_pool import CompiledSelector, VariablePool, _parse_template
+from core.workflow.utils.condition.entities import Condition
 
 
 @pytest.fixture
@@ -44,3 +49,270 @@ def test_use_long_selector(pool):
     result = pool.get(("node_1", "part_1", "part_2"))
     assert result is not None
     assert result.value == "test_value"
+
+
+def test_compiled_selector(pool, file):
+    selector = VariablePool.compile_selector(["node_1", "part_1", "part_2"])
+    pool.add(selector, StringSegment(value="test_value"))
+
+    assert pool.get(selector).value == "test_value"
+    assert pool.get(["node_1", "part_1", "part_2"]).value == "test_value"
+
+    pool.remove(selector)
+    assert pool.get(selector) is None
+
+    pool.add(("node_1", "file_var"), FileSegment(value=file))
+    result = pool.get(VariablePool.compile_selector(("node_1", "file_var", "name")))
+    assert result is not None
+    assert result.value == file.filename
+    assert pool.get(VariablePool.compile_selector(("node_1", "file_var", "non_existent_attr"))) is None
+
+
+def test_compile_invalid_selector():
+    with pytest.raises(ValueError):
+        VariablePool.compile_selector(["node_1"])
+
+
+def test_node_data_selectors_are_compiled_when_built(pool):
+    pool.add(("node_1", "var"), StringSegment(value="test_value"))
+    variable_selector = VariableSelector(variable="var", value_selector=["node_1", "var"])
+    condition = Condition(variable_selector=["node_1", "var"], comparison_operator="is", value="test_value")
+
+    assert isinstance(variable_selector.compiled_value_selector, CompiledSelector)
+    assert isinstance(condition.compiled_variable_selector, CompiledSelector)
+    assert pool.get(variable_selector.compiled_value_selector).value == "test_value"
+    assert pool.get(condition.compiled_variable_selector).value == "test_value"
+
+
+def test_invalid_node_data_selector_is_kept_raw(pool):
+    # invalid selectors keep failing at lookup instead of when the node is built
+    variable_selector = VariableSelector(variable="var", value_selector=["node_1"])
+
+    assert variable_selector.compiled_value_selector == ["node_1"]
+    assert pool.get(variable_selector.compiled_value_selector) is None
+
+
+def test_add_variable_is_not_rewrapped(pool):
+    variable = StringVariable(name="var", value="test_value")
+    pool.add(("node_1", "var"), variable)
+
+    assert pool.get(("node_1", "var")) is variable
+
+
+def _lookup_iterations(pool: VariablePool, iterations: int, index_selector, item_selector, missing_selector) -> int:
+    lookups = 0
+    for _ in range(iterations):
+        # the iteration node reads its index, the nodes inside the iteration read the item
+        # and optional inputs which may not exist
+        assert pool.get(index_selector) is not None
+        for _ in range(5):
+            assert pool.get(item_selector) is not None
+        assert pool.get(missing_selector) is None
+        lookups += 7
+    return lookups
+
+
+@pytest.fixture
+def iteration_pool(pool):
+    pool.add(("iteration", "index"), 0)
+    pool.add(("iteration", "item"), "item")
+    return pool
+
+
+@pytest.mark.benchmark(group="variable_pool_iteration")
+def test_benchmark_iteration_with_raw_selectors(benchmark, iteration_pool):
+    lookups = benchmark(
+        _lookup_iterations,
+        iteration_pool,
+        1000,
+        ["iteration", "index"],
+        ["iteration", "item"],
+        ["iteration", "item", "size"],
+    )
+    assert lookups == 7000
+
+
+@pytest.mark.benchmark(group="variable_pool_iteration")
+def test_benchmark_iteration_with_compiled_selectors(benchmark, iteration_pool):
+    lookups = benchmark(
+        _lookup_iterations,
+        iteration_pool,
+        1000,
+        VariablePool.compile_selector(["iteration", "index"]),
+        VariablePool.compile_selector(["iteration", "item"]),
+        VariablePool.compile_selector(["iteration", "item", "size"]),
+    )
+    assert lookups == 7000
+
+
+def test_overlay_reads_through_and_keeps_own_writes(pool, file):
+    pool.add(("llm", "text"), "answer")
+    pool.add(("llm", "usage"), {"tokens": 10})
+    pool.add(("files", "file"), FileSegment(value=file))
+    pool.add(("iteration", "index"), 0)
+
+    overlay = pool.create_overlay()
+    overlay.add(("iteration", "index"), 1)
+    overlay.add(("code", "result"), "child")
+    overlay.remove(("llm", "usage"))
+
+    assert overlay.get(("llm", "text")).value == "answer"
+    assert overlay.get(("files", "file", "name")).value == file.filename
+    assert overlay.get(("iteration", "index")).value == 1
+    assert overlay.get(("code", "result")).value == "child"
+    assert overlay.get(("llm", "usage")) is None
+    # the parent doesn't see the writes and removals of the overlay
+    assert pool.get(("iteration", "index")).value == 0
+    assert pool.get(("code", "result")) is None
+    assert pool.get(("llm", "usage")).value == {"tokens": 10}
+
+    overlay.add(("llm", "usage"), {"tokens": 20})
+    assert overlay.get(("llm", "usage")).value == {"tokens": 20}
+
+    nested = overlay.create_overlay()
+    nested.remove(("llm",))
+    assert nested.get(("llm", "text")) is None
+    assert nested.get(("code", "result")).value == "child"
+    assert overlay.get(("llm", "text")).value == "answer"
+
+
+def test_overlay_keeps_the_parent_values_it_was_created_with(pool):
+    pool.add(("llm", "text"), "answer")
+    pool.add(("llm", "usage"), {"tokens": 10})
+    pool.add(("conversation", "topic"), "first")
+
+    overlay = pool.create_overlay()
+    nested = overlay.create_overlay()
+    overlay.add(("conversation", "topic"), "overlay")
+    # a sibling branch writes to the parent while the overlay runs
+    pool.add(("conversation", "topic"), "second")
+    pool.add(("llm", "text"), "changed")
+    pool.add(("sibling", "output"), "new")
+    pool.remove(("llm", "usage"))
+
+    assert overlay.get(("llm", "text")).value == "answer"
+    assert overlay.get(("llm", "usage")).value == {"tokens": 10}
+    assert overlay.get(("sibling", "output")) is None
+    assert overlay.get(("conversation", "topic")).value == "overlay"
+    assert nested.get(("llm", "text")).value == "answer"
+    assert nested.get(("conversation", "topic")).value == "first"
+    # the parent and overlays created later see the new values
+    assert pool.get(("llm", "text")).value == "changed"
+    assert pool.create_overlay().get(("sibling", "output")).value == "new"
+
+    pool.remove(("llm",))
+    assert overlay.get(("llm", "text")).value == "answer"
+    assert pool.get(("llm", "text")) is None
+
+    overlay.add(("sibling", "output"), "own")
+    assert overlay.get(("sibling", "output")).value == "own"
+
+
+def _iteration_pool_with_upstream_outputs() -> VariablePool:
+    pool = VariablePool(system_variables={}, user_inputs={})
+    for node_index in range(20):
+        # LLM answers and retrieval results of the nodes before the iteration, about 4MB in total
+        pool.add((f"llm_{node_index}", "text"), "token " * 20000)
+        pool.add(
+            (f"retrieval_{node_index}", "result"),
+            [{"content": "chunk " * 200, "metadata": {"score": 0.5, "position": i}} for i in range(80)],
+        )
+    pool.add(("iteration", "item"), "item")
+    return pool
+
+
+def _run_parallel_iteration_scopes(pool: VariablePool, copy_pool, items: int) -> int:
+    tracemalloc.start()
+    scopes = []
+    for index in range(items):
+        scope = copy_pool(pool)
+        scope.add(("iteration", "index"), index)
+        scope.add(("iteration", "item"), f"item {index}")
+        scopes.append(scope)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert scopes[-1].get(("llm_0", "text")) is not None
+    assert scopes[-1].get(("iteration", "index")).value == items - 1
+    return peak_memory
+
+
+@pytest.mark.parametrize(
+    "copy_pool",
+    [deepcopy, VariablePool.create_overlay],
+    ids=["deepcopy", "overlay"],
+)
+@pytest.mark.benchmark(group="variable_pool_parallel_iteration")
+def test_benchmark_parallel_iteration_scopes(benchmark, copy_pool):
+    pool = _iteration_pool_with_upstream_outputs()
+    items = 50 if copy_pool is deepcopy else 500
+
+    peak_memory = benchmark.pedantic(_run_parallel_iteration_scopes, args=(pool, copy_pool, items), rounds=3)
+
+    benchmark.extra_info["items"] = items
+    benchmark.extra_info["peak_memory_per_item_kb"] = peak_memory / items / 1024
+
+
+def test_render_template(pool, file):
+    pool.add(("node_1", "name"), "dify")
+    pool.add(("node_1", "count"), 3)
+    pool.add(("node_1", "items"), ["a", "b"])
+    pool.add(("node_1", "obj"), {"key": "value"})
+    pool.add(("node_1", "file_var"), FileSegment(value=file))
+    template = (
+        "Hello {{#node_1.name#}}, {{#node_1.count#}} {{#node_1.items#}} {{#node_1.obj#}}"
+        " {{#node_1.file_var#}} {{#node_1.file_var.name#}} {{#node_1.missing#}} example.com"
+    )
+
+    segment_group = pool.convert_template(template)
+    assert pool.render_template(template) == segment_group.text
+    assert segment_group.text == ('Hello dify, 3 ["a", "b"] {"key": "value"}  test_file.txt node_1.missing example.com')
+
+
+def test_convert_template_reuses_literal_segments(pool):
+    pool.add(("node_1", "name"), "dify")
+    template = "Hello {{#node_1.name#}}!"
+
+    first = pool.convert_template(template)
+    pool.add(("node_1", "name"), "world")
+    second = pool.convert_template(template)
+
+    assert first.text == "Hello dify!"
+    assert second.text == "Hello world!"
+    assert first.value[0] is second.value[0]
+    assert first.value[2] is second.value[2]
+
+
+def test_uncached_template_is_not_kept_in_parse_cache(pool):
+    pool.add(("node_1", "name"), "dify")
+    template = "Context: retrieved text for this request only. Hello {{#node_1.name#}}!"
+
+    _parse_template.cache_clear()
+    assert pool.render_template(template, cache=False) == "Context: retrieved text for this request only. Hello dify!"
+    assert pool.convert_template(template, cache=False).text == pool.render_template(template, cache=False)
+    assert _parse_template.cache_info().currsize == 0
+
+    pool.render_template(template)
+    assert _parse_template.cache_info().currsize == 1
+
+
+@pytest.mark.benchmark(group="variable_pool_template")
+def test_benchmark_convert_template(benchmark, iteration_pool):
+    template = "Item {{#iteration.item#}} at index {{#iteration.index#}} of the list, " * 10
+
+    def _render():
+        for _ in range(1000):
+            iteration_pool.convert_template(template)
+
+    benchmark(_render)
+
+
+@pytest.mark.benchmark(group="variable_pool_template")
+def test_benchmark_render_template(benchmark, iteration_pool):
+    template = "Item {{#iteration.item#}} at index {{#iteration.index#}} of the list, " * 10
+
+    def _render():
+        for _ in range(1000):
+            iteration_pool.render_template(template)
+
+    benchmark(_render)
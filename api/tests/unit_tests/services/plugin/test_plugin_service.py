@@ -0,0 +1,54 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from core.plugin.entities.plugin_daemon import PluginInstallTask, PluginInstallTaskStatus
+from services.plugin.plugin_service import PluginService
+
+
+def _task(task_id: str, status: PluginInstallTaskStatus) -> PluginInstallTask:
+    now = datetime.now()
+    return PluginInstallTask(
+        id=task_id,
+        created_at=now,
+        updated_at=now,
+        status=status,
+        total_plugins=1,
+        completed_plugins=0,
+        plugins=[],
+    )
+
+
+def test_provider_configurations_invalidated_once_per_finished_task():
+    seen: set[str] = set()
+
+    def _set(key, value, ex=None, nx=False):
+        if key in seen:
+            return None
+        seen.add(key)
+        return True
+
+    redis_client = MagicMock()
+    redis_client.set.side_effect = _set
+    manager = MagicMock()
+    with (
+        patch("services.plugin.plugin_service.redis_client", redis_client),
+        patch("services.plugin.plugin_service.PluginInstallationManager", return_value=manager),
+        patch("core.helper.provider_configurations_cache.ProviderConfigurationsCache") as cache,
+    ):
+        manager.fetch_plugin_installation_task.return_value = _task("task-1", PluginInstallTaskStatus.Running)
+        PluginService.fetch_install_task("tenant-1", "task-1")
+        cache.invalidate.assert_not_called()
+
+        manager.fetch_plugin_installation_task.return_value = _task("task-1", PluginInstallTaskStatus.Success)
+        PluginService.fetch_install_task("tenant-1", "task-1")
+        PluginService.fetch_install_task("tenant-1", "task-1")
+        cache.invalidate.assert_called_once_with("tenant-1")
+
+        manager.fetch_plugin_installation_tasks.return_value = [
+            _task("task-1", PluginInstallTaskStatus.Success),
+            _task("task-2", PluginInstallTaskStatus.Failed),
+            _task("task-3", PluginInstallTaskStatus.Pending),
+        ]
+        PluginService.fetch_install_tasks("tenant-1", 1, 10)
+        PluginService.fetch_install_tasks("tenant-1", 1, 10)
+        assert cache.invalidate.call_count == 2